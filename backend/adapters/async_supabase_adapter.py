@@ -0,0 +1,764 @@
+"""
+Adaptador asíncrono de Supabase (PostgREST sobre httpx) para MIAPPBORA
+Misma superficie de métodos que SupabaseAdapter, pensado para la ruta caliente del lexicón
+
+A diferencia de supabase-py (síncrono, ejecutado en hilos), aquí un único
+httpx.AsyncClient compartido mantiene conexiones keep-alive hacia PostgREST:
+- Pool acotado (SUPABASE_HTTP_MAX_CONNECTIONS / SUPABASE_HTTP_MAX_KEEPALIVE)
+- Timeouts por defecto y por llamada (argumento `timeout`)
+- Reintentos con backoff exponencial + jitter ante errores transitorios
+- Transporte inyectable (httpx.MockTransport) para pruebas: ver scripts/tests/postgrest_fake.py
+"""
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+import asyncio
+import json
+import logging
+import random
+import time
+
+import httpx
+
+from config.settings import settings
+from adapters.supabase_adapter import _MAX_EXAMPLES_PER_LEMMA
+
+logger = logging.getLogger(__name__)
+
+# Respuestas que vale la pena reintentar (sobrecarga / gateway)
+_RETRYABLE_STATUS = {429, 502, 503, 504}
+# Errores en los que la petición no llegó a enviarse: seguros incluso para escrituras
+_NOT_SENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+Filter = Tuple[str, str, Any]
+
+
+class PostgrestError(Exception):
+    """Error devuelto por PostgREST (status >= 400) tras agotar reintentos."""
+
+    def __init__(self, status_code: int, message: str):
+        super().__init__(f"PostgREST {status_code}: {message}")
+        self.status_code = status_code
+        self.message = message
+
+
+class PostgrestResponse:
+    """Resultado mínimo compatible con el de postgrest-py (data + count)."""
+
+    def __init__(self, data: Any, count: Optional[int] = None):
+        self.data = data
+        self.count = count
+
+
+def _format_value(value: Any) -> str:
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if value is None:
+        return "null"
+    return str(value)
+
+
+def _format_in(values: Iterable[Any]) -> str:
+    """Lista para el operador in.(...) de PostgREST (strings entre comillas)."""
+    parts = []
+    for v in values:
+        if isinstance(v, str):
+            escaped = v.replace("\\", "\\\\").replace('"', '\\"')
+            parts.append(f'"{escaped}"')
+        else:
+            parts.append(_format_value(v))
+    return f"({','.join(parts)})"
+
+
+def _parse_count(content_range: Optional[str]) -> Optional[int]:
+    """Content-Range: 0-9/42 o */42 -> 42."""
+    if not content_range or "/" not in content_range:
+        return None
+    total = content_range.rsplit("/", 1)[1]
+    return int(total) if total.isdigit() else None
+
+
+class AsyncSupabaseAdapter:
+    """
+    Adaptador PostgREST asíncrono con pool de conexiones compartido
+
+    El cliente httpx se crea de forma perezosa dentro del event loop y se
+    cierra en el shutdown de la app (aclose).
+    """
+
+    def __init__(
+        self,
+        use_service_role: bool = False,
+        base_url: Optional[str] = None,
+        api_key: Optional[str] = None,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        if api_key is None:
+            if use_service_role and settings.SUPABASE_SERVICE_KEY:
+                api_key = settings.SUPABASE_SERVICE_KEY
+            else:
+                api_key = settings.SUPABASE_ANON_KEY
+        supabase_url = base_url if base_url is not None else settings.SUPABASE_URL
+
+        self._api_key = api_key
+        self._rest_url = f"{supabase_url.rstrip('/')}/rest/v1" if supabase_url else None
+        self._transport = transport
+        self._client: Optional[httpx.AsyncClient] = None
+
+        self.retries = max(0, settings.SUPABASE_HTTP_RETRIES)
+        self.backoff = settings.SUPABASE_HTTP_BACKOFF
+
+        self.requests = 0
+        self.retried = 0
+        self.failures = 0
+
+        if not self._rest_url or not self._api_key:
+            logger.warning("Supabase (async) no configurado. Configura SUPABASE_URL y SUPABASE_ANON_KEY en .env")
+
+    def is_connected(self) -> bool:
+        """Hay URL y key (la conexión real se abre en la primera petición)."""
+        return bool(self._rest_url and self._api_key)
+
+    # ==========================================
+    # CLIENTE HTTP
+    # ==========================================
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            http2 = bool(settings.SUPABASE_HTTP2)
+            if http2:
+                try:
+                    import h2  # noqa: F401
+                except ImportError:
+                    logger.warning("⚠️ SUPABASE_HTTP2=true pero falta h2 (pip install 'httpx[http2]'); usando HTTP/1.1")
+                    http2 = False
+            self._client = httpx.AsyncClient(
+                base_url=self._rest_url,
+                headers={
+                    "apikey": self._api_key,
+                    "Authorization": f"Bearer {self._api_key}",
+                    "Accept": "application/json",
+                },
+                limits=httpx.Limits(
+                    max_connections=settings.SUPABASE_HTTP_MAX_CONNECTIONS,
+                    max_keepalive_connections=settings.SUPABASE_HTTP_MAX_KEEPALIVE,
+                    keepalive_expiry=settings.SUPABASE_HTTP_KEEPALIVE_EXPIRY,
+                ),
+                timeout=httpx.Timeout(
+                    settings.SUPABASE_HTTP_TIMEOUT,
+                    connect=settings.SUPABASE_HTTP_CONNECT_TIMEOUT,
+                ),
+                http2=http2,
+                transport=self._transport,
+            )
+        return self._client
+
+    async def aclose(self) -> None:
+        """Cierra el pool de conexiones (lifespan shutdown)."""
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+        self._client = None
+
+    def _backoff_delay(self, attempt: int) -> float:
+        base = self.backoff * (2 ** attempt)
+        return base + random.uniform(0, base)
+
+    async def _request(
+        self,
+        method: str,
+        path: str,
+        *,
+        params: Optional[Sequence[Tuple[str, str]]] = None,
+        json_body: Any = None,
+        headers: Optional[Dict[str, str]] = None,
+        timeout: Optional[float] = None,
+        idempotent: bool = True,
+    ) -> PostgrestResponse:
+        """
+        Ejecuta una petición con reintentos.
+
+        Las lecturas (y RPC de solo lectura) se reintentan ante timeouts, errores
+        de transporte y 429/5xx de gateway; las escrituras solo si la petición
+        no llegó a enviarse. `timeout` es un único deadline para la llamada
+        completa, reintentos y esperas de backoff incluidos: no se reintenta si
+        el backoff no cabe en lo que queda.
+        """
+        client = self._get_client()
+        request_timeout = httpx.Timeout(timeout, connect=settings.SUPABASE_HTTP_CONNECT_TIMEOUT) if timeout else httpx.USE_CLIENT_DEFAULT
+        content = json.dumps(json_body).encode("utf-8") if json_body is not None else None
+        req_headers = dict(headers or {})
+        if content is not None:
+            req_headers["Content-Type"] = "application/json"
+
+        deadline = time.monotonic() + timeout if timeout else None
+        attempt = 0
+        while True:
+            self.requests += 1
+            try:
+                call = client.request(
+                    method,
+                    path,
+                    params=list(params or []),
+                    content=content,
+                    headers=req_headers,
+                    timeout=request_timeout,
+                )
+                # httpx limita cada fase (connect/read); el deadline acota el total
+                if deadline is None:
+                    resp = await call
+                else:
+                    resp = await asyncio.wait_for(call, max(0.0, deadline - time.monotonic()))
+            except asyncio.TimeoutError:
+                # Agotado el deadline de la llamada completa: no queda tiempo para reintentar
+                self.failures += 1
+                raise httpx.TimeoutException(f"PostgREST {method} {path} superó {timeout}s") from None
+            except httpx.TransportError as e:
+                retryable = idempotent or isinstance(e, _NOT_SENT_ERRORS)
+                if not retryable or attempt >= self.retries:
+                    self.failures += 1
+                    raise
+                error: Exception = e
+            else:
+                if resp.status_code < 400:
+                    data = resp.json() if resp.content else None
+                    return PostgrestResponse(data, _parse_count(resp.headers.get("content-range")))
+                error = PostgrestError(resp.status_code, resp.text[:500])
+                if not (idempotent and resp.status_code in _RETRYABLE_STATUS) or attempt >= self.retries:
+                    self.failures += 1
+                    raise error
+
+            delay = self._backoff_delay(attempt)
+            if deadline is not None and time.monotonic() + delay >= deadline:
+                self.failures += 1
+                raise error
+            logger.debug(f"Reintento PostgREST {method} {path} tras {type(error).__name__}: {error}")
+            self.retried += 1
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    # ==========================================
+    # PRIMITIVAS POSTGREST
+    # ==========================================
+
+    async def _select(
+        self,
+        table: str,
+        columns: str = "*",
+        filters: Sequence[Filter] = (),
+        order: Optional[str] = None,
+        limit: Optional[int] = None,
+        offset: Optional[int] = None,
+        single: bool = False,
+        timeout: Optional[float] = None,
+    ) -> PostgrestResponse:
+        params: List[Tuple[str, str]] = [("select", columns.replace(" ", ""))]
+        for column, op, value in filters:
+            if op == "in":
+                params.append((column, f"in.{_format_in(value)}"))
+            else:
+                params.append((column, f"{op}.{_format_value(value)}"))
+        if order:
+            params.append(("order", order))
+        if limit is not None:
+            params.append(("limit", str(int(limit))))
+        if offset:
+            params.append(("offset", str(int(offset))))
+        headers = {"Accept": "application/vnd.pgrst.object+json"} if single else None
+        return await self._request("GET", f"/{table}", params=params, headers=headers, timeout=timeout)
+
+    async def _insert(
+        self,
+        table: str,
+        rows: Any,
+        on_conflict: Optional[str] = None,
+        count: bool = False,
+        timeout: Optional[float] = None,
+    ) -> PostgrestResponse:
+        prefer = ["return=representation"]
+        params: List[Tuple[str, str]] = []
+        if on_conflict:
+            prefer.append("resolution=merge-duplicates")
+            params.append(("on_conflict", on_conflict.replace(" ", "")))
+        if count:
+            prefer.append("count=exact")
+        return await self._request(
+            "POST",
+            f"/{table}",
+            params=params,
+            json_body=rows,
+            headers={"Prefer": ",".join(prefer)},
+            timeout=timeout,
+            # Un upsert es idempotente; un insert simple podría duplicar filas
+            idempotent=bool(on_conflict),
+        )
+
+    async def _delete(self, table: str, filters: Sequence[Filter]) -> PostgrestResponse:
+        params = [(column, f"{op}.{_format_value(value)}") for column, op, value in filters]
+        return await self._request("DELETE", f"/{table}", params=params, idempotent=True)
+
+    async def _rpc(
+        self,
+        name: str,
+        params: Dict[str, Any],
+        timeout: Optional[float] = None,
+        idempotent: bool = True,
+    ) -> PostgrestResponse:
+        return await self._request("POST", f"/rpc/{name}", json_body=params, timeout=timeout, idempotent=idempotent)
+
+    # ==========================================
+    # OPERACIONES DE CORPUS
+    # ==========================================
+
+    async def insert_phrase(self, phrase_data: Dict[str, Any]) -> Optional[Dict]:
+        """Inserta una frase del corpus (misma normalización que SupabaseAdapter)."""
+        if not self.is_connected():
+            return None
+
+        payload = dict(phrase_data)
+        bora_text = payload.get('bora_text')
+        spanish_translation = payload.get('spanish_translation') or payload.get('spanish_text')
+        if not bora_text or not spanish_translation:
+            logger.warning("Datos incompletos para insertar frase (bora_text/spanish_translation faltante)")
+            return None
+
+        payload['bora_text'] = bora_text.strip()
+        payload['spanish_translation'] = spanish_translation.strip()
+        payload.pop('spanish_text', None)
+        if not payload.get('category'):
+            payload['category'] = 'General'
+        try:
+            payload['difficulty_level'] = int(payload.get('difficulty_level', 1))
+        except (TypeError, ValueError):
+            payload['difficulty_level'] = 1
+
+        existing = await self.find_phrase_by_texts(payload['bora_text'], payload['spanish_translation'])
+        if existing:
+            return existing
+
+        try:
+            result = await self._insert('bora_phrases', payload)
+            return result.data[0] if result.data else None
+        except Exception as e:
+            logger.error(f"Error al insertar frase: {e}")
+            return None
+
+    async def insert_phrases_bulk(self, phrases: List[Dict[str, Any]]) -> List[Dict]:
+        if not self.is_connected() or not phrases:
+            return []
+        try:
+            result = await self._insert('bora_phrases', phrases)
+            return result.data or []
+        except Exception as e:
+            logger.error(f"Error en inserción bulk de frases: {e}")
+            return []
+
+    async def find_phrase_by_texts(self, bora_text: str, spanish_text: str) -> Optional[Dict]:
+        if not self.is_connected():
+            return None
+        try:
+            result = await self._select(
+                'bora_phrases',
+                filters=[('bora_text', 'eq', bora_text), ('spanish_translation', 'eq', spanish_text)],
+                limit=1,
+            )
+            return result.data[0] if result.data else None
+        except Exception as e:
+            logger.error(f"Error buscando frase: {e}")
+            return None
+
+    async def get_phrases_by_category(self, category: str, limit: int = 10) -> List[Dict]:
+        if not self.is_connected():
+            return []
+        try:
+            result = await self._select('bora_phrases', filters=[('category', 'eq', category)], limit=limit)
+            return result.data or []
+        except Exception as e:
+            logger.error(f"Error al obtener frases: {e}")
+            return []
+
+    # ==========================================
+    # BÚSQUEDA VECTORIAL (pgvector)
+    # ==========================================
+
+    async def vector_search(
+        self,
+        query_embedding: List[float],
+        top_k: int = 5,
+        category: Optional[str] = None,
+        timeout: Optional[float] = None,
+    ) -> List[Dict]:
+        if not self.is_connected():
+            return []
+        try:
+            rpc_name = 'match_phrases_v2' if getattr(settings, 'USE_VECTOR_1536', False) else 'match_phrases'
+            result = await self._rpc(rpc_name, {
+                'query_embedding': query_embedding,
+                'match_threshold': settings.SIMILARITY_THRESHOLD,
+                'match_count': top_k,
+                'category_filter': category,
+            }, timeout=timeout)
+            return result.data or []
+        except Exception as e:
+            logger.error(f"Error en búsqueda vectorial: {e}")
+            return []
+
+    async def store_embedding(self, phrase_id: int, embedding: List[float], metadata: Optional[Dict] = None) -> bool:
+        if not self.is_connected():
+            return False
+        try:
+            result = await self._insert('phrase_embeddings', {
+                'phrase_id': phrase_id,
+                'embedding': embedding,
+                'metadata': metadata or {},
+            })
+            return bool(result.data)
+        except Exception as e:
+            logger.error(f"Error al almacenar embedding: {e}")
+            return False
+
+    async def has_embedding(self, phrase_id: int) -> bool:
+        if not self.is_connected():
+            return False
+        try:
+            result = await self._select('phrase_embeddings', 'id', [('phrase_id', 'eq', phrase_id)], limit=1)
+            return bool(result.data)
+        except Exception as e:
+            logger.error(f"Error verificando embedding existente: {e}")
+            return False
+
+    # ==========================================
+    # LEXICON
+    # ==========================================
+
+    async def insert_lexicon_entry(self, entry: Dict[str, Any]) -> Optional[Dict]:
+        if not self.is_connected():
+            return None
+        try:
+            result = await self._insert('lexicon_entries', entry)
+            return result.data[0] if result.data else None
+        except Exception as e:
+            # Si es conflicto por UNIQUE, intentar recuperar existente
+            logger.warning(f"Insert lexicon entry aviso: {e}")
+            return await self.find_lexicon_by_texts(entry.get('bora_text'), entry.get('spanish_text'))
+
+    async def find_lexicon_by_texts(self, bora_text: str, spanish_text: str) -> Optional[Dict]:
+        if not self.is_connected():
+            return None
+        try:
+            result = await self._select(
+                'lexicon_entries',
+                filters=[('bora_text', 'eq', bora_text), ('spanish_text', 'eq', spanish_text)],
+                limit=1,
+            )
+            return result.data[0] if result.data else None
+        except Exception as e:
+            logger.error(f"Error buscando lexicon entry: {e}")
+            return None
+
+    async def has_lexicon_embedding(self, entry_id: int) -> bool:
+        if not self.is_connected():
+            return False
+        try:
+            result = await self._select('lexicon_embeddings', 'id', [('entry_id', 'eq', entry_id)], limit=1)
+            return bool(result.data)
+        except Exception as e:
+            logger.error(f"Error verificando lexicon embedding: {e}")
+            return False
+
+    async def store_lexicon_embedding(self, entry_id: int, embedding: List[float], metadata: Optional[Dict] = None) -> bool:
+        if not self.is_connected():
+            return False
+        try:
+            result = await self._insert('lexicon_embeddings', {
+                'entry_id': entry_id,
+                'embedding': embedding,
+                'metadata': metadata or {},
+            })
+            return bool(result.data)
+        except Exception as e:
+            logger.error(f"Error guardando lexicon embedding: {e}")
+            return False
+
+    async def vector_search_lexicon(
+        self,
+        query_embedding: List[float],
+        top_k: int = 5,
+        category: Optional[str] = None,
+        min_similarity: Optional[float] = None,
+        timeout: Optional[float] = None,
+    ) -> List[Dict]:
+        if not self.is_connected():
+            return []
+        try:
+            threshold = settings.SIMILARITY_THRESHOLD if (min_similarity is None) else float(min_similarity)
+            rpc_name = 'match_lexicon_v2' if getattr(settings, 'USE_VECTOR_1536', False) else 'match_lexicon'
+            result = await self._rpc(rpc_name, {
+                'query_embedding': query_embedding,
+                'match_threshold': threshold,
+                'match_count': top_k,
+                'category_filter': category,
+            }, timeout=timeout)
+            return result.data or []
+        except Exception as e:
+            logger.error(f"Error en match_lexicon: {e}")
+            return []
+
+    async def reset_lexicon_source(self, source: str = 'salida.json') -> bool:
+        if not self.is_connected():
+            return False
+        try:
+            await self._delete('lexicon_entries', [('source', 'eq', source)])
+            return True
+        except Exception as e:
+            logger.error(f"Error reseteando lexicon por source: {e}")
+            return False
+
+    async def upsert_lexicon_entries_bulk(self, entries: List[Dict[str, Any]], on_conflict: str = 'bora_text,spanish_text') -> List[Dict]:
+        if not self.is_connected() or not entries:
+            return []
+        try:
+            result = await self._insert('lexicon_entries', entries, on_conflict=on_conflict)
+            return result.data or []
+        except Exception as e:
+            logger.error(f"Error en upsert bulk de lexicon_entries: {e}")
+            return []
+
+    async def get_existing_lexicon_embeddings(self, entry_ids: List[int]) -> List[int]:
+        if not self.is_connected() or not entry_ids:
+            return []
+        try:
+            result = await self._select('lexicon_embeddings', 'entry_id', [('entry_id', 'in', entry_ids)])
+            return [r.get('entry_id') for r in result.data or [] if r.get('entry_id') is not None]
+        except Exception as e:
+            logger.error(f"Error consultando embeddings existentes: {e}")
+            return []
+
+    async def get_existing_lexicon_embeddings_by_kind(self, entry_ids: List[int], kind: str) -> List[int]:
+        if not self.is_connected() or not entry_ids:
+            return []
+        try:
+            result = await self._select(
+                'lexicon_embeddings',
+                'entry_id, metadata',
+                [('entry_id', 'in', entry_ids), ('metadata->>kind', 'eq', kind)],
+            )
+            return [r.get('entry_id') for r in result.data or [] if r.get('entry_id') is not None]
+        except Exception as e:
+            logger.error(f"Error consultando embeddings por kind='{kind}': {e}")
+            return []
+
+    async def insert_lexicon_embeddings_bulk(self, rows: List[Dict[str, Any]]) -> int:
+        if not self.is_connected() or not rows:
+            return 0
+        try:
+            result = await self._insert('lexicon_embeddings', rows)
+            return len(result.data or [])
+        except Exception as e:
+            logger.error(f"Error en inserción bulk de lexicon_embeddings: {e}")
+            return 0
+
+    # ==========================================
+    # BORA_DOCS: Nuevo esquema unificado
+    # ==========================================
+
+    async def upsert_lemmas_bulk(self, lemmas: List[Dict[str, Any]]) -> List[Dict]:
+        if not self.is_connected() or not lemmas:
+            return []
+        try:
+            result = await self._insert('lexicon_lemmas', lemmas, on_conflict='lemma,source,direction')
+            return result.data or []
+        except Exception as e:
+            logger.error(f"Error upsert lemmas: {e}")
+            return []
+
+    async def insert_subentries_bulk(self, subentries: List[Dict[str, Any]]) -> List[Dict]:
+        if not self.is_connected() or not subentries:
+            return []
+        try:
+            result = await self._insert('lexicon_subentries', subentries)
+            return result.data or []
+        except Exception as e:
+            logger.error(f"Error insert subentries: {e}")
+            return []
+
+    async def insert_examples_bulk(self, examples: List[Dict[str, Any]]) -> List[Dict]:
+        if not self.is_connected() or not examples:
+            return []
+        try:
+            result = await self._insert('lexicon_examples', examples)
+            return result.data or []
+        except Exception as e:
+            logger.error(f"Error insert examples: {e}")
+            return []
+
+    async def insert_bora_docs_bulk(self, docs: List[Dict[str, Any]]) -> int:
+        if not self.is_connected() or not docs:
+            return 0
+        try:
+            result = await self._insert('bora_docs', docs, count=True)
+            if isinstance(result.count, int) and result.count >= 0:
+                return result.count
+            return len(result.data) if result.data else len(docs)
+        except Exception as e:
+            logger.error(f"Error insert bora_docs: {e}")
+            return 0
+
+    async def fetch_all_lemmas(self, columns: str = 'id, lemma, direction', page_size: int = 1000) -> List[Dict[str, Any]]:
+        """Lee lexicon_lemmas completo paginando por offset."""
+        if not self.is_connected():
+            return []
+        rows: List[Dict[str, Any]] = []
+        offset = 0
+        try:
+            while True:
+                res = await self._select('lexicon_lemmas', columns, order='id.asc', limit=page_size, offset=offset)
+                batch = res.data or []
+                rows.extend(batch)
+                if len(batch) < page_size:
+                    break
+                offset += page_size
+        except Exception as e:
+            logger.error(f"Error listando lexicon_lemmas: {e}")
+        return rows
+
+    async def find_lemma_by_text(self, lemma: str, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Busca un lemma exacto (case-sensitive por defecto)."""
+        if not self.is_connected():
+            return None
+        try:
+            res = await self._select(
+                'lexicon_lemmas',
+                'id, lemma, gloss_es, gloss_bora, direction, pos, pos_full, page',
+                [('lemma', 'eq', lemma)],
+                limit=1,
+                timeout=timeout,
+            )
+            rows = res.data or []
+            return rows[0] if rows else None
+        except Exception as e:
+            logger.error(f"Error buscando lemma='{lemma}': {e}")
+            return None
+
+    async def get_examples_by_lemma_id(self, lemma_id: int, limit: int = 3, timeout: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Obtiene ejemplos (bora_text, spanish_text) de un lemma dado."""
+        if not self.is_connected():
+            return []
+        try:
+            res = await self._select(
+                'lexicon_examples',
+                'id, bora_text, spanish_text, page',
+                [('lemma_id', 'eq', lemma_id)],
+                limit=limit,
+                timeout=timeout,
+            )
+            return res.data or []
+        except Exception as e:
+            logger.error(f"Error obteniendo ejemplos de lemma_id={lemma_id}: {e}")
+            return []
+
+    async def get_examples_by_lemma_ids(
+        self,
+        lemma_ids: List[int],
+        limit_per_lemma: int = 3,
+        timeout: Optional[float] = None,
+    ) -> Dict[int, List[Dict[str, Any]]]:
+        """Ejemplos de varios lemmas en una sola consulta (ver SupabaseAdapter.get_examples_by_lemma_ids)."""
+        if not self.is_connected():
+            return {}
+        unique_ids = list(dict.fromkeys(int(i) for i in lemma_ids if i is not None))
+        if not unique_ids or limit_per_lemma <= 0:
+            return {}
+        try:
+            res = await self._select(
+                'lexicon_examples',
+                'id, lemma_id, bora_text, spanish_text, page',
+                [('lemma_id', 'in', unique_ids)],
+                order='id.asc',
+                limit=len(unique_ids) * max(limit_per_lemma, _MAX_EXAMPLES_PER_LEMMA),
+                timeout=timeout,
+            )
+            grouped: Dict[int, List[Dict[str, Any]]] = {}
+            for row in res.data or []:
+                bucket = grouped.setdefault(row.get('lemma_id'), [])
+                if len(bucket) < limit_per_lemma:
+                    bucket.append(row)
+            return grouped
+        except Exception as e:
+            logger.error(f"Error obteniendo ejemplos de {len(unique_ids)} lemmas: {e}")
+            return {}
+
+    async def vector_search_bora_docs(
+        self,
+        query_embedding: List[float],
+        top_k: int = 10,
+        kinds: Optional[List[str]] = None,
+        pos_full: Optional[str] = None,
+        min_similarity: Optional[float] = None,
+        direction: Optional[str] = None,  # Compatibilidad: match_bora_docs_v2 no filtra por dirección
+        timeout: Optional[float] = None,
+    ) -> List[Dict]:
+        if not self.is_connected():
+            return []
+        try:
+            threshold = settings.SIMILARITY_THRESHOLD if (min_similarity is None) else float(min_similarity)
+            params: Dict[str, Any] = {
+                'query_embedding': query_embedding,
+                'match_threshold': threshold,
+                'match_count': top_k,
+                'kind_filter': kinds if kinds else None,
+                'pos_filter': pos_full if pos_full else None,
+            }
+            rpc_name = 'match_bora_docs_v2' if getattr(settings, 'USE_VECTOR_1536', False) else 'match_bora_docs'
+            res = await self._rpc(rpc_name, params, timeout=timeout)
+            return res.data or []
+        except Exception as e:
+            logger.error(f"Error en match_bora_docs: {e}")
+            return []
+
+    # ==========================================
+    # OPERACIONES DE USUARIO
+    # ==========================================
+
+    async def get_user_by_email(self, email: str) -> Optional[Dict]:
+        if not self.is_connected():
+            return None
+        try:
+            result = await self._select('users', filters=[('email', 'eq', email)], single=True)
+            return result.data
+        except Exception as e:
+            logger.error(f"Error al obtener usuario: {e}")
+            return None
+
+    async def update_user_points(self, user_id: str, points_to_add: int) -> bool:
+        if not self.is_connected():
+            return False
+        try:
+            # Incremento no idempotente: sin reintentos tras enviar
+            await self._rpc('increment_user_points', {'user_uuid': user_id, 'points': points_to_add}, idempotent=False)
+            return True
+        except Exception as e:
+            logger.error(f"Error al actualizar puntos: {e}")
+            return False
+
+    # ==========================================
+    # ESTADÍSTICAS
+    # ==========================================
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "configured": self.is_connected(),
+            "open": self._client is not None and not self._client.is_closed,
+            "http2": bool(settings.SUPABASE_HTTP2),
+            "max_connections": settings.SUPABASE_HTTP_MAX_CONNECTIONS,
+            "max_keepalive": settings.SUPABASE_HTTP_MAX_KEEPALIVE,
+            "requests": self.requests,
+            "retried": self.retried,
+            "failures": self.failures,
+        }
+
+
+# Instancia global (un único pool de conexiones por proceso)
+async_supabase_adapter = AsyncSupabaseAdapter(use_service_role=False)
+
+
+def get_async_supabase_adapter() -> AsyncSupabaseAdapter:
+    """Función helper para obtener el adaptador asíncrono"""
+    return async_supabase_adapter
@@ -0,0 +1,359 @@
+"""
+Cache de embeddings para MIAPPBORA
+Direccionada por contenido: sha256(modelo, dimensión, texto normalizado)
+
+Dos niveles:
+    memoria -> LRU acotado por número de entradas (float32)
+    disco   -> SQLite (EMBEDDING_CACHE_PATH) que sobrevive reinicios y re-ingestas
+
+La usan de forma transparente HuggingFaceAdapter y HuggingFaceHybridAdapter,
+tanto en generate_embedding como en generate_embeddings_batch. Las variantes
+async (aget_many/aput_many) solo tocan la memoria en el event loop: las
+lecturas de disco van a un hilo y las escrituras a un escritor en segundo plano.
+
+Las métricas se inyectan con `lookup_hook` (la capa de servicios lo conecta al
+arrancar), así los adaptadores no dependen de services/.
+"""
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Any
+import asyncio
+import hashlib
+import logging
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+
+import numpy as np
+
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+BACKEND_ROOT = Path(__file__).resolve().parent.parent
+
+_WHITESPACE_RE = re.compile(r"\s+")
+# Límite de parámetros por sentencia en SQLite (SQLITE_MAX_VARIABLE_NUMBER conservador)
+_SQLITE_CHUNK = 500
+
+
+def normalize_text(text: str) -> str:
+    """NFC + espacios colapsados. No se cambia mayúsculas: el embedding sí las distingue."""
+    return _WHITESPACE_RE.sub(" ", unicodedata.normalize("NFC", text or "")).strip()
+
+
+def make_cache_key(model: str, dimension: Optional[int], text: str) -> str:
+    """Clave estable para (modelo, dimensión, texto normalizado)."""
+    dim = str(dimension) if dimension else "native"
+    payload = f"{model}\x1f{dim}\x1f{normalize_text(text)}"
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def resolve_cache_path(path: Optional[str] = None) -> Optional[Path]:
+    """Resuelve la ruta del SQLite (relativa a backend/ si no es absoluta). '' desactiva el disco."""
+    raw = settings.EMBEDDING_CACHE_PATH if path is None else path
+    if not raw:
+        return None
+    resolved = Path(raw)
+    if not resolved.is_absolute():
+        resolved = BACKEND_ROOT / resolved
+    return resolved
+
+
+class EmbeddingCache:
+    """
+    Cache de embeddings en dos niveles (memoria LRU + SQLite)
+
+    Thread-safe: los adaptadores de embeddings son síncronos y pueden
+    ejecutarse desde el threadpool de FastAPI o desde scripts. La memoria y el
+    disco tienen locks separados: el LRU nunca espera a una consulta SQLite.
+    """
+
+    def __init__(
+        self,
+        max_entries: Optional[int] = None,
+        path: Optional[str] = None,
+        enabled: Optional[bool] = None,
+    ):
+        self.enabled = settings.EMBEDDING_CACHE_ENABLED if enabled is None else enabled
+        self.max_entries = max_entries if max_entries is not None else settings.EMBEDDING_CACHE_MAX_ENTRIES
+        self.path = resolve_cache_path(path)
+
+        self._memory: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._disk_failed = False
+        # Un solo hilo: las escrituras diferidas se aplican en orden
+        self._writer: Optional[ThreadPoolExecutor] = None
+        # (resultado 'hit'/'miss', cantidad) -> métricas; lo asigna la capa de servicios
+        self.lookup_hook: Optional[Callable[[str, int], None]] = None
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.writes = 0
+
+    # ==========================================
+    # API PÚBLICA
+    # ==========================================
+
+    def get(self, model: str, dimension: Optional[int], text: str) -> Optional[List[float]]:
+        """Retorna el embedding cacheado o None."""
+        return self.get_many(model, dimension, [text])[0]
+
+    def put(self, model: str, dimension: Optional[int], text: str, embedding: Sequence[float]) -> None:
+        """Guarda un embedding en ambos niveles."""
+        self.put_many(model, dimension, [(text, embedding)])
+
+    def get_many(self, model: str, dimension: Optional[int], texts: Sequence[str]) -> List[Optional[List[float]]]:
+        """
+        Busca varios textos a la vez (una sola consulta a disco para los que
+        no están en memoria). Retorna una lista alineada con `texts`.
+        """
+        results: List[Optional[List[float]]] = [None] * len(texts)
+        if not self.enabled or not texts:
+            return results
+        pending = self._memory_get(model, dimension, texts, results)
+        if pending:
+            self._fill_from_disk(pending, results, self._disk_get(list(pending.keys())))
+        self._record_lookup(len(texts), pending)
+        return results
+
+    async def aget_many(
+        self, model: str, dimension: Optional[int], texts: Sequence[str]
+    ) -> List[Optional[List[float]]]:
+        """get_many para el event loop: la memoria se consulta aquí y el disco en un hilo."""
+        results: List[Optional[List[float]]] = [None] * len(texts)
+        if not self.enabled or not texts:
+            return results
+        pending = self._memory_get(model, dimension, texts, results)
+        if pending and self._has_disk():
+            found = await asyncio.to_thread(self._disk_get, list(pending.keys()))
+            self._fill_from_disk(pending, results, found)
+        self._record_lookup(len(texts), pending)
+        return results
+
+    def put_many(
+        self,
+        model: str,
+        dimension: Optional[int],
+        items: Iterable[Tuple[str, Optional[Sequence[float]]]],
+    ) -> None:
+        """Guarda pares (texto, embedding); ignora embeddings vacíos."""
+        if not self.enabled:
+            return
+        rows = self._memory_put(model, dimension, items)
+        if rows:
+            self._disk_put(rows)
+
+    def aput_many(
+        self,
+        model: str,
+        dimension: Optional[int],
+        items: Iterable[Tuple[str, Optional[Sequence[float]]]],
+    ) -> None:
+        """
+        put_many para el event loop: guarda en memoria y deja la escritura a
+        disco al escritor en segundo plano (no espera al INSERT ni al commit).
+        """
+        if not self.enabled:
+            return
+        rows = self._memory_put(model, dimension, items)
+        if rows and self._has_disk():
+            if self._writer is None:
+                self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='embedding-cache-writer')
+            self._writer.submit(self._disk_put, rows)
+
+    def flush(self) -> None:
+        """Espera a que terminen las escrituras diferidas (scripts y tests)."""
+        if self._writer is not None:
+            self._writer.submit(lambda: None).result()
+
+    def clear_memory(self) -> None:
+        with self._lock:
+            self._memory.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "memory_entries": len(self._memory),
+            "max_entries": self.max_entries,
+            "disk_path": str(self.path) if self.path else None,
+            "disk_entries": self._disk_count(),
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "writes": self.writes,
+            "hit_rate": round((self.memory_hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+        }
+
+    # ==========================================
+    # INTERNOS
+    # ==========================================
+
+    def _memory_get(
+        self,
+        model: str,
+        dimension: Optional[int],
+        texts: Sequence[str],
+        results: List[Optional[List[float]]],
+    ) -> Dict[str, List[int]]:
+        """Rellena `results` desde memoria; retorna clave -> posiciones pendientes de disco."""
+        pending: Dict[str, List[int]] = {}
+        with self._lock:
+            for i, text in enumerate(texts):
+                key = make_cache_key(model, dimension, text)
+                vec = self._memory.get(key)
+                if vec is not None:
+                    self._memory.move_to_end(key)
+                    results[i] = vec.tolist()
+                    self.memory_hits += 1
+                else:
+                    pending.setdefault(key, []).append(i)
+        return pending
+
+    def _fill_from_disk(
+        self,
+        pending: Dict[str, List[int]],
+        results: List[Optional[List[float]]],
+        found: Dict[str, np.ndarray],
+    ) -> None:
+        with self._lock:
+            for key, vec in found.items():
+                self._remember(key, vec)
+                for i in pending.pop(key):
+                    results[i] = vec.tolist()
+                    self.disk_hits += 1
+
+    def _memory_put(
+        self,
+        model: str,
+        dimension: Optional[int],
+        items: Iterable[Tuple[str, Optional[Sequence[float]]]],
+    ) -> List[Tuple[str, str, int, bytes, float]]:
+        """Guarda en memoria y retorna las filas para disco."""
+        rows: List[Tuple[str, str, int, bytes, float]] = []
+        now = time.time()
+        with self._lock:
+            for text, embedding in items:
+                if not embedding:
+                    continue
+                key = make_cache_key(model, dimension, text)
+                vec = np.asarray(embedding, dtype=np.float32)
+                self._remember(key, vec)
+                rows.append((key, model, int(vec.shape[0]), vec.tobytes(), now))
+            self.writes += len(rows)
+        return rows
+
+    def _record_lookup(self, total: int, pending: Dict[str, List[int]]) -> None:
+        misses = sum(len(idx) for idx in pending.values())
+        with self._lock:
+            self.misses += misses
+        if self.lookup_hook is not None:
+            self.lookup_hook("miss", misses)
+            self.lookup_hook("hit", total - misses)
+
+    def _has_disk(self) -> bool:
+        return self.path is not None and not self._disk_failed
+
+    def _remember(self, key: str, vec: np.ndarray) -> None:
+        # Llamar con self._lock tomado
+        self._memory[key] = vec
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _connection(self) -> Optional[sqlite3.Connection]:
+        # Llamar con self._disk_lock tomado
+        if self._conn is not None or self._disk_failed or self.path is None:
+            return self._conn
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.path), check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                " key TEXT PRIMARY KEY,"
+                " model TEXT NOT NULL,"
+                " dim INTEGER NOT NULL,"
+                " vec BLOB NOT NULL,"
+                " created_at REAL NOT NULL)"
+            )
+            conn.commit()
+            self._conn = conn
+            logger.info(f"💾 Cache de embeddings en disco: {self.path}")
+        except sqlite3.Error as e:
+            # Sin disco seguimos solo con memoria
+            self._disk_failed = True
+            logger.warning(f"⚠️ Cache de embeddings en disco no disponible ({self.path}): {e}")
+        return self._conn
+
+    def _disk_get(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        with self._disk_lock:
+            return self._disk_get_locked(keys)
+
+    def _disk_get_locked(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        conn = self._connection()
+        if conn is None:
+            return {}
+        found: Dict[str, np.ndarray] = {}
+        try:
+            for start in range(0, len(keys), _SQLITE_CHUNK):
+                chunk = keys[start:start + _SQLITE_CHUNK]
+                placeholders = ",".join("?" * len(chunk))
+                cur = conn.execute(
+                    f"SELECT key, dim, vec FROM embeddings WHERE key IN ({placeholders})",
+                    chunk,
+                )
+                for key, dim, blob in cur.fetchall():
+                    vec = np.frombuffer(blob, dtype=np.float32)
+                    if vec.shape[0] == dim:
+                        found[key] = vec
+        except sqlite3.Error as e:
+            logger.warning(f"⚠️ Error leyendo cache de embeddings: {e}")
+        return found
+
+    def _disk_put(self, rows: List[Tuple[str, str, int, bytes, float]]) -> None:
+        with self._disk_lock:
+            conn = self._connection()
+            if conn is None:
+                return
+            try:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, model, dim, vec, created_at) VALUES (?, ?, ?, ?, ?)",
+                    rows,
+                )
+                conn.commit()
+            except sqlite3.Error as e:
+                logger.warning(f"⚠️ Error escribiendo cache de embeddings: {e}")
+
+    def _disk_count(self) -> Optional[int]:
+        with self._disk_lock:
+            conn = self._connection()
+            if conn is None:
+                return None
+            try:
+                return int(conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0])
+            except sqlite3.Error:
+                return None
+
+
+# Instancia global compartida por ambos adaptadores de embeddings
+_cache_instance: Optional[EmbeddingCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_embedding_cache() -> EmbeddingCache:
+    """Obtiene la instancia singleton de la cache de embeddings"""
+    global _cache_instance
+    if _cache_instance is None:
+        with _cache_lock:
+            if _cache_instance is None:
+                _cache_instance = EmbeddingCache()
+    return _cache_instance
@@ -2,10 +2,13 @@
 Adaptador de HuggingFace para MIAPPBORA
 Maneja embeddings y modelos de lenguaje desde HuggingFace
 """
-from typing import List, Optional, TYPE_CHECKING
+from typing import List, Optional, Tuple, TYPE_CHECKING
+from concurrent.futures import ThreadPoolExecutor
 from huggingface_hub import InferenceClient
 from config.settings import settings
-from openai import OpenAI
+from adapters.embedding_cache import get_embedding_cache
+from openai import OpenAI, AsyncOpenAI
+import asyncio
 import logging
 import numpy as np
 
@@ -15,6 +18,13 @@ if TYPE_CHECKING:
 
 logger = logging.getLogger(__name__)
 
+# Pool acotado para SentenceTransformer.encode (CPU): evita bloquear el event loop
+# sin lanzar más codificaciones simultáneas que núcleos útiles
+_encode_executor = ThreadPoolExecutor(
+    max_workers=settings.EMBEDDING_ENCODE_THREADS,
+    thread_name_prefix='embedding-encode',
+)
+
 
 class HuggingFaceAdapter:
     """
@@ -24,12 +34,15 @@ class HuggingFaceAdapter:
     - Generar embeddings de texto
     - Inferencia con LLMs
     - Caché de modelos
+    - Caché de embeddings (memoria + disco, ver adapters/embedding_cache.py)
     """
     
     def __init__(self):
         self.embedding_model: Optional['SentenceTransformer'] = None
         self.inference_client: Optional[InferenceClient] = None
         self._openai_client: Optional[OpenAI] = None
+        self._async_openai_client: Optional[AsyncOpenAI] = None
+        self.embedding_cache = get_embedding_cache()
         self._initialize_models()
     
     def _initialize_models(self):
@@ -53,6 +66,8 @@ class HuggingFaceAdapter:
                 if settings.OPENAI_ORG:
                     client_kwargs["organization"] = settings.OPENAI_ORG
                 self._openai_client = OpenAI(**client_kwargs)
+                # Cliente asíncrono para la ruta de request (no bloquea el event loop)
+                self._async_openai_client = AsyncOpenAI(**client_kwargs)
             else:
                 # Inicializar modelo de embeddings local (requiere sentence-transformers)
                 try:
@@ -111,6 +126,25 @@ class HuggingFaceAdapter:
             >>> len(embedding)  # Para all-MiniLM-L6-v2: 384
             384
         """
+        model, dimension = self._embedding_namespace()
+        cached = self.embedding_cache.get(model, dimension, text)
+        if cached is not None:
+            return cached
+
+        embedding = self._compute_embedding(text)
+        if embedding:
+            self.embedding_cache.put(model, dimension, text, embedding)
+        return embedding
+
+    def _embedding_namespace(self) -> Tuple[str, Optional[int]]:
+        """(modelo, dimensión) que identifican los vectores en la cache."""
+        if settings.USE_EMBEDDING_API and self._openai_client:
+            # Sin parámetro `dimensions`: la dimensión es la nativa del modelo
+            return f"openai:{settings.EMBEDDING_API_MODEL}", None
+        return f"st:{settings.EMBEDDING_MODEL}:normalized", settings.EMBEDDING_DIMENSION
+
+    def _compute_embedding(self, text: str) -> Optional[List[float]]:
+        """Genera el embedding sin pasar por la cache."""
         # Ruta OpenAI API
         if settings.USE_EMBEDDING_API and self._openai_client:
             try:
@@ -152,6 +186,22 @@ class HuggingFaceAdapter:
         Returns:
             Lista de embeddings o None si falla
         """
+        model, dimension = self._embedding_namespace()
+        results = self.embedding_cache.get_many(model, dimension, texts)
+
+        # Solo se calculan los textos que faltan (sin repetir)
+        missing = list(dict.fromkeys(t for t, r in zip(texts, results) if r is None))
+        if missing:
+            computed = self._compute_embeddings_batch(missing)
+            if computed is None:
+                return None
+            self.embedding_cache.put_many(model, dimension, zip(missing, computed))
+            by_text = dict(zip(missing, computed))
+            results = [r if r is not None else by_text.get(t) for t, r in zip(texts, results)]
+        return results
+
+    def _compute_embeddings_batch(self, texts: List[str]) -> Optional[List[List[float]]]:
+        """Genera embeddings en lote sin pasar por la cache."""
         # Ruta OpenAI API (entrada como lista -> una sola llamada)
         if settings.USE_EMBEDDING_API and self._openai_client:
             try:
@@ -185,6 +235,71 @@ class HuggingFaceAdapter:
             logger.error(f"Error al generar embeddings batch local: {e}")
             return None
     
+    # ==========================================
+    # EMBEDDINGS (ASYNC)
+    # ==========================================
+
+    async def agenerate_embedding(self, text: str) -> Optional[List[float]]:
+        """
+        Versión asíncrona de generate_embedding para handlers async.
+
+        OpenAI se consulta con AsyncOpenAI; el modelo local se ejecuta en un
+        pool de hilos acotado (EMBEDDING_ENCODE_THREADS). La cache solo toca
+        la memoria en el event loop (disco en hilo / escritor en segundo plano).
+        """
+        model, dimension = self._embedding_namespace()
+        cached = (await self.embedding_cache.aget_many(model, dimension, [text]))[0]
+        if cached is not None:
+            return cached
+
+        if settings.USE_EMBEDDING_API and self._async_openai_client:
+            try:
+                resp = await self._async_openai_client.embeddings.create(
+                    model=settings.EMBEDDING_API_MODEL,
+                    input=text,
+                )
+                vec = (resp.data[0].embedding if resp and resp.data else None)
+                embedding = list(vec) if vec is not None else None
+            except Exception as e:
+                logger.error(f"Error al generar embedding (OpenAI API async): {e}")
+                return None
+        else:
+            loop = asyncio.get_running_loop()
+            embedding = await loop.run_in_executor(_encode_executor, self._compute_embedding, text)
+
+        if embedding:
+            self.embedding_cache.aput_many(model, dimension, [(text, embedding)])
+        return embedding
+
+    async def agenerate_embeddings_batch(self, texts: List[str]) -> Optional[List[List[float]]]:
+        """Versión asíncrona de generate_embeddings_batch (misma cache y deduplicación)."""
+        model, dimension = self._embedding_namespace()
+        results = await self.embedding_cache.aget_many(model, dimension, texts)
+
+        missing = list(dict.fromkeys(t for t, r in zip(texts, results) if r is None))
+        if not missing:
+            return results
+
+        if settings.USE_EMBEDDING_API and self._async_openai_client:
+            try:
+                resp = await self._async_openai_client.embeddings.create(
+                    model=settings.EMBEDDING_API_MODEL,
+                    input=missing,
+                )
+                computed = [list(item.embedding) for item in resp.data] if resp and resp.data else None
+            except Exception as e:
+                logger.error(f"Error al generar embeddings batch (OpenAI API async): {e}")
+                return None
+        else:
+            loop = asyncio.get_running_loop()
+            computed = await loop.run_in_executor(_encode_executor, self._compute_embeddings_batch, missing)
+
+        if computed is None:
+            return None
+        self.embedding_cache.aput_many(model, dimension, zip(missing, computed))
+        by_text = dict(zip(missing, computed))
+        return [r if r is not None else by_text.get(t) for t, r in zip(texts, results)]
+
     def compute_similarity(
         self, 
         embedding1: List[float], 
@@ -6,13 +6,14 @@ Configuración en .env:
     USE_EMBEDDING_API=true   # Usar API de HuggingFace
     USE_EMBEDDING_API=false  # Usar modelo local (por defecto)
 """
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple
 import logging
 import numpy as np
 import requests
 import time
 
 from config.settings import settings
+from adapters.embedding_cache import get_embedding_cache
 
 logger = logging.getLogger(__name__)
 
@@ -57,6 +58,7 @@ class HuggingFaceHybridAdapter:
         self.use_api = use_api if use_api is not None else getattr(settings, 'USE_EMBEDDING_API', False)
         self.api_url = self.API_ENDPOINTS.get(settings.EMBEDDING_MODEL)
         self.api_headers = None
+        self.embedding_cache = get_embedding_cache()
         
         if settings.HUGGINGFACE_API_KEY:
             self.api_headers = {"Authorization": f"Bearer {settings.HUGGINGFACE_API_KEY}"}
@@ -143,23 +145,32 @@ class HuggingFaceHybridAdapter:
             logger.warning("Texto vacío, retornando None")
             return None
         
+        model, dimension = self._embedding_namespace()
+        cached = self.embedding_cache.get(model, dimension, text)
+        if cached is not None:
+            return cached
+        
         # Intentar con el modo configurado
-        if self.use_api:
-            embedding = self._generate_via_api(text)
-            
-            # Fallback a local si API falla y está disponible
-            if embedding is None and retry_on_failure and self.embedding_model:
+        embedding = self._generate_via_api(text) if self.use_api else self._generate_local(text)
+        if embedding is not None:
+            self.embedding_cache.put(model, dimension, text, embedding)
+            return embedding
+        
+        # Fallback al otro modo (no se cachea: el vector viene de otro backend)
+        if retry_on_failure:
+            if self.use_api and self.embedding_model:
                 logger.warning("API falló, intentando con modelo local...")
-                embedding = self._generate_local(text)
-        else:
-            embedding = self._generate_local(text)
-            
-            # Fallback a API si local falla
-            if embedding is None and retry_on_failure and self.api_url:
+                return self._generate_local(text)
+            if not self.use_api and self.api_url:
                 logger.warning("Modelo local falló, intentando con API...")
-                embedding = self._generate_via_api(text)
+                return self._generate_via_api(text)
         
-        return embedding
+        return None
+    
+    def _embedding_namespace(self) -> Tuple[str, Optional[int]]:
+        """(modelo, dimensión) que identifican los vectores en la cache."""
+        prefix = "hf-api" if self.use_api else "st"
+        return f"{prefix}:{settings.EMBEDDING_MODEL}", settings.EMBEDDING_DIMENSION
     
     # ==========================================
     # MODO LOCAL
@@ -302,12 +313,26 @@ class HuggingFaceHybridAdapter:
         Returns:
             Lista de embeddings
         """
+        model, dimension = self._embedding_namespace()
+        results = self.embedding_cache.get_many(model, dimension, texts)
+        
+        # Solo se calculan los textos que faltan (sin repetir)
+        missing = list(dict.fromkeys(t for t, r in zip(texts, results) if r is None))
+        if not missing:
+            return results
+        if len(missing) < len(texts):
+            logger.info(f"💾 Cache de embeddings: {len(texts) - len(missing)}/{len(texts)} reutilizados")
+        
         if self.use_api:
             # API: procesar uno por uno (no soporta batch nativo)
-            return self._batch_api(texts, show_progress)
+            computed = self._batch_api(missing, show_progress)
         else:
             # Local: usar batch nativo de sentence-transformers
-            return self._batch_local(texts, batch_size, show_progress)
+            computed = self._batch_local(missing, batch_size, show_progress)
+        
+        self.embedding_cache.put_many(model, dimension, zip(missing, computed))
+        by_text = dict(zip(missing, computed))
+        return [r if r is not None else by_text.get(t) for t, r in zip(texts, results)]
     
     def _batch_local(
         self, 
@@ -349,7 +374,7 @@ class HuggingFaceHybridAdapter:
             if show_progress and (i + 1) % 10 == 0:
                 logger.info(f"Progreso: {i + 1}/{len(texts)}")
             
-            emb = self.generate_embedding(text, retry_on_failure=False)
+            emb = self._generate_via_api(text) if text and text.strip() else None
             embeddings.append(emb)
             
             # Rate limiting gentil
@@ -370,7 +395,8 @@ class HuggingFaceHybridAdapter:
             "dimension": settings.EMBEDDING_DIMENSION,
             "api_available": self.api_url is not None,
             "local_available": self.embedding_model is not None,
-            "has_api_key": self.api_headers is not None
+            "has_api_key": self.api_headers is not None,
+            "embedding_cache": self.embedding_cache.stats(),
         }
 
 
@@ -0,0 +1,457 @@
+"""
+Adaptador de búsqueda vectorial LOCAL para MIAPPBORA
+Espejo en memoria de bora_docs para evitar el RPC match_bora_docs por consulta
+
+Estructura del snapshot (directorio LOCAL_VECTOR_INDEX_DIR):
+    manifest.json              -> puntero: nombra el snapshot vigente ("snapshot") + su manifest
+    snapshots/<versión>/
+        manifest.json          -> dimensión, número de documentos, columna de embedding, fecha
+        embeddings.f32         -> matriz float32 contigua (N x D) de embeddings normalizados (memmap)
+        metadata.json          -> arrays paralelos por columna (kind, parent_lemma_id, pos_full, direction, ...)
+
+Cada regeneración escribe un directorio de versión nuevo y lo publica con un
+único os.replace del puntero; los lectores solo cargan del directorio que el
+puntero nombra, así nunca mezclan embeddings de un snapshot con metadatos de otro.
+
+Uso:
+    python scripts/snapshot_bora_docs.py         # genera/actualiza el snapshot
+    VECTOR_SEARCH_BACKEND=local                  # en .env para usarlo en el Mentor
+"""
+from typing import Optional, List, Dict, Any, Tuple
+from datetime import datetime, timezone
+from pathlib import Path
+import asyncio
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+
+import numpy as np
+
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+BACKEND_ROOT = Path(__file__).resolve().parent.parent
+
+MANIFEST_FILE = "manifest.json"
+EMBEDDINGS_FILE = "embeddings.f32"
+METADATA_FILE = "metadata.json"
+SNAPSHOTS_DIR = "snapshots"
+# Versiones conservadas: la vigente y la anterior (un worker puede tenerla aún en memmap)
+SNAPSHOTS_KEEP = 2
+
+# Columnas devueltas por match_bora_docs_v2 (mismo contrato que el RPC)
+RESULT_COLUMNS = [
+    'id', 'kind', 'parent_lemma_id', 'subentry_id', 'example_id',
+    'lemma', 'pos_full', 'bora_text', 'spanish_text', 'gloss_es', 'gloss_bora', 'direction',
+]
+# Columnas adicionales guardadas en el snapshot (no forman parte del resultado)
+EXTRA_COLUMNS = ['content']
+
+
+def resolve_index_dir(index_dir: Optional[str] = None) -> Path:
+    """Resuelve el directorio del snapshot (relativo a backend/ si no es absoluto)."""
+    path = Path(index_dir or settings.LOCAL_VECTOR_INDEX_DIR)
+    if not path.is_absolute():
+        path = BACKEND_ROOT / path
+    return path
+
+
+def resolve_snapshot_dir(index_dir: Optional[str] = None) -> Tuple[Optional[Path], Dict[str, Any]]:
+    """
+    Lee el puntero del índice y retorna (directorio del snapshot vigente, manifest).
+
+    Un manifest sin "snapshot" es el formato plano anterior (todo en index_dir).
+    Sin puntero retorna (None, {}).
+    """
+    root = resolve_index_dir(index_dir)
+    pointer = root / MANIFEST_FILE
+    if not pointer.exists():
+        return None, {}
+    manifest = json.loads(pointer.read_text(encoding='utf-8'))
+    name = manifest.get('snapshot')
+    return (root / name if name else root), manifest
+
+
+def _parse_vector(value: Any) -> Optional[List[float]]:
+    """pgvector llega por PostgREST como string '[0.1,0.2,...]'."""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        try:
+            return json.loads(value)
+        except ValueError:
+            return None
+    return list(value)
+
+
+class LocalVectorIndex:
+    """
+    Índice vectorial en proceso con la misma semántica que match_bora_docs(_v2)
+
+    - Similaridad coseno (producto punto sobre vectores normalizados)
+    - Filtro estricto similarity > match_threshold
+    - kind_filter (lista) y pos_filter (igualdad exacta sobre pos_full)
+    - Orden descendente por similaridad y LIMIT match_count
+    """
+
+    def __init__(self, index_dir: Optional[str] = None):
+        self.index_dir = resolve_index_dir(index_dir)
+        self._lock = threading.Lock()
+        self._matrix: Optional[np.ndarray] = None
+        self._columns: Dict[str, List[Any]] = {}
+        self._kind: Optional[np.ndarray] = None
+        self._pos_full: Optional[np.ndarray] = None
+        self._parent_lemma_id: Optional[np.ndarray] = None
+        self.manifest: Dict[str, Any] = {}
+
+    # ==========================================
+    # CARGA / REFRESCO
+    # ==========================================
+
+    def is_loaded(self) -> bool:
+        return self._matrix is not None
+
+    def ensure_loaded(self) -> bool:
+        """Carga el snapshot si aún no está en memoria. Retorna True si está disponible."""
+        if self.is_loaded():
+            return True
+        return self.refresh()
+
+    def refresh(self) -> bool:
+        """(Re)carga el snapshot que nombra el puntero, de forma atómica para los lectores."""
+        try:
+            t0 = time.perf_counter()
+            snapshot_dir, manifest = resolve_snapshot_dir(str(self.index_dir))
+            if snapshot_dir is None:
+                logger.warning(f"⚠️ Snapshot vectorial no encontrado en {self.index_dir}")
+                return False
+            count = int(manifest['count'])
+            dim = int(manifest['dimension'])
+            columns = json.loads((snapshot_dir / METADATA_FILE).read_text(encoding='utf-8'))
+
+            if count:
+                matrix = np.memmap(
+                    snapshot_dir / EMBEDDINGS_FILE,
+                    dtype=np.float32,
+                    mode='r',
+                    shape=(count, dim),
+                )
+            else:
+                matrix = np.zeros((0, dim), dtype=np.float32)
+
+            for col in RESULT_COLUMNS:
+                if len(columns.get(col, [])) != count:
+                    raise ValueError(f"Columna '{col}' inconsistente con count={count}")
+
+            kind = np.asarray(columns['kind'], dtype=str)
+            pos_full = np.asarray([p or '' for p in columns['pos_full']], dtype=str)
+            parent_lemma_id = np.asarray(columns['parent_lemma_id'], dtype=np.int64)
+
+            with self._lock:
+                self._matrix = matrix
+                self._columns = columns
+                self._kind = kind
+                self._pos_full = pos_full
+                self._parent_lemma_id = parent_lemma_id
+                self.manifest = manifest
+
+            logger.info(
+                f"✓ Índice vectorial local cargado: {count} docs x {dim} dims "
+                f"({(time.perf_counter() - t0) * 1000.0:.0f}ms)"
+            )
+            return True
+        except Exception as e:
+            logger.error(f"Error cargando índice vectorial local: {e}")
+            return False
+
+    # ==========================================
+    # BÚSQUEDA
+    # ==========================================
+
+    def search(
+        self,
+        query_embedding: List[float],
+        top_k: int = 10,
+        kinds: Optional[List[str]] = None,
+        pos_full: Optional[str] = None,
+        min_similarity: Optional[float] = None,
+    ) -> List[Dict[str, Any]]:
+        """Top-k vectorizado con NumPy sobre el snapshot."""
+        with self._lock:
+            matrix = self._matrix
+            columns = self._columns
+            kind_arr = self._kind
+            pos_arr = self._pos_full
+
+        if matrix is None or top_k <= 0 or matrix.shape[0] == 0:
+            return []
+
+        q = np.asarray(query_embedding, dtype=np.float32)
+        if q.shape[0] != matrix.shape[1]:
+            logger.error(
+                f"Dimensión de query ({q.shape[0]}) distinta a la del índice local ({matrix.shape[1]})"
+            )
+            return []
+        norm = float(np.linalg.norm(q))
+        if norm == 0.0:
+            return []
+        q = q / norm
+
+        threshold = settings.SIMILARITY_THRESHOLD if (min_similarity is None) else float(min_similarity)
+        sims = matrix @ q
+
+        mask = sims > threshold
+        if kinds:
+            mask &= np.isin(kind_arr, kinds)
+        if pos_full:
+            mask &= pos_arr == pos_full
+
+        candidates = np.flatnonzero(mask)
+        if candidates.size > top_k:
+            part = np.argpartition(-sims[candidates], top_k - 1)[:top_k]
+            candidates = candidates[part]
+        ordered = candidates[np.argsort(-sims[candidates], kind='stable')]
+
+        results: List[Dict[str, Any]] = []
+        for i in ordered.tolist():
+            row = {col: columns[col][i] for col in RESULT_COLUMNS}
+            row['similarity'] = float(sims[i])
+            results.append(row)
+        return results
+
+    def get_rows(self, positions: List[int]) -> List[Dict[str, Any]]:
+        """Devuelve filas del snapshot (sin similarity) para posiciones dadas."""
+        with self._lock:
+            columns = self._columns
+        return [{col: columns[col][i] for col in RESULT_COLUMNS} for i in positions]
+
+    async def vector_search_bora_docs(
+        self,
+        query_embedding: List[float],
+        top_k: int = 10,
+        kinds: Optional[List[str]] = None,
+        pos_full: Optional[str] = None,
+        min_similarity: Optional[float] = None,
+        direction: Optional[str] = None,  # Paridad con SupabaseAdapter: no se usa para filtrar
+    ) -> List[Dict]:
+        """Misma firma que SupabaseAdapter.vector_search_bora_docs (el matmul corre en un hilo)."""
+        try:
+            return await asyncio.to_thread(
+                self.search,
+                query_embedding=query_embedding,
+                top_k=top_k,
+                kinds=kinds,
+                pos_full=pos_full,
+                min_similarity=min_similarity,
+            )
+        except Exception as e:
+            logger.error(f"Error en búsqueda vectorial local: {e}")
+            return []
+
+    def get_info(self) -> Dict[str, Any]:
+        """Retorna información sobre el índice"""
+        return {
+            "loaded": self.is_loaded(),
+            "index_dir": str(self.index_dir),
+            "snapshot": self.manifest.get("snapshot"),
+            "count": self.manifest.get("count", 0),
+            "dimension": self.manifest.get("dimension"),
+            "embedding_column": self.manifest.get("embedding_column"),
+            "created_at": self.manifest.get("created_at"),
+        }
+
+
+# ==========================================
+# CONSTRUCCIÓN DEL SNAPSHOT
+# ==========================================
+
+def _fetch_all(client, table: str, columns: str, page_size: int) -> List[Dict[str, Any]]:
+    """Lee una tabla completa paginando con range() (PostgREST limita filas por request)."""
+    rows: List[Dict[str, Any]] = []
+    start = 0
+    while True:
+        res = (
+            client.table(table)
+            .select(columns)
+            .order('id')
+            .range(start, start + page_size - 1)
+            .execute()
+        )
+        batch = res.data or []
+        rows.extend(batch)
+        if len(batch) < page_size:
+            break
+        start += page_size
+    return rows
+
+
+def fetch_bora_doc_rows(
+    client,
+    emb_col: Optional[str] = None,
+    page_size: int = 1000,
+) -> Tuple[List[Dict[str, Any]], List[List[float]], int]:
+    """
+    Descarga bora_docs (+ joins de lemmas/subentries/examples) con las columnas de match_bora_docs_v2.
+
+    Args:
+        client: cliente supabase-py (SupabaseAdapter.client)
+        emb_col: columna de embedding a descargar; None para solo metadatos (índice léxico)
+        page_size: filas por request de PostgREST
+
+    Returns:
+        (filas con RESULT_COLUMNS + EXTRA_COLUMNS, vectores alineados o [], descartadas)
+    """
+    if client is None:
+        raise ValueError("Cliente de Supabase no inicializado")
+
+    lemmas = {
+        r['id']: r for r in _fetch_all(
+            client, 'lexicon_lemmas', 'id, lemma, pos_full, gloss_es, gloss_bora, direction', page_size
+        )
+    }
+    subentries = {
+        r['id']: r for r in _fetch_all(client, 'lexicon_subentries', 'id, gloss_es, gloss_bora', page_size)
+    }
+    examples = {
+        r['id']: r for r in _fetch_all(client, 'lexicon_examples', 'id, bora_text, spanish_text', page_size)
+    }
+    doc_columns = 'id, kind, parent_lemma_id, subentry_id, example_id, content'
+    docs = _fetch_all(client, 'bora_docs', f'{doc_columns}, {emb_col}' if emb_col else doc_columns, page_size)
+    logger.info(
+        f"📥 Descargados {len(docs)} bora_docs, {len(lemmas)} lemmas, "
+        f"{len(subentries)} subentries, {len(examples)} examples"
+    )
+
+    rows: List[Dict[str, Any]] = []
+    vectors: List[List[float]] = []
+    skipped = 0
+    for d in docs:
+        vec = _parse_vector(d.get(emb_col)) if emb_col else None
+        lemma = lemmas.get(d.get('parent_lemma_id'))
+        if (emb_col and not vec) or not lemma:
+            skipped += 1
+            continue
+        sub = subentries.get(d.get('subentry_id')) or {}
+        ex = examples.get(d.get('example_id')) or {}
+        rows.append({
+            'id': d['id'],
+            'kind': d.get('kind'),
+            'parent_lemma_id': d.get('parent_lemma_id'),
+            'subentry_id': d.get('subentry_id'),
+            'example_id': d.get('example_id'),
+            'lemma': lemma.get('lemma'),
+            'pos_full': lemma.get('pos_full'),
+            'bora_text': ex.get('bora_text'),
+            'spanish_text': ex.get('spanish_text'),
+            'gloss_es': sub.get('gloss_es') or lemma.get('gloss_es'),
+            'gloss_bora': sub.get('gloss_bora') or lemma.get('gloss_bora'),
+            'direction': lemma.get('direction'),
+            'content': d.get('content'),
+        })
+        if emb_col:
+            vectors.append(vec)
+    return rows, vectors, skipped
+
+
+def build_snapshot(
+    client,
+    index_dir: Optional[str] = None,
+    use_1536: Optional[bool] = None,
+    page_size: int = 1000,
+) -> Dict[str, Any]:
+    """
+    Descarga bora_docs (+ joins de lemmas/subentries/examples) y escribe el snapshot.
+
+    Replica el SELECT de match_bora_docs_v2 en Python para que las filas del
+    índice local tengan exactamente las mismas columnas que el RPC.
+
+    Args:
+        client: cliente supabase-py (SupabaseAdapter.client)
+        index_dir: directorio destino (default: settings.LOCAL_VECTOR_INDEX_DIR)
+        use_1536: usar embedding_1536 (default: settings.USE_VECTOR_1536)
+        page_size: filas por request de PostgREST
+
+    Returns:
+        Manifest escrito
+    """
+    if client is None:
+        raise ValueError("Cliente de Supabase no inicializado")
+
+    use_1536 = settings.USE_VECTOR_1536 if use_1536 is None else use_1536
+    emb_col = 'embedding_1536' if use_1536 else 'embedding'
+    out_dir = resolve_index_dir(index_dir)
+    snapshots_root = out_dir / SNAPSHOTS_DIR
+    snapshots_root.mkdir(parents=True, exist_ok=True)
+
+    t0 = time.perf_counter()
+    rows, vectors, skipped = fetch_bora_doc_rows(client, emb_col, page_size)
+    columns: Dict[str, List[Any]] = {
+        col: [r[col] for r in rows] for col in RESULT_COLUMNS + EXTRA_COLUMNS
+    }
+
+    dim = len(vectors[0]) if vectors else (1536 if use_1536 else settings.EMBEDDING_DIMENSION)
+    matrix = np.asarray(vectors, dtype=np.float32).reshape(len(vectors), dim)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0.0] = 1.0
+    matrix = np.ascontiguousarray(matrix / norms, dtype=np.float32)
+
+    # Versión nueva en un directorio temporal; nadie lo nombra hasta terminar
+    version = f"{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S%fZ')}-{os.getpid()}"
+    tmp_dir = snapshots_root / f".tmp-{version}"
+    tmp_dir.mkdir()
+    manifest = {
+        "snapshot": f"{SNAPSHOTS_DIR}/{version}",
+        "count": int(matrix.shape[0]),
+        "dimension": int(dim),
+        "embedding_column": emb_col,
+        "skipped": skipped,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "build_ms": round((time.perf_counter() - t0) * 1000.0, 1),
+    }
+    matrix.tofile(tmp_dir / EMBEDDINGS_FILE)
+    (tmp_dir / METADATA_FILE).write_text(json.dumps(columns, ensure_ascii=False), encoding='utf-8')
+    (tmp_dir / MANIFEST_FILE).write_text(json.dumps(manifest, indent=2), encoding='utf-8')
+    os.replace(tmp_dir, snapshots_root / version)
+
+    # Publicación: un único os.replace del puntero
+    pointer_tmp = out_dir / f"{MANIFEST_FILE}.{version}.tmp"
+    pointer_tmp.write_text(json.dumps(manifest, indent=2), encoding='utf-8')
+    os.replace(pointer_tmp, out_dir / MANIFEST_FILE)
+    _prune_snapshots(out_dir)
+
+    logger.info(f"✅ Snapshot vectorial escrito en {out_dir}: {manifest}")
+    return manifest
+
+
+def _prune_snapshots(out_dir: Path) -> None:
+    """Borra versiones antiguas (conserva SNAPSHOTS_KEEP y siempre la que nombra el puntero)."""
+    current, _ = resolve_snapshot_dir(str(out_dir))
+    versions = sorted(
+        (p for p in (out_dir / SNAPSHOTS_DIR).iterdir() if p.is_dir() and not p.name.startswith('.')),
+        key=lambda p: p.name,
+        reverse=True,
+    )
+    for old in versions[SNAPSHOTS_KEEP:]:
+        if current is not None and old.resolve() == current.resolve():
+            continue
+        # En Windows un memmap abierto impide borrar: se reintenta en la próxima regeneración
+        shutil.rmtree(old, ignore_errors=True)
+
+
+# ==========================================
+# SINGLETON
+# ==========================================
+
+_local_index_instance: Optional[LocalVectorIndex] = None
+
+
+def get_local_vector_index() -> LocalVectorIndex:
+    """Obtiene instancia singleton del índice vectorial local"""
+    global _local_index_instance
+    if _local_index_instance is None:
+        _local_index_instance = LocalVectorIndex()
+    return _local_index_instance
@@ -4,9 +4,12 @@ Permite generar respuestas usando modelos de OpenAI (GPT-4o-mini, GPT-4o, etc.)
 """
 
 import logging
-from typing import List, Dict, Optional
+from typing import AsyncIterator, List, Dict, Optional
 from openai import AsyncOpenAI, OpenAIError, APITimeoutError, RateLimitError
 from config.settings import settings
+from services.metrics import record_llm_call
+from services.prompt_assembler import record_prompt_usage
+from adapters.openai_rate_governor import LLMQueueTimeout, estimate_request_tokens, get_openai_rate_governor
 
 logger = logging.getLogger(__name__)
 
@@ -51,6 +54,8 @@ class OpenAIAdapter:
             client_kwargs = {
                 "api_key": self.api_key,
                 "timeout": self.timeout,
+                # Los reintentos (429/5xx con Retry-After) los gestiona el gobernador
+                "max_retries": 0,
             }
             if self.base_url:
                 client_kwargs["base_url"] = self.base_url
@@ -65,6 +70,7 @@ class OpenAIAdapter:
         messages: List[Dict[str, str]],
         temperature: Optional[float] = None,
         max_tokens: Optional[int] = None,
+        purpose: str = "answer",
         **kwargs
     ) -> str:
         """
@@ -74,6 +80,7 @@ class OpenAIAdapter:
             messages: Lista de mensajes (role/content) en formato OpenAI
             temperature: Temperatura de generación (override del default)
             max_tokens: Máximo de tokens de salida (override del default)
+            purpose: Etiqueta de métricas (extraction, direction, answer)
             **kwargs: Parámetros adicionales para chat.completions.create
 
         Returns:
@@ -113,10 +120,17 @@ class OpenAIAdapter:
                 else:
                     completion_params["max_tokens"] = final_max_tokens
             
-            response = await self.client.chat.completions.create(
-                **completion_params,
-                **kwargs,
-            )
+            self._apply_prompt_cache_key(completion_params, purpose)
+
+            # Concurrencia por propósito + cuotas RPM/TPM + reintentos (adapters/openai_rate_governor.py)
+            governor = get_openai_rate_governor()
+            estimated_tokens = estimate_request_tokens(messages, final_max_tokens)
+            async with governor.slot(purpose):
+                response = await governor.call(
+                    purpose,
+                    estimated_tokens,
+                    lambda: self.client.chat.completions.create(**completion_params, **kwargs),
+                )
 
             # Extraer el contenido de la respuesta
             if not response.choices or len(response.choices) == 0:
@@ -129,29 +143,147 @@ class OpenAIAdapter:
                 logger.error("❌ OpenAI devolvió una respuesta vacía")
                 raise OpenAIError("La respuesta de OpenAI no contenía texto utilizable")
 
-            # Log de uso de tokens
-            if hasattr(response, 'usage') and response.usage:
+            # Log y métricas de uso de tokens
+            usage = getattr(response, 'usage', None)
+            governor.settle_tokens(estimated_tokens, getattr(usage, 'total_tokens', None))
+            if usage:
                 logger.info(
-                    f"✅ OpenAI response | tokens: in={response.usage.prompt_tokens} "
-                    f"out={response.usage.completion_tokens} total={response.usage.total_tokens}"
+                    f"✅ OpenAI response | tokens: in={usage.prompt_tokens} "
+                    f"(cached={_cached_tokens(usage)}) out={usage.completion_tokens} total={usage.total_tokens}"
                 )
+            record_prompt_usage(usage)
+            record_llm_call(
+                purpose,
+                input_tokens=getattr(usage, 'prompt_tokens', None),
+                output_tokens=getattr(usage, 'completion_tokens', None),
+                cached_tokens=_cached_tokens(usage),
+            )
 
             logger.info(f"✅ Respuesta generada ({len(answer)} chars): {answer[:100]}...")
             return answer.strip()
 
+        except LLMQueueTimeout as e:
+            logger.error(f"🚦 {e}")
+            record_llm_call(purpose, status="queue_timeout")
+            raise
         except APITimeoutError as e:
             logger.error(f"⏱️ Timeout en OpenAI API: {e}")
+            record_llm_call(purpose, status="timeout")
             raise OpenAIError(f"Timeout al contactar OpenAI: {str(e)}")
         except RateLimitError as e:
             logger.error(f"🚫 Rate limit excedido en OpenAI: {e}")
+            record_llm_call(purpose, status="rate_limited")
             raise OpenAIError(f"Rate limit excedido: {str(e)}")
         except OpenAIError as e:
             logger.error(f"❌ Error de OpenAI API: {e}")
+            record_llm_call(purpose, status="error")
             raise
         except Exception as e:
             logger.error(f"❌ Error inesperado en chat_completion: {e}", exc_info=True)
+            record_llm_call(purpose, status="error")
             raise OpenAIError(f"Error inesperado: {str(e)}")
 
+    async def chat_completion_stream(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+        purpose: str = "answer",
+        **kwargs
+    ) -> AsyncIterator[str]:
+        """
+        Variante en streaming de chat_completion: produce fragmentos de texto
+        a medida que llegan (stream=True de Chat Completions).
+
+        Los errores se normalizan igual que en chat_completion (OpenAIError) y
+        se lanzan al iterar, normalmente antes del primer fragmento.
+        """
+        if not self.client:
+            raise ValueError("OpenAI client no inicializado. Verifica OPENAI_API_KEY en .env")
+
+        final_temperature = temperature if temperature is not None else self.temperature
+        final_max_tokens = max_tokens if max_tokens is not None else self.max_tokens
+
+        completion_params = {
+            "model": self.model,
+            "messages": messages,
+            "temperature": final_temperature,
+            "stream": True,
+            # El último chunk trae el uso de tokens (choices vacío)
+            "stream_options": {"include_usage": True},
+        }
+        if final_max_tokens is not None:
+            if "gpt-4o" in self.model or "gpt-5" in self.model:
+                completion_params["max_completion_tokens"] = final_max_tokens
+            else:
+                completion_params["max_tokens"] = final_max_tokens
+        self._apply_prompt_cache_key(completion_params, purpose)
+
+        logger.info(f"🤖 Llamando a OpenAI Chat Completions API en streaming ({self.model})...")
+        total_chars = 0
+        usage = None
+        governor = get_openai_rate_governor()
+        estimated_tokens = estimate_request_tokens(messages, final_max_tokens)
+        try:
+            # El hueco de concurrencia se mantiene mientras dura el stream; solo se
+            # reintenta la apertura (antes del primer fragmento)
+            async with governor.slot(purpose):
+                stream = await governor.call(
+                    purpose,
+                    estimated_tokens,
+                    lambda: self.client.chat.completions.create(**completion_params, **kwargs),
+                )
+                # Cerrar la respuesta HTTP también si el consumidor abandona el
+                # generador (cliente SSE desconectado), no al recolectar basura
+                async with stream:
+                    async for chunk in stream:
+                        if chunk.choices:
+                            delta = chunk.choices[0].delta
+                            text = getattr(delta, "content", None)
+                            if text:
+                                total_chars += len(text)
+                                yield text
+                        if getattr(chunk, "usage", None):
+                            usage = chunk.usage
+                            logger.info(
+                                f"✅ OpenAI stream | tokens: in={usage.prompt_tokens} "
+                                f"(cached={_cached_tokens(usage)}) out={usage.completion_tokens} total={usage.total_tokens}"
+                            )
+        except LLMQueueTimeout as e:
+            logger.error(f"🚦 {e} (stream)")
+            record_llm_call(purpose, status="queue_timeout")
+            raise
+        except APITimeoutError as e:
+            logger.error(f"⏱️ Timeout en OpenAI API (stream): {e}")
+            record_llm_call(purpose, status="timeout")
+            raise OpenAIError(f"Timeout al contactar OpenAI: {str(e)}")
+        except RateLimitError as e:
+            logger.error(f"🚫 Rate limit excedido en OpenAI (stream): {e}")
+            record_llm_call(purpose, status="rate_limited")
+            raise OpenAIError(f"Rate limit excedido: {str(e)}")
+        except OpenAIError as e:
+            logger.error(f"❌ Error de OpenAI API (stream): {e}")
+            record_llm_call(purpose, status="error")
+            raise
+        except Exception as e:
+            logger.error(f"❌ Error inesperado en chat_completion_stream: {e}", exc_info=True)
+            record_llm_call(purpose, status="error")
+            raise OpenAIError(f"Error inesperado: {str(e)}")
+
+        governor.settle_tokens(estimated_tokens, getattr(usage, 'total_tokens', None))
+        record_prompt_usage(usage)
+        record_llm_call(
+            purpose,
+            status="ok" if total_chars else "empty",
+            input_tokens=getattr(usage, 'prompt_tokens', None),
+            output_tokens=getattr(usage, 'completion_tokens', None),
+            cached_tokens=_cached_tokens(usage),
+        )
+        if total_chars == 0:
+            logger.error("❌ OpenAI devolvió un stream sin texto")
+            raise OpenAIError("La respuesta de OpenAI no contenía texto utilizable")
+        logger.info(f"✅ Respuesta en streaming completada ({total_chars} chars)")
+
     """
     # ============================================================================
     # CÓDIGO LEGACY COMENTADO: Responses API (solo para gpt-5 reasoning models)
@@ -419,6 +551,12 @@ class OpenAIAdapter:
     # FIN DEL CÓDIGO LEGACY COMENTADO
     # ============================================================================
 
+    @staticmethod
+    def _apply_prompt_cache_key(completion_params: Dict[str, object], purpose: str) -> None:
+        """prompt_cache_key para las respuestas del mentor (mismo prefijo estático en todas)."""
+        if purpose == "answer" and settings.OPENAI_PROMPT_CACHE_KEY:
+            completion_params["prompt_cache_key"] = settings.OPENAI_PROMPT_CACHE_KEY
+
     async def health_check(self) -> Dict[str, str]:
         """
         Verifica que el adaptador esté configurado correctamente
@@ -470,6 +608,12 @@ class OpenAIAdapter:
             raise
 
 
+def _cached_tokens(usage) -> Optional[int]:
+    """Tokens de entrada servidos desde el prompt cache de OpenAI (None si no se informa)."""
+    details = getattr(usage, 'prompt_tokens_details', None)
+    return getattr(details, 'cached_tokens', None)
+
+
 # Singleton para reutilizar el adaptador
 _openai_adapter_instance: Optional[OpenAIAdapter] = None
 
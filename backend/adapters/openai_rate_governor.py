@@ -0,0 +1,318 @@
+"""
+Gobernador de concurrencia y cuotas para las llamadas a OpenAI
+
+Ante ráfagas (una clase entera preguntando a la vez) las llamadas esperan un
+poco en cola en vez de acabar en 429:
+
+- Semáforo por propósito (answer / auxiliares: extraction, direction, ... /
+  summary) para acotar las peticiones en vuelo. "summary" (resúmenes en
+  segundo plano) tiene carril propio y cede ante la ruta de petición
+  (request_path_contended).
+- Token buckets de peticiones (OPENAI_RPM_LIMIT) y tokens (OPENAI_TPM_LIMIT)
+  por minuto. Los tokens se estiman antes de la llamada (prompt/4 + max_tokens)
+  y se ajustan con el `usage` real.
+- Cola justa (FIFO) con timeout OPENAI_QUEUE_TIMEOUT_SECONDS por espera
+  (concurrencia y cuota): si no hay hueco a tiempo se lanza LLMQueueTimeout
+  (subclase de OpenAIError).
+- Reintentos de 429/5xx/conexión con backoff exponencial + jitter, respetando
+  Retry-After; un 429 pausa el bucket de peticiones para toda la cola.
+
+El SDK de OpenAI trae sus propios reintentos; el adaptador los desactiva
+(max_retries=0) para que solo reintente este módulo.
+"""
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional, TypeVar
+import asyncio
+import logging
+import random
+import time
+
+from openai import APIConnectionError, APIStatusError, APITimeoutError, OpenAIError, RateLimitError
+
+from config.settings import settings
+from services.metrics import observe_llm_queue_wait, record_llm_retry, set_llm_queue_depth
+from services.prompt_assembler import estimate_messages_tokens
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Propósitos con semáforo propio; el resto comparte el de auxiliares
+ANSWER_PURPOSE = "answer"
+AUX_PURPOSE = "aux"
+# Trabajo en segundo plano (baja prioridad): no ocupa huecos de answer/aux
+SUMMARY_PURPOSE = "summary"
+
+# Ráfaga permitida de los buckets: equivalente a 10s de cuota
+_BURST_SECONDS = 10.0
+
+
+class LLMQueueTimeout(OpenAIError):
+    """No hubo hueco (concurrencia o cuota) dentro de OPENAI_QUEUE_TIMEOUT_SECONDS."""
+
+
+class TokenBucket:
+    """
+    Token bucket asíncrono con cola FIFO
+
+    Un único lock serializa a los que esperan: el primero en llegar es el
+    primero en consumir, y si su espera no cabe en el timeout falla de
+    inmediato en lugar de dormir inútilmente. La espera por el lock (detrás
+    de otros en cola) también cuenta para el mismo deadline.
+    """
+
+    def __init__(self, per_minute: float, burst_seconds: float = _BURST_SECONDS):
+        self.rate = per_minute / 60.0
+        self.capacity = max(1.0, self.rate * burst_seconds)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    @property
+    def available(self) -> float:
+        self._refill()
+        return self._tokens
+
+    async def acquire(self, amount: float, deadline: float) -> None:
+        """Consume `amount` esperando como mucho hasta `deadline` (time.monotonic)."""
+        amount = min(float(amount), self.capacity)
+        await asyncio.wait_for(self._lock.acquire(), timeout=max(0.0, deadline - time.monotonic()))
+        try:
+            while True:
+                self._refill()
+                now = time.monotonic()
+                if now < self._paused_until:
+                    wait = self._paused_until - now
+                elif self._tokens >= amount:
+                    self._tokens -= amount
+                    return
+                else:
+                    wait = (amount - self._tokens) / self.rate
+                if now + wait > deadline:
+                    raise asyncio.TimeoutError()
+                await asyncio.sleep(wait)
+        finally:
+            self._lock.release()
+
+    def adjust(self, delta: float) -> None:
+        """Corrige el consumo estimado con el real (delta > 0 consume, < 0 devuelve)."""
+        self._refill()
+        self._tokens = max(-self.capacity, min(self.capacity, self._tokens - delta))
+
+    def pause(self, seconds: float) -> None:
+        """Nadie consume hasta dentro de `seconds` (p. ej. tras un 429 con Retry-After)."""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+
+class OpenAIRateGovernor:
+    """Concurrencia por propósito + cuotas RPM/TPM + reintentos para OpenAIAdapter."""
+
+    def __init__(
+        self,
+        answer_concurrency: Optional[int] = None,
+        aux_concurrency: Optional[int] = None,
+        summary_concurrency: Optional[int] = None,
+        rpm_limit: Optional[int] = None,
+        tpm_limit: Optional[int] = None,
+        queue_timeout: Optional[float] = None,
+        max_retries: Optional[int] = None,
+        retry_base: Optional[float] = None,
+        retry_max: Optional[float] = None,
+    ):
+        answer_concurrency = answer_concurrency if answer_concurrency is not None else settings.OPENAI_CONCURRENCY_ANSWER
+        aux_concurrency = aux_concurrency if aux_concurrency is not None else settings.OPENAI_CONCURRENCY_AUX
+        summary_concurrency = (
+            summary_concurrency if summary_concurrency is not None else settings.OPENAI_CONCURRENCY_SUMMARY
+        )
+        rpm_limit = rpm_limit if rpm_limit is not None else settings.OPENAI_RPM_LIMIT
+        tpm_limit = tpm_limit if tpm_limit is not None else settings.OPENAI_TPM_LIMIT
+        self.queue_timeout = queue_timeout if queue_timeout is not None else settings.OPENAI_QUEUE_TIMEOUT_SECONDS
+        self.max_retries = max_retries if max_retries is not None else settings.OPENAI_MAX_RETRIES
+        self.retry_base = retry_base if retry_base is not None else settings.OPENAI_RETRY_BASE_SECONDS
+        self.retry_max = retry_max if retry_max is not None else settings.OPENAI_RETRY_MAX_SECONDS
+
+        self._limits = {
+            ANSWER_PURPOSE: answer_concurrency,
+            AUX_PURPOSE: aux_concurrency,
+            SUMMARY_PURPOSE: summary_concurrency,
+        }
+        self._semaphores: Dict[str, asyncio.Semaphore] = {
+            key: asyncio.Semaphore(limit) for key, limit in self._limits.items() if limit and limit > 0
+        }
+        # 0 = sin límite
+        self.requests = TokenBucket(rpm_limit) if rpm_limit and rpm_limit > 0 else None
+        self.tokens = TokenBucket(tpm_limit) if tpm_limit and tpm_limit > 0 else None
+        self._waiting: Dict[str, int] = {key: 0 for key in self._limits}
+        self._in_flight: Dict[str, int] = {key: 0 for key in self._limits}
+
+    # ==========================================
+    # API PÚBLICA
+    # ==========================================
+
+    @asynccontextmanager
+    async def slot(self, purpose: str) -> AsyncIterator[None]:
+        """Hueco de concurrencia del propósito, esperando en cola como mucho queue_timeout."""
+        key = self._key(purpose)
+        semaphore = self._semaphores.get(key)
+        if semaphore is None:
+            yield
+            return
+        t0 = time.monotonic()
+        self._waiting[key] += 1
+        set_llm_queue_depth(key, self._waiting[key])
+        try:
+            await asyncio.wait_for(semaphore.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            raise LLMQueueTimeout(
+                f"Sin capacidad para llamar a OpenAI ({key}) tras {self.queue_timeout:.1f}s en cola"
+            ) from None
+        finally:
+            self._waiting[key] -= 1
+            set_llm_queue_depth(key, self._waiting[key])
+        observe_llm_queue_wait(key, "concurrency", time.monotonic() - t0)
+        self._in_flight[key] += 1
+        try:
+            yield
+        finally:
+            self._in_flight[key] -= 1
+            semaphore.release()
+
+    async def call(self, purpose: str, estimated_tokens: int, request: Callable[[], Awaitable[T]]) -> T:
+        """
+        Ejecuta `request` (la llamada al SDK) respetando cuotas, con reintentos.
+
+        Debe llamarse dentro de `slot(purpose)`; cada intento consume una
+        petición y los tokens estimados de los buckets.
+        """
+        attempt = 0
+        while True:
+            await self._acquire_quota(purpose, estimated_tokens)
+            try:
+                return await request()
+            except Exception as e:
+                delay = self._retry_delay(e, attempt)
+                if delay is None:
+                    raise
+                attempt += 1
+                reason = "rate_limited" if isinstance(e, RateLimitError) else "server_error"
+                record_llm_retry(self._key(purpose), reason)
+                logger.warning(
+                    f"🔁 OpenAI {reason} ({purpose}); reintento {attempt}/{self.max_retries} en {delay:.2f}s"
+                )
+                if isinstance(e, RateLimitError) and self.requests is not None:
+                    # Toda la cola espera: reintentar en paralelo solo provocaría más 429
+                    self.requests.pause(delay)
+                await asyncio.sleep(delay)
+
+    def settle_tokens(self, estimated_tokens: int, actual_tokens: Optional[int]) -> None:
+        """Ajusta el bucket TPM con el uso real devuelto por la API."""
+        if self.tokens is not None and actual_tokens is not None:
+            self.tokens.adjust(actual_tokens - estimated_tokens)
+
+    def request_path_contended(self) -> bool:
+        """
+        Hay llamadas de la ruta de petición (answer/aux) esperando hueco, o la
+        cuota de peticiones está agotada: el trabajo de baja prioridad debe ceder.
+        """
+        if self._waiting[ANSWER_PURPOSE] or self._waiting[AUX_PURPOSE]:
+            return True
+        return self.requests is not None and self.requests.available < 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "concurrency": dict(self._limits),
+            "in_flight": dict(self._in_flight),
+            "waiting": dict(self._waiting),
+            "requests_available": round(self.requests.available, 1) if self.requests else None,
+            "tokens_available": round(self.tokens.available, 1) if self.tokens else None,
+        }
+
+    # ==========================================
+    # INTERNOS
+    # ==========================================
+
+    @staticmethod
+    def _key(purpose: str) -> str:
+        if purpose in (ANSWER_PURPOSE, SUMMARY_PURPOSE):
+            return purpose
+        return AUX_PURPOSE
+
+    async def _acquire_quota(self, purpose: str, estimated_tokens: int) -> None:
+        if self.requests is None and self.tokens is None:
+            return
+        key = self._key(purpose)
+        t0 = time.monotonic()
+        deadline = t0 + self.queue_timeout
+        try:
+            if self.requests is not None:
+                await self.requests.acquire(1, deadline)
+            if self.tokens is not None:
+                await self.tokens.acquire(estimated_tokens, deadline)
+        except asyncio.TimeoutError:
+            raise LLMQueueTimeout(
+                f"Cuota de OpenAI agotada ({key}); no hay hueco en {self.queue_timeout:.1f}s"
+            ) from None
+        waited = time.monotonic() - t0
+        if waited > 0.001:
+            observe_llm_queue_wait(key, "quota", waited)
+
+    def _retry_delay(self, error: Exception, attempt: int) -> Optional[float]:
+        """Espera antes del siguiente intento, o None si no se reintenta."""
+        if attempt >= self.max_retries:
+            return None
+        if isinstance(error, APITimeoutError):
+            # Un timeout ya consumió OPENAI_TIMEOUT: reintentar solo alarga la espera
+            return None
+        if isinstance(error, APIStatusError):
+            if error.status_code != 429 and error.status_code < 500:
+                return None
+        elif not isinstance(error, APIConnectionError):
+            return None
+
+        base = self.retry_base * (2 ** attempt)
+        delay = min(self.retry_max, base + random.uniform(0, base))
+        retry_after = _retry_after_seconds(error)
+        if retry_after is not None:
+            if retry_after > self.retry_max:
+                return None
+            delay = max(delay, retry_after)
+        return delay
+
+
+def _retry_after_seconds(error: Exception) -> Optional[float]:
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    for name, scale in (("retry-after-ms", 0.001), ("retry-after", 1.0)):
+        value = headers.get(name)
+        if value is None:
+            continue
+        try:
+            return max(0.0, float(value) * scale)
+        except (TypeError, ValueError):
+            continue
+    return None
+
+
+def estimate_request_tokens(messages, max_tokens: Optional[int]) -> int:
+    """Tokens que reservar en el bucket TPM: estimación local del prompt + salida máxima."""
+    return estimate_messages_tokens(messages) + (max_tokens or 0)
+
+
+# Instancia global (compartida por todas las llamadas del proceso)
+_governor: Optional[OpenAIRateGovernor] = None
+
+
+def get_openai_rate_governor() -> OpenAIRateGovernor:
+    """Función helper para obtener el gobernador de llamadas a OpenAI"""
+    global _governor
+    if _governor is None:
+        _governor = OpenAIRateGovernor()
+    return _governor
@@ -3,12 +3,24 @@ Adaptador de Supabase para MIAPPBORA
 Maneja la conexión con Supabase (PostgreSQL + pgvector)
 """
 from typing import Optional, List, Dict, Any
+from concurrent.futures import ThreadPoolExecutor
 from supabase import create_client, Client
 from config.settings import settings
+import asyncio
 import logging
 
 logger = logging.getLogger(__name__)
 
+# supabase-py es síncrono: cada .execute() se ejecuta en este pool acotado para
+# no bloquear el event loop mientras espera a PostgREST
+_io_executor = ThreadPoolExecutor(
+    max_workers=settings.SUPABASE_IO_THREADS,
+    thread_name_prefix='supabase-io',
+)
+
+# Cota superior de ejemplos por lemma usada en consultas batch (ver get_examples_by_lemma_ids)
+_MAX_EXAMPLES_PER_LEMMA = 20
+
 
 class SupabaseAdapter:
     """
@@ -59,6 +71,11 @@ class SupabaseAdapter:
     def is_connected(self) -> bool:
         """Verifica si hay conexión con Supabase"""
         return self.client is not None
+
+    async def _execute(self, request):
+        """Ejecuta un request builder de postgrest (table/rpc) fuera del event loop."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_io_executor, request.execute)
     
     # ==========================================
     # OPERACIONES DE CORPUS
@@ -118,7 +135,7 @@ class SupabaseAdapter:
             logger.warning(f"No se pudo verificar duplicado antes de insertar frase: {e}")
 
         try:
-            result = self.client.table('bora_phrases').insert(payload).execute()
+            result = await self._execute(self.client.table('bora_phrases').insert(payload))
             return result.data[0] if result.data else None
         except Exception as e:
             logger.error(f"Error al insertar frase: {e}")
@@ -133,7 +150,7 @@ class SupabaseAdapter:
         if not phrases:
             return []
         try:
-            result = self.client.table('bora_phrases').insert(phrases).execute()
+            result = await self._execute(self.client.table('bora_phrases').insert(phrases))
             return result.data or []
         except Exception as e:
             logger.error(f"Error en inserción bulk de frases: {e}")
@@ -146,13 +163,12 @@ class SupabaseAdapter:
         if not self.is_connected():
             return None
         try:
-            result = (
+            result = await self._execute(
                 self.client.table('bora_phrases')
                 .select('*')
                 .eq('bora_text', bora_text)
                 .eq('spanish_translation', spanish_text)
                 .limit(1)
-                .execute()
             )
             if result.data:
                 return result.data[0]
@@ -180,11 +196,12 @@ class SupabaseAdapter:
             return []
         
         try:
-            result = self.client.table('bora_phrases')\
-                .select('*')\
-                .eq('category', category)\
-                .limit(limit)\
-                .execute()
+            result = await self._execute(
+                self.client.table('bora_phrases')
+                .select('*')
+                .eq('category', category)
+                .limit(limit)
+            )
             return result.data
         except Exception as e:
             logger.error(f"Error al obtener frases: {e}")
@@ -239,7 +256,7 @@ class SupabaseAdapter:
                 }
             )
             
-            result = query.execute()
+            result = await self._execute(query)
             return result.data
         except Exception as e:
             logger.error(f"Error en búsqueda vectorial: {e}")
@@ -272,7 +289,7 @@ class SupabaseAdapter:
                 'metadata': metadata or {}
             }
 
-            result = self.client.table('phrase_embeddings').insert(data).execute()
+            result = await self._execute(self.client.table('phrase_embeddings').insert(data))
             return bool(result.data)
         except Exception as e:
             logger.error(f"Error al almacenar embedding: {e}")
@@ -283,12 +300,11 @@ class SupabaseAdapter:
         if not self.is_connected():
             return False
         try:
-            result = (
+            result = await self._execute(
                 self.client.table('phrase_embeddings')
                 .select('id')
                 .eq('phrase_id', phrase_id)
                 .limit(1)
-                .execute()
             )
             return bool(result.data)
         except Exception as e:
@@ -303,7 +319,7 @@ class SupabaseAdapter:
         if not self.is_connected():
             return None
         try:
-            result = self.client.table('lexicon_entries').insert(entry).execute()
+            result = await self._execute(self.client.table('lexicon_entries').insert(entry))
             return result.data[0] if result.data else None
         except Exception as e:
             # Si es conflicto por UNIQUE, intentar recuperar existente
@@ -318,13 +334,12 @@ class SupabaseAdapter:
         if not self.is_connected():
             return None
         try:
-            result = (
+            result = await self._execute(
                 self.client.table('lexicon_entries')
                 .select('*')
                 .eq('bora_text', bora_text)
                 .eq('spanish_text', spanish_text)
                 .limit(1)
-                .execute()
             )
             return result.data[0] if result.data else None
         except Exception as e:
@@ -335,12 +350,11 @@ class SupabaseAdapter:
         if not self.is_connected():
             return False
         try:
-            result = (
+            result = await self._execute(
                 self.client.table('lexicon_embeddings')
                 .select('id')
                 .eq('entry_id', entry_id)
                 .limit(1)
-                .execute()
             )
             return bool(result.data)
         except Exception as e:
@@ -352,7 +366,7 @@ class SupabaseAdapter:
             return False
         try:
             payload = {'entry_id': entry_id, 'embedding': embedding, 'metadata': metadata or {}}
-            result = self.client.table('lexicon_embeddings').insert(payload).execute()
+            result = await self._execute(self.client.table('lexicon_embeddings').insert(payload))
             return bool(result.data)
         except Exception as e:
             logger.error(f"Error guardando lexicon embedding: {e}")
@@ -364,7 +378,7 @@ class SupabaseAdapter:
         try:
             threshold = settings.SIMILARITY_THRESHOLD if (min_similarity is None) else float(min_similarity)
             rpc_name = 'match_lexicon_v2' if getattr(settings, 'USE_VECTOR_1536', False) else 'match_lexicon'
-            result = self.client.rpc(
+            result = await self._execute(self.client.rpc(
                 rpc_name,
                 {
                     'query_embedding': query_embedding,
@@ -372,7 +386,7 @@ class SupabaseAdapter:
                     'match_count': top_k,
                     'category_filter': category,
                 },
-            ).execute()
+            ))
             return result.data or []
         except Exception as e:
             logger.error(f"Error en match_lexicon: {e}")
@@ -384,7 +398,7 @@ class SupabaseAdapter:
             return False
         try:
             # Borrar entradas por source; embeddings se eliminan por CASCADE
-            self.client.table('lexicon_entries').delete().eq('source', source).execute()
+            await self._execute(self.client.table('lexicon_entries').delete().eq('source', source))
             return True
         except Exception as e:
             logger.error(f"Error reseteando lexicon por source: {e}")
@@ -401,11 +415,10 @@ class SupabaseAdapter:
         if not entries:
             return []
         try:
-            result = (
+            result = await self._execute(
                 self.client
                 .table('lexicon_entries')
                 .upsert(entries, on_conflict=on_conflict)
-                .execute()
             )
             return result.data or []
         except Exception as e:
@@ -419,12 +432,11 @@ class SupabaseAdapter:
         if not entry_ids:
             return []
         try:
-            result = (
+            result = await self._execute(
                 self.client
                 .table('lexicon_embeddings')
                 .select('entry_id')
                 .in_('entry_id', entry_ids)
-                .execute()
             )
             rows = result.data or []
             return [r.get('entry_id') for r in rows if r.get('entry_id') is not None]
@@ -441,13 +453,12 @@ class SupabaseAdapter:
         try:
             # Supabase JS query style for JSON filter: metadata->>kind equals value
             # Python client supports .filter('metadata->>kind','eq',kind)
-            result = (
+            result = await self._execute(
                 self.client
                 .table('lexicon_embeddings')
                 .select('entry_id, metadata')
                 .in_('entry_id', entry_ids)
                 .filter('metadata->>kind', 'eq', kind)
-                .execute()
             )
             rows = result.data or []
             return [r.get('entry_id') for r in rows if r.get('entry_id') is not None]
@@ -462,11 +473,10 @@ class SupabaseAdapter:
         if not rows:
             return 0
         try:
-            result = (
+            result = await self._execute(
                 self.client
                 .table('lexicon_embeddings')
                 .insert(rows)
-                .execute()
             )
             return len(result.data or [])
         except Exception as e:
@@ -483,11 +493,10 @@ class SupabaseAdapter:
         if not lemmas:
             return []
         try:
-            result = (
+            result = await self._execute(
                 self.client
                 .table('lexicon_lemmas')
                 .upsert(lemmas, on_conflict='lemma,source,direction')
-                .execute()
             )
             return result.data or []
         except Exception as e:
@@ -500,7 +509,7 @@ class SupabaseAdapter:
         if not subentries:
             return []
         try:
-            result = self.client.table('lexicon_subentries').insert(subentries).execute()
+            result = await self._execute(self.client.table('lexicon_subentries').insert(subentries))
             return result.data or []
         except Exception as e:
             logger.error(f"Error insert subentries: {e}")
@@ -512,7 +521,7 @@ class SupabaseAdapter:
         if not examples:
             return []
         try:
-            result = self.client.table('lexicon_examples').insert(examples).execute()
+            result = await self._execute(self.client.table('lexicon_examples').insert(examples))
             return result.data or []
         except Exception as e:
             logger.error(f"Error insert examples: {e}")
@@ -524,7 +533,7 @@ class SupabaseAdapter:
         if not docs:
             return 0
         try:
-            result = self.client.table('bora_docs').insert(docs, count='exact').execute()
+            result = await self._execute(self.client.table('bora_docs').insert(docs, count='exact'))
 
             # 1) Si Supabase devuelve un contador explícito, úsalo
             count = getattr(result, 'count', None)
@@ -545,18 +554,46 @@ class SupabaseAdapter:
             logger.error(f"Error insert bora_docs: {e}")
             return 0
 
+    def fetch_all_lemmas(
+        self,
+        columns: str = 'id, lemma, direction',
+        page_size: int = 1000,
+    ) -> List[Dict[str, Any]]:
+        """Lee lexicon_lemmas completo paginando con range() (síncrono, para hilos/scripts)."""
+        if not self.is_connected():
+            return []
+        rows: List[Dict[str, Any]] = []
+        start = 0
+        try:
+            while True:
+                res = (
+                    self.client
+                    .table('lexicon_lemmas')
+                    .select(columns)
+                    .order('id')
+                    .range(start, start + page_size - 1)
+                    .execute()
+                )
+                batch = res.data or []
+                rows.extend(batch)
+                if len(batch) < page_size:
+                    break
+                start += page_size
+        except Exception as e:
+            logger.error(f"Error listando lexicon_lemmas: {e}")
+        return rows
+
     async def find_lemma_by_text(self, lemma: str) -> Optional[Dict[str, Any]]:
         """Busca un lemma exacto (case-sensitive por defecto)."""
         if not self.is_connected():
             return None
         try:
-            res = (
+            res = await self._execute(
                 self.client
                 .table('lexicon_lemmas')
                 .select('id, lemma, gloss_es, gloss_bora, direction, pos, pos_full, page')
                 .eq('lemma', lemma)
                 .limit(1)
-                .execute()
             )
             rows = res.data or []
             return rows[0] if rows else None
@@ -569,19 +606,57 @@ class SupabaseAdapter:
         if not self.is_connected():
             return []
         try:
-            res = (
+            res = await self._execute(
                 self.client
                 .table('lexicon_examples')
                 .select('id, bora_text, spanish_text, page')
                 .eq('lemma_id', lemma_id)
                 .limit(limit)
-                .execute()
             )
             return res.data or []
         except Exception as e:
             logger.error(f"Error obteniendo ejemplos de lemma_id={lemma_id}: {e}")
             return []
 
+    async def get_examples_by_lemma_ids(
+        self,
+        lemma_ids: List[int],
+        limit_per_lemma: int = 3,
+    ) -> Dict[int, List[Dict[str, Any]]]:
+        """
+        Obtiene ejemplos de varios lemmas en una sola consulta (filtro in_).
+
+        PostgREST no soporta LIMIT por grupo: se acota el total de filas con una
+        cota holgada (el corpus tiene como máximo ~16 ejemplos por lemma) y se
+        recorta a `limit_per_lemma` por lemma en memoria.
+
+        Returns:
+            Dict lemma_id -> lista de ejemplos (id, lemma_id, bora_text, spanish_text, page)
+        """
+        if not self.is_connected():
+            return {}
+        unique_ids = list(dict.fromkeys(int(i) for i in lemma_ids if i is not None))
+        if not unique_ids or limit_per_lemma <= 0:
+            return {}
+        try:
+            res = await self._execute(
+                self.client
+                .table('lexicon_examples')
+                .select('id, lemma_id, bora_text, spanish_text, page')
+                .in_('lemma_id', unique_ids)
+                .order('id')
+                .limit(len(unique_ids) * max(limit_per_lemma, _MAX_EXAMPLES_PER_LEMMA))
+            )
+            grouped: Dict[int, List[Dict[str, Any]]] = {}
+            for row in res.data or []:
+                bucket = grouped.setdefault(row.get('lemma_id'), [])
+                if len(bucket) < limit_per_lemma:
+                    bucket.append(row)
+            return grouped
+        except Exception as e:
+            logger.error(f"Error obteniendo ejemplos de {len(unique_ids)} lemmas: {e}")
+            return {}
+
     async def vector_search_bora_docs(
         self,
         query_embedding: List[float],
@@ -605,7 +680,7 @@ class SupabaseAdapter:
                 # La función SQL retorna 'direction' en los resultados pero NO filtra por ella
             }
             rpc_name = 'match_bora_docs_v2' if getattr(settings, 'USE_VECTOR_1536', False) else 'match_bora_docs'
-            res = self.client.rpc(rpc_name, params).execute()
+            res = await self._execute(self.client.rpc(rpc_name, params))
             return res.data or []
         except Exception as e:
             logger.error(f"Error en match_bora_docs: {e}")
@@ -621,11 +696,12 @@ class SupabaseAdapter:
             return None
         
         try:
-            result = self.client.table('users')\
-                .select('*')\
-                .eq('email', email)\
-                .single()\
-                .execute()
+            result = await self._execute(
+                self.client.table('users')
+                .select('*')
+                .eq('email', email)
+                .single()
+            )
             return result.data
         except Exception as e:
             logger.error(f"Error al obtener usuario: {e}")
@@ -638,10 +714,10 @@ class SupabaseAdapter:
         
         try:
             # Incrementar puntos atomicamente
-            self.client.rpc(
+            await self._execute(self.client.rpc(
                 'increment_user_points',
                 {'user_uuid': user_id, 'points': points_to_add}
-            ).execute()
+            ))
             return True
         except Exception as e:
             logger.error(f"Error al actualizar puntos: {e}")
@@ -32,12 +32,31 @@ class Settings(BaseSettings):
     SUPABASE_URL: Optional[str] = None
     SUPABASE_ANON_KEY: Optional[str] = None
     SUPABASE_SERVICE_KEY: Optional[str] = None
+    # Hilos para ejecutar las llamadas síncronas de supabase-py fuera del event loop
+    SUPABASE_IO_THREADS: int = 16
+    # Cliente PostgREST asíncrono (httpx) para la ruta caliente del lexicón
+    SUPABASE_ASYNC_CLIENT: bool = True
+    SUPABASE_HTTP_MAX_CONNECTIONS: int = 50
+    SUPABASE_HTTP_MAX_KEEPALIVE: int = 20
+    SUPABASE_HTTP_KEEPALIVE_EXPIRY: float = 30.0
+    SUPABASE_HTTP_CONNECT_TIMEOUT: float = 5.0
+    SUPABASE_HTTP_TIMEOUT: float = 10.0
+    SUPABASE_HTTP_RETRIES: int = 2
+    SUPABASE_HTTP_BACKOFF: float = 0.2
+    # HTTP/2 requiere el extra httpx[http2] (paquete h2)
+    SUPABASE_HTTP2: bool = False
 
     # ---- HuggingFace ----
     HUGGINGFACE_API_KEY: Optional[str] = None
     USE_EMBEDDING_API: bool = False
     # Cuando USE_EMBEDDING_API=True, usar este modelo del proveedor (OpenAI por defecto)
     EMBEDDING_API_MODEL: str = "text-embedding-3-small"
+    # Cache de embeddings (memoria LRU + SQLite en disco; ruta vacía = solo memoria)
+    EMBEDDING_CACHE_ENABLED: bool = True
+    EMBEDDING_CACHE_MAX_ENTRIES: int = 4096
+    EMBEDDING_CACHE_PATH: str = "data/embedding_cache.sqlite3"
+    # Hilos para codificar con el modelo local (SentenceTransformer) fuera del event loop
+    EMBEDDING_ENCODE_THREADS: int = 2
 
     # ---- Modelos ----
     EMBEDDING_MODEL: str = "sentence-transformers/all-MiniLM-L6-v2"
@@ -87,10 +106,89 @@ class Settings(BaseSettings):
     # Permitir fallback automático a Hugging Face LLM por API si OpenAI falla
     # Por ahora debe ser False para que el sistema falle si OpenAI no está disponible
     ALLOW_HF_LLM_FALLBACK: bool = False
+    # Circuit breaker por proveedor LLM: N fallos o llamadas lentas seguidas lo abren durante OPEN_SECONDS
+    LLM_BREAKER_FAILURE_THRESHOLD: int = 5
+    LLM_BREAKER_SLOW_CALL_MS: int = 15000
+    LLM_BREAKER_OPEN_SECONDS: float = 30.0
+    # Hedging: lanzar el secundario (HF) si el primario supera su p95 (requiere ALLOW_HF_LLM_FALLBACK)
+    LLM_HEDGE_ENABLED: bool = False
+    LLM_HEDGE_MIN_DELAY_MS: int = 2000
+    LLM_HEDGE_DEFAULT_DELAY_MS: int = 4000
     # Habilitar preprocesamiento de queries con LLM antes de vectorización
     # True: Extrae keywords/frases clave para mejorar búsqueda (agrega ~200-400ms)
     # False: Usa query original completa para búsqueda (más rápido, posible ruido)
     ENABLE_QUERY_PREPROCESSING: bool = True
+    # Recuperación especulativa: con consultas cortas, embedding + búsqueda de la query
+    # original en paralelo con la extracción de keywords; se reutiliza si la limpia coincide
+    SPECULATIVE_RETRIEVAL_ENABLED: bool = True
+    SPECULATIVE_RETRIEVAL_MAX_WORDS: int = 8
+    # Motor de búsqueda vectorial del lexicón: "rpc" (match_bora_docs en Supabase)
+    # o "local" (snapshot en memoria generado con scripts/snapshot_bora_docs.py)
+    VECTOR_SEARCH_BACKEND: str = "rpc"
+    # Directorio del snapshot local (relativo a backend/ si no es absoluto)
+    LOCAL_VECTOR_INDEX_DIR: str = "data/vector_index"
+    # Búsqueda léxica (BM25 sobre n-gramas de caracteres) fusionada con la vectorial por RRF
+    LEXICAL_SEARCH_ENABLED: bool = True
+    LEXICAL_NGRAM_SIZE: int = 3
+    LEXICAL_TOP_K: int = 5
+    LEXICAL_MIN_SCORE_RATIO: float = 0.5
+    RRF_K: int = 60
+    # Mapa de lemas en memoria: refresco periódico desde lexicon_lemmas (0 = solo al arrancar)
+    LEMMA_MAP_REFRESH_SECONDS: int = 3600
+    # Búsqueda por lotes (/lexicon/search/batch): tamaño máximo y fan-out concurrente
+    LEXICON_BATCH_MAX_QUERIES: int = 50
+    LEXICON_BATCH_CONCURRENCY: int = 8
+    # Presupuesto de latencia (deadline_ms): EWMA por etapa y márgenes de degradación
+    LATENCY_EWMA_ALPHA: float = 0.2
+    LATENCY_ESTIMATE_STALE_SECONDS: int = 600
+    DEADLINE_SAFETY_MARGIN_MS: int = 50
+    DEADLINE_REDUCED_TOP_K: int = 5
+    DEADLINE_MIN_RESPONSE_TOKENS: int = 80
+    # Control de admisión de /lexicon (pipelines concurrentes, cola por prioridad, cuotas por usuario/IP)
+    ADMISSION_ENABLED: bool = True
+    ADMISSION_MAX_CONCURRENT: int = 16
+    ADMISSION_MAX_QUEUE: int = 200
+    ADMISSION_QUEUE_TIMEOUT_CHAT_MS: int = 8000
+    ADMISSION_QUEUE_TIMEOUT_SEARCH_MS: int = 2000
+    ADMISSION_QUEUE_TIMEOUT_BATCH_MS: int = 5000
+    ADMISSION_USER_RPM: int = 60
+    ADMISSION_IP_RPM: int = 30
+    ADMISSION_BURST: int = 10
+    ADMISSION_MAX_TRACKED_KEYS: int = 10000
+    # Usar la última IP de X-Forwarded-For (la que añade el proxy; solo detrás de uno, p. ej. Railway)
+    ADMISSION_TRUST_FORWARDED_FOR: bool = False
+    # Cache de respuestas del lexicón (LRU + TTL, con single-flight)
+    LEXICON_CACHE_TTL_SECONDS: int = 120
+    LEXICON_CACHE_MAX_ENTRIES: int = 512
+    LEXICON_CACHE_MAX_BYTES: int = 8 * 1024 * 1024
+    # Cache semántica: reutiliza respuestas de paráfrasis con la misma clave de término
+    # (dirección + términos); el umbral es el coseno entre embeddings de la query original
+    SEMANTIC_CACHE_ENABLED: bool = True
+    SEMANTIC_CACHE_THRESHOLD: float = 0.95
+    SEMANTIC_CACHE_MAX_ENTRIES: int = 1024
+    # Tarjetas de respuesta precalculadas por lema (scripts/build_answer_cards.py; ruta vacía = desactivadas)
+    ANSWER_CARDS_ENABLED: bool = True
+    ANSWER_CARDS_PATH: str = "data/answer_cards.sqlite3"
+    ANSWER_CARDS_MAX_EXAMPLES: int = 2
+    # Historial del mentor: ventana en memoria por conversación (buffer circular, LRU)
+    CONVERSATION_HISTORY_WINDOW: int = 20
+    CONVERSATION_HISTORY_CACHE_MAX_CONVERSATIONS: int = 2048
+    # Persistencia diferida de mensajes del chat (cola acotada + worker por lotes)
+    CHAT_PERSIST_WRITE_BEHIND: bool = True
+    CHAT_PERSIST_QUEUE_MAX: int = 1000
+    CHAT_PERSIST_BATCH_SIZE: int = 50
+    CHAT_PERSIST_ENQUEUE_TIMEOUT_SECONDS: float = 0.5
+    CHAT_PERSIST_SHUTDOWN_TIMEOUT_SECONDS: float = 10.0
+    # Resumen incremental de conversaciones largas: el prompt lleva resumen + mensajes no resumidos
+    # Requiere la migración docs/migrations/006_chat_conversations_summary.sql antes de activarlo
+    CONVERSATION_SUMMARY_ENABLED: bool = False
+    CONVERSATION_SUMMARY_EVERY_EXCHANGES: int = 2
+    CONVERSATION_SUMMARY_KEEP_MESSAGES: int = 4
+    CONVERSATION_SUMMARY_MAX_TOKENS: int = 250
+
+    # ---- Observabilidad ----
+    # Métricas en proceso (histogramas por etapa RAG, caches, uso del LLM) en GET /metrics
+    METRICS_ENABLED: bool = True
 
     # ---- OpenAI API ----
     OPENAI_API_KEY: Optional[str] = None
@@ -101,6 +199,22 @@ class Settings(BaseSettings):
     OPENAI_TEMPERATURE: float = 0.7
     OPENAI_MAX_TOKENS: int = 500
     OPENAI_TIMEOUT: int = 30
+    # Gobernador de llamadas: concurrencia por propósito, cuotas por minuto (0 = sin límite) y reintentos
+    OPENAI_CONCURRENCY_ANSWER: int = 10
+    OPENAI_CONCURRENCY_AUX: int = 8
+    OPENAI_CONCURRENCY_SUMMARY: int = 1
+    OPENAI_RPM_LIMIT: int = 500
+    OPENAI_TPM_LIMIT: int = 200000
+    OPENAI_QUEUE_TIMEOUT_SECONDS: float = 10.0
+    OPENAI_MAX_RETRIES: int = 3
+    OPENAI_RETRY_BASE_SECONDS: float = 0.5
+    OPENAI_RETRY_MAX_SECONDS: float = 8.0
+    # Presupuesto de tokens de entrada del prompt del mentor (0 = sin límite); se recorta
+    # historial -> ejemplos -> grupos del contexto (services/prompt_assembler.py)
+    PROMPT_MAX_INPUT_TOKENS: int = 2500
+    # prompt_cache_key para las respuestas del mentor (mejora el enrutado del prompt caching
+    # de OpenAI); vacío = no enviarlo (endpoints compatibles que no lo acepten)
+    OPENAI_PROMPT_CACHE_KEY: str = ""
     # Opcionales: soporte para endpoints compatibles (Azure/OpenRouter/self-hosted proxies)
     OPENAI_BASE_URL: Optional[str] = None
     OPENAI_ORG: Optional[str] = None
@@ -12,7 +12,8 @@ import logging
 
 from config.settings import settings
 from config.database_connection import init_db
-from routers import health_router, auth_router, game_router, profile_router, feedback_router, admin_router
+from routers import health_router, auth_router, game_router, profile_router, feedback_router, admin_router, metrics_router
+from services.metrics import MetricsMiddleware
 
 # Configurar logging
 logging.basicConfig(
@@ -53,6 +54,12 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         logger.warning(f"✗ Supabase: {e}")
     
+    # Métricas de la cache de embeddings (los adaptadores no importan services/)
+    from functools import partial
+    from adapters.embedding_cache import get_embedding_cache
+    from services.metrics import record_cache_lookup
+    get_embedding_cache().lookup_hook = partial(record_cache_lookup, "embedding")
+
     try:
         from adapters.huggingface_adapter import get_huggingface_adapter
         hf = get_huggingface_adapter()
@@ -82,12 +89,58 @@ async def lifespan(app: FastAPI):
     else:
         logger.info("OpenAI deshabilitado por configuración")
     
+    # Mapa de lemas en memoria (boost de lemma exacto + detector de dirección), en segundo plano
+    try:
+        from adapters.supabase_adapter import get_supabase_adapter
+        from services.lemma_map import get_lemma_map
+        get_lemma_map().schedule_load(
+            get_supabase_adapter(),
+            refresh_seconds=settings.LEMMA_MAP_REFRESH_SECONDS,
+        )
+    except Exception as e:
+        logger.warning(f"⚠️ Mapa de lemas no disponible: {e}")
+
+    # Índice léxico (BM25 n-gramas) para la recuperación híbrida (en segundo plano)
+    if settings.LEXICAL_SEARCH_ENABLED:
+        try:
+            from adapters.supabase_adapter import get_supabase_adapter
+            from services.lexical_index import get_lexical_index
+            get_lexical_index().schedule_load(get_supabase_adapter())
+        except Exception as e:
+            logger.warning(f"⚠️ Índice léxico no disponible: {e}")
+
+    # Cola write-behind de mensajes del chat (fuera de la ruta de respuesta)
+    if settings.CHAT_PERSIST_WRITE_BEHIND:
+        from services.chat_persistence import get_chat_persistence_queue
+        get_chat_persistence_queue().start()
+    
     logger.info(f"Servidor listo en modo {'DEBUG' if settings.DEBUG else 'PRODUCCIÓN'}")
     
     yield
     
     # Shutdown
     logger.info("Cerrando aplicación...")
+    # Primero vaciar la cola de chat: usa la DB y no debe perder mensajes
+    try:
+        from services.chat_persistence import get_chat_persistence_queue
+        await get_chat_persistence_queue().stop()
+    except Exception as e:
+        logger.warning(f"⚠️ Error vaciando la cola de chat: {e}")
+    try:
+        from services.conversation_summarizer import get_conversation_summarizer
+        await get_conversation_summarizer().stop()
+    except Exception as e:
+        logger.warning(f"⚠️ Error cancelando resúmenes de conversación: {e}")
+    try:
+        from services.lemma_map import get_lemma_map
+        get_lemma_map().stop()
+    except Exception as e:
+        logger.warning(f"⚠️ Error deteniendo refresco de lemas: {e}")
+    try:
+        from adapters.async_supabase_adapter import get_async_supabase_adapter
+        await get_async_supabase_adapter().aclose()
+    except Exception as e:
+        logger.warning(f"⚠️ Error cerrando cliente PostgREST: {e}")
 
 
 # Crear aplicación FastAPI
@@ -166,6 +219,8 @@ if frontend_url:
 logger.info(f"CORS configuración final - Orígenes permitidos: {allowed_origins}")
 logger.info(f"CORS - allow_credentials: True")
 
+# Peticiones en curso y latencia por ruta (GET /metrics)
+app.add_middleware(MetricsMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=allowed_origins,
@@ -181,6 +236,7 @@ app.include_router(game_router.router)
 app.include_router(profile_router.router)
 app.include_router(feedback_router.router)
 app.include_router(admin_router.router)
+app.include_router(metrics_router.router)
 try:
     from routers import lexicon_router
     app.include_router(lexicon_router.router)
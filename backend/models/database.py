@@ -2,7 +2,7 @@
 Modelos de base de datos para MIAPPBORA
 Sincronizado con esquema de Supabase PostgreSQL
 """
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Float, Text, Date
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Float, Text, Date, Index, text
 from sqlalchemy.orm import relationship
 from sqlalchemy.ext.declarative import declarative_base
 from datetime import datetime
@@ -99,6 +99,14 @@ class ChatConversation(Base):
     id = Column(Integer, primary_key=True, autoincrement=True)
     user_id = Column(Integer, ForeignKey('users.id', ondelete='CASCADE'), nullable=False, index=True)
     title = Column(String(200), default='Nueva conversación')
+
+    # Resumen incremental de los mensajes antiguos (services/conversation_summarizer.py)
+    # Solo en la tabla (create_all), sin mapear: los SELECT/INSERT del ORM no las tocan,
+    # así que una base sin la migración 006 sigue funcionando con el resumen apagado.
+    # Se leen/escriben con ChatConversation.__table__.c.
+    summary = Column(Text, nullable=True)
+    summary_message_count = Column(Integer, nullable=False, server_default=text('0'))  # Mensajes cubiertos por summary
+    __mapper_args__ = {"exclude_properties": ["summary", "summary_message_count"]}
     
     # Timestamps
     created_at = Column(DateTime, default=datetime.utcnow)
@@ -115,6 +123,10 @@ class ChatMessage(Base):
     Almacena el historial de conversaciones con el asistente
     """
     __tablename__ = "chat_messages"
+    # Historial reciente: WHERE conversation_id = ? ORDER BY created_at DESC LIMIT n
+    __table_args__ = (
+        Index("ix_chat_messages_conversation_created", "conversation_id", "created_at"),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     conversation_id = Column(Integer, ForeignKey('chat_conversations.id', ondelete='CASCADE'), nullable=False, index=True)
@@ -1,11 +1,21 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 from sqlalchemy import func
-from typing import List
+from typing import List, Optional
 from datetime import datetime, timedelta
 from config.database_connection import get_db
 from models.database import User
 from dependencies import get_current_user
+from services.lexicon_cache import get_lexicon_cache
+from services.semantic_cache import get_semantic_cache
+from services.conversation_history_cache import get_conversation_history_cache
+from services.chat_persistence import get_chat_persistence_queue
+from services.conversation_summarizer import get_conversation_summarizer
+from services.lexical_index import get_lexical_index
+from services.lemma_map import get_lemma_map
+from services.answer_cards import get_answer_card_store
+from services.admission_control import get_admission_controller
+from config.settings import settings
 
 router = APIRouter(prefix="/admin", tags=["admin"])
 
@@ -240,3 +250,111 @@ async def get_all_feedback(
     except Exception as e:
         print(f"Error getting feedback: {e}")
         return []
+
+@router.post("/lexicon/vector-index/refresh")
+async def refresh_vector_index(
+    rebuild: bool = False,
+    admin: User = Depends(verify_admin)
+):
+    """Recargar (o regenerar desde Supabase) el índice vectorial local del lexicón (solo admin)"""
+    from fastapi.concurrency import run_in_threadpool
+    from adapters.local_vector_adapter import get_local_vector_index, build_snapshot
+    from adapters.supabase_adapter import get_supabase_adapter
+
+    index = get_local_vector_index()
+    if rebuild:
+        supabase = get_supabase_adapter()
+        if not supabase.is_connected():
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Supabase no configurado"
+            )
+        try:
+            await run_in_threadpool(build_snapshot, supabase.client, str(index.index_dir))
+        except Exception as e:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Error generando snapshot: {e}"
+            )
+
+    loaded = await run_in_threadpool(index.refresh)
+    if not loaded:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Snapshot vectorial no disponible. Ejecuta scripts/snapshot_bora_docs.py"
+        )
+    # El índice léxico se reconstruye sobre las mismas filas del snapshot
+    lexical_index = get_lexical_index()
+    if settings.LEXICAL_SEARCH_ENABLED:
+        await run_in_threadpool(lexical_index.load_from_snapshot, str(index.index_dir))
+    # Las respuestas cacheadas se generaron con el índice anterior
+    get_lexicon_cache().invalidate()
+    get_semantic_cache().invalidate()
+    return {
+        "message": "Índice vectorial recargado",
+        "index": index.get_info(),
+        "lexical": lexical_index.stats(),
+    }
+
+
+@router.get("/lexicon/cache")
+async def get_lexicon_cache_stats(admin: User = Depends(verify_admin)):
+    """Estadísticas de la cache de respuestas del lexicón (solo admin)"""
+    stats = get_lexicon_cache().stats()
+    stats["semantic"] = get_semantic_cache().stats()
+    stats["conversation_history"] = get_conversation_history_cache().stats()
+    stats["chat_persistence"] = get_chat_persistence_queue().stats()
+    stats["conversation_summaries"] = get_conversation_summarizer().stats()
+    stats["answer_cards"] = get_answer_card_store().stats()
+    stats["admission"] = get_admission_controller().stats()
+    return stats
+
+
+@router.post("/lexicon/cache/invalidate")
+async def invalidate_lexicon_cache(
+    prefix: Optional[str] = None,
+    admin: User = Depends(verify_admin)
+):
+    """Vaciar la cache de respuestas del lexicón (solo admin)"""
+    removed = get_lexicon_cache().invalidate(prefix)
+    # La cache semántica no tiene claves textuales: se vacía completa
+    semantic_removed = get_semantic_cache().invalidate()
+    return {"message": "Cache del lexicón invalidada", "removed": removed, "semantic_removed": semantic_removed}
+
+
+@router.get("/lexicon/lemmas")
+async def get_lemma_map_stats(admin: User = Depends(verify_admin)):
+    """Estado del mapa de lemas en memoria y del detector de dirección (solo admin)"""
+    from services.direction_detector import get_direction_detector
+
+    stats = get_lemma_map().stats()
+    stats["direction_detector"] = get_direction_detector().stats()
+    return stats
+
+
+@router.post("/lexicon/lemmas/refresh")
+async def refresh_lemma_map(admin: User = Depends(verify_admin)):
+    """Recargar el mapa de lemas desde lexicon_lemmas (solo admin)"""
+    from adapters.supabase_adapter import get_supabase_adapter
+
+    supabase = get_supabase_adapter()
+    if not supabase.is_connected():
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Supabase no configurado"
+        )
+    lemma_map = get_lemma_map()
+    count = await lemma_map.refresh(supabase)
+    # El boost de lemma forma parte de las respuestas cacheadas
+    get_lexicon_cache().invalidate()
+    get_semantic_cache().invalidate()
+    return {"message": "Mapa de lemas recargado", "lemmas": count, "stats": lemma_map.stats()}
+
+
+@router.get("/lexicon/latency")
+async def get_latency_estimates(admin: User = Depends(verify_admin)):
+    """Latencias estimadas por etapa (EWMA) que usa deadline_ms para degradar (solo admin)"""
+    from services.latency_budget import get_latency_estimator
+
+    estimator = get_latency_estimator()
+    return {"stages": estimator.stats(), "priors_ms": estimator.priors_ms}
@@ -9,6 +9,7 @@ import logging
 # Imports opcionales - tolerante a dependencias faltantes
 try:
     from adapters.supabase_adapter import get_supabase_adapter
+    from adapters.async_supabase_adapter import get_async_supabase_adapter
     SUPABASE_AVAILABLE = True
 except ImportError as e:
     SUPABASE_AVAILABLE = False
@@ -17,6 +18,7 @@ except ImportError as e:
 
 try:
     from adapters.huggingface_adapter import get_huggingface_adapter
+    from adapters.embedding_cache import get_embedding_cache
     HUGGINGFACE_AVAILABLE = True
 except ImportError as e:
     HUGGINGFACE_AVAILABLE = False
@@ -24,6 +26,7 @@ except ImportError as e:
     get_huggingface_adapter = None
 
 from config.settings import settings
+from services.llm_router import OPEN, get_llm_router
 
 router = APIRouter(prefix="/health", tags=["Health"])
 logger = logging.getLogger(__name__)
@@ -86,7 +89,9 @@ async def check_connections() -> Dict[str, Any]:
                 status_report["services"]["supabase"] = {
                     "status": "connected",
                     "url": settings.SUPABASE_URL if settings.SUPABASE_URL else "not_configured",
-                    "message": "Conexión establecida correctamente"
+                    "message": "Conexión establecida correctamente",
+                    # Pool httpx del cliente PostgREST asíncrono (ruta del lexicón)
+                    "postgrest_pool": get_async_supabase_adapter().stats(),
                 }
             else:
                 status_report["services"]["supabase"] = {
@@ -129,7 +134,7 @@ async def check_connections() -> Dict[str, Any]:
                 }
                 
                 # Test rápido de embedding
-                test_embedding = hf_adapter.generate_embedding("test")
+                test_embedding = await hf_adapter.agenerate_embedding("test")
                 if test_embedding:
                     status_report["services"]["huggingface"]["embedding_dimension"] = len(test_embedding)
                     status_report["services"]["huggingface"]["test_embedding"] = "success"
@@ -150,7 +155,21 @@ async def check_connections() -> Dict[str, Any]:
                 "message": str(e)
             }
             issues.append(f"Error en HuggingFace: {str(e)}")
+        
+        # Estadísticas de la cache de embeddings (hit-rate memoria/disco)
+        if "huggingface" in status_report["services"]:
+            status_report["services"]["huggingface"]["embedding_cache"] = get_embedding_cache().stats()
     
+    # ==========================================
+    # PROVEEDORES LLM (circuit breakers)
+    # ==========================================
+    llm_router = get_llm_router()
+    llm_status = llm_router.stats()
+    status_report["services"]["llm"] = llm_status
+    for name in llm_status.get("candidates", []):
+        if llm_status["breakers"][name]["state"] == OPEN:
+            issues.append(f"LLM: circuito abierto para {name}")
+
     # ==========================================
     # VERIFICAR CONFIGURACIÓN
     # ==========================================
@@ -284,7 +303,7 @@ async def check_huggingface_only() -> Dict[str, Any]:
     # Test de embedding
     try:
         test_text = "Hola, ¿cómo estás?"
-        embedding = hf_adapter.generate_embedding(test_text)
+        embedding = await hf_adapter.agenerate_embedding(test_text)
         
         if embedding:
             return {
@@ -1,9 +1,22 @@
-from fastapi import APIRouter, Depends, Query
-from pydantic import BaseModel
-from typing import Optional, Dict, Any, List
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+from typing import Optional, Dict, Any, List, Callable, Awaitable
 from sqlalchemy.orm import Session
+import json
+import math
 
 from services.rag_service import RAGService
+from services.admission_control import (
+    PRIORITY_BATCH,
+    PRIORITY_CHAT,
+    PRIORITY_SEARCH,
+    RATE_LIMITED,
+    AdmissionController,
+    AdmissionRejected,
+    get_admission_controller,
+)
+from config.settings import settings
 from config.database_connection import get_db
 from dependencies import get_current_user
 from models.database import User, ChatConversation, ChatMessage
@@ -18,51 +31,249 @@ class LexiconChatRequest(BaseModel):
     category: Optional[str] = None
     fast: bool = False
     conversation_id: Optional[int] = None
+    # Presupuesto de latencia (ms); solo aplica a /chat (el streaming no se degrada)
+    deadline_ms: Optional[int] = Field(None, ge=100, le=60000)
+    # True = respuesta del LLM aunque exista tarjeta precalculada del lema (solo /chat)
+    full_answer: bool = False
+
+
+def _client_ip(request: Request) -> Optional[str]:
+    """IP del cliente para las cuotas anónimas (detrás de proxy, la última de X-Forwarded-For)."""
+    if settings.ADMISSION_TRUST_FORWARDED_FOR:
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            return forwarded.split(",")[-1].strip() or None
+    return request.client.host if request.client else None
+
+
+def _shed(
+    controller: AdmissionController,
+    priority: str,
+    rejection: AdmissionRejected,
+    shed: Optional[Callable[[], Optional[Dict[str, Any]]]],
+) -> Optional[Dict[str, Any]]:
+    """Respuesta barata para una petición rechazada por saturación (no por cuota)."""
+    if rejection.reason == RATE_LIMITED:
+        return None
+    result = shed() if shed else None
+    controller.record_shed(priority, result.get("shed") if result else None)
+    return result
+
+
+def _rejection_error(rejection: AdmissionRejected) -> HTTPException:
+    return HTTPException(
+        status_code=429 if rejection.reason == RATE_LIMITED else 503,
+        detail=str(rejection),
+        headers={"Retry-After": str(max(1, math.ceil(rejection.retry_after)))},
+    )
+
+
+async def _run_admitted(
+    request: Request,
+    priority: str,
+    call: Callable[[], Awaitable[Dict[str, Any]]],
+    shed: Optional[Callable[[], Optional[Dict[str, Any]]]] = None,
+    user_id: Optional[int] = None,
+    cost: float = 1.0,
+    slots: int = 1,
+) -> Dict[str, Any]:
+    """Ejecuta `call` con `slots` huecos del control de admisión; si no se admite, `shed()` o 429/503."""
+    controller = get_admission_controller()
+    try:
+        await controller.acquire(
+            priority, user_id=user_id, client_ip=_client_ip(request), cost=cost, slots=slots
+        )
+    except AdmissionRejected as e:
+        result = _shed(controller, priority, e, shed)
+        if result is None:
+            raise _rejection_error(e)
+        return result
+    try:
+        return await call()
+    finally:
+        controller.release(slots)
 
 
 @router.get("/search")
 async def search_lexicon(
+    request: Request,
     q: str = Query(..., description="Consulta del usuario"),
     top_k: int = Query(10, ge=1, le=50),
     min_similarity: float = Query(0.7, ge=0.0, le=1.0),
     category: Optional[str] = Query(None),
     fast: bool = Query(False, description="Modo rápido: menos contexto y respuesta más corta"),
+    deadline_ms: Optional[int] = Query(
+        None, ge=100, le=60000,
+        description="Presupuesto de latencia: degrada etapas (ejemplos, top_k, tokens) para responder a tiempo",
+    ),
+    full_answer: bool = Query(False, description="Generar con el LLM aunque exista tarjeta precalculada del lema"),
     db: Session = Depends(get_db),
 ) -> Dict[str, Any]:
     service = RAGService()
-    result = await service.answer_with_lexicon(
-        query=q,
-        top_k=top_k,
-        min_similarity=min_similarity,
-        category=category,
-        conversation_history=None,
-        fast=fast,
+    return await _run_admitted(
+        request,
+        PRIORITY_SEARCH,
+        lambda: service.answer_with_lexicon(
+            query=q,
+            top_k=top_k,
+            min_similarity=min_similarity,
+            category=category,
+            conversation_history=None,
+            fast=fast,
+            deadline_ms=deadline_ms,
+            full_answer=full_answer,
+        ),
+        shed=lambda: service.shed_lexicon_answer(q, top_k, min_similarity, category, fast),
+    )
+
+
+class LexiconBatchSearchRequest(BaseModel):
+    queries: List[str] = Field(..., min_length=1)
+    top_k: int = Field(10, ge=1, le=50)
+    min_similarity: float = Field(0.7, ge=0.0, le=1.0)
+    category: Optional[str] = None
+    fast: bool = False
+    skip_llm: bool = False
+
+
+@router.post("/search/batch")
+async def search_lexicon_batch(
+    payload: LexiconBatchSearchRequest,
+    request: Request,
+) -> Dict[str, Any]:
+    """Varias consultas en una petición: un solo embedding batch y recuperación concurrente."""
+    if len(payload.queries) > settings.LEXICON_BATCH_MAX_QUERIES:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Máximo {settings.LEXICON_BATCH_MAX_QUERIES} consultas por lote",
+        )
+    service = RAGService()
+    # Un lote consume de la cuota de la IP tantas consultas como trae y ocupa un
+    # hueco por cada pipeline que search_lexicon_batch ejecuta a la vez
+    unique_queries = {q.strip() for q in payload.queries if q and q.strip()}
+    return await _run_admitted(
+        request,
+        PRIORITY_BATCH,
+        lambda: service.search_lexicon_batch(
+            queries=payload.queries,
+            top_k=payload.top_k,
+            min_similarity=payload.min_similarity,
+            category=payload.category,
+            fast=payload.fast,
+            skip_llm=payload.skip_llm,
+        ),
+        cost=len(payload.queries),
+        slots=min(len(unique_queries), settings.LEXICON_BATCH_CONCURRENCY),
     )
-    return result
 
 
 @router.post("/chat")
 async def chat_with_lexicon(
     payload: LexiconChatRequest,
+    request: Request,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ) -> Dict[str, Any]:
     service = RAGService()
-    result = await service.answer_with_lexicon(
-        query=payload.q,
-        top_k=payload.top_k,
-        min_similarity=payload.min_similarity,
-        category=payload.category,
-        conversation_history=None,
-        fast=payload.fast,
-        db=db,
+    result = await _run_admitted(
+        request,
+        PRIORITY_CHAT,
+        lambda: service.answer_with_lexicon(
+            query=payload.q,
+            top_k=payload.top_k,
+            min_similarity=payload.min_similarity,
+            category=payload.category,
+            conversation_history=None,
+            fast=payload.fast,
+            db=db,
+            user_id=current_user.id,
+            conversation_id=payload.conversation_id,
+            persist=True,
+            deadline_ms=payload.deadline_ms,
+            full_answer=payload.full_answer,
+        ),
+        shed=lambda: service.shed_lexicon_answer(
+            payload.q, payload.top_k, payload.min_similarity, payload.category, payload.fast
+        ),
         user_id=current_user.id,
-        conversation_id=payload.conversation_id,
-        persist=True,
     )
+    if result.get("shed"):
+        # La respuesta de saturación no se guarda: la conversación sigue donde estaba
+        result["conversation_id"] = payload.conversation_id
     return result
 
 
+def _format_sse(event: Dict[str, Any]) -> str:
+    """Serializa un evento del servicio al formato Server-Sent Events."""
+    data = json.dumps(event.get("data", {}), ensure_ascii=False, default=str)
+    return f"event: {event.get('event', 'message')}\ndata: {data}\n\n"
+
+
+@router.post("/chat/stream")
+async def chat_with_lexicon_stream(
+    payload: LexiconChatRequest,
+    request: Request,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+) -> StreamingResponse:
+    """
+    Igual que /chat pero emite la respuesta por SSE (retrieval -> token* -> done).
+
+    El hueco de admisión se pide dentro del generador para que se libere
+    siempre (también si el cliente corta); un rechazo llega como evento
+    "error" con retry_after, o como retrieval + done con la respuesta de
+    saturación.
+    """
+    service = RAGService()
+    user_id = current_user.id
+    client_ip = _client_ip(request)
+
+    # Con FastAPI 0.104 la sesión de get_db sigue abierta hasta que termina el
+    # stream, así que la persistencia al final del generador puede usarla.
+    async def event_stream():
+        controller = get_admission_controller()
+        try:
+            await controller.acquire(PRIORITY_CHAT, user_id=user_id, client_ip=client_ip)
+        except AdmissionRejected as e:
+            result = _shed(
+                controller, PRIORITY_CHAT, e,
+                lambda: service.shed_lexicon_answer(
+                    payload.q, payload.top_k, payload.min_similarity, payload.category, payload.fast
+                ),
+            )
+            if result is None:
+                yield _format_sse({
+                    "event": "error",
+                    "data": {"detail": str(e), "retry_after": max(1, math.ceil(e.retry_after))},
+                })
+                return
+            result["conversation_id"] = payload.conversation_id
+            yield _format_sse({"event": "retrieval", "data": {"results": result.get("results", [])}})
+            yield _format_sse({"event": "done", "data": result})
+            return
+        try:
+            async for event in service.stream_answer_with_lexicon(
+                query=payload.q,
+                top_k=payload.top_k,
+                min_similarity=payload.min_similarity,
+                category=payload.category,
+                fast=payload.fast,
+                db=db,
+                user_id=user_id,
+                conversation_id=payload.conversation_id,
+                persist=True,
+            ):
+                yield _format_sse(event)
+        finally:
+            controller.release()
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @router.get("/conversations/recent", response_model=List[Dict[str, Any]])
 async def get_recent_conversations(
     limit: int = Query(10, ge=1, le=50, description="Número máximo de conversaciones a retornar"),
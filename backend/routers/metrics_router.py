@@ -0,0 +1,27 @@
+"""
+Router de métricas para MIAPPBORA
+Expone el registro en proceso en formato de texto de Prometheus
+"""
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import PlainTextResponse
+
+from config.settings import settings
+from services.metrics import get_metrics
+
+router = APIRouter(tags=["Metrics"])
+
+# Formato de exposición de texto 0.0.4 (Starlette añade charset=utf-8)
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4"
+
+
+@router.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def metrics() -> PlainTextResponse:
+    """
+    Histogramas por etapa RAG, caches, llamadas/tokens del LLM y peticiones en curso.
+
+    Con varios workers cada proceso tiene su propio registro: Prometheus debe
+    raspar cada instancia (o usar un solo worker por contenedor, como en Railway).
+    """
+    if not settings.METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Métricas deshabilitadas")
+    return PlainTextResponse(get_metrics().render(), media_type=PROMETHEUS_CONTENT_TYPE)
@@ -0,0 +1,149 @@
+"""
+Benchmark de concurrencia del Mentor Bora (GET /lexicon/search)
+
+Lanza la misma carga con distintos niveles de peticiones en vuelo y reporta
+throughput y latencias. Si el event loop no se bloquea, el throughput debe
+crecer casi linealmente con la concurrencia hasta saturar OpenAI/Supabase.
+
+Uso típico (con el backend corriendo):
+  python backend/scripts/bench_concurrency.py
+  python backend/scripts/bench_concurrency.py --levels 1,4,16 --requests 48 --fast
+  python backend/scripts/bench_concurrency.py --base-url https://mi-backend.up.railway.app
+
+Las consultas se generan con lemas distintos del diccionario ES→Bora para no
+medir aciertos de cache (exacta ni semántica).
+"""
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import httpx
+
+CURRENT_DIR = Path(__file__).resolve().parent
+REPO_ROOT = CURRENT_DIR.parent.parent
+DEFAULT_DICTIONARY = REPO_ROOT / 'salida_es_bora_final.json'
+
+FALLBACK_WORDS = [
+    'cantar', 'casa', 'agua', 'comer', 'dormir', 'río', 'madre', 'padre', 'sol', 'luna',
+    'árbol', 'pescado', 'yuca', 'caminar', 'hablar', 'mirar', 'fuego', 'lluvia', 'niño', 'perro',
+]
+
+
+def load_words(dictionary: Path, count: int, seed: int) -> List[str]:
+    """Lemas en español (distintos) para construir consultas sin repetir."""
+    words: List[str] = []
+    if dictionary.exists():
+        with open(dictionary, 'r', encoding='utf-8') as f:
+            entries = json.load(f)
+        words = sorted({(e.get('lemma') or '').strip() for e in entries if (e.get('lemma') or '').strip()})
+    if len(words) < count:
+        words = words + FALLBACK_WORDS
+    rng = random.Random(seed)
+    rng.shuffle(words)
+    return words
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * (len(ordered) - 1)))))
+    return ordered[idx]
+
+
+async def run_level(
+    client: httpx.AsyncClient,
+    concurrency: int,
+    queries: List[str],
+    fast: bool,
+) -> Dict[str, float]:
+    """Ejecuta `queries` con `concurrency` peticiones en vuelo como máximo."""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    errors = 0
+
+    async def one(q: str) -> None:
+        nonlocal errors
+        async with semaphore:
+            t0 = time.perf_counter()
+            try:
+                resp = await client.get('/lexicon/search', params={'q': q, 'fast': str(fast).lower()})
+                if resp.status_code != 200:
+                    errors += 1
+                    return
+            except httpx.HTTPError:
+                errors += 1
+                return
+            latencies.append((time.perf_counter() - t0) * 1000.0)
+
+    t_start = time.perf_counter()
+    await asyncio.gather(*(one(q) for q in queries))
+    wall = time.perf_counter() - t_start
+
+    return {
+        'concurrency': concurrency,
+        'requests': len(queries),
+        'ok': len(latencies),
+        'errors': errors,
+        'wall_s': wall,
+        'throughput_rps': len(latencies) / wall if wall > 0 else 0.0,
+        'p50_ms': statistics.median(latencies) if latencies else 0.0,
+        'p95_ms': percentile(latencies, 95),
+    }
+
+
+async def main_async(args) -> int:
+    levels = [int(x) for x in args.levels.split(',') if x.strip()]
+    total_needed = args.requests * len(levels)
+    words = load_words(Path(args.dictionary), total_needed, args.seed)
+    if len(words) < total_needed:
+        print(f"⚠️ Solo hay {len(words)} palabras distintas; algunas consultas se repetirán (posibles hits de cache)")
+
+    timeout = httpx.Timeout(args.timeout)
+    limits = httpx.Limits(max_connections=max(levels) * 2, max_keepalive_connections=max(levels))
+    results = []
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=timeout, limits=limits) as client:
+        offset = 0
+        for level in levels:
+            batch = [f"como se dice {words[(offset + i) % len(words)]} en bora" for i in range(args.requests)]
+            offset += args.requests
+            print(f"⏳ Concurrencia {level}: {len(batch)} peticiones...")
+            results.append(await run_level(client, level, batch, args.fast))
+
+    base = results[0]['throughput_rps'] if results and results[0]['throughput_rps'] else None
+    print()
+    print(f"{'conc':>5} {'ok':>5} {'err':>4} {'wall_s':>8} {'req/s':>8} {'scale':>6} {'p50_ms':>8} {'p95_ms':>8}")
+    for r in results:
+        scale = (r['throughput_rps'] / base) if base else 0.0
+        print(
+            f"{r['concurrency']:>5} {r['ok']:>5} {r['errors']:>4} {r['wall_s']:>8.2f} "
+            f"{r['throughput_rps']:>8.2f} {scale:>6.2f} {r['p50_ms']:>8.0f} {r['p95_ms']:>8.0f}"
+        )
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    return 0 if all(r['ok'] for r in results) else 1
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark de concurrencia de /lexicon/search")
+    parser.add_argument('--base-url', type=str, default='http://localhost:8000', help='URL del backend')
+    parser.add_argument('--levels', type=str, default='1,2,4,8,16', help='Niveles de concurrencia (CSV)')
+    parser.add_argument('--requests', type=int, default=32, help='Peticiones por nivel')
+    parser.add_argument('--fast', action='store_true', help='Usar modo rápido del Mentor')
+    parser.add_argument('--timeout', type=float, default=60.0, help='Timeout por petición (s)')
+    parser.add_argument('--dictionary', type=str, default=str(DEFAULT_DICTIONARY), help='JSON ES→Bora para generar consultas')
+    parser.add_argument('--seed', type=int, default=13, help='Semilla para barajar las palabras')
+    parser.add_argument('--json', action='store_true', help='Imprimir también los resultados en JSON')
+    args = parser.parse_args()
+    return asyncio.run(main_async(args))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
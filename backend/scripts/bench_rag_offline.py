@@ -0,0 +1,506 @@
+"""
+Benchmark offline del pipeline RAG del lexicón (sin Supabase ni OpenAI)
+
+Carga salida.json (Bora→ES) y salida_es_bora_final.json (ES→Bora) en
+sustitutos locales y repite un conjunto de consultas de referencia a través
+de RAGService.answer_with_lexicon:
+
+  - Supabase: FakePostgrest (scripts/tests/postgrest_fake.py) servido al
+    AsyncSupabaseAdapter real, con match_bora_docs sobre una matriz NumPy.
+  - OpenAI: FakeOpenAI (scripts/tests/openai_fake.py) para embeddings (hashing de
+    n-gramas, deterministas) y para el LLM, con latencia inyectada.
+  - Mapa de lemas e índice léxico: construidos en memoria con el mismo corpus.
+
+Reporta p50/p95/p99 por etapa (timings del pipeline), throughput por nivel de
+concurrencia y recall@k/MRR del lemma esperado. Con --json y --min-recall
+sirve como gate en CI (código de salida 1 si el recall baja del umbral).
+
+Uso típico:
+  python backend/scripts/bench_rag_offline.py
+  python backend/scripts/bench_rag_offline.py --levels 1,8,32 --repeat 3 --answer-latency-ms 600
+  python backend/scripts/bench_rag_offline.py --json bench.json --min-recall 0.8
+
+Las latencias absolutas dependen de las inyectadas; lo útil es comparar
+corridas con los mismos parámetros antes y después de un cambio.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+CURRENT_DIR = Path(__file__).resolve().parent
+BACKEND_ROOT = CURRENT_DIR.parent
+REPO_ROOT = BACKEND_ROOT.parent
+if str(BACKEND_ROOT) not in sys.path:
+    sys.path.insert(0, str(BACKEND_ROOT))
+
+# Antes de importar settings: OpenAI "habilitado" (el cliente se sustituye) y embeddings por API
+os.environ.setdefault('OPENAI_API_KEY', 'sk-offline-bench')
+os.environ['USE_EMBEDDING_API'] = 'true'
+os.environ.setdefault('DEBUG', 'false')
+
+import numpy as np
+
+from config.settings import settings
+import adapters.async_supabase_adapter as async_supabase_module
+from adapters.async_supabase_adapter import AsyncSupabaseAdapter
+from adapters.embedding_cache import get_embedding_cache
+from adapters.huggingface_adapter import get_huggingface_adapter
+from adapters.openai_adapter import get_openai_adapter
+from services.direction_detector import get_direction_detector
+from services.lemma_map import get_lemma_map
+from services.lexical_index import fold_text, get_lexical_index
+from services.lexicon_cache import get_lexicon_cache
+from services.metrics import CACHE_LOOKUPS, LLM_CALLS, LLM_TOKENS, RAG_STAGES
+from services.rag_service import RAGService
+from services.semantic_cache import get_semantic_cache
+from scripts.tests.openai_fake import FakeOpenAI, hashing_embedding
+from scripts.tests.postgrest_fake import FakePostgrest
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BORA_ES = REPO_ROOT / 'salida.json'
+DEFAULT_ES_BORA = REPO_ROOT / 'salida_es_bora_final.json'
+
+# Consultas de referencia: texto tal como lo escribe un usuario + lemma(s) que deben aparecer
+GOLDEN_QUERIES: List[Dict[str, Any]] = [
+    {'query': 'como se dice cantar en bora', 'expected': ['cantar']},
+    {'query': 'abrazar en bora', 'expected': ['abrazar']},
+    {'query': 'cómo saludar en bora', 'expected': ['saludar']},
+    {'query': 'traducir comer al bora', 'expected': ['comer']},
+    {'query': 'como se dice dormir', 'expected': ['dormir']},
+    {'query': 'palabra para pescado en bora', 'expected': ['pescado']},
+    {'query': 'caminar', 'expected': ['caminar']},
+    {'query': 'cómo se dice hablar en bora', 'expected': ['hablar']},
+    {'query': 'mirar en bora', 'expected': ['mirar']},
+    {'query': 'fuego', 'expected': ['fuego']},
+    {'query': 'como se dice perro en bora', 'expected': ['perro']},
+    {'query': 'padre en bora', 'expected': ['padre']},
+    {'query': 'sol', 'expected': ['sol']},
+    {'query': 'como se dice río en bora', 'expected': ['río']},
+    {'query': 'bailar en bora', 'expected': ['bailar']},
+    {'query': 'cómo se dice llorar', 'expected': ['llorar']},
+    {'query': 'correr en bora', 'expected': ['correr']},
+    {'query': 'qué significa pirújtso', 'expected': ['pirújtso']},
+    {'query': 'traducir úújove al español', 'expected': ['úújove']},
+    {'query': 'que significa covu', 'expected': ['cóvu']},
+    {'query': 'significado de tajco', 'expected': ['tajco']},
+    {'query': 'qué significa barááta', 'expected': ['barááta']},
+    {'query': 'hállulli', 'expected': ['hállulli']},
+    {'query': 'qué quiere decir pajtsiro', 'expected': ['pajtsíro']},
+]
+
+
+# ==========================================
+# CORPUS
+# ==========================================
+
+def _load_entries(path: Path, limit: Optional[int]) -> List[Dict[str, Any]]:
+    if not path.exists():
+        logger.warning(f"⚠️ No existe {path}; se omite")
+        return []
+    data = json.loads(path.read_text(encoding='utf-8'))
+    return data[:limit] if limit else data
+
+
+def build_corpus(bora_es_path: Path, es_bora_path: Path, limit: Optional[int] = None) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Filas de lexicon_lemmas, lexicon_examples y bora_docs (mismas columnas que
+    las tablas reales) a partir de los JSON del diccionario.
+
+    Además de las columnas de bora_docs, cada doc lleva `embed_text`: lemma
+    (repetido) + glosa o par de ejemplo. Con embeddings por hashing de n-gramas
+    embeber `content` completo haría que todos los docs se parezcan por sus
+    etiquetas fijas ("[LEMMA] ... | DEF_ES: ... | POS:").
+    """
+    lemmas: List[Dict[str, Any]] = []
+    examples: List[Dict[str, Any]] = []
+    docs: List[Dict[str, Any]] = []
+    ids = {'lemma': 0, 'subentry': 0, 'example': 0, 'doc': 0}
+
+    def _next(kind: str) -> int:
+        ids[kind] += 1
+        return ids[kind]
+
+    def _doc(kind: str, lemma_row: Dict[str, Any], embed_text: str, content: str, **extra) -> None:
+        doc = {
+            'id': _next('doc'),
+            'kind': kind,
+            'parent_lemma_id': lemma_row['id'],
+            'subentry_id': None,
+            'example_id': None,
+            'lemma': lemma_row['lemma'],
+            'pos_full': lemma_row.get('pos_full'),
+            'bora_text': None,
+            'spanish_text': None,
+            'gloss_es': lemma_row.get('gloss_es'),
+            'gloss_bora': lemma_row.get('gloss_bora'),
+            'direction': lemma_row['direction'],
+            'content': content,
+            'embed_text': embed_text,
+        }
+        doc.update(extra)
+        docs.append(doc)
+
+    def _examples(lemma_row: Dict[str, Any], items, subentry_id: Optional[int]) -> None:
+        for ex in items or []:
+            bora = (ex.get('bora') or '').strip()
+            es = (ex.get('es') or '').strip()
+            if not (bora and es):
+                continue
+            example = {
+                'id': _next('example'),
+                'lemma_id': lemma_row['id'],
+                'subentry_id': subentry_id,
+                'bora_text': bora,
+                'spanish_text': es,
+                'page': lemma_row.get('page'),
+            }
+            examples.append(example)
+            _doc(
+                'example', lemma_row,
+                embed_text=f"{bora} {es}",
+                content=f"BORA: {bora} [SEP] ES: {es} [SEP] LEMMA: {lemma_row['lemma']} POS: {lemma_row.get('pos_full')}",
+                subentry_id=subentry_id,
+                example_id=example['id'],
+                bora_text=bora,
+                spanish_text=es,
+            )
+
+    sources = (
+        (bora_es_path, 'bora_es', 'gloss_es', '[LEMMA]', 'DEF_ES'),
+        (es_bora_path, 'es_bora', 'gloss_bora', '[LEMMA_ES]', 'DEF_BORA'),
+    )
+    for path, direction, gloss_key, tag, def_tag in sources:
+        for entry in _load_entries(path, limit):
+            lemma = (entry.get('lemma') or '').strip()
+            gloss = entry.get(gloss_key)
+            if not lemma or not gloss:
+                continue
+            row = {
+                'id': _next('lemma'),
+                'lemma': lemma,
+                'gloss_es': gloss if gloss_key == 'gloss_es' else None,
+                'gloss_bora': gloss if gloss_key == 'gloss_bora' else None,
+                'direction': direction,
+                'pos': entry.get('pos'),
+                'pos_full': entry.get('pos_full') or entry.get('pos'),
+                'page': entry.get('page'),
+            }
+            lemmas.append(row)
+            _doc(
+                'lemma', row,
+                embed_text=f"{lemma} {lemma} {lemma} {gloss}",
+                content=f"{tag} {lemma} | {def_tag}: {gloss} | POS: {row['pos_full']} | PAG: {row['page']}",
+            )
+            _examples(row, entry.get('examples'), None)
+            for sub in entry.get('subentries') or []:
+                sublemma = (sub.get('sublemma') or sub.get('lemma') or sub.get('bora') or '').strip()
+                sub_gloss = sub.get(gloss_key)
+                if not sub_gloss:
+                    continue
+                subentry_id = _next('subentry')
+                _doc(
+                    'subentry', row,
+                    embed_text=f"{sublemma} {sublemma} {sub_gloss}",
+                    content=f"[SUBLEMMA] {sublemma} | {def_tag}: {sub_gloss} | POS: {sub.get('pos_full') or sub.get('pos')}",
+                    subentry_id=subentry_id,
+                    pos_full=sub.get('pos_full') or row['pos_full'],
+                )
+                _examples(row, sub.get('examples'), subentry_id)
+
+    return {'lemmas': lemmas, 'examples': examples, 'docs': docs}
+
+
+class NumpyMatchBoraDocs:
+    """match_bora_docs(_v2) sobre una matriz de embeddings normalizados (producto punto = coseno)."""
+
+    def __init__(self, docs: List[Dict[str, Any]], matrix: np.ndarray):
+        self.rows = [{k: v for k, v in d.items() if k not in ('content', 'embed_text')} for d in docs]
+        self.matrix = matrix
+        self.kinds = np.asarray([d['kind'] for d in docs], dtype=str)
+        self.pos_full = np.asarray([d.get('pos_full') or '' for d in docs], dtype=str)
+
+    def __call__(self, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        query = np.asarray(params.get('query_embedding') or [], dtype=np.float32)
+        if query.shape != (self.matrix.shape[1],):
+            return []
+        sims = self.matrix @ query
+        if params.get('kind_filter'):
+            sims[~np.isin(self.kinds, params['kind_filter'])] = -1.0
+        if params.get('pos_filter'):
+            sims[self.pos_full != params['pos_filter']] = -1.0
+        count = int(params.get('match_count') or 10)
+        top = np.argpartition(-sims, min(count, len(sims) - 1))[:count]
+        top = top[np.argsort(-sims[top], kind='stable')]
+        threshold = float(params.get('match_threshold') or 0.0)
+        results = []
+        for i in top.tolist():
+            # Filtro estricto, como match_bora_docs (similarity > match_threshold)
+            if sims[i] <= threshold:
+                break
+            row = dict(self.rows[i])
+            row['similarity'] = float(sims[i])
+            results.append(row)
+        return results
+
+
+def install_stand_ins(corpus: Dict[str, List[Dict[str, Any]]], fake_openai: FakeOpenAI) -> FakePostgrest:
+    """Conecta los sustitutos a los singletons que usa RAGService."""
+    t0 = time.perf_counter()
+    docs = corpus['docs']
+    matrix = np.asarray(
+        [hashing_embedding(d['embed_text'], fake_openai.dimension) for d in docs], dtype=np.float32
+    )
+    fake = FakePostgrest()
+    fake.add_rows('lexicon_lemmas', corpus['lemmas'])
+    fake.add_rows('lexicon_examples', corpus['examples'])
+    match = NumpyMatchBoraDocs(docs, matrix)
+    for name in ('match_bora_docs', 'match_bora_docs_v2'):
+        fake.register_rpc(name, match)
+
+    # Supabase -> PostgREST falso (el singleton lo resuelve get_async_supabase_adapter)
+    settings.SUPABASE_ASYNC_CLIENT = True
+    settings.VECTOR_SEARCH_BACKEND = 'rpc'
+    async_supabase_module.async_supabase_adapter = AsyncSupabaseAdapter(
+        base_url='http://offline-bench', api_key='bench', transport=fake.transport(),
+    )
+
+    # OpenAI -> cliente falso (chat + embeddings); sin cache de embeddings en disco
+    get_openai_adapter().client = fake_openai
+    get_huggingface_adapter()._async_openai_client = fake_openai
+    get_embedding_cache().enabled = False
+
+    get_lemma_map().set_rows(corpus['lemmas'])
+    get_direction_detector().set_lemmas(corpus['lemmas'])
+    get_lexical_index().build(docs, source='offline-bench')
+    print(
+        f"📚 Corpus: {len(corpus['lemmas'])} lemas, {len(corpus['examples'])} ejemplos, "
+        f"{len(docs)} docs ({(time.perf_counter() - t0):.1f}s para preparar)"
+    )
+    return fake
+
+
+# ==========================================
+# MÉTRICAS
+# ==========================================
+
+def percentile(values: Sequence[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    return float(np.percentile(np.asarray(values, dtype=np.float64), pct))
+
+
+def expected_rank(results: List[Dict[str, Any]], expected: Sequence[str]) -> Optional[int]:
+    """Posición (1-based, por lemma distinto) del primer lemma esperado en los resultados."""
+    targets = {fold_text(e) for e in expected}
+    seen: List[str] = []
+    for row in results:
+        folded = fold_text(row.get('lemma') or '')
+        if folded in seen:
+            continue
+        seen.append(folded)
+        if folded in targets:
+            return len(seen)
+    return None
+
+
+def _counter_snapshot() -> Dict[str, float]:
+    return {
+        'lexicon_hits': CACHE_LOOKUPS.value(cache='lexicon', result='hit'),
+        'lexicon_coalesced': CACHE_LOOKUPS.value(cache='lexicon', result='coalesced'),
+        'llm_calls': sum(LLM_CALLS.value(purpose=p, status='ok') for p in ('extraction', 'direction', 'answer')),
+        'tokens_in': sum(LLM_TOKENS.value(purpose=p, kind='input') for p in ('extraction', 'direction', 'answer')),
+        'tokens_out': sum(LLM_TOKENS.value(purpose=p, kind='output') for p in ('extraction', 'direction', 'answer')),
+    }
+
+
+# ==========================================
+# EJECUCIÓN
+# ==========================================
+
+async def run_level(
+    concurrency: int,
+    queries: List[Dict[str, Any]],
+    args,
+) -> Dict[str, Any]:
+    """Repite `queries` con `concurrency` peticiones en vuelo como máximo."""
+    get_lexicon_cache().invalidate()
+    get_semantic_cache().invalidate()
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    stage_values: Dict[str, List[float]] = {}
+    ranks: Dict[str, Optional[int]] = {}
+    errors = 0
+    before = _counter_snapshot()
+
+    async def one(item: Dict[str, Any]) -> None:
+        nonlocal errors
+        async with semaphore:
+            t0 = time.perf_counter()
+            try:
+                result = await RAGService().answer_with_lexicon(
+                    query=item['query'],
+                    top_k=args.top_k,
+                    min_similarity=args.min_similarity,
+                    fast=args.fast,
+                )
+            except Exception as e:
+                errors += 1
+                logger.error(f"❌ {item['query']}: {e}")
+                return
+            latencies.append((time.perf_counter() - t0) * 1000.0)
+            timings = result.get('timings') or {}
+            if 'cache_hit_ms' not in timings:
+                for key in RAG_STAGES:
+                    if key in timings:
+                        stage_values.setdefault(key[:-3], []).append(timings[key])
+            ranks.setdefault(item['query'], expected_rank(result.get('results') or [], item['expected']))
+
+    t_start = time.perf_counter()
+    await asyncio.gather(*(one(q) for q in queries))
+    wall = time.perf_counter() - t_start
+    after = _counter_snapshot()
+
+    return {
+        'concurrency': concurrency,
+        'requests': len(queries),
+        'ok': len(latencies),
+        'errors': errors,
+        'wall_s': wall,
+        'throughput_rps': len(latencies) / wall if wall > 0 else 0.0,
+        'latency_ms': {p: percentile(latencies, p) for p in (50, 95, 99)},
+        'stages_ms': {
+            stage: {'count': len(v), **{f'p{p}': percentile(v, p) for p in (50, 95, 99)}}
+            for stage, v in stage_values.items()
+        },
+        'ranks': ranks,
+        'counters': {k: after[k] - before[k] for k in after},
+    }
+
+
+def recall_report(ranks: Dict[str, Optional[int]], ks: Sequence[int]) -> Dict[str, Any]:
+    total = len(ranks) or 1
+    report: Dict[str, Any] = {
+        f'recall@{k}': sum(1 for r in ranks.values() if r is not None and r <= k) / total for k in ks
+    }
+    report['mrr'] = sum(1.0 / r for r in ranks.values() if r) / total
+    report['misses'] = sorted(q for q, r in ranks.items() if r is None or r > max(ks))
+    return report
+
+
+def print_report(levels: List[Dict[str, Any]], recall: Dict[str, Any]) -> None:
+    print()
+    print(f"{'conc':>5} {'ok':>5} {'err':>4} {'wall_s':>8} {'req/s':>8} {'p50_ms':>8} {'p95_ms':>8} {'p99_ms':>8} {'cache':>6} {'llm':>5} {'tok_in':>8}")
+    for r in levels:
+        c = r['counters']
+        print(
+            f"{r['concurrency']:>5} {r['ok']:>5} {r['errors']:>4} {r['wall_s']:>8.2f} {r['throughput_rps']:>8.2f} "
+            f"{r['latency_ms'][50]:>8.0f} {r['latency_ms'][95]:>8.0f} {r['latency_ms'][99]:>8.0f} "
+            f"{int(c['lexicon_hits'] + c['lexicon_coalesced']):>6} {int(c['llm_calls']):>5} {int(c['tokens_in']):>8}"
+        )
+
+    for r in levels:
+        print()
+        print(f"Etapas (concurrencia {r['concurrency']}):")
+        print(f"  {'etapa':<22} {'n':>5} {'p50_ms':>9} {'p95_ms':>9} {'p99_ms':>9}")
+        for key in RAG_STAGES:
+            stage = key[:-3]
+            s = r['stages_ms'].get(stage)
+            if s:
+                print(f"  {stage:<22} {s['count']:>5} {s['p50']:>9.2f} {s['p95']:>9.2f} {s['p99']:>9.2f}")
+
+    print()
+    print("Recall: " + "  ".join(f"{k}={v:.3f}" for k, v in recall.items() if k != 'misses'))
+    if recall['misses']:
+        print("Sin el lemma esperado en el top: " + ", ".join(recall['misses']))
+
+
+async def main_async(args) -> int:
+    fake_openai = FakeOpenAI(
+        dimension=1536 if settings.USE_VECTOR_1536 else settings.EMBEDDING_DIMENSION,
+        embedding_latency_ms=args.embedding_latency_ms,
+        extraction_latency_ms=args.aux_latency_ms,
+        direction_latency_ms=args.aux_latency_ms,
+        answer_latency_ms=args.answer_latency_ms,
+        jitter=args.jitter,
+        seed=args.seed,
+    )
+    corpus = build_corpus(Path(args.bora_es), Path(args.es_bora), args.limit)
+    install_stand_ins(corpus, fake_openai)
+    settings.ENABLE_QUERY_PREPROCESSING = not args.no_preprocessing
+    settings.SEMANTIC_CACHE_ENABLED = args.cache
+    if not args.cache:
+        # TTL 0: nada se reutiliza entre peticiones (el single-flight sigue activo)
+        get_lexicon_cache().ttl_seconds = 0
+
+    golden = GOLDEN_QUERIES
+    if args.queries:
+        golden = json.loads(Path(args.queries).read_text(encoding='utf-8'))
+
+    levels = [int(x) for x in args.levels.split(',') if x.strip()]
+    results = []
+    for level in levels:
+        print(f"⏳ Concurrencia {level}: {len(golden) * args.repeat} consultas...")
+        results.append(await run_level(level, golden * args.repeat, args))
+
+    ks = [int(k) for k in args.recall_k.split(',') if k.strip()]
+    recall = recall_report(results[0]['ranks'] if results else {}, ks)
+    print_report(results, recall)
+
+    if args.json:
+        payload = {
+            'params': {k: v for k, v in vars(args).items() if k != 'json'},
+            'levels': [{k: v for k, v in r.items() if k != 'ranks'} for r in results],
+            'recall': recall,
+            'ranks': results[0]['ranks'] if results else {},
+        }
+        Path(args.json).write_text(json.dumps(payload, indent=2, ensure_ascii=False), encoding='utf-8')
+        print(f"💾 Resultados en {args.json}")
+
+    if any(r['errors'] for r in results):
+        return 1
+    if args.min_recall is not None and recall.get(f'recall@{max(ks)}', 0.0) < args.min_recall:
+        print(f"❌ recall@{max(ks)} por debajo de {args.min_recall}")
+        return 1
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark offline del pipeline RAG del lexicón")
+    parser.add_argument('--bora-es', type=str, default=str(DEFAULT_BORA_ES), help='JSON Bora→ES (salida.json)')
+    parser.add_argument('--es-bora', type=str, default=str(DEFAULT_ES_BORA), help='JSON ES→Bora')
+    parser.add_argument('--limit', type=int, default=None, help='Máximo de entradas por diccionario')
+    parser.add_argument('--queries', type=str, default=None, help='JSON con [{"query", "expected": [...]}]')
+    parser.add_argument('--levels', type=str, default='1,4,16', help='Niveles de concurrencia (CSV)')
+    parser.add_argument('--repeat', type=int, default=2, help='Veces que se repite el conjunto por nivel')
+    parser.add_argument('--top-k', type=int, default=10, help='top_k de answer_with_lexicon')
+    parser.add_argument('--min-similarity', type=float, default=0.3,
+                        help='Umbral vectorial (el espacio de hashing tiene cosenos más bajos que OpenAI)')
+    parser.add_argument('--fast', action='store_true', help='Modo rápido del Mentor')
+    parser.add_argument('--no-preprocessing', action='store_true', help='Desactivar la extracción de keywords')
+    parser.add_argument('--cache', action='store_true', help='Mantener las caches de respuestas activas')
+    parser.add_argument('--embedding-latency-ms', type=float, default=80.0, help='Latencia del embedding')
+    parser.add_argument('--aux-latency-ms', type=float, default=250.0, help='Latencia de extracción/dirección LLM')
+    parser.add_argument('--answer-latency-ms', type=float, default=900.0, help='Latencia de la respuesta LLM')
+    parser.add_argument('--jitter', type=float, default=0.5, help='Jitter uniforme relativo (0.5 = hasta +50%%)')
+    parser.add_argument('--seed', type=int, default=13, help='Semilla del jitter')
+    parser.add_argument('--recall-k', type=str, default='1,3,5', help='Valores de k para recall (CSV)')
+    parser.add_argument('--min-recall', type=float, default=None, help='Falla si recall@max(k) queda por debajo')
+    parser.add_argument('--json', type=str, default=None, help='Guardar resultados en este archivo JSON')
+    parser.add_argument('--verbose', action='store_true', help='Logs INFO del backend')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING)
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.ERROR)
+    return asyncio.run(main_async(args))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,68 @@
+"""
+Genera las tarjetas de respuesta precalculadas por lema (answer cards).
+
+Una respuesta determinista del mentor por cada fila de lexicon_lemmas (ambas
+direcciones), con sus ejemplos, guardada en el SQLite ANSWER_CARDS_PATH.
+Volver a ejecutar tras cada re-ingesta del lexicón; el servidor detecta el
+fichero nuevo sin reiniciar y descarta tarjetas de lemas editados después.
+
+Uso típico:
+  python backend/scripts/build_answer_cards.py
+  python backend/scripts/build_answer_cards.py --out data/answer_cards.sqlite3 --examples 2
+
+Requisitos:
+  - .env con SUPABASE_URL y SUPABASE_SERVICE_KEY (o SUPABASE_ANON_KEY con RLS de lectura)
+"""
+import argparse
+from pathlib import Path
+import asyncio
+import logging
+import sys
+
+CURRENT_DIR = Path(__file__).resolve().parent
+BACKEND_ROOT = CURRENT_DIR.parent
+if str(BACKEND_ROOT) not in sys.path:
+    sys.path.insert(0, str(BACKEND_ROOT))
+
+# Cargar variables de entorno desde .env si existe
+try:
+    from dotenv import load_dotenv
+    env_path = BACKEND_ROOT / '.env'
+    if env_path.exists():
+        load_dotenv(dotenv_path=env_path)
+except ImportError:
+    pass
+
+from adapters.supabase_adapter import SupabaseAdapter
+from services.answer_cards import AnswerCardStore, build_answer_cards
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Tarjetas de respuesta precalculadas por lema")
+    parser.add_argument('--out', type=str, default=None, help='Fichero SQLite destino (default: ANSWER_CARDS_PATH)')
+    parser.add_argument('--examples', type=int, default=None, help='Ejemplos por tarjeta (default: ANSWER_CARDS_MAX_EXAMPLES)')
+    args = parser.parse_args()
+
+    adapter = SupabaseAdapter(use_service_role=True)
+    if not adapter.is_connected():
+        logger.error("❌ Supabase no configurado (SUPABASE_URL / SUPABASE_SERVICE_KEY)")
+        return 1
+
+    store = AnswerCardStore(path=args.out, enabled=True)
+    summary = asyncio.run(build_answer_cards(adapter, store=store, max_examples=args.examples))
+    if not summary["cards"]:
+        logger.error("❌ No se generó ninguna tarjeta (¿lexicon_lemmas vacío?)")
+        return 1
+
+    print(
+        f"✅ Tarjetas listas: {summary['cards']} de {summary['lemmas']} lemas "
+        f"({summary['skipped']} sin glosa) en {store.path}"
+    )
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
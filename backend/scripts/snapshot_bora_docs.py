@@ -0,0 +1,72 @@
+"""
+Genera/actualiza el snapshot local de bora_docs para búsqueda vectorial en proceso.
+
+El snapshot (matriz float32 normalizada + metadatos paralelos) se usa cuando
+VECTOR_SEARCH_BACKEND=local. Volver a ejecutar tras cada re-ingesta y luego
+refrescar el servidor con POST /admin/lexicon/vector-index/refresh.
+
+Uso típico:
+  python backend/scripts/snapshot_bora_docs.py
+  python backend/scripts/snapshot_bora_docs.py --out data/vector_index --page-size 1000
+  python backend/scripts/snapshot_bora_docs.py --use-384
+
+Requisitos:
+  - .env con SUPABASE_URL y SUPABASE_SERVICE_KEY (o SUPABASE_ANON_KEY con RLS de lectura)
+"""
+import argparse
+from pathlib import Path
+import logging
+import sys
+
+CURRENT_DIR = Path(__file__).resolve().parent
+BACKEND_ROOT = CURRENT_DIR.parent
+if str(BACKEND_ROOT) not in sys.path:
+    sys.path.insert(0, str(BACKEND_ROOT))
+
+# Cargar variables de entorno desde .env si existe
+try:
+    from dotenv import load_dotenv
+    env_path = BACKEND_ROOT / '.env'
+    if env_path.exists():
+        load_dotenv(dotenv_path=env_path)
+except ImportError:
+    pass
+
+from adapters.supabase_adapter import SupabaseAdapter
+from adapters.local_vector_adapter import build_snapshot, LocalVectorIndex
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Snapshot local de bora_docs (índice vectorial)")
+    parser.add_argument('--out', type=str, default=None, help='Directorio destino (default: LOCAL_VECTOR_INDEX_DIR)')
+    parser.add_argument('--page-size', type=int, default=1000, help='Filas por request a PostgREST')
+    parser.add_argument('--use-384', action='store_true', help='Usar columna embedding (384) en vez de embedding_1536')
+    args = parser.parse_args()
+
+    adapter = SupabaseAdapter(use_service_role=True)
+    if not adapter.is_connected():
+        logger.error("❌ Supabase no configurado (SUPABASE_URL / SUPABASE_SERVICE_KEY)")
+        return 1
+
+    manifest = build_snapshot(
+        adapter.client,
+        index_dir=args.out,
+        use_1536=False if args.use_384 else None,
+        page_size=args.page_size,
+    )
+
+    # Verificación: cargar el snapshot recién escrito
+    index = LocalVectorIndex(args.out)
+    if not index.refresh():
+        logger.error("❌ El snapshot se escribió pero no pudo cargarse")
+        return 1
+
+    print(f"✅ Snapshot listo: {manifest['count']} docs x {manifest['dimension']} dims en {index.index_dir}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
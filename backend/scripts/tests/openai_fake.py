@@ -0,0 +1,199 @@
+"""
+Cliente OpenAI falso en proceso para benchmarks offline del pipeline RAG
+
+Imita la parte de AsyncOpenAI que usa el backend, sin red ni API key:
+
+    fake = FakeOpenAI(dimension=384, answer_latency_ms=600)
+    get_openai_adapter().client = fake                 # chat.completions.create
+    get_huggingface_adapter()._async_openai_client = fake  # embeddings.create
+
+- embeddings.create: embedding determinista por hashing de n-gramas de
+  caracteres (texto plegado), normalizado. Textos con n-gramas en común
+  tienen coseno alto, así que la búsqueda vectorial se comporta de forma
+  plausible y repetible.
+- chat.completions.create: responde según el propósito del prompt
+  (extracción de keywords, detección de dirección o respuesta del mentor),
+  con streaming y `usage` como la API real.
+
+Cada propósito tiene su latencia inyectada (ms) con jitter uniforme
+reproducible (semilla fija).
+"""
+from types import SimpleNamespace
+from typing import Any, AsyncIterator, Dict, List, Sequence, Union
+import asyncio
+import random
+import re
+import zlib
+
+import numpy as np
+
+from services.direction_detector import query_terms
+from services.lexical_index import char_ngrams
+
+# Marcadores de los prompts de RAGService (_extract_search_keywords / _detect_query_direction_llm)
+_EXTRACTION_MARKER = "Ahora extrae de esta consulta"
+_DIRECTION_MARKER = "ES_BORA, BORA_ES, o AMBIGUO"
+# Líneas de grupo del contexto: "1. [Lemma ES→Bora | sim 0.82] cantar — DEF_BORA: ..."
+_CONTEXT_LEMMA_RE = re.compile(r"^\d+\. \[Lemma[^\]]*\] (.+?) — ", re.MULTILINE)
+
+
+def hashing_embedding(text: str, dimension: int, ngram_size: int = 3) -> List[float]:
+    """Vector unitario por feature hashing (crc32) de los n-gramas de caracteres."""
+    vec = np.zeros(dimension, dtype=np.float32)
+    for gram in char_ngrams(text, ngram_size):
+        h = zlib.crc32(gram.encode("utf-8"))
+        vec[h % dimension] += 1.0 if (h >> 31) & 1 else -1.0
+    norm = float(np.linalg.norm(vec))
+    if norm == 0.0:
+        vec[0] = 1.0
+        norm = 1.0
+    return (vec / norm).tolist()
+
+
+def _estimate_tokens(text: str) -> int:
+    """Aproximación habitual: ~4 caracteres por token."""
+    return max(1, len(text) // 4)
+
+
+def _last_prompt_line(prompt: str, prefix: str) -> str:
+    for line in reversed(prompt.splitlines()):
+        if line.startswith(prefix):
+            return line[len(prefix):].strip()
+    return prompt.strip()
+
+
+class _Embeddings:
+    def __init__(self, owner: "FakeOpenAI"):
+        self._owner = owner
+
+    async def create(self, model: str, input: Union[str, Sequence[str]], **kwargs) -> SimpleNamespace:
+        texts = [input] if isinstance(input, str) else list(input)
+        await self._owner._sleep("embedding")
+        data = [
+            SimpleNamespace(embedding=hashing_embedding(t, self._owner.dimension), index=i)
+            for i, t in enumerate(texts)
+        ]
+        return SimpleNamespace(data=data, model=model)
+
+
+class _FakeStream:
+    """Como openai.AsyncStream: iterable async con close() y context manager."""
+
+    def __init__(self, chunks: AsyncIterator[SimpleNamespace], owner: "FakeOpenAI"):
+        self._chunks = chunks
+        self._owner = owner
+        self.closed = False
+
+    def __aiter__(self) -> AsyncIterator[SimpleNamespace]:
+        return self._chunks
+
+    async def close(self) -> None:
+        if not self.closed:
+            self.closed = True
+            self._owner.closed_streams += 1
+            await self._chunks.aclose()
+
+    async def __aenter__(self) -> "_FakeStream":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+
+class _Completions:
+    def __init__(self, owner: "FakeOpenAI"):
+        self._owner = owner
+
+    async def create(self, messages: List[Dict[str, Any]], stream: bool = False, **kwargs):
+        prompt = "\n".join(str(m.get("content", "")) for m in messages)
+        purpose = self._owner.classify(prompt)
+        text = self._owner.respond(purpose, prompt)
+        usage = SimpleNamespace(
+            prompt_tokens=_estimate_tokens(prompt),
+            completion_tokens=_estimate_tokens(text),
+        )
+        usage.total_tokens = usage.prompt_tokens + usage.completion_tokens
+        if stream:
+            return _FakeStream(self._stream(purpose, text, usage), self._owner)
+        await self._owner._sleep(purpose)
+        message = SimpleNamespace(content=text, role="assistant")
+        return SimpleNamespace(choices=[SimpleNamespace(message=message, index=0)], usage=usage)
+
+    async def _stream(self, purpose: str, text: str, usage: SimpleNamespace) -> AsyncIterator[SimpleNamespace]:
+        self._owner.calls[purpose] = self._owner.calls.get(purpose, 0) + 1
+        # La latencia se reparte: la mitad antes del primer token, el resto entre fragmentos
+        words = text.split(" ")
+        total = self._owner.latency_seconds(purpose)
+        await asyncio.sleep(total / 2)
+        step = (total / 2) / max(1, len(words))
+        for i, word in enumerate(words):
+            piece = word if i == 0 else " " + word
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=piece), index=0)], usage=None)
+            await asyncio.sleep(step)
+        yield SimpleNamespace(choices=[], usage=usage)
+
+
+class FakeOpenAI:
+    """Sustituto de AsyncOpenAI con embeddings deterministas y LLM de respuestas fijas."""
+
+    def __init__(
+        self,
+        dimension: int = 384,
+        embedding_latency_ms: float = 0.0,
+        extraction_latency_ms: float = 0.0,
+        direction_latency_ms: float = 0.0,
+        answer_latency_ms: float = 0.0,
+        jitter: float = 0.0,
+        seed: int = 13,
+    ):
+        self.dimension = dimension
+        self.latency_ms: Dict[str, float] = {
+            "embedding": embedding_latency_ms,
+            "extraction": extraction_latency_ms,
+            "direction": direction_latency_ms,
+            "answer": answer_latency_ms,
+        }
+        self.jitter = jitter
+        self._rng = random.Random(seed)
+        self.calls: Dict[str, int] = {k: 0 for k in self.latency_ms}
+        self.closed_streams = 0
+
+        self.embeddings = _Embeddings(self)
+        self.chat = SimpleNamespace(completions=_Completions(self))
+
+    # ==========================================
+    # COMPORTAMIENTO
+    # ==========================================
+
+    @staticmethod
+    def classify(prompt: str) -> str:
+        if _EXTRACTION_MARKER in prompt:
+            return "extraction"
+        if _DIRECTION_MARKER in prompt:
+            return "direction"
+        return "answer"
+
+    def respond(self, purpose: str, prompt: str) -> str:
+        if purpose == "extraction":
+            # Quitar frases guía como haría el modelo ("como se dice X en bora" -> "X")
+            query = _last_prompt_line(prompt, "Usuario:")
+            return " ".join(query_terms(query)) or query
+        if purpose == "direction":
+            return "AMBIGUO"
+        lemmas = _CONTEXT_LEMMA_RE.findall(prompt)
+        if lemmas:
+            return f"Según el diccionario, la entrada más relevante es {lemmas[0]}. " \
+                   f"También puedes revisar: {', '.join(lemmas[1:4]) or 'ninguna otra'}."
+        return "No encontré entradas relevantes en el diccionario para esa consulta."
+
+    def latency_seconds(self, purpose: str) -> float:
+        base = self.latency_ms.get(purpose, 0.0) / 1000.0
+        if base <= 0.0:
+            return 0.0
+        return base * (1.0 + self.jitter * self._rng.random())
+
+    async def _sleep(self, purpose: str) -> None:
+        self.calls[purpose] = self.calls.get(purpose, 0) + 1
+        delay = self.latency_seconds(purpose)
+        if delay > 0.0:
+            await asyncio.sleep(delay)
@@ -0,0 +1,270 @@
+"""
+Servidor PostgREST falso en proceso para pruebas de AsyncSupabaseAdapter
+
+Se conecta como transporte de httpx (httpx.MockTransport), sin red ni Supabase:
+
+    fake = FakePostgrest()
+    fake.add_rows('lexicon_lemmas', [{'lemma': 'cantar', 'direction': 'es_bora'}])
+    adapter = AsyncSupabaseAdapter(base_url='http://fake', api_key='test', transport=fake.transport())
+
+Soporta el subconjunto de PostgREST que usa el adaptador: select con
+columnas, filtros eq/neq/in/gt/gte/lt/lte (incluido col->>clave), order,
+limit/offset, inserts y upserts (on_conflict), delete, objeto único y RPC
+registrables. match_bora_docs(_v2) viene registrado sobre la tabla bora_docs.
+También permite inyectar fallos y latencia para probar reintentos y timeouts.
+"""
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import asyncio
+import json
+import re
+
+import httpx
+import numpy as np
+
+RpcHandler = Callable[[Dict[str, Any]], Any]
+
+_IN_ITEM_RE = re.compile(r'"((?:[^"\\]|\\.)*)"|([^,]+)')
+_COMPARISONS = ("eq", "neq", "gt", "gte", "lt", "lte")
+
+
+def _coerce(raw: str) -> Any:
+    """Convierte el literal de un filtro al tipo más probable."""
+    if raw == "null":
+        return None
+    if raw in ("true", "false"):
+        return raw == "true"
+    try:
+        return int(raw)
+    except ValueError:
+        pass
+    try:
+        return float(raw)
+    except ValueError:
+        return raw
+
+
+def _parse_in(raw: str) -> List[Any]:
+    inner = raw[1:-1] if raw.startswith("(") and raw.endswith(")") else raw
+    values = []
+    for quoted, bare in _IN_ITEM_RE.findall(inner):
+        if quoted or not bare:
+            values.append(re.sub(r"\\(.)", r"\1", quoted))
+        else:
+            values.append(_coerce(bare.strip()))
+    return values
+
+
+def _column_value(row: Dict[str, Any], column: str) -> Any:
+    if "->>" in column:
+        base, key = column.split("->>", 1)
+        value = (row.get(base) or {}).get(key)
+        return None if value is None else str(value)
+    return row.get(column)
+
+
+def _predicate(op: str, raw: str) -> Callable[[Any], bool]:
+    """Filtro ya parseado (el literal se interpreta una vez por petición, no por fila)."""
+    if op == "in":
+        values = _parse_in(raw)
+        as_text = {str(v) for v in values}
+        return lambda value: value in values or (value is not None and str(value) in as_text)
+    if op not in _COMPARISONS:
+        raise ValueError(f"Operador no soportado: {op}")
+    target = _coerce(raw)
+    return lambda value: _compare(value, op, raw, target)
+
+
+def _compare(value: Any, op: str, raw: str, target: Any) -> bool:
+    if op == "eq":
+        return value == target or (value is not None and str(value) == raw)
+    if op == "neq":
+        return value != target
+    if value is None:
+        return False
+    if op == "gt":
+        return value > target
+    if op == "gte":
+        return value >= target
+    if op == "lt":
+        return value < target
+    if op == "lte":
+        return value <= target
+    raise ValueError(f"Operador no soportado: {op}")
+
+
+class FakePostgrest:
+    """Tablas en memoria + RPC registrables, servidas vía httpx.MockTransport."""
+
+    def __init__(self):
+        self.tables: Dict[str, List[Dict[str, Any]]] = {}
+        self.rpcs: Dict[str, RpcHandler] = {}
+        self.requests: List[Tuple[str, str]] = []
+        self.latency_seconds = 0.0
+        self._failures: List[Any] = []
+        self._next_id: Dict[str, int] = {}
+
+        for name in ("match_bora_docs", "match_bora_docs_v2"):
+            self.register_rpc(name, self._match_bora_docs)
+
+    # ==========================================
+    # CONFIGURACIÓN
+    # ==========================================
+
+    def add_rows(self, table: str, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Inserta filas asignando `id` incremental si falta."""
+        stored = self.tables.setdefault(table, [])
+        added = []
+        for row in rows:
+            row = dict(row)
+            if "id" not in row:
+                row["id"] = self._next_id.get(table, 1)
+            self._next_id[table] = max(self._next_id.get(table, 1), int(row["id"]) + 1)
+            stored.append(row)
+            added.append(row)
+        return added
+
+    def register_rpc(self, name: str, handler: RpcHandler) -> None:
+        self.rpcs[name] = handler
+
+    def fail_next(self, count: int = 1, status: int = 503, error: Optional[Exception] = None) -> None:
+        """Las próximas `count` peticiones fallan con `status` (o lanzan `error`)."""
+        self._failures.extend([error or status] * count)
+
+    def transport(self) -> httpx.MockTransport:
+        return httpx.MockTransport(self.handle)
+
+    # ==========================================
+    # MANEJADOR HTTP
+    # ==========================================
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append((request.method, request.url.path))
+        if self.latency_seconds:
+            await asyncio.sleep(self.latency_seconds)
+        if self._failures:
+            failure = self._failures.pop(0)
+            if isinstance(failure, Exception):
+                raise failure
+            return httpx.Response(failure, json={"message": "fallo inyectado"})
+
+        path = request.url.path
+        marker = "/rest/v1/"
+        resource = path.split(marker, 1)[1] if marker in path else path.lstrip("/")
+        try:
+            if resource.startswith("rpc/"):
+                return self._handle_rpc(resource[4:], request)
+            if request.method == "GET":
+                return self._handle_select(resource, request)
+            if request.method == "POST":
+                return self._handle_insert(resource, request)
+            if request.method == "DELETE":
+                return self._handle_delete(resource, request)
+        except (ValueError, KeyError) as e:
+            return httpx.Response(400, json={"message": str(e)})
+        return httpx.Response(405, json={"message": f"Método no soportado: {request.method}"})
+
+    def _filtered(self, table: str, request: httpx.Request) -> List[Dict[str, Any]]:
+        rows = self.tables.get(table, [])
+        for column, raw in request.url.params.multi_items():
+            if column in ("select", "order", "limit", "offset", "on_conflict"):
+                continue
+            op, _, value = raw.partition(".")
+            keep = _predicate(op, value)
+            rows = [r for r in rows if keep(_column_value(r, column))]
+        return rows
+
+    def _handle_select(self, table: str, request: httpx.Request) -> httpx.Response:
+        params = request.url.params
+        rows = self._filtered(table, request)
+
+        order = params.get("order")
+        if order:
+            for part in reversed(order.split(",")):
+                column, _, direction = part.partition(".")
+                rows = sorted(rows, key=lambda r: (r.get(column) is None, r.get(column)), reverse=direction == "desc")
+
+        offset = int(params.get("offset", 0))
+        limit = params.get("limit")
+        rows = rows[offset:offset + int(limit)] if limit is not None else rows[offset:]
+
+        columns = params.get("select", "*")
+        if columns != "*":
+            keys = [c.strip() for c in columns.split(",")]
+            rows = [{k: r.get(k) for k in keys} for r in rows]
+
+        if "vnd.pgrst.object" in request.headers.get("accept", ""):
+            if len(rows) != 1:
+                return httpx.Response(406, json={"message": "JSON object requested, multiple (or no) rows returned"})
+            return httpx.Response(200, json=rows[0])
+        return httpx.Response(200, json=rows)
+
+    def _handle_insert(self, table: str, request: httpx.Request) -> httpx.Response:
+        payload = json.loads(request.content or b"null")
+        rows = payload if isinstance(payload, list) else [payload]
+        prefer = request.headers.get("prefer", "")
+        on_conflict = request.url.params.get("on_conflict")
+
+        affected: List[Dict[str, Any]] = []
+        if on_conflict and "merge-duplicates" in prefer:
+            keys = on_conflict.split(",")
+            stored = self.tables.setdefault(table, [])
+            for row in rows:
+                existing = next((r for r in stored if all(r.get(k) == row.get(k) for k in keys)), None)
+                if existing is not None:
+                    existing.update(row)
+                    affected.append(existing)
+                else:
+                    affected.extend(self.add_rows(table, [row]))
+        else:
+            affected = self.add_rows(table, rows)
+
+        headers = {}
+        if "count=exact" in prefer:
+            headers["content-range"] = f"*/{len(affected)}"
+        if "return=representation" in prefer:
+            return httpx.Response(201, json=affected, headers=headers)
+        return httpx.Response(201, headers=headers)
+
+    def _handle_delete(self, table: str, request: httpx.Request) -> httpx.Response:
+        doomed = {id(r) for r in self._filtered(table, request)}
+        self.tables[table] = [r for r in self.tables.get(table, []) if id(r) not in doomed]
+        return httpx.Response(204)
+
+    def _handle_rpc(self, name: str, request: httpx.Request) -> httpx.Response:
+        handler = self.rpcs.get(name)
+        if handler is None:
+            return httpx.Response(404, json={"message": f"RPC no registrada: {name}"})
+        params = json.loads(request.content or b"{}")
+        return httpx.Response(200, json=handler(params))
+
+    # ==========================================
+    # RPC POR DEFECTO
+    # ==========================================
+
+    def _match_bora_docs(self, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Coseno exacto sobre bora_docs.embedding (equivalente a match_bora_docs, filtro estricto > umbral)."""
+        query = np.asarray(params.get("query_embedding") or [], dtype=np.float32)
+        qnorm = float(np.linalg.norm(query))
+        if qnorm == 0.0:
+            return []
+        kinds = params.get("kind_filter")
+        pos = params.get("pos_filter")
+        threshold = float(params.get("match_threshold") or 0.0)
+
+        scored = []
+        for row in self.tables.get("bora_docs", []):
+            if kinds and row.get("kind") not in kinds:
+                continue
+            if pos and row.get("pos_full") != pos:
+                continue
+            vec = np.asarray(row.get("embedding") or [], dtype=np.float32)
+            if vec.shape != query.shape:
+                continue
+            norm = float(np.linalg.norm(vec))
+            similarity = float(vec @ query) / (norm * qnorm) if norm else 0.0
+            if similarity > threshold:
+                out = {k: v for k, v in row.items() if k != "embedding"}
+                out["similarity"] = similarity
+                scored.append(out)
+        scored.sort(key=lambda r: r["similarity"], reverse=True)
+        return scored[: int(params.get("match_count") or 10)]
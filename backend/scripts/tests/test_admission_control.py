@@ -0,0 +1,235 @@
+"""
+Prueba offline del control de admisión de /lexicon (sin servidor ni red)
+Cubre: cola por prioridad, huecos de lotes concedidos de golpe, cuotas por
+token bucket con deuda y desplazamiento con la cola llena
+"""
+import asyncio
+import os
+import sys
+from pathlib import Path
+
+BACKEND_ROOT = Path(__file__).resolve().parents[2]
+if str(BACKEND_ROOT) not in sys.path:
+    sys.path.insert(0, str(BACKEND_ROOT))
+# settings exige una key del LLM activo aunque aquí no se llame a OpenAI
+os.environ.setdefault('OPENAI_API_KEY', 'sk-offline-test')
+os.environ.setdefault('DEBUG', 'false')
+
+from services.admission_control import (
+    AdmissionController,
+    AdmissionRejected,
+    KeyedRateLimiter,
+    PRIORITY_BATCH,
+    PRIORITY_CHAT,
+    PRIORITY_SEARCH,
+    QUEUE_FULL,
+    QUEUE_TIMEOUT,
+    RATE_LIMITED,
+)
+
+failures = []
+
+
+def print_step(num, title):
+    print(f"\n{'='*60}")
+    print(f"  PASO {num}: {title}")
+    print(f"{'='*60}\n")
+
+
+def check(condition, message):
+    if condition:
+        print(f"✅ {message}")
+    else:
+        print(f"❌ {message}")
+        failures.append(message)
+
+
+def make_controller(max_concurrent=4, max_queue=10, timeout_ms=500, **kwargs):
+    return AdmissionController(
+        max_concurrent=max_concurrent,
+        max_queue=max_queue,
+        queue_timeouts_ms={PRIORITY_CHAT: timeout_ms, PRIORITY_SEARCH: timeout_ms, PRIORITY_BATCH: timeout_ms},
+        user_rpm=kwargs.get('user_rpm', 0),
+        ip_rpm=kwargs.get('ip_rpm', 0),
+        burst=kwargs.get('burst', 10),
+        max_keys=100,
+        enabled=True,
+    )
+
+
+async def settle():
+    # Deja correr a las tareas que acaban de despertar
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+async def main():
+    # PASO 1: PRIORIDAD
+    print_step(1, "COLA POR PRIORIDAD (CHAT > SEARCH > BATCH, FIFO DENTRO)")
+    ctl = make_controller(max_concurrent=1)
+    await ctl.acquire(PRIORITY_SEARCH)
+    order = []
+
+    async def waiter(priority, tag):
+        await ctl.acquire(priority)
+        order.append(tag)
+
+    tasks = [
+        asyncio.create_task(waiter(PRIORITY_BATCH, 'batch')),
+        asyncio.create_task(waiter(PRIORITY_SEARCH, 'search-1')),
+        asyncio.create_task(waiter(PRIORITY_CHAT, 'chat')),
+        asyncio.create_task(waiter(PRIORITY_SEARCH, 'search-2')),
+    ]
+    await settle()
+    check(ctl.stats()['waiting'] == {PRIORITY_CHAT: 1, PRIORITY_SEARCH: 2, PRIORITY_BATCH: 1},
+          "las cuatro peticiones esperan en cola con el único hueco ocupado")
+    for _ in tasks:
+        ctl.release()
+        await settle()
+    await asyncio.gather(*tasks)
+    check(order == ['chat', 'search-1', 'search-2', 'batch'],
+          f"el hueco liberado va al más prioritario y FIFO dentro de su clase ({order})")
+    ctl.release()
+    check(ctl.stats()['in_flight'] == 0, "tras liberar todo no queda ningún hueco ocupado")
+
+    # PASO 2: LOTES CONCURRENTES + CHAT CON EL LÍMITE LLENO
+    print_step(2, "DOS LOTES Y UN CHAT LLEGAN CON EL LÍMITE LLENO")
+    ctl = make_controller(max_concurrent=4, timeout_ms=2000)
+    await ctl.acquire(PRIORITY_SEARCH, slots=4)
+    order = []
+
+    async def batch(tag):
+        await ctl.acquire(PRIORITY_BATCH, slots=3)
+        order.append(tag)
+        await asyncio.sleep(0.05)
+        ctl.release(3)
+
+    async def chat():
+        await ctl.acquire(PRIORITY_CHAT)
+        order.append('chat')
+        await asyncio.sleep(0.05)
+        ctl.release()
+
+    tasks = [
+        asyncio.create_task(batch('batch-a')),
+        asyncio.create_task(batch('batch-b')),
+        asyncio.create_task(chat()),
+    ]
+    await settle()
+    # Se liberan los huecos uno a uno: con reparto hueco a hueco los lotes se
+    # quedarían con huecos a medias y el chat esperaría a su timeout
+    ctl.release()
+    await settle()
+    check(order == ['chat'], "el primer hueco libre va al chat aunque llegó después de los lotes")
+    ctl.release()
+    ctl.release()
+    await settle()
+    check(order == ['chat'] and ctl.stats()['in_flight'] == 2,
+          "con 2 huecos libres ningún lote de 3 se queda con huecos a medias")
+    ctl.release()
+    await settle()
+    check(order == ['chat', 'batch-a'] and ctl.stats()['in_flight'] == 4,
+          "con 3 libres entra el primer lote entero y el segundo sigue esperando sin huecos")
+    try:
+        await asyncio.wait_for(asyncio.gather(*tasks), timeout=1.0)
+        finished = True
+    except asyncio.TimeoutError:
+        finished = False
+    check(finished, "los dos lotes y el chat terminan sin bloquearse entre sí")
+    check(order == ['chat', 'batch-a', 'batch-b'], f"los lotes entran después, en orden de llegada ({order})")
+    check(ctl.stats()['in_flight'] == 0, "tras los lotes no queda ningún hueco ocupado")
+
+    # PASO 3: DEMANDA COMPLETA
+    print_step(3, "UN LOTE SOLO ENTRA CUANDO CABE ENTERO")
+    ctl = make_controller(max_concurrent=4, timeout_ms=200)
+    await ctl.acquire(PRIORITY_SEARCH, slots=2)
+    task = asyncio.create_task(ctl.acquire(PRIORITY_BATCH, slots=3))
+    await settle()
+    check(not task.done() and ctl.stats()['in_flight'] == 2,
+          "con 2 huecos libres un lote de 3 espera sin reservar ninguno")
+    ctl.release()
+    await settle()
+    check(task.done() and ctl.stats()['in_flight'] == 4, "al quedar 3 libres el lote recibe los 3 de golpe")
+    ctl.release(4)
+    await ctl.acquire(PRIORITY_SEARCH, slots=4)
+    try:
+        await ctl.acquire(PRIORITY_BATCH, slots=2)
+        rejected = None
+    except AdmissionRejected as exc:
+        rejected = exc.reason
+    check(rejected == QUEUE_TIMEOUT and ctl.stats()['in_flight'] == 4,
+          "si no caben antes del plazo se rechaza (timeout) sin dejar huecos tomados")
+    check(ctl._slots(50) == 4, "un lote nunca pide más huecos de los que existen")
+    ctl.release(4)
+
+    # PASO 4: CANCELACIÓN EN COLA
+    print_step(4, "EL PRIMERO DE LA COLA SE VA Y LOS DEMÁS AVANZAN")
+    ctl = make_controller(max_concurrent=2, timeout_ms=2000)
+    await ctl.acquire(PRIORITY_SEARCH)
+    big = asyncio.create_task(ctl.acquire(PRIORITY_BATCH, slots=2))
+    await settle()
+    small = asyncio.create_task(ctl.acquire(PRIORITY_BATCH))
+    await settle()
+    check(not small.done(), "un lote pequeño no se cuela por delante del primero de la cola")
+    big.cancel()
+    await settle()
+    check(small.done() and ctl.stats()['in_flight'] == 2,
+          "al cancelarse el primero, el siguiente entra con el hueco libre")
+    ctl.release(2)
+
+    # PASO 5: COLA LLENA
+    print_step(5, "COLA LLENA: EL CHAT DESPLAZA AL ÚLTIMO LOTE")
+    ctl = make_controller(max_concurrent=1, max_queue=1, timeout_ms=2000)
+    await ctl.acquire(PRIORITY_SEARCH)
+    queued_batch = asyncio.create_task(ctl.acquire(PRIORITY_BATCH))
+    await settle()
+    queued_chat = asyncio.create_task(ctl.acquire(PRIORITY_CHAT))
+    await settle()
+    try:
+        await queued_batch
+        reason = None
+    except AdmissionRejected as exc:
+        reason = exc.reason
+    check(reason == QUEUE_FULL, "el lote en cola recibe queue_full al llegar un chat")
+    try:
+        await ctl.acquire(PRIORITY_BATCH)
+        reason = None
+    except AdmissionRejected as exc:
+        reason = exc.reason
+    check(reason == QUEUE_FULL, "un lote nuevo no puede desplazar al chat")
+    ctl.release()
+    await settle()
+    check(queued_chat.done() and ctl.stats()['in_flight'] == 1, "el chat recibe el hueco liberado")
+    ctl.release()
+
+    # PASO 6: CUOTAS
+    print_step(6, "TOKEN BUCKET CON DEUDA")
+    limiter = KeyedRateLimiter(per_minute=60, burst=10, max_keys=10)
+    check(limiter.try_acquire('ip:1', cost=50) == 0.0, "un lote de 50 se admite con el bucket lleno")
+    wait = limiter.try_acquire('ip:1')
+    check(40 < wait < 42, f"la deuda (-40) hace esperar a la siguiente ~41s ({wait:.1f}s)")
+    ctl = make_controller(ip_rpm=60, burst=2)
+    await ctl.acquire(PRIORITY_SEARCH, client_ip='1.2.3.4')
+    await ctl.acquire(PRIORITY_SEARCH, client_ip='1.2.3.4')
+    try:
+        await ctl.acquire(PRIORITY_SEARCH, client_ip='1.2.3.4')
+        rejected = None
+    except AdmissionRejected as exc:
+        rejected = exc
+    check(rejected is not None and rejected.reason == RATE_LIMITED and rejected.retry_after > 0,
+          "la tercera consulta de la misma IP se rechaza con Retry-After")
+    check(ctl.stats()['in_flight'] == 2, "un rechazo por cuota no ocupa hueco")
+
+
+if __name__ == '__main__':
+    print("\n" + "="*60)
+    print("  🧪 CONTROL DE ADMISIÓN DE /lexicon")
+    print("="*60)
+    asyncio.run(main())
+    print("\n" + "="*60)
+    if failures:
+        print(f"  ❌ {len(failures)} COMPROBACIONES FALLARON")
+        print("="*60)
+        sys.exit(1)
+    print("  ✅ TODAS LAS COMPROBACIONES PASARON")
+    print("="*60)
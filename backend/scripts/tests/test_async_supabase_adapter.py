@@ -0,0 +1,129 @@
+"""
+Prueba offline de AsyncSupabaseAdapter contra el PostgREST falso (sin red ni Supabase)
+Cubre: select/filtros, upsert, match_bora_docs, reintentos y el deadline por llamada
+"""
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+
+BACKEND_ROOT = Path(__file__).resolve().parents[2]
+if str(BACKEND_ROOT) not in sys.path:
+    sys.path.insert(0, str(BACKEND_ROOT))
+# settings exige una key del LLM activo aunque aquí no se llame a OpenAI
+os.environ.setdefault('OPENAI_API_KEY', 'sk-offline-test')
+os.environ.setdefault('DEBUG', 'false')
+
+from config.settings import settings
+from adapters.async_supabase_adapter import AsyncSupabaseAdapter
+from scripts.tests.postgrest_fake import FakePostgrest
+
+failures = []
+
+
+def print_step(num, title):
+    print(f"\n{'='*60}")
+    print(f"  PASO {num}: {title}")
+    print(f"{'='*60}\n")
+
+
+def check(condition, message):
+    if condition:
+        print(f"✅ {message}")
+    else:
+        print(f"❌ {message}")
+        failures.append(message)
+
+
+def make_adapter(fake):
+    return AsyncSupabaseAdapter(base_url='http://fake', api_key='test', transport=fake.transport())
+
+
+async def main():
+    settings.SUPABASE_HTTP_RETRIES = 2
+    settings.SUPABASE_HTTP_BACKOFF = 0.05
+    settings.USE_VECTOR_1536 = False
+
+    # PASO 1: LECTURAS
+    print_step(1, "SELECT CON FILTROS")
+    fake = FakePostgrest()
+    fake.add_rows('lexicon_lemmas', [
+        {'lemma': 'cantar', 'direction': 'es_bora', 'gloss_bora': 'bájtsi'},
+        {'lemma': 'llorar', 'direction': 'es_bora', 'gloss_bora': 'tsáhdi'},
+    ])
+    fake.add_rows('lexicon_examples', [
+        {'lemma_id': 1, 'bora_text': 'a', 'spanish_text': 'x'},
+        {'lemma_id': 1, 'bora_text': 'b', 'spanish_text': 'y'},
+        {'lemma_id': 2, 'bora_text': 'c', 'spanish_text': 'z'},
+    ])
+    adapter = make_adapter(fake)
+    row = await adapter.find_lemma_by_text('cantar')
+    check(row is not None and row['gloss_bora'] == 'bájtsi', "find_lemma_by_text encuentra 'cantar'")
+    check(await adapter.find_lemma_by_text('correr') is None, "find_lemma_by_text sin coincidencia retorna None")
+    grouped = await adapter.get_examples_by_lemma_ids([1, 2], limit_per_lemma=1)
+    check(sorted(grouped) == [1, 2] and all(len(v) == 1 for v in grouped.values()),
+          "get_examples_by_lemma_ids agrupa y respeta limit_per_lemma")
+    lemmas = await adapter.fetch_all_lemmas(page_size=1)
+    check([r['lemma'] for r in lemmas] == ['cantar', 'llorar'], "fetch_all_lemmas pagina por offset")
+
+    # PASO 2: ESCRITURAS
+    print_step(2, "UPSERT DE LEMMAS")
+    await adapter.upsert_lemmas_bulk([
+        {'lemma': 'cantar', 'source': 's', 'direction': 'es_bora', 'gloss_bora': 'nuevo'},
+    ])
+    await adapter.upsert_lemmas_bulk([
+        {'lemma': 'cantar', 'source': 's', 'direction': 'es_bora', 'gloss_bora': 'otra vez'},
+    ])
+    rows = [r for r in fake.tables['lexicon_lemmas'] if r.get('source') == 's']
+    check(len(rows) == 1 and rows[0]['gloss_bora'] == 'otra vez', "on_conflict actualiza en lugar de duplicar")
+
+    # PASO 3: MATCH_BORA_DOCS
+    print_step(3, "MATCH_BORA_DOCS (FILTRO ESTRICTO)")
+    fake.add_rows('bora_docs', [
+        {'kind': 'lemma', 'lemma': 'cantar', 'embedding': [1.0, 0.0]},
+        {'kind': 'lemma', 'lemma': 'llorar', 'embedding': [0.0, 1.0]},
+    ])
+    hits = await adapter.vector_search_bora_docs([1.0, 0.0], top_k=5, min_similarity=0.0)
+    check([h['lemma'] for h in hits] == ['cantar'],
+          "similitud igual al umbral queda fuera (similarity > match_threshold)")
+
+    # PASO 4: REINTENTOS
+    print_step(4, "REINTENTOS ANTE 503")
+    fake.fail_next(2, status=503)
+    retried = adapter.retried
+    row = await adapter.find_lemma_by_text('cantar')
+    check(row is not None and adapter.retried - retried == 2, "dos 503 seguidos se reintentan y la lectura termina bien")
+    fake.fail_next(1, status=503)
+    sent = len(fake.requests)
+    created = await adapter.insert_examples_bulk([{'lemma_id': 2, 'bora_text': 'd', 'spanish_text': 'w'}])
+    check(created == [] and len(fake.requests) - sent == 1,
+          "un insert simple que llegó al servidor no se reintenta (podría duplicar filas)")
+
+    # PASO 5: DEADLINE
+    print_step(5, "TIMEOUT = DEADLINE DE LA LLAMADA COMPLETA")
+    fake.latency_seconds = 0.15
+    fake.fail_next(3, status=503)
+    t0 = time.perf_counter()
+    row = await adapter.find_lemma_by_text('cantar', timeout=0.25)
+    elapsed = time.perf_counter() - t0
+    check(row is None and elapsed < 0.3,
+          f"con reintentos y backoff la llamada no pasa de su timeout ({elapsed * 1000:.0f}ms de 250ms)")
+    fake.latency_seconds = 0.0
+    fake._failures.clear()
+
+    await adapter.aclose()
+
+
+if __name__ == '__main__':
+    print("\n" + "="*60)
+    print("  🧪 ASYNC SUPABASE ADAPTER CONTRA POSTGREST FALSO")
+    print("="*60)
+    asyncio.run(main())
+    print("\n" + "="*60)
+    if failures:
+        print(f"  ❌ {len(failures)} COMPROBACIONES FALLARON")
+        print("="*60)
+        sys.exit(1)
+    print("  ✅ TODAS LAS COMPROBACIONES PASARON")
+    print("="*60)
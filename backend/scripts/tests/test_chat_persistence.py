@@ -0,0 +1,161 @@
+"""
+Prueba offline de la persistencia diferida del chat (SQLite temporal, sin red)
+Cubre: lotes del worker, reintento uno a uno cuando falla una fila,
+backpressure con la cola llena (escritura inline), vaciado en stop() y aviso
+al resumidor solo de los intercambios escritos
+"""
+import asyncio
+import logging
+import os
+import sys
+import tempfile
+import threading
+from datetime import datetime, timedelta
+from pathlib import Path
+
+BACKEND_ROOT = Path(__file__).resolve().parents[2]
+if str(BACKEND_ROOT) not in sys.path:
+    sys.path.insert(0, str(BACKEND_ROOT))
+# settings exige una key del LLM activo aunque aquí no se llame a OpenAI
+os.environ.setdefault('OPENAI_API_KEY', 'sk-offline-test')
+os.environ.setdefault('DEBUG', 'false')
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from models.database import Base, ChatMessage
+from services.chat_persistence import ChatPersistenceQueue
+from services.conversation_summarizer import get_conversation_summarizer
+
+failures = []
+
+
+def print_step(num, title):
+    print(f"\n{'='*60}")
+    print(f"  PASO {num}: {title}")
+    print(f"{'='*60}\n")
+
+
+def check(condition, message):
+    if condition:
+        print(f"✅ {message}")
+    else:
+        print(f"❌ {message}")
+        failures.append(message)
+
+
+def exchange(text, answer="respuesta"):
+    return [{"role": "user", "content": text}, {"role": "assistant", "content": answer}]
+
+
+class GatedSessions:
+    """Session factory que puede bloquear al worker hasta que el test lo libere."""
+
+    def __init__(self, factory):
+        self.factory = factory
+        self.gate = threading.Event()
+        self.gate.set()
+        self.opened = 0
+
+    def __call__(self):
+        self.opened += 1
+        self.gate.wait(timeout=5)
+        return self.factory()
+
+
+async def main():
+    tmp = tempfile.TemporaryDirectory()
+    engine = create_engine(f"sqlite:///{Path(tmp.name) / 'chat.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine, tables=[ChatMessage.__table__])
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    def stored(conversation_id):
+        db = Session()
+        try:
+            rows = (
+                db.query(ChatMessage)
+                .filter(ChatMessage.conversation_id == conversation_id)
+                .order_by(ChatMessage.created_at, ChatMessage.id)
+                .all()
+            )
+            return [row.content for row in rows]
+        finally:
+            db.close()
+
+    notes = []
+    get_conversation_summarizer().note_exchange = notes.append
+
+    # PASO 1: LOTES
+    print_step(1, "EL WORKER ESCRIBE POR LOTES")
+    queue = ChatPersistenceQueue(max_size=10, batch_size=10, enqueue_timeout=0.05, session_factory=Session)
+    check(not await queue.submit(1, exchange("hola")), "sin arrancar, submit pide escritura inline (False)")
+    queue.start()
+    for i, convo in enumerate((1, 2, 1)):
+        check(await queue.submit(convo, exchange(f"pregunta {i}")), f"intercambio {i} encolado")
+    await queue.stop()
+    check(queue.batches == 1 and queue.written == 6 and queue.failed == 0,
+          f"tres intercambios ya en cola se escriben en un solo lote (batches={queue.batches})")
+    check(stored(1) == ["pregunta 0", "respuesta", "pregunta 2", "respuesta"] and len(stored(2)) == 2,
+          "cada mensaje queda en su conversación y en orden")
+    check(sorted(notes) == [1, 1, 2], f"el resumidor recibe cada intercambio escrito ({notes})")
+    check(not await queue.submit(1, exchange("tarde")), "tras stop() ya no acepta (escritura inline)")
+
+    # PASO 2: created_at AL ENCOLAR
+    print_step(2, "created_at SE FIJA AL ENCOLAR")
+    queue = ChatPersistenceQueue(max_size=10, batch_size=10, enqueue_timeout=0.05, session_factory=Session)
+    queue.start()
+    earlier = datetime.utcnow() - timedelta(minutes=5)
+    await queue.submit(3, [{"role": "user", "content": "primero", "created_at": earlier}])
+    await queue.submit(3, [{"role": "user", "content": "después"}])
+    await queue.stop()
+    check(stored(3) == ["primero", "después"], "se respeta un created_at explícito y el resto se sella al encolar")
+
+    # PASO 3: FILA INVÁLIDA
+    print_step(3, "UN INTERCAMBIO INVÁLIDO NO HACE PERDER EL LOTE")
+    notes.clear()
+    # El traceback del intercambio inválido es esperado
+    logging.getLogger("services.chat_persistence").setLevel(logging.CRITICAL)
+    queue = ChatPersistenceQueue(max_size=10, batch_size=10, enqueue_timeout=0.05, session_factory=Session)
+    queue.start()
+    await queue.submit(4, exchange("válido"))
+    await queue.submit(5, exchange("inválido", answer=None))  # content NOT NULL
+    await queue.submit(4, exchange("también válido"))
+    await queue.stop()
+    check(stored(4) == ["válido", "respuesta", "también válido", "respuesta"] and stored(5) == [],
+          "el lote falla y se reintenta uno a uno: se escriben los válidos")
+    check((queue.written, queue.failed) == (4, 2), f"written={queue.written}, failed={queue.failed}")
+    check(notes == [4, 4], "el resumidor no recibe el intercambio que no se escribió")
+    logging.getLogger("services.chat_persistence").setLevel(logging.NOTSET)
+
+    # PASO 4: BACKPRESSURE
+    print_step(4, "COLA LLENA: ESPERA ACOTADA Y ESCRITURA INLINE")
+    sessions = GatedSessions(Session)
+    sessions.gate.clear()
+    queue = ChatPersistenceQueue(max_size=1, batch_size=10, enqueue_timeout=0.05, session_factory=sessions)
+    queue.start()
+    await queue.submit(6, exchange("a"))
+    await asyncio.sleep(0.05)  # el worker escribe en un hilo (to_thread)
+    check(sessions.opened == 1, "el worker toma el primero y queda bloqueado escribiendo")
+    check(await queue.submit(6, exchange("b")), "el segundo cabe en la cola")
+    check(not await queue.submit(6, exchange("c")), "el tercero espera enqueue_timeout y pide escritura inline")
+    sessions.gate.set()
+    await queue.stop()
+    check(stored(6) == ["a", "respuesta", "b", "respuesta"] and queue.stats()["queued"] == 0,
+          "stop() vacía la cola: no se pierde nada de lo aceptado")
+
+    engine.dispose()
+    tmp.cleanup()
+
+
+if __name__ == '__main__':
+    print("\n" + "="*60)
+    print("  🧪 PERSISTENCIA DIFERIDA DEL CHAT")
+    print("="*60)
+    asyncio.run(main())
+    print("\n" + "="*60)
+    if failures:
+        print(f"  ❌ {len(failures)} COMPROBACIONES FALLARON")
+        print("="*60)
+        sys.exit(1)
+    print("  ✅ TODAS LAS COMPROBACIONES PASARON")
+    print("="*60)
@@ -0,0 +1,112 @@
+"""
+Prueba offline de la cache de historial de conversaciones (sin DB)
+Cubre: ventana circular, conversaciones completas e incompletas,
+conversaciones nuevas, resumen y total de mensajes, invalidación y LRU
+"""
+import os
+import sys
+from pathlib import Path
+
+BACKEND_ROOT = Path(__file__).resolve().parents[2]
+if str(BACKEND_ROOT) not in sys.path:
+    sys.path.insert(0, str(BACKEND_ROOT))
+# settings exige una key del LLM activo aunque aquí no se llame a OpenAI
+os.environ.setdefault('OPENAI_API_KEY', 'sk-offline-test')
+os.environ.setdefault('DEBUG', 'false')
+
+from services.conversation_history_cache import ConversationHistoryCache
+
+failures = []
+
+
+def print_step(num, title):
+    print(f"\n{'='*60}")
+    print(f"  PASO {num}: {title}")
+    print(f"{'='*60}\n")
+
+
+def check(condition, message):
+    if condition:
+        print(f"✅ {message}")
+    else:
+        print(f"❌ {message}")
+        failures.append(message)
+
+
+def msgs(*numbers):
+    return [{"role": "user" if n % 2 else "assistant", "content": f"m{n}"} for n in numbers]
+
+
+def contents(messages):
+    return [m["content"] for m in messages] if messages is not None else None
+
+
+def main():
+    # PASO 1: VENTANA
+    print_step(1, "VENTANA CIRCULAR Y CONVERSACIONES COMPLETAS")
+    cache = ConversationHistoryCache(window=4, max_conversations=10)
+    check(cache.get(1, 2) is None, "sin cargar: fallo")
+    cache.load(1, msgs(1, 2), complete=True)
+    check(contents(cache.get(1, 4)) == ["m1", "m2"],
+          "completa: responde aunque pidan más mensajes de los que tiene")
+    check(contents(cache.get(1, 1)) == ["m2"] and cache.get(1, 0) == [], "devuelve los últimos `limit` en orden")
+    cache.append(1, msgs(3, 4))
+    check(contents(cache.get(1, 4)) == ["m1", "m2", "m3", "m4"], "append añade al final")
+    cache.append(1, msgs(5, 6))
+    check(contents(cache.get(1, 4)) == ["m3", "m4", "m5", "m6"], "al desbordar se descartan los más antiguos")
+    check(cache.get(1, 5) is None, "desbordada ya no está completa: una ventana mayor es un fallo")
+
+    cache.load(2, msgs(7, 8), complete=False)
+    check(cache.get(2, 2) is not None and cache.get(2, 3) is None,
+          "cargada parcialmente solo responde a ventanas <= lo cacheado")
+
+    # PASO 2: CONVERSACIONES NUEVAS
+    print_step(2, "APPEND EN CONVERSACIONES NO CACHEADAS")
+    cache.append(3, msgs(1, 2))
+    check(cache.get(3, 2) is None, "sin `new` no se crea el buffer (faltarían los mensajes anteriores)")
+    cache.append(4, msgs(1, 2), new=True)
+    check(contents(cache.get(4, 10)) == ["m1", "m2"], "con `new` se crea completa")
+
+    # PASO 3: RESUMEN
+    print_step(3, "RESUMEN Y TOTAL DE MENSAJES")
+    check(cache.get_summary(4) == (None, 0, 2), "una conversación nueva conoce su total")
+    check(cache.get_summary(2) is None, "cargada parcialmente sin total: la cache no lo sabe")
+    cache.load(5, msgs(9, 10), complete=False, summary="Resumen previo", summary_covered=8, total=10)
+    check(cache.get_summary(5) == ("Resumen previo", 8, 10), "load guarda resumen, mensajes cubiertos y total")
+    cache.append(5, msgs(11, 12))
+    cache.set_summary(5, "Resumen nuevo", 10)
+    check(cache.get_summary(5) == ("Resumen nuevo", 10, 12), "append suma al total y set_summary lo actualiza")
+    cache.set_summary(99, "nada", 1)
+    check(cache.get_summary(99) is None, "set_summary de una conversación no cacheada no la crea")
+
+    # PASO 4: INVALIDACIÓN Y LRU
+    print_step(4, "INVALIDACIÓN Y EXPULSIÓN LRU")
+    check(cache.invalidate(4) == 1 and cache.get(4, 1) is None and cache.invalidate(4) == 0,
+          "invalidate(id) quita solo esa conversación")
+    check(cache.invalidate() == 3 and cache.stats()["conversations"] == 0, "invalidate() vacía la cache")
+
+    cache = ConversationHistoryCache(window=4, max_conversations=2)
+    cache.load(1, msgs(1), complete=True)
+    cache.load(2, msgs(2), complete=True)
+    cache.get(1, 1)
+    cache.append(3, msgs(3), new=True)
+    check(cache.get(2, 1) is None and cache.get(1, 1) is not None and cache.get(3, 1) is not None,
+          "al superar max_conversations sale la menos usada (2), no la más antigua (1)")
+
+    disabled = ConversationHistoryCache(window=0, max_conversations=10)
+    disabled.load(1, msgs(1), complete=True)
+    check(not disabled.enabled and disabled.get(1, 1) is None, "con window 0 la cache está desactivada")
+
+
+if __name__ == '__main__':
+    print("\n" + "="*60)
+    print("  🧪 CACHE DE HISTORIAL DE CONVERSACIONES")
+    print("="*60)
+    main()
+    print("\n" + "="*60)
+    if failures:
+        print(f"  ❌ {len(failures)} COMPROBACIONES FALLARON")
+        print("="*60)
+        sys.exit(1)
+    print("  ✅ TODAS LAS COMPROBACIONES PASARON")
+    print("="*60)
@@ -0,0 +1,98 @@
+"""
+Prueba offline del detector local de dirección de traducción (sin LLM)
+Cubre: frases guía, ortografía Bora, lemas conocidos, señales contradictorias
+y extracción del término consultado
+"""
+import os
+import sys
+from pathlib import Path
+
+BACKEND_ROOT = Path(__file__).resolve().parents[2]
+if str(BACKEND_ROOT) not in sys.path:
+    sys.path.insert(0, str(BACKEND_ROOT))
+# settings exige una key del LLM activo aunque aquí no se llame a OpenAI
+os.environ.setdefault('OPENAI_API_KEY', 'sk-offline-test')
+os.environ.setdefault('DEBUG', 'false')
+
+from services.direction_detector import (
+    DIRECTION_BORA_ES,
+    DIRECTION_ES_BORA,
+    DirectionDetector,
+    normalize_term,
+    query_terms,
+)
+
+failures = []
+
+
+def print_step(num, title):
+    print(f"\n{'='*60}")
+    print(f"  PASO {num}: {title}")
+    print(f"{'='*60}\n")
+
+
+def check(condition, message):
+    if condition:
+        print(f"✅ {message}")
+    else:
+        print(f"❌ {message}")
+        failures.append(message)
+
+
+def main():
+    # PASO 1: TÉRMINO CONSULTADO
+    print_step(1, "TÉRMINO SIN FRASES GUÍA")
+    check(query_terms("¿Cómo se dice cantar en bora?") == ["cantar"], "'¿Cómo se dice cantar en bora?' → ['cantar']")
+    check(query_terms("qué significa  MAJTSÍVA") == ["majtsíva"], "'qué significa MAJTSÍVA' → ['majtsíva']")
+    check(normalize_term("  «Perro»  ") == "perro", "normalize_term quita comillas, espacios y mayúsculas")
+
+    # PASO 2: SEÑALES SIN LEMAS
+    print_step(2, "FRASES GUÍA Y ORTOGRAFÍA BORA")
+    detector = DirectionDetector()
+    cases = [
+        ("cómo se dice cantar", (DIRECTION_ES_BORA, True)),
+        ("qué significa majtsíva", (DIRECTION_BORA_ES, True)),
+        ("pájtsiro", (DIRECTION_BORA_ES, True)),
+        ("tsɨ́ɨ́mene", (DIRECTION_BORA_ES, True)),
+        ("cantar", (None, False)),
+        ("cómo se dice majtsíva", (None, False)),
+    ]
+    for query, expected in cases:
+        got = detector.classify(query)
+        check(got == expected, f"'{query}' → {got}")
+
+    # PASO 3: LEMAS CONOCIDOS
+    print_step(3, "LEMAS CONOCIDOS DE CADA DICCIONARIO")
+    detector.set_lemmas([
+        {"lemma": "cantar", "direction": DIRECTION_ES_BORA},
+        {"lemma": "pájtsiro", "direction": DIRECTION_BORA_ES},
+        {"lemma": "casa", "direction": DIRECTION_ES_BORA},
+        {"lemma": "casa", "direction": DIRECTION_BORA_ES},
+    ])
+    check(detector.classify("Cantar") == (DIRECTION_ES_BORA, True),
+          "una palabra suelta que solo existe en el diccionario ES se decide sin LLM")
+    check(detector.classify("casa") == (None, False),
+          "un lema presente en los dos diccionarios sigue siendo ambiguo")
+    check(detector.classify("cantar casa") == (DIRECTION_ES_BORA, True),
+          "con varios tokens decide la mayoría de coincidencias exclusivas")
+
+    # PASO 4: ESTADÍSTICAS
+    print_step(4, "PROPORCIÓN DE DECISIONES LOCALES")
+    for source in ("local", "local", "local", "llm"):
+        detector.record(source)
+    check(detector.local_share() == 0.75 and detector.stats()["llm_fallbacks"] == 1,
+          "3 decisiones locales y 1 al LLM → local_share 0.75")
+
+
+if __name__ == '__main__':
+    print("\n" + "="*60)
+    print("  🧪 DETECTOR DE DIRECCIÓN DE TRADUCCIÓN")
+    print("="*60)
+    main()
+    print("\n" + "="*60)
+    if failures:
+        print(f"  ❌ {len(failures)} COMPROBACIONES FALLARON")
+        print("="*60)
+        sys.exit(1)
+    print("  ✅ TODAS LAS COMPROBACIONES PASARON")
+    print("="*60)
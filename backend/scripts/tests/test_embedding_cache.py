@@ -0,0 +1,146 @@
+"""
+Prueba offline de la cache de embeddings (sin red ni modelo)
+Cubre: clave por contenido normalizado, LRU en memoria, persistencia en
+SQLite entre instancias, métricas inyectadas y variantes async que no
+bloquean el event loop
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+import unicodedata
+from pathlib import Path
+
+BACKEND_ROOT = Path(__file__).resolve().parents[2]
+if str(BACKEND_ROOT) not in sys.path:
+    sys.path.insert(0, str(BACKEND_ROOT))
+# settings exige una key del LLM activo aunque aquí no se llame a OpenAI
+os.environ.setdefault('OPENAI_API_KEY', 'sk-offline-test')
+os.environ.setdefault('DEBUG', 'false')
+
+from adapters.embedding_cache import EmbeddingCache, make_cache_key
+
+failures = []
+
+MODEL = "text-embedding-3-small"
+DIM = 3
+
+
+def print_step(num, title):
+    print(f"\n{'='*60}")
+    print(f"  PASO {num}: {title}")
+    print(f"{'='*60}\n")
+
+
+def check(condition, message):
+    if condition:
+        print(f"✅ {message}")
+    else:
+        print(f"❌ {message}")
+        failures.append(message)
+
+
+def vec(seed):
+    return [float(seed), float(seed) + 0.5, float(seed) + 0.25]
+
+
+async def main():
+    tmp = tempfile.TemporaryDirectory()
+    db_path = str(Path(tmp.name) / "embeddings.sqlite3")
+
+    # PASO 1: CLAVE
+    print_step(1, "CLAVE POR CONTENIDO NORMALIZADO")
+    composed = unicodedata.normalize("NFC", "canción")
+    decomposed = unicodedata.normalize("NFD", "canción")
+    check(composed != decomposed and make_cache_key(MODEL, DIM, composed) == make_cache_key(MODEL, DIM, decomposed),
+          "NFC: 'canción' compuesta y descompuesta comparten clave")
+    check(make_cache_key(MODEL, DIM, "  cómo   se dice ") == make_cache_key(MODEL, DIM, "cómo se dice"),
+          "los espacios se colapsan")
+    check(make_cache_key(MODEL, DIM, "Bora") != make_cache_key(MODEL, DIM, "bora"),
+          "las mayúsculas sí cambian la clave")
+    check(make_cache_key(MODEL, DIM, "bora") != make_cache_key(MODEL, 1536, "bora")
+          and make_cache_key(MODEL, DIM, "bora") != make_cache_key("otro-modelo", DIM, "bora"),
+          "modelo y dimensión forman parte de la clave")
+
+    # PASO 2: MEMORIA
+    print_step(2, "LRU EN MEMORIA")
+    cache = EmbeddingCache(max_entries=2, path="", enabled=True)
+    cache.put(MODEL, DIM, "a", vec(1))
+    cache.put(MODEL, DIM, "b", vec(2))
+    cache.get(MODEL, DIM, "a")
+    cache.put(MODEL, DIM, "c", vec(3))
+    check(cache.get(MODEL, DIM, "b") is None and cache.get(MODEL, DIM, "a") == vec(1),
+          "al superar max_entries sale la menos usada (b), no la más antigua (a)")
+    cache.put(MODEL, DIM, "vacío", [])
+    check(cache.get(MODEL, DIM, "vacío") is None, "los embeddings vacíos no se guardan")
+    disabled = EmbeddingCache(max_entries=2, path="", enabled=False)
+    disabled.put(MODEL, DIM, "a", vec(1))
+    check(disabled.get(MODEL, DIM, "a") is None, "desactivada no guarda ni sirve nada")
+
+    # PASO 3: DISCO
+    print_step(3, "PERSISTENCIA EN SQLITE ENTRE INSTANCIAS")
+    first = EmbeddingCache(max_entries=10, path=db_path, enabled=True)
+    first.put_many(MODEL, DIM, [("perro", vec(4)), ("gato", vec(5))])
+    second = EmbeddingCache(max_entries=10, path=db_path, enabled=True)
+    lookups = []
+    second.lookup_hook = lambda result, count: lookups.append((result, count))
+    results = second.get_many(MODEL, DIM, ["perro", "pez", "perro", "gato"])
+    check(results == [vec(4), None, vec(4), vec(5)], "una instancia nueva lee del disco lo que escribió otra")
+    stats = second.stats()
+    check((stats["disk_hits"], stats["misses"], stats["disk_entries"]) == (3, 1, 2),
+          f"un texto repetido se consulta una vez y cuenta en cada posición ({stats['disk_hits']} disk hits)")
+    check(sorted(lookups) == [("hit", 3), ("miss", 1)], f"lookup_hook recibe hits y misses ({lookups})")
+    second.get(MODEL, DIM, "gato")
+    check(second.stats()["memory_hits"] == 1, "lo leído del disco queda en memoria")
+
+    # PASO 4: ASYNC
+    print_step(4, "VARIANTES ASYNC: EL DISCO NO BLOQUEA EL EVENT LOOP")
+    cache = EmbeddingCache(max_entries=10, path=db_path, enabled=True)
+    ticks = 0
+
+    async def ticker():
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.01)
+            ticks += 1
+
+    ticking = asyncio.create_task(ticker())
+    cache._disk_lock.acquire()
+    lookup = asyncio.create_task(cache.aget_many(MODEL, DIM, ["perro", "gato"]))
+    await asyncio.sleep(0.1)
+    check(not lookup.done() and ticks >= 5,
+          f"con el disco ocupado la lectura espera en un hilo y el loop sigue ({ticks} ticks)")
+    cache._disk_lock.release()
+    check(await lookup == [vec(4), vec(5)], "al liberar el disco la lectura termina")
+
+    cache._disk_lock.acquire()
+    t0 = time.perf_counter()
+    cache.aput_many(MODEL, DIM, [("casa", vec(6))])
+    elapsed = time.perf_counter() - t0
+    check(elapsed < 0.05 and await cache.aget_many(MODEL, DIM, ["casa"]) == [vec(6)],
+          f"aput_many vuelve sin esperar al disco y el valor ya se sirve desde memoria ({elapsed * 1000:.1f}ms)")
+    cache._disk_lock.release()
+    cache.flush()
+    ticking.cancel()
+    reader = EmbeddingCache(max_entries=10, path=db_path, enabled=True)
+    check(reader.get(MODEL, DIM, "casa") == vec(6), "tras flush la escritura diferida está en disco")
+
+    for instance in (first, second, cache, reader):
+        if instance._conn is not None:
+            instance._conn.close()
+    tmp.cleanup()
+
+
+if __name__ == '__main__':
+    print("\n" + "="*60)
+    print("  🧪 CACHE DE EMBEDDINGS")
+    print("="*60)
+    asyncio.run(main())
+    print("\n" + "="*60)
+    if failures:
+        print(f"  ❌ {len(failures)} COMPROBACIONES FALLARON")
+        print("="*60)
+        sys.exit(1)
+    print("  ✅ TODAS LAS COMPROBACIONES PASARON")
+    print("="*60)
@@ -0,0 +1,132 @@
+"""
+Prueba offline del presupuesto de latencia (sin red ni LLM)
+Cubre: EWMA de media y varianza por etapa, priors y estimaciones caducadas,
+etapas degradadas que no se observan, tiempo restante, timeout del LLM,
+degradaciones y tokens de respuesta que caben en el deadline
+"""
+import math
+import os
+import sys
+import time
+from pathlib import Path
+
+BACKEND_ROOT = Path(__file__).resolve().parents[2]
+if str(BACKEND_ROOT) not in sys.path:
+    sys.path.insert(0, str(BACKEND_ROOT))
+# settings exige una key del LLM activo aunque aquí no se llame a OpenAI
+os.environ.setdefault('OPENAI_API_KEY', 'sk-offline-test')
+os.environ.setdefault('DEBUG', 'false')
+
+from config.settings import settings
+from services.latency_budget import (
+    SKIP_EXAMPLES,
+    SKIP_PREPROCESSING,
+    LatencyBudget,
+    LatencyEstimator,
+)
+from services.metrics import RAG_DEGRADATIONS
+
+failures = []
+
+PRIORS = {"preprocessing_total": 300.0, "embedding": 100.0, "examples_fetch": 80.0, "llm": 1000.0}
+
+
+def print_step(num, title):
+    print(f"\n{'='*60}")
+    print(f"  PASO {num}: {title}")
+    print(f"{'='*60}\n")
+
+
+def check(condition, message):
+    if condition:
+        print(f"✅ {message}")
+    else:
+        print(f"❌ {message}")
+        failures.append(message)
+
+
+def make_budget(deadline_ms, elapsed_ms=0.0, estimator=None):
+    started_at = time.perf_counter() - elapsed_ms / 1000.0
+    return LatencyBudget(deadline_ms, started_at=started_at, estimator=estimator or LatencyEstimator(priors_ms=PRIORS))
+
+
+def main():
+    settings.DEADLINE_SAFETY_MARGIN_MS = 50
+    settings.DEADLINE_MIN_RESPONSE_TOKENS = 80
+
+    # PASO 1: EWMA
+    print_step(1, "ESTIMADOR: EWMA, PRIORS Y CADUCIDAD")
+    estimator = LatencyEstimator(alpha=0.5, stale_seconds=0, priors_ms=PRIORS)
+    check(estimator.estimate("embedding") == 100.0 and estimator.estimate("desconocida") == 0.0,
+          "sin observaciones se usa el prior (0 si la etapa no tiene)")
+    estimator.observe("embedding", 100.0)
+    check(estimator.estimate("embedding") == 100.0, "la primera observación fija la media sin varianza")
+    estimator.observe("embedding", 200.0)
+    stats = estimator.stats()["embedding"]
+    check((stats["mean_ms"], stats["std_ms"], stats["estimate_ms"], stats["samples"]) == (150.0, 50.0, 200.0, 2),
+          f"con alpha 0.5: media 150, desviación 50, estimación media + 1σ = 200 ({stats})")
+    for bad in (-5.0, math.nan, None):
+        estimator.observe("embedding", bad)
+    check(estimator.stats()["embedding"]["samples"] == 2, "valores negativos, NaN o None se ignoran")
+
+    estimator = LatencyEstimator(alpha=0.5, stale_seconds=0.05, priors_ms=PRIORS)
+    estimator.observe("llm", 5000.0)
+    time.sleep(0.06)
+    check(estimator.estimate("llm") == 1000.0, "una estimación sin medir desde stale_seconds vuelve al prior")
+    estimator.observe("llm", 400.0)
+    check(estimator.estimate("llm") == 400.0, "la siguiente observación reinicia la etapa (no arrastra el valor viejo)")
+
+    estimator = LatencyEstimator(alpha=0.5, stale_seconds=0, priors_ms=PRIORS)
+    estimator.observe_timings(
+        {"preprocessing_total_ms": 5.0, "embedding_ms": 90.0, "examples_fetch_ms": 1.0, "otra_ms": 7.0},
+        degradations=[SKIP_PREPROCESSING, SKIP_EXAMPLES],
+    )
+    check(set(estimator.stats()) == {"embedding"},
+          "observe_timings omite las etapas degradadas y las que no tienen prior")
+
+    # PASO 2: PRESUPUESTO
+    print_step(2, "TIEMPO RESTANTE Y TIMEOUT DEL LLM")
+    budget = make_budget(2000, elapsed_ms=500)
+    check(1490 <= budget.remaining_ms() <= 1500, f"deadline 2000ms con 500ms gastados ({budget.remaining_ms():.0f}ms)")
+    check(1.44 <= budget.llm_timeout_seconds() <= 1.45, "el timeout del LLM descuenta el margen de seguridad (50ms)")
+    check(make_budget(100, elapsed_ms=500).llm_timeout_seconds() == 0.0, "pasado el deadline el timeout es 0, no negativo")
+    check(budget.estimate("embedding", "llm") == 1100.0, "estimate suma las etapas pendientes")
+    tight = make_budget(2000, elapsed_ms=700)
+    check(tight.fits("embedding", "llm") and not tight.fits("preprocessing_total", "embedding", "llm"),
+          "fits compara restante - margen (1250ms) con la suma de estimaciones (1100 sí, 1400 no)")
+
+    # PASO 3: DEGRADACIONES
+    print_step(3, "DEGRADACIONES")
+    before = RAG_DEGRADATIONS.value(kind=SKIP_EXAMPLES)
+    budget.degrade(SKIP_EXAMPLES)
+    budget.degrade(SKIP_EXAMPLES)
+    budget.degrade(SKIP_PREPROCESSING)
+    check(budget.applied == [SKIP_EXAMPLES, SKIP_PREPROCESSING], "cada degradación se anota una vez y en orden")
+    if settings.METRICS_ENABLED:
+        check(RAG_DEGRADATIONS.value(kind=SKIP_EXAMPLES) - before == 1, "y se cuenta una vez en /metrics")
+
+    # PASO 4: TOKENS
+    print_step(4, "TOKENS DE RESPUESTA QUE CABEN")
+    check(make_budget(2000).response_tokens(400) == 400, "si la estimación del LLM cabe entera, base_tokens")
+    tokens = make_budget(550).response_tokens(400)
+    check(tokens is not None and 195 <= tokens <= 200,
+          f"si cabe la mitad (500ms de 1000ms), la mitad de tokens ({tokens})")
+    check(make_budget(100).response_tokens(400) is None,
+          "si ni DEADLINE_MIN_RESPONSE_TOKENS caben, None (respuesta de fallback)")
+    tokens = make_budget(960).response_tokens(100)
+    check(tokens is not None and 85 <= tokens <= 91 and make_budget(760).response_tokens(100) is None,
+          f"el corte está en DEADLINE_MIN_RESPONSE_TOKENS (~{tokens} pasa, ~70 no)")
+
+
+if __name__ == '__main__':
+    print("\n" + "="*60)
+    print("  🧪 PRESUPUESTO DE LATENCIA")
+    print("="*60)
+    main()
+    print("\n" + "="*60)
+    if failures:
+        print(f"  ❌ {len(failures)} COMPROBACIONES FALLARON")
+        print("="*60)
+        sys.exit(1)
+    print("  ✅ TODAS LAS COMPROBACIONES PASARON")
+    print("="*60)
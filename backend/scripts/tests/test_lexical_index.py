@@ -0,0 +1,113 @@
+"""
+Prueba offline del índice léxico BM25 y de la fusión RRF (sin red ni Supabase)
+Cubre: plegado de diacríticos Bora, n-gramas con bordes, búsqueda por término
+(filtro por categoría y corte relativo) y orden/empates de reciprocal-rank fusion
+"""
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+BACKEND_ROOT = Path(__file__).resolve().parents[2]
+if str(BACKEND_ROOT) not in sys.path:
+    sys.path.insert(0, str(BACKEND_ROOT))
+# settings exige una key del LLM activo aunque aquí no se llame a OpenAI
+os.environ.setdefault('OPENAI_API_KEY', 'sk-offline-test')
+os.environ.setdefault('DEBUG', 'false')
+
+from services.lexical_index import LexicalIndex, char_ngrams, fold_text, reciprocal_rank_fusion
+
+failures = []
+
+ROWS = [
+    {"id": "l1", "kind": "lemma", "lemma": "áábukɨ", "pos_full": "sustantivo",
+     "gloss_es": "hoja", "direction": "bora_es"},
+    {"id": "l2", "kind": "lemma", "lemma": "cantar", "pos_full": "verbo",
+     "gloss_bora": "bájtsi", "direction": "es_bora"},
+    {"id": "l3", "kind": "lemma", "lemma": "canto", "pos_full": "sustantivo",
+     "gloss_bora": "bájtsiyi", "direction": "es_bora"},
+    {"id": "e1", "kind": "example", "lemma": "cantar", "pos_full": "verbo",
+     "bora_text": "Tsʉ́bɨ bájtsiíbye", "spanish_text": "El niño canta", "direction": "es_bora"},
+]
+
+
+def print_step(num, title):
+    print(f"\n{'='*60}")
+    print(f"  PASO {num}: {title}")
+    print(f"{'='*60}\n")
+
+
+def check(condition, message):
+    if condition:
+        print(f"✅ {message}")
+    else:
+        print(f"❌ {message}")
+        failures.append(message)
+
+
+def ids(rows):
+    return [row["id"] for row in rows]
+
+
+def main():
+    # PASO 1: PLEGADO
+    print_step(1, "PLEGADO DE TEXTO Y N-GRAMAS")
+    check(fold_text("Tsʉ́bɨ") == "tsubi", "'Tsʉ́bɨ' → 'tsubi' (ʉ, ɨ y acentos)")
+    check(fold_text("ÁÁBUKƗ, ¿cantar?") == "aabuki cantar", "mayúsculas y puntuación se pliegan")
+    check(char_ngrams("Can", 3) == [" ca", "can", "an "], "los n-gramas llevan marcas de borde")
+    check(char_ngrams("a", 3) == [" a "], "una palabra más corta que n es un único n-grama")
+
+    # PASO 2: BÚSQUEDA
+    print_step(2, "BÚSQUEDA BM25 POR TÉRMINO")
+    index = LexicalIndex(ngram_size=3)
+    check(index.search("cantar") == [] and not index.is_loaded(), "sin construir no devuelve nada")
+    check(index.build(ROWS, source="test") == 4 and index.stats()["docs"] == 4, "se indexan las cuatro filas")
+    hits = index.search("aabuki", top_k=5, min_score_ratio=0.0)
+    check(ids(hits)[:1] == ["l1"] and hits[0]["lexical_score"] > 0 and hits[0]["similarity"] == 0.0,
+          "'aabuki' encuentra 'áábukɨ' sin diacríticos")
+    hits = index.search("¿cómo se dice cantar?", top_k=5, min_score_ratio=0.0)
+    check(ids(hits)[0] == "l2", "las frases guía se ignoran y el lema exacto va primero (peso del campo lemma)")
+    check("l3" in ids(hits) and "l1" not in ids(hits),
+          "'canto' comparte n-gramas; 'áábukɨ' no aparece ni con min_score_ratio=0")
+    check(ids(index.search("tsubi", top_k=5, min_score_ratio=0.0)) == ["e1"], "los textos de ejemplo también se indexan")
+    check(ids(index.search("cantar", top_k=1, min_score_ratio=0.0)) == ["l2"], "top_k acota los resultados")
+    check(ids(index.search("cantar", pos_full="sustantivo", min_score_ratio=0.0)) == ["l3"],
+          "pos_full filtra por categoría")
+    strict = index.search("cantar", top_k=5, min_score_ratio=0.9)
+    loose = index.search("cantar", top_k=5, min_score_ratio=0.0)
+    check(len(strict) < len(loose) and ids(strict)[0] == "l2",
+          f"min_score_ratio descarta coincidencias débiles ({len(strict)} de {len(loose)})")
+    check(not LexicalIndex(ngram_size=3).load_from_snapshot(tempfile.mkdtemp()),
+          "sin snapshot local load_from_snapshot no construye nada")
+
+    # PASO 3: RRF
+    print_step(3, "RECIPROCAL-RANK FUSION")
+    vector = [{"id": "a", "similarity": 0.9}, {"id": "b", "similarity": 0.8}, {"id": "c", "similarity": 0.7}]
+    lexical = [{"id": "c", "lexical_score": 5.0}, {"id": "d", "lexical_score": 3.0}]
+    fused = reciprocal_rank_fusion([vector, lexical], k=60)
+    check(ids(fused) == ["c", "a", "b", "d"],
+          f"un documento en las dos listas sube por encima del primero de una sola ({ids(fused)})")
+    top = fused[0]
+    check(top["similarity"] == 0.7 and top["lexical_score"] == 5.0,
+          "se conserva la fila vectorial y se completa con los campos léxicos")
+    check(abs(top["rrf_score"] - round(1 / 63 + 1 / 61, 6)) < 1e-9, "rrf_score = Σ 1/(k + rank)")
+    check(fused[1]["rrf_score"] > fused[2]["rrf_score"] == fused[3]["rrf_score"],
+          "el rango 1 de una lista supera al rango 2; b (vectorial) y d (léxica) empatan")
+    tied = reciprocal_rank_fusion([[{"id": "x"}], [{"id": "y"}]], k=60)
+    check(ids(tied) == ["x", "y"] and tied[0]["rrf_score"] == tied[1]["rrf_score"],
+          "en empate manda el orden de las listas de entrada")
+    check(reciprocal_rank_fusion([[], []]) == [], "listas vacías dan un resultado vacío")
+
+
+if __name__ == '__main__':
+    print("\n" + "="*60)
+    print("  🧪 ÍNDICE LÉXICO Y FUSIÓN RRF")
+    print("="*60)
+    main()
+    print("\n" + "="*60)
+    if failures:
+        print(f"  ❌ {len(failures)} COMPROBACIONES FALLARON")
+        print("="*60)
+        sys.exit(1)
+    print("  ✅ TODAS LAS COMPROBACIONES PASARON")
+    print("="*60)
@@ -0,0 +1,161 @@
+"""
+Prueba offline de la cache de respuestas del lexicón (sin red)
+Cubre: LRU por entradas y bytes, TTL, single-flight (incluido el líder
+cancelado), errores compartidos e invalidación con cómputos en curso
+"""
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+
+BACKEND_ROOT = Path(__file__).resolve().parents[2]
+if str(BACKEND_ROOT) not in sys.path:
+    sys.path.insert(0, str(BACKEND_ROOT))
+# settings exige una key del LLM activo aunque aquí no se llame a OpenAI
+os.environ.setdefault('OPENAI_API_KEY', 'sk-offline-test')
+os.environ.setdefault('DEBUG', 'false')
+
+from services.lexicon_cache import CACHE_COALESCED, CACHE_HIT, CACHE_MISS, LexiconAnswerCache
+
+failures = []
+
+
+def print_step(num, title):
+    print(f"\n{'='*60}")
+    print(f"  PASO {num}: {title}")
+    print(f"{'='*60}\n")
+
+
+def check(condition, message):
+    if condition:
+        print(f"✅ {message}")
+    else:
+        print(f"❌ {message}")
+        failures.append(message)
+
+
+def make_cache(**kwargs):
+    params = dict(max_entries=3, max_bytes=1024 * 1024, ttl_seconds=60)
+    params.update(kwargs)
+    return LexiconAnswerCache(**params)
+
+
+class Gate:
+    """Cómputo que espera a que el test lo libere y cuenta sus ejecuciones."""
+
+    def __init__(self, value=None, error=None):
+        self.event = asyncio.Event()
+        self.value = value or {"answer": "bájtsi"}
+        self.error = error
+        self.runs = 0
+
+    async def __call__(self):
+        self.runs += 1
+        await self.event.wait()
+        if self.error is not None:
+            raise self.error
+        return dict(self.value)
+
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+async def main():
+    # PASO 1: LRU Y TTL
+    print_step(1, "LRU POR ENTRADAS Y BYTES, TTL")
+    cache = make_cache()
+    for key in ("a", "b", "c"):
+        cache.set(key, {"answer": key})
+    cache.get("a")
+    cache.set("d", {"answer": "d"})
+    check(cache.get("b") is None and cache.get("a") is not None,
+          "al superar max_entries sale la menos usada (b), no la más antigua (a)")
+    cache = make_cache(max_bytes=60)
+    check(not cache.set("big", {"answer": "x" * 100}) and cache.rejected == 1,
+          "un valor mayor que max_bytes no se guarda")
+    cache.set("one", {"answer": "x" * 20})
+    cache.set("two", {"answer": "y" * 20})
+    check(cache.get("one") is None and cache.stats()["bytes"] <= 60, "al superar max_bytes se expulsa la más antigua")
+    cache = make_cache(ttl_seconds=0.05)
+    cache.set("k", {"answer": "z"})
+    time.sleep(0.06)
+    check(cache.get("k") is None and cache.expirations == 1, "pasado el TTL la entrada ya no se sirve")
+
+    # PASO 2: SINGLE-FLIGHT
+    print_step(2, "SINGLE-FLIGHT: UN SOLO CÓMPUTO PARA CONSULTAS IDÉNTICAS")
+    cache = make_cache()
+    gate = Gate()
+    tasks = [asyncio.create_task(cache.get_or_compute("q", gate)) for _ in range(5)]
+    await settle()
+    gate.event.set()
+    results = await asyncio.gather(*tasks)
+    statuses = sorted(status for _, status in results)
+    check(gate.runs == 1, "cinco consultas concurrentes ejecutan un solo cómputo")
+    check(statuses == sorted([CACHE_MISS] + [CACHE_COALESCED] * 4), f"1 miss y 4 coalesced ({statuses})")
+    value, status = await cache.get_or_compute("q", gate)
+    check(status == CACHE_HIT and gate.runs == 1, "la siguiente consulta es un hit")
+
+    gate = Gate(error=RuntimeError("falló el embedding"))
+    tasks = [asyncio.create_task(cache.get_or_compute("err", gate)) for _ in range(3)]
+    await settle()
+    gate.event.set()
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+    check(all(isinstance(r, RuntimeError) for r in results) and cache.get("err") is None,
+          "un error del cómputo llega a todos los que esperaban y no se cachea")
+
+    # PASO 3: LÍDER CANCELADO
+    print_step(3, "SINGLE-FLIGHT: EL LÍDER SE CANCELA")
+    cache = make_cache()
+    gate = Gate()
+    leader = asyncio.create_task(cache.get_or_compute("q", gate))
+    await settle()
+    waiters = [asyncio.create_task(cache.get_or_compute("q", gate)) for _ in range(2)]
+    await settle()
+    leader.cancel()
+    await settle()
+    check(leader.cancelled() and not any(w.done() for w in waiters),
+          "cancelar al líder no cancela ni hace fallar a los que esperaban")
+    check(gate.runs == 2, "uno de los que esperaban pasa a ser líder y repite el cómputo")
+    gate.event.set()
+    results = await asyncio.gather(*waiters)
+    check(sorted(s for _, s in results) == [CACHE_COALESCED, CACHE_MISS] and gate.runs == 2,
+          "el nuevo líder es un miss y el otro se une a su cómputo")
+    stats = cache.stats()
+    check((stats["misses"], stats["coalesced"]) == (2, 1),
+          f"cada consulta cuenta una sola vez (misses={stats['misses']}, coalesced={stats['coalesced']})")
+
+    # PASO 4: INVALIDACIÓN
+    print_step(4, "INVALIDACIÓN CON UN CÓMPUTO EN CURSO")
+    cache = make_cache()
+    old = Gate(value={"answer": "antigua"})
+    stale = asyncio.create_task(cache.get_or_compute("q", old))
+    await settle()
+    cache.invalidate()
+    fresh_gate = Gate(value={"answer": "nueva"})
+    fresh = asyncio.create_task(cache.get_or_compute("q", fresh_gate))
+    await settle()
+    check(fresh_gate.runs == 1, "tras invalidar, una consulta nueva no se une al cómputo antiguo")
+    old.event.set()
+    value, _ = await stale
+    check(value["answer"] == "antigua" and cache.get("q") is None,
+          "el cómputo antiguo responde a su llamador pero no se guarda")
+    fresh_gate.event.set()
+    value, status = await fresh
+    check(status == CACHE_MISS and cache.get("q")["answer"] == "nueva", "el cómputo nuevo sí se guarda")
+
+
+if __name__ == '__main__':
+    print("\n" + "="*60)
+    print("  🧪 CACHE DE RESPUESTAS DEL LEXICÓN")
+    print("="*60)
+    asyncio.run(main())
+    print("\n" + "="*60)
+    if failures:
+        print(f"  ❌ {len(failures)} COMPROBACIONES FALLARON")
+        print("="*60)
+        sys.exit(1)
+    print("  ✅ TODAS LAS COMPROBACIONES PASARON")
+    print("="*60)
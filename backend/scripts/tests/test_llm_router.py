@@ -0,0 +1,194 @@
+"""
+Prueba offline del router de proveedores LLM (sin red ni API keys reales)
+Cubre: circuit breaker (apertura, half-open con una sola llamada de prueba,
+colas locales que no cuentan) y hedging (cancelación del perdedor, fallback)
+"""
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+
+BACKEND_ROOT = Path(__file__).resolve().parents[2]
+if str(BACKEND_ROOT) not in sys.path:
+    sys.path.insert(0, str(BACKEND_ROOT))
+# settings exige una key del LLM activo aunque aquí no se llame a OpenAI
+os.environ.setdefault('OPENAI_API_KEY', 'sk-offline-test')
+os.environ.setdefault('DEBUG', 'false')
+
+from config.settings import settings
+from adapters.openai_rate_governor import LLMQueueTimeout
+from services.llm_router import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, LLMRouter
+
+failures = []
+
+
+def print_step(num, title):
+    print(f"\n{'='*60}")
+    print(f"  PASO {num}: {title}")
+    print(f"{'='*60}\n")
+
+
+def check(condition, message):
+    if condition:
+        print(f"✅ {message}")
+    else:
+        print(f"❌ {message}")
+        failures.append(message)
+
+
+class FakeProvider:
+    """Proveedor programable: latencia, error y registro de cancelaciones."""
+
+    def __init__(self, name, latency=0.0, error=None, text=None):
+        self.name = name
+        self.latency = latency
+        self.error = error
+        self.text = text if text is not None else f"respuesta de {name}"
+        self.calls = 0
+        self.cancelled = 0
+
+    async def __call__(self, messages, max_tokens):
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.latency)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if self.error is not None:
+            raise self.error
+        return self.text
+
+
+def make_router(primary, secondary, hedge):
+    settings.LLM_PROVIDER = 'openai'
+    settings.ALLOW_HF_LLM_FALLBACK = True
+    settings.LLM_HEDGE_ENABLED = hedge
+    settings.LLM_HEDGE_DEFAULT_DELAY_MS = 50
+    settings.LLM_HEDGE_MIN_DELAY_MS = 50
+    router = LLMRouter(providers={'openai': primary, 'huggingface': secondary})
+    for breaker in router.breakers.values():
+        breaker.failure_threshold = 3
+        breaker.slow_call_ms = 0
+        breaker.open_seconds = 0.1
+    return router
+
+
+async def main():
+    # PASO 1: APERTURA
+    print_step(1, "EL BREAKER SE ABRE TRAS N FALLOS SEGUIDOS")
+    breaker = CircuitBreaker('test', failure_threshold=3, slow_call_ms=0, open_seconds=0.1)
+    for _ in range(2):
+        check(breaker.allow(), "cerrado deja pasar")
+        breaker.record_failure(RuntimeError('boom'))
+    check(breaker.state == CLOSED, "con 2 fallos de 3 sigue cerrado")
+    breaker.allow()
+    breaker.record_failure(RuntimeError('boom'))
+    check(breaker.state == OPEN and not breaker.allow(), "al tercer fallo se abre y rechaza sin llamar")
+
+    # PASO 2: HALF-OPEN
+    print_step(2, "HALF-OPEN: UNA SOLA LLAMADA DE PRUEBA")
+    time.sleep(0.12)
+    check(breaker.allow() and breaker.state == HALF_OPEN, "pasado open_seconds deja pasar la prueba")
+    check(not breaker.allow() and not breaker.allow(), "mientras la prueba está en curso las demás se rechazan")
+    breaker.record_failure(RuntimeError('sigue caído'))
+    check(breaker.state == OPEN and not breaker.allow(), "si la prueba falla vuelve a abrirse")
+    time.sleep(0.12)
+    check(breaker.allow(), "nueva prueba tras otro open_seconds")
+    breaker.release()
+    check(breaker.state == HALF_OPEN and breaker.allow(), "una prueba cancelada libera el turno sin contar")
+    breaker.record_success(10.0)
+    check(breaker.state == CLOSED and breaker.consecutive_failures == 0, "si la prueba responde se cierra")
+
+    breaker = CircuitBreaker('slow', failure_threshold=2, slow_call_ms=100, open_seconds=10)
+    breaker.allow()
+    breaker.record_success(150.0)
+    breaker.allow()
+    breaker.record_success(150.0)
+    check(breaker.state == OPEN, "dos respuestas lentas seguidas también abren el circuito")
+
+    # PASO 3: COLA LOCAL
+    print_step(3, "UN TIMEOUT DE LA COLA LOCAL NO CUENTA COMO FALLO")
+    primary = FakeProvider('openai', error=LLMQueueTimeout('sin hueco'))
+    router = make_router(primary, FakeProvider('huggingface'), hedge=False)
+    settings.ALLOW_HF_LLM_FALLBACK = False
+    for _ in range(5):
+        try:
+            await router.generate([{'role': 'user', 'content': 'hola'}])
+        except RuntimeError:
+            pass
+    check(router.breakers['openai'].state == CLOSED and router.breakers['openai'].failures == 0,
+          "cinco LLMQueueTimeout seguidos dejan el circuito cerrado")
+    settings.ALLOW_HF_LLM_FALLBACK = True
+
+    # PASO 4: HEDGING
+    print_step(4, "HEDGING: GANA EL SECUNDARIO Y SE CANCELA EL PRIMARIO")
+    primary = FakeProvider('openai', latency=1.0)
+    secondary = FakeProvider('huggingface', latency=0.01)
+    router = make_router(primary, secondary, hedge=True)
+    t0 = time.perf_counter()
+    answer = await router.generate([{'role': 'user', 'content': 'hola'}])
+    elapsed = time.perf_counter() - t0
+    await asyncio.sleep(0)
+    check(answer == 'respuesta de huggingface' and elapsed < 0.5,
+          f"el secundario responde tras el retardo de hedge ({elapsed * 1000:.0f}ms)")
+    check(primary.cancelled == 1, "el primario lento se cancela al ganar el secundario")
+    check(router.hedges == 1 and router.hedge_wins == 1, "se cuenta un hedge lanzado y ganado")
+    check(router.breakers['openai'].failures == 0 and not router.breakers['openai']._probe_in_flight,
+          "la cancelación no cuenta como fallo del primario")
+
+    print_step(5, "HEDGING: PRIMARIO RÁPIDO, FALLO Y CANCELACIÓN DEL LLAMADOR")
+    primary = FakeProvider('openai', latency=0.0)
+    secondary = FakeProvider('huggingface', latency=0.0)
+    router = make_router(primary, secondary, hedge=True)
+    answer = await router.generate([{'role': 'user', 'content': 'hola'}])
+    check(answer == 'respuesta de openai' and secondary.calls == 0,
+          "si el primario responde antes del retardo no se lanza el secundario")
+
+    primary = FakeProvider('openai', error=RuntimeError('500'))
+    secondary = FakeProvider('huggingface')
+    router = make_router(primary, secondary, hedge=True)
+    answer = await router.generate([{'role': 'user', 'content': 'hola'}])
+    check(answer == 'respuesta de huggingface' and router.hedges == 0,
+          "si el primario falla antes del retardo el secundario actúa como fallback (sin hedge)")
+
+    primary = FakeProvider('openai', latency=1.0)
+    secondary = FakeProvider('huggingface', latency=1.0)
+    router = make_router(primary, secondary, hedge=True)
+    caller = asyncio.create_task(router.generate([{'role': 'user', 'content': 'hola'}]))
+    await asyncio.sleep(0.1)
+    caller.cancel()
+    try:
+        await caller
+    except asyncio.CancelledError:
+        pass
+    await asyncio.sleep(0)
+    check(primary.cancelled == 1 and secondary.cancelled == 1,
+          "si el llamador se cancela, se cancelan las dos llamadas en curso")
+    check(all(not b._probe_in_flight and b.failures == 0 for b in router.breakers.values()),
+          "y ninguna cuenta como fallo")
+
+    primary = FakeProvider('openai', error=RuntimeError('500'))
+    secondary = FakeProvider('huggingface', error=RuntimeError('503'))
+    router = make_router(primary, secondary, hedge=True)
+    try:
+        await router.generate([{'role': 'user', 'content': 'hola'}])
+        raised = None
+    except RuntimeError as e:
+        raised = str(e)
+    check(raised is not None and 'openai' in raised and 'huggingface' in raised,
+          "si fallan los dos el error nombra ambos proveedores")
+
+
+if __name__ == '__main__':
+    print("\n" + "="*60)
+    print("  🧪 ROUTER LLM: CIRCUIT BREAKER Y HEDGING")
+    print("="*60)
+    asyncio.run(main())
+    print("\n" + "="*60)
+    if failures:
+        print(f"  ❌ {len(failures)} COMPROBACIONES FALLARON")
+        print("="*60)
+        sys.exit(1)
+    print("  ✅ TODAS LAS COMPROBACIONES PASARON")
+    print("="*60)
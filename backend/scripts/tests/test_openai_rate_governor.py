@@ -0,0 +1,195 @@
+"""
+Prueba offline del gobernador de llamadas a OpenAI (sin red)
+Cubre: token bucket FIFO con timeout, huecos de concurrencia por propósito,
+cesión de los resúmenes ante la ruta de petición y reintentos de 429
+"""
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+
+BACKEND_ROOT = Path(__file__).resolve().parents[2]
+if str(BACKEND_ROOT) not in sys.path:
+    sys.path.insert(0, str(BACKEND_ROOT))
+# settings exige una key del LLM activo aunque aquí no se llame a OpenAI
+os.environ.setdefault('OPENAI_API_KEY', 'sk-offline-test')
+os.environ.setdefault('DEBUG', 'false')
+
+import httpx
+from openai import BadRequestError, RateLimitError
+
+from adapters.openai_rate_governor import LLMQueueTimeout, OpenAIRateGovernor, TokenBucket
+
+failures = []
+
+
+def print_step(num, title):
+    print(f"\n{'='*60}")
+    print(f"  PASO {num}: {title}")
+    print(f"{'='*60}\n")
+
+
+def check(condition, message):
+    if condition:
+        print(f"✅ {message}")
+    else:
+        print(f"❌ {message}")
+        failures.append(message)
+
+
+def api_error(cls, status, headers=None):
+    request = httpx.Request('POST', 'https://api.openai.com/v1/chat/completions')
+    response = httpx.Response(status, request=request, headers=headers or {})
+    return cls(f"HTTP {status}", response=response, body=None)
+
+
+def make_governor(**kwargs):
+    params = dict(
+        answer_concurrency=1, aux_concurrency=1, summary_concurrency=1,
+        rpm_limit=0, tpm_limit=0, queue_timeout=0.2,
+        max_retries=2, retry_base=0.01, retry_max=1.0,
+    )
+    params.update(kwargs)
+    return OpenAIRateGovernor(**params)
+
+
+async def main():
+    # PASO 1: FIFO
+    print_step(1, "TOKEN BUCKET: ORDEN DE LLEGADA")
+    bucket = TokenBucket(per_minute=6000)  # 100 tokens/s
+    bucket.adjust(bucket.capacity)  # vacío
+    order = []
+
+    async def take(tag, amount):
+        await bucket.acquire(amount, time.monotonic() + 2.0)
+        order.append(tag)
+
+    tasks = [asyncio.create_task(take(tag, amount)) for tag, amount in (('a', 3), ('b', 1), ('c', 1))]
+    await asyncio.gather(*tasks)
+    check(order == ['a', 'b', 'c'], f"los que esperan consumen en orden de llegada aunque pidan menos ({order})")
+
+    # PASO 2: TIMEOUT
+    print_step(2, "TOKEN BUCKET: TIMEOUT SIN DORMIR DE MÁS")
+    bucket = TokenBucket(per_minute=6000)
+    bucket.adjust(bucket.capacity)
+    t0 = time.perf_counter()
+    try:
+        await bucket.acquire(50, time.monotonic() + 0.1)
+        timed_out = False
+    except asyncio.TimeoutError:
+        timed_out = True
+    elapsed = time.perf_counter() - t0
+    check(timed_out and elapsed < 0.05,
+          f"si la espera (0.5s) no cabe en el plazo (0.1s) falla de inmediato ({elapsed * 1000:.0f}ms)")
+
+    bucket = TokenBucket(per_minute=6000)
+    bucket.adjust(bucket.capacity)
+    first = asyncio.create_task(bucket.acquire(50, time.monotonic() + 2.0))
+    await asyncio.sleep(0)
+    t0 = time.perf_counter()
+    try:
+        await bucket.acquire(1, time.monotonic() + 0.1)
+        timed_out = False
+    except asyncio.TimeoutError:
+        timed_out = True
+    elapsed = time.perf_counter() - t0
+    check(timed_out and elapsed < 0.2,
+          f"detrás de otro en cola, el plazo incluye la espera del turno ({elapsed * 1000:.0f}ms de 100ms)")
+    await first
+    check(bucket.available < 1, "el primero de la cola consume cuando le llega el turno")
+
+    bucket = TokenBucket(per_minute=6000)
+    bucket.pause(0.5)
+    try:
+        await bucket.acquire(1, time.monotonic() + 0.1)
+        paused = False
+    except asyncio.TimeoutError:
+        paused = True
+    check(paused, "pausado (Retry-After) nadie consume aunque haya saldo")
+
+    # PASO 3: CONCURRENCIA
+    print_step(3, "HUECOS POR PROPÓSITO")
+    governor = make_governor()
+    release = asyncio.Event()
+
+    async def hold(purpose):
+        async with governor.slot(purpose):
+            await release.wait()
+
+    holder = asyncio.create_task(hold('answer'))
+    await asyncio.sleep(0)
+    async with governor.slot('extraction'):
+        aux_ok = True
+    check(aux_ok, "answer ocupado no bloquea a los auxiliares (semáforos distintos)")
+    try:
+        async with governor.slot('answer'):
+            pass
+        queued_out = False
+    except LLMQueueTimeout:
+        queued_out = True
+    check(queued_out and governor.stats()['waiting']['answer'] == 0,
+          "sin hueco de answer en queue_timeout se lanza LLMQueueTimeout y la cola queda vacía")
+
+    waiter = asyncio.create_task(hold('answer'))
+    await asyncio.sleep(0)
+    check(governor.request_path_contended(), "con una respuesta esperando, la ruta de petición está saturada")
+    release.set()
+    await asyncio.gather(holder, waiter)
+    check(not governor.request_path_contended(), "sin esperas ni cuota agotada los resúmenes pueden correr")
+
+    governor = make_governor(rpm_limit=6)
+    governor.requests.adjust(governor.requests.capacity)
+    check(governor.request_path_contended(), "con el bucket de peticiones vacío los resúmenes ceden")
+
+    # PASO 4: REINTENTOS
+    print_step(4, "REINTENTOS DE 429 Y ERRORES NO REINTENTABLES")
+    governor = make_governor(rpm_limit=600)
+    attempts = []
+
+    async def flaky():
+        attempts.append(time.monotonic())
+        if len(attempts) == 1:
+            raise api_error(RateLimitError, 429, {'retry-after-ms': '150'})
+        return 'ok'
+
+    async with governor.slot('answer'):
+        result = await governor.call('answer', 10, flaky)
+    check(result == 'ok' and len(attempts) == 2, "un 429 se reintenta y la llamada termina bien")
+    check(attempts[1] - attempts[0] >= 0.14, "el reintento respeta Retry-After")
+
+    attempts.clear()
+
+    async def bad_request():
+        attempts.append(time.monotonic())
+        raise api_error(BadRequestError, 400)
+
+    try:
+        async with governor.slot('answer'):
+            await governor.call('answer', 10, bad_request)
+        raised = False
+    except BadRequestError:
+        raised = True
+    check(raised and len(attempts) == 1, "un 400 no se reintenta")
+
+    governor = make_governor(tpm_limit=600)
+    before = governor.tokens.available
+    async with governor.slot('answer'):
+        await governor.call('answer', 50, lambda: asyncio.sleep(0, result='ok'))
+    governor.settle_tokens(50, 20)
+    check(abs(governor.tokens.available - (before - 20)) < 1.0,
+          "el bucket TPM se corrige con el uso real (estimado 50, real 20)")
+
+
+if __name__ == '__main__':
+    print("\n" + "="*60)
+    print("  🧪 GOBERNADOR DE LLAMADAS A OPENAI")
+    print("="*60)
+    asyncio.run(main())
+    print("\n" + "="*60)
+    if failures:
+        print(f"  ❌ {len(failures)} COMPROBACIONES FALLARON")
+        print("="*60)
+        sys.exit(1)
+    print("  ✅ TODAS LAS COMPROBACIONES PASARON")
+    print("="*60)
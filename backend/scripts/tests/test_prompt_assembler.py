@@ -0,0 +1,137 @@
+"""
+Prueba offline del ensamblado del prompt del mentor (sin red ni LLM)
+Cubre: orden de recorte (historial, resumen, ejemplos, grupos), posición del
+resumen y prefijo estático intacto
+"""
+import os
+import sys
+from pathlib import Path
+
+BACKEND_ROOT = Path(__file__).resolve().parents[2]
+if str(BACKEND_ROOT) not in sys.path:
+    sys.path.insert(0, str(BACKEND_ROOT))
+# settings exige una key del LLM activo aunque aquí no se llame a OpenAI
+os.environ.setdefault('OPENAI_API_KEY', 'sk-offline-test')
+os.environ.setdefault('DEBUG', 'false')
+
+from config.settings import settings
+from services.prompt_assembler import (
+    MENTOR_SYSTEM_PROMPT,
+    PromptAssembler,
+    collect_prompt_stats,
+    estimate_messages_tokens,
+)
+
+failures = []
+
+
+def print_step(num, title):
+    print(f"\n{'='*60}")
+    print(f"  PASO {num}: {title}")
+    print(f"{'='*60}\n")
+
+
+def check(condition, message):
+    if condition:
+        print(f"✅ {message}")
+    else:
+        print(f"❌ {message}")
+        failures.append(message)
+
+
+QUERY = "¿cómo se dice cantar?"
+CONTEXT = "\n".join([
+    "Resultados del lexicón:",
+    "1. [Lemma ES→Bora | sim 0.91] cantar — DEF_BORA: bájtsi",
+    "   • Ejemplo: BORA: Ó bájtsiíbye | ES: Yo canto",
+    "   • Ejemplo: BORA: Mé bájtsiíbye | ES: Cantamos",
+    "2. [Lemma ES→Bora | sim 0.74] canto — DEF_BORA: bájtsiyi",
+    "   • Ejemplo: BORA: Bájtsiyi tsáá | ES: Viene el canto",
+    "3. [Lemma ES→Bora | sim 0.61] cantor — DEF_BORA: bájtsíímye",
+    "   • Ejemplo: BORA: Bájtsíímye ihjyúvaa | ES: El cantor habla",
+])
+SUMMARY = {"role": "system", "content": "Resumen de la conversación: el estudiante practica verbos de música."}
+HISTORY = [
+    SUMMARY,
+    {"role": "user", "content": "turno uno: ¿cómo se dice bailar?"},
+    {"role": "assistant", "content": "turno dos: bailar se dice ...; practica con un ejemplo."},
+    {"role": "user", "content": "turno tres: ¿y tocar el tambor?"},
+]
+
+
+def assemble(budget):
+    with collect_prompt_stats() as stats:
+        messages = PromptAssembler(max_input_tokens=budget).assemble(QUERY, CONTEXT, HISTORY)
+    return messages, stats
+
+
+def trims(stats):
+    return tuple(stats.get(f"prompt_trimmed_{part}", 0) for part in ("history", "summary", "examples", "groups"))
+
+
+def main():
+    settings.CONVERSATION_SUMMARY_ENABLED = False
+
+    # PASO 1: SIN RECORTE
+    print_step(1, "SIN PRESUPUESTO: ORDEN DE LOS MENSAJES")
+    messages, stats = assemble(0)
+    full = stats["prompt_tokens_estimated"]
+    check(messages[0] == {"role": "system", "content": MENTOR_SYSTEM_PROMPT},
+          "el system prompt estático va primero y sin interpolar")
+    check(messages[1] == SUMMARY, "el resumen va justo después del system prompt")
+    check([m["content"][:10] for m in messages[2:5]] == ["turno uno:", "turno dos:", "turno tres"],
+          "después el historial en orden")
+    check(messages[-1]["role"] == "user" and "<query>" in messages[-1]["content"],
+          "la query y el contexto van al final")
+    check(trims(stats) == (0, 0, 0, 0), f"sin presupuesto no se recorta nada (~{full} tokens)")
+
+    # Coste de cada mensaje (sin los tokens de cebado de la respuesta)
+    history_cost = [estimate_messages_tokens([m]) - estimate_messages_tokens([]) for m in HISTORY[1:]]
+    summary_cost = estimate_messages_tokens([SUMMARY]) - estimate_messages_tokens([])
+
+    # PASO 2: HISTORIAL
+    print_step(2, "PRIMERO SE RECORTA EL HISTORIAL (EL MÁS ANTIGUO)")
+    messages, stats = assemble(full - 1)
+    check(trims(stats) == (1, 0, 0, 0), f"un token de más quita solo el turno más antiguo {trims(stats)}")
+    check(messages[1] == SUMMARY and messages[2]["content"].startswith("turno dos"),
+          "el resumen se conserva y el historial empieza en el segundo turno")
+
+    # PASO 3: RESUMEN
+    print_step(3, "DESPUÉS EL RESUMEN")
+    messages, stats = assemble(full - sum(history_cost) - 1)
+    check(trims(stats) == (3, 1, 0, 0), f"sin historial y aún por encima, se quita el resumen {trims(stats)}")
+    check(len(messages) == 2 and messages[0]["content"] == MENTOR_SYSTEM_PROMPT,
+          "quedan solo el system prompt y la pregunta")
+
+    # PASO 4: EJEMPLOS
+    print_step(4, "LUEGO LOS EJEMPLOS (DE LOS GRUPOS MENOS RELEVANTES)")
+    messages, stats = assemble(full - sum(history_cost) - summary_cost - 1)
+    user = messages[-1]["content"]
+    check(trims(stats) == (3, 1, 1, 0), f"se quita un ejemplo {trims(stats)}")
+    check("El cantor habla" not in user and "Viene el canto" in user and "Yo canto" in user,
+          "el ejemplo quitado es el del último grupo")
+
+    # PASO 5: GRUPOS
+    print_step(5, "POR ÚLTIMO LOS GRUPOS (EL MEJOR SE CONSERVA)")
+    messages, stats = assemble(1)
+    user = messages[-1]["content"]
+    history_trim, summary_trim, examples_trim, groups_trim = trims(stats)
+    check((history_trim, summary_trim, groups_trim) == (3, 1, 2) and examples_trim >= 2,
+          f"con un presupuesto imposible se quitan ejemplos y grupos salvo el primero {trims(stats)}")
+    check("1. [Lemma" in user and "2. [Lemma" not in user and QUERY in user,
+          "el grupo más relevante y la query se conservan siempre")
+    check(messages[0]["content"] == MENTOR_SYSTEM_PROMPT, "el system prompt nunca se recorta")
+
+
+if __name__ == '__main__':
+    print("\n" + "="*60)
+    print("  🧪 ENSAMBLADO DEL PROMPT DEL MENTOR")
+    print("="*60)
+    main()
+    print("\n" + "="*60)
+    if failures:
+        print(f"  ❌ {len(failures)} COMPROBACIONES FALLARON")
+        print("="*60)
+        sys.exit(1)
+    print("  ✅ TODAS LAS COMPROBACIONES PASARON")
+    print("="*60)
@@ -0,0 +1,127 @@
+"""
+Prueba offline de la cache semántica de respuestas (sin red ni embeddings reales)
+Cubre: clave de término para paráfrasis y palabras distintas, ámbito, umbral,
+TTL, buffer circular e invalidación
+"""
+import os
+import sys
+import time
+from pathlib import Path
+
+BACKEND_ROOT = Path(__file__).resolve().parents[2]
+if str(BACKEND_ROOT) not in sys.path:
+    sys.path.insert(0, str(BACKEND_ROOT))
+# settings exige una key del LLM activo aunque aquí no se llame a OpenAI
+os.environ.setdefault('OPENAI_API_KEY', 'sk-offline-test')
+os.environ.setdefault('DEBUG', 'false')
+
+from services.semantic_cache import SemanticAnswerCache, make_semantic_scope, semantic_query_key
+
+failures = []
+
+SCOPE = make_semantic_scope(top_k=5, min_sim=0.5, category=None, fast=False)
+CLOSE = [1.0, 0.05, 0.0]  # coseno ~0.999 con BASE
+FAR = [1.0, 1.0, 0.0]     # coseno ~0.707 con BASE
+BASE = [1.0, 0.0, 0.0]
+
+
+def print_step(num, title):
+    print(f"\n{'='*60}")
+    print(f"  PASO {num}: {title}")
+    print(f"{'='*60}\n")
+
+
+def check(condition, message):
+    if condition:
+        print(f"✅ {message}")
+    else:
+        print(f"❌ {message}")
+        failures.append(message)
+
+
+def make_cache(**kwargs):
+    params = dict(max_entries=4, threshold=0.95, ttl_seconds=60)
+    params.update(kwargs)
+    return SemanticAnswerCache(**params)
+
+
+def main():
+    # PASO 1: CLAVE DE TÉRMINO
+    print_step(1, "CLAVE DE TÉRMINO")
+    key = semantic_query_key("como se dice cantar")
+    check(key == semantic_query_key("cómo digo cantar en bora") == semantic_query_key("¿Cómo se dice cantar en bora?"),
+          f"las paráfrasis comparten clave ({key})")
+    check(semantic_query_key("cómo se dice perro") != semantic_query_key("cómo se dice perros"),
+          "'perro' y 'perros' tienen claves distintas")
+    check(semantic_query_key("cómo se dice padre") != semantic_query_key("cómo se dice madre"),
+          "'padre' y 'madre' tienen claves distintas")
+    check(semantic_query_key("qué significa pájtsiro") == semantic_query_key("pájtsiro")
+          and semantic_query_key("pájtsiro").startswith("bora_es|"),
+          "la dirección forma parte de la clave")
+    check(make_semantic_scope(5, 0.5, "Verbos", False) == make_semantic_scope(5, 0.5, " verbos ", False)
+          and make_semantic_scope(5, 0.5, None, False) != make_semantic_scope(5, 0.5, None, True),
+          "el ámbito normaliza la categoría y distingue el modo rápido")
+
+    # PASO 2: LOOKUP
+    print_step(2, "LOOKUP DENTRO DEL ÁMBITO, LA CLAVE Y EL UMBRAL")
+    cache = make_cache()
+    check(cache.lookup(BASE, SCOPE, key) is None, "vacía: fallo")
+    cache.store(BASE, SCOPE, key, "como se dice cantar", {"answer": "bájtsi"})
+    hit = cache.lookup(CLOSE, SCOPE, key)
+    check(hit is not None and hit[0]["answer"] == "bájtsi" and hit[1] > 0.99 and hit[2] == "como se dice cantar",
+          "una paráfrasis con embedding cercano reutiliza la respuesta")
+    check(cache.has_candidates(SCOPE, key) and not cache.has_candidates(SCOPE, "es_bora|bailar"),
+          "has_candidates solo ve la misma clave")
+    check(cache.lookup(BASE, SCOPE, semantic_query_key("cómo se dice bailar")) is None,
+          "un embedding idéntico con otra clave de término no se reutiliza")
+    other_scope = make_semantic_scope(top_k=10, min_sim=0.5, category=None, fast=False)
+    check(cache.lookup(BASE, other_scope, key) is None, "otro ámbito (top_k distinto) no se reutiliza")
+    check(cache.lookup(FAR, SCOPE, key) is None, "por debajo del umbral es un fallo aunque la clave coincida")
+    check(cache.lookup(None, SCOPE, key) is None and cache.lookup([0.0, 0.0, 0.0], SCOPE, key) is None,
+          "un embedding ausente o nulo cuenta como fallo")
+    check(cache.lookup([1.0, 0.0], SCOPE, key) is None, "un embedding de otra dimensión no se compara")
+    stats = cache.stats()
+    check((stats["hits"], stats["misses"], stats["stores"]) == (1, 7, 1),
+          f"contadores (hits={stats['hits']}, misses={stats['misses']})")
+
+    # PASO 3: TTL
+    print_step(3, "TTL")
+    cache = make_cache(ttl_seconds=0.05)
+    cache.store(BASE, SCOPE, key, "q", {"answer": "x"})
+    time.sleep(0.06)
+    check(cache.lookup(BASE, SCOPE, key) is None and not cache.has_candidates(SCOPE, key),
+          "pasado el TTL la entrada ya no se sirve")
+
+    # PASO 4: BUFFER CIRCULAR
+    print_step(4, "BUFFER CIRCULAR")
+    cache = make_cache(max_entries=2)
+    keys = [f"es_bora|palabra{i}" for i in range(3)]
+    for i, k in enumerate(keys):
+        cache.store(BASE, SCOPE, k, f"q{i}", {"answer": str(i)})
+    check(cache.lookup(BASE, SCOPE, keys[0]) is None, "la tercera entrada sobrescribe la más antigua")
+    check(cache.lookup(BASE, SCOPE, keys[2])[0]["answer"] == "2" and cache.lookup(BASE, SCOPE, keys[1]) is not None,
+          "las dos más recientes siguen disponibles")
+    check(len(cache._slots) == 2 and (SCOPE, keys[0]) not in cache._slots,
+          "el slot sobrescrito sale del índice por clave (no crece sin límite)")
+
+    # PASO 5: INVALIDACIÓN
+    print_step(5, "INVALIDACIÓN")
+    removed = cache.invalidate()
+    check(removed == 2 and cache.lookup(BASE, SCOPE, keys[2]) is None and cache.stats()["entries"] == 0,
+          f"invalidate vacía la cache ({removed} entradas)")
+    cache.store(BASE, SCOPE, keys[0], "q0", {"answer": "nueva"})
+    check(cache.lookup(BASE, SCOPE, keys[0])[0]["answer"] == "nueva", "después se puede volver a guardar")
+
+
+if __name__ == '__main__':
+    print("\n" + "="*60)
+    print("  🧪 CACHE SEMÁNTICA DE RESPUESTAS")
+    print("="*60)
+    main()
+    print("\n" + "="*60)
+    if failures:
+        print(f"  ❌ {len(failures)} COMPROBACIONES FALLARON")
+        print("="*60)
+        sys.exit(1)
+    print("  ✅ TODAS LAS COMPROBACIONES PASARON")
+    print("="*60)
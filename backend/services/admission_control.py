@@ -0,0 +1,351 @@
+"""
+Control de admisión delante del pipeline RAG de /lexicon
+
+Sin límite, una ráfaga de búsquedas anónimas ocupa el pipeline (embeddings,
+Supabase, LLM) y deja esperando a los estudiantes autenticados. El
+controlador:
+
+- Acota las ejecuciones concurrentes del pipeline (ADMISSION_MAX_CONCURRENT).
+- Las peticiones que no caben esperan en una cola por prioridad: chat
+  autenticado > búsqueda anónima > lotes (FIFO dentro de cada clase). Al
+  liberar un hueco se entrega directamente al siguiente de la cola.
+- Cuotas por minuto con token buckets por usuario (ADMISSION_USER_RPM) o por
+  IP (ADMISSION_IP_RPM) para quien no está autenticado: exceder la cuota es
+  un rechazo inmediato (429). Un lote paga una consulta por query aunque
+  supere la ráfaga: el saldo queda en negativo y las siguientes esperan.
+- Un lote que ejecuta varios pipelines a la vez ocupa un hueco por pipeline
+  concurrente (`slots`), no uno solo. Los huecos se conceden todos de golpe:
+  quien espera en cola guarda su demanda completa y solo se le entrega cuando
+  cabe entera, así dos lotes nunca se quedan con huecos a medias esperándose
+  entre sí. La cola se atiende en orden estricto: un chat que llega detrás de
+  un lote pasa delante de él.
+- Load shedding: si la espera supera el presupuesto de su clase
+  (ADMISSION_QUEUE_TIMEOUT_*_MS) o la cola está llena (ADMISSION_MAX_QUEUE;
+  una petición de más prioridad desplaza a la última de menos prioridad),
+  se lanza AdmissionRejected y el router sirve una respuesta barata
+  (RAGService.shed_lexicon_answer) o un 503 con Retry-After.
+
+Todo corre en el event loop (sin hilos), así que no hace falta lock. Las
+colas, esperas y decisiones se exponen en /metrics y en las estadísticas de admin.
+"""
+from collections import Counter, OrderedDict
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+
+from config.settings import settings
+from services.metrics import (
+    observe_admission_wait,
+    record_admission_decision,
+    record_admission_shed,
+    set_admission_in_flight,
+    set_admission_queue_depth,
+)
+
+logger = logging.getLogger(__name__)
+
+# Clases de prioridad (menor rango = antes)
+PRIORITY_CHAT = "chat"
+PRIORITY_SEARCH = "search"
+PRIORITY_BATCH = "batch"
+_RANK = {PRIORITY_CHAT: 0, PRIORITY_SEARCH: 1, PRIORITY_BATCH: 2}
+
+# Motivos de rechazo
+RATE_LIMITED = "rate_limited"
+QUEUE_FULL = "queue_full"
+QUEUE_TIMEOUT = "timeout"
+
+
+class AdmissionRejected(Exception):
+    """La petición no se admite: cuota agotada, cola llena o espera fuera de presupuesto."""
+
+    def __init__(self, reason: str, retry_after: float, detail: str):
+        super().__init__(detail)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class KeyedRateLimiter:
+    """Token buckets por clave (usuario o IP) con expulsión LRU de las claves inactivas."""
+
+    def __init__(self, per_minute: float, burst: float, max_keys: int):
+        self.rate = max(0.0, float(per_minute)) / 60.0
+        self.capacity = max(1.0, float(burst))
+        self.max_keys = max(1, int(max_keys))
+        # clave -> [tokens, último refresco (time.monotonic)]
+        self._buckets: "OrderedDict[str, List[float]]" = OrderedDict()
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def try_acquire(self, key: str, cost: float = 1.0) -> float:
+        """
+        Consume `cost` y retorna 0.0, o retorna los segundos hasta que se admita (sin consumir).
+
+        Se admite con saldo >= min(cost, capacity) y se cobra el coste completo:
+        un coste mayor que la ráfaga deja el saldo en negativo (deuda que las
+        siguientes peticiones esperan a pagar), así la tasa media se respeta.
+        """
+        if not self.enabled:
+            return 0.0
+        cost = float(cost)
+        needed = min(cost, self.capacity)
+        now = time.monotonic()
+        bucket = self._buckets.pop(key, None)
+        tokens = self.capacity if bucket is None else min(self.capacity, bucket[0] + (now - bucket[1]) * self.rate)
+        if tokens >= needed:
+            tokens -= cost
+            wait = 0.0
+        else:
+            wait = (needed - tokens) / self.rate
+        self._buckets[key] = [tokens, now]
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return wait
+
+
+class AdmissionController:
+    """Huecos de ejecución del pipeline, cola por prioridad y cuotas por usuario/IP."""
+
+    def __init__(
+        self,
+        max_concurrent: Optional[int] = None,
+        max_queue: Optional[int] = None,
+        queue_timeouts_ms: Optional[Dict[str, float]] = None,
+        user_rpm: Optional[int] = None,
+        ip_rpm: Optional[int] = None,
+        burst: Optional[int] = None,
+        max_keys: Optional[int] = None,
+        enabled: Optional[bool] = None,
+    ):
+        self.enabled = settings.ADMISSION_ENABLED if enabled is None else enabled
+        self.max_concurrent = max_concurrent if max_concurrent is not None else settings.ADMISSION_MAX_CONCURRENT
+        self.max_queue = max_queue if max_queue is not None else settings.ADMISSION_MAX_QUEUE
+        self.queue_timeouts_ms = queue_timeouts_ms or {
+            PRIORITY_CHAT: settings.ADMISSION_QUEUE_TIMEOUT_CHAT_MS,
+            PRIORITY_SEARCH: settings.ADMISSION_QUEUE_TIMEOUT_SEARCH_MS,
+            PRIORITY_BATCH: settings.ADMISSION_QUEUE_TIMEOUT_BATCH_MS,
+        }
+        burst = burst if burst is not None else settings.ADMISSION_BURST
+        max_keys = max_keys if max_keys is not None else settings.ADMISSION_MAX_TRACKED_KEYS
+        self.user_limiter = KeyedRateLimiter(
+            user_rpm if user_rpm is not None else settings.ADMISSION_USER_RPM, burst, max_keys
+        )
+        self.ip_limiter = KeyedRateLimiter(
+            ip_rpm if ip_rpm is not None else settings.ADMISSION_IP_RPM, burst, max_keys
+        )
+
+        self._in_flight = 0
+        # (rango de prioridad, orden de llegada, huecos pedidos, future que los recibe)
+        self._queue: List[Tuple[int, int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self._waiting: Dict[str, int] = {priority: 0 for priority in _RANK}
+        self._decisions: Counter = Counter()
+        self._shed: Counter = Counter()
+
+    # ==========================================
+    # API PÚBLICA
+    # ==========================================
+
+    @asynccontextmanager
+    async def admit(
+        self,
+        priority: str,
+        user_id: Optional[int] = None,
+        client_ip: Optional[str] = None,
+        cost: float = 1.0,
+        slots: int = 1,
+    ) -> AsyncIterator[float]:
+        """Cuota + huecos de ejecución durante el bloque; produce los ms esperados en cola."""
+        waited_ms = await self.acquire(priority, user_id=user_id, client_ip=client_ip, cost=cost, slots=slots)
+        try:
+            yield waited_ms
+        finally:
+            self.release(slots)
+
+    async def acquire(
+        self,
+        priority: str,
+        user_id: Optional[int] = None,
+        client_ip: Optional[str] = None,
+        cost: float = 1.0,
+        slots: int = 1,
+    ) -> float:
+        """
+        Comprueba la cuota y espera `slots` huecos (uno por pipeline que la
+        petición ejecute a la vez); retorna los ms esperados.
+
+        Lanza AdmissionRejected si no se admite. Cada acquire() admitido debe
+        ir seguido de un release(slots) (p. ej. al terminar un stream).
+        """
+        if priority not in _RANK:
+            raise ValueError(f"Prioridad de admisión desconocida: {priority}")
+        slots = self._slots(slots)
+        if not self.enabled:
+            self._in_flight += slots
+            return 0.0
+        self._check_rate(priority, user_id, client_ip, cost)
+
+        t0 = time.monotonic()
+        timeout = max(0.0, float(self.queue_timeouts_ms.get(priority, 0))) / 1000.0
+        await self._acquire_slots(priority, slots, timeout)
+        waited_ms = (time.monotonic() - t0) * 1000.0
+        self._admitted(priority, waited_ms)
+        return waited_ms
+
+    def release(self, slots: int = 1) -> None:
+        """Libera huecos y los entrega a la cola (por prioridad) si la demanda del primero cabe."""
+        self._in_flight = max(0, self._in_flight - self._slots(slots))
+        self._dispatch()
+
+    def record_shed(self, priority: str, source: Optional[str]) -> None:
+        """Anota cómo se atendió una petición rechazada (answer_card, cache, lexical o none)."""
+        source = source or "none"
+        self._shed[(priority, source)] += 1
+        record_admission_shed(priority, source)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "max_concurrent": self.max_concurrent,
+            "in_flight": self._in_flight,
+            "max_queue": self.max_queue,
+            "waiting": dict(self._waiting),
+            "queue_timeouts_ms": dict(self.queue_timeouts_ms),
+            "decisions": {f"{p}:{r}": n for (p, r), n in sorted(self._decisions.items())},
+            "shed": {f"{p}:{s}": n for (p, s), n in sorted(self._shed.items())},
+            "tracked_users": len(self.user_limiter),
+            "tracked_ips": len(self.ip_limiter),
+        }
+
+    # ==========================================
+    # INTERNOS
+    # ==========================================
+
+    async def _acquire_slots(self, priority: str, slots: int, timeout: float) -> None:
+        """
+        Todos los huecos de golpe: inmediato si caben y nadie espera; si no, en
+        cola con la demanda completa hasta `timeout` segundos.
+        """
+        if self._in_flight + slots <= self._limit() and not self._queued():
+            self._in_flight += slots
+            set_admission_in_flight(self._in_flight)
+            return
+        if self._queued() >= self.max_queue and not self._displace(_RANK[priority]):
+            self._reject(priority, QUEUE_FULL)
+            raise AdmissionRejected(QUEUE_FULL, 1.0, "Servicio saturado: la cola de consultas está llena")
+
+        grant = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queue, (_RANK[priority], next(self._seq), slots, grant))
+        self._set_waiting(priority, +1)
+        try:
+            await asyncio.wait_for(grant, timeout=timeout)
+        except AdmissionRejected:
+            self._reject(priority, QUEUE_FULL)
+            raise
+        except asyncio.TimeoutError:
+            # Si los huecos llegaron justo al vencer el plazo, se aprovechan
+            if not (grant.done() and not grant.cancelled()):
+                self._reject(priority, QUEUE_TIMEOUT)
+                raise AdmissionRejected(
+                    QUEUE_TIMEOUT, timeout or 1.0,
+                    f"Servicio saturado: sin hueco en {timeout * 1000:.0f}ms",
+                ) from None
+        except asyncio.CancelledError:
+            # El cliente se fue; si ya se le habían entregado los huecos, devolverlos
+            if grant.done() and not grant.cancelled() and grant.exception() is None:
+                self.release(slots)
+            raise
+        finally:
+            self._set_waiting(priority, -1)
+            # Si el primero de la cola se fue, los siguientes quizá ya caben
+            self._dispatch()
+
+    def _dispatch(self) -> None:
+        """Entrega huecos al primero de la cola mientras su demanda completa quepa."""
+        while self._queue:
+            _, _, slots, grant = self._queue[0]
+            if grant.done():
+                # Vencido, cancelado o desplazado
+                heapq.heappop(self._queue)
+                continue
+            if self._in_flight + slots > self._limit():
+                # Orden estricto: nadie se cuela por detrás del primero
+                break
+            heapq.heappop(self._queue)
+            self._in_flight += slots
+            grant.set_result(None)
+        set_admission_in_flight(self._in_flight)
+
+    def _slots(self, slots: int) -> int:
+        # Nunca más huecos de los que existen (si no, el lote no se admitiría jamás)
+        return max(1, int(min(slots, self._limit())))
+
+    def _limit(self) -> float:
+        # 0 = sin límite de concurrencia (solo cuotas)
+        return self.max_concurrent if self.max_concurrent and self.max_concurrent > 0 else float("inf")
+
+    def _queued(self) -> int:
+        return sum(self._waiting.values())
+
+    def _check_rate(self, priority: str, user_id: Optional[int], client_ip: Optional[str], cost: float) -> None:
+        if user_id is not None:
+            wait = self.user_limiter.try_acquire(f"user:{user_id}", cost)
+        elif client_ip:
+            wait = self.ip_limiter.try_acquire(f"ip:{client_ip}", cost)
+        else:
+            return
+        if wait > 0:
+            self._reject(priority, RATE_LIMITED)
+            raise AdmissionRejected(
+                RATE_LIMITED, wait, f"Demasiadas consultas; reintenta en {max(1, round(wait))}s"
+            )
+
+    def _displace(self, rank: int) -> bool:
+        """Expulsa de la cola al último en llegar de la clase menos prioritaria si es peor que `rank`."""
+        pending = [entry for entry in self._queue if not entry[3].done()]
+        if not pending:
+            return False
+        worst = max(pending, key=lambda entry: (entry[0], entry[1]))
+        if worst[0] <= rank:
+            return False
+        # El desplazado recibe el rechazo en su espera (y lo cuenta allí)
+        worst[3].set_exception(
+            AdmissionRejected(QUEUE_FULL, 1.0, "Servicio saturado: desplazada por una consulta prioritaria")
+        )
+        return True
+
+    def _set_waiting(self, priority: str, delta: int) -> None:
+        self._waiting[priority] += delta
+        set_admission_queue_depth(priority, self._waiting[priority])
+
+    def _admitted(self, priority: str, waited_ms: float) -> None:
+        self._decisions[(priority, "admitted")] += 1
+        record_admission_decision(priority, "admitted")
+        observe_admission_wait(priority, waited_ms / 1000.0)
+
+    def _reject(self, priority: str, reason: str) -> None:
+        self._decisions[(priority, reason)] += 1
+        record_admission_decision(priority, reason)
+        if reason != RATE_LIMITED:
+            logger.warning(f"🚦 Consulta {priority} rechazada por saturación ({reason})")
+
+
+# Instancia global (compartida por todos los endpoints del proceso)
+_controller: Optional[AdmissionController] = None
+
+
+def get_admission_controller() -> AdmissionController:
+    """Función helper para obtener el control de admisión de /lexicon"""
+    global _controller
+    if _controller is None:
+        _controller = AdmissionController()
+    return _controller
@@ -0,0 +1,264 @@
+"""
+Tarjetas de respuesta precalculadas por lema ("answer cards")
+
+Buena parte del tráfico del mentor es una palabra suelta o "cómo se dice X":
+la respuesta queda determinada por una fila de lexicon_lemmas y sus ejemplos.
+Un job offline (scripts/build_answer_cards.py) renderiza una respuesta
+determinista por lema (ambas direcciones) y la guarda en un SQLite
+(ANSWER_CARDS_PATH): lemma_id -> (huella del lema, respuesta).
+
+answer_with_lexicon sirve la tarjeta sin embedding ni LLM cuando la consulta
+coincide exactamente con un lema (ver RAGService._answer_card_lemma), salvo
+que el llamador pida full_answer. La huella (glosas, POS, dirección) descarta
+tarjetas de lemas editados después del build; el fichero se reabre solo cuando
+el job lo reemplaza (cambia su mtime).
+"""
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from config.settings import settings
+from services.metrics import record_cache_lookup
+
+logger = logging.getLogger(__name__)
+
+BACKEND_ROOT = Path(__file__).resolve().parent.parent
+
+# Lemas por consulta in_() de ejemplos al construir las tarjetas
+_BUILD_CHUNK = 200
+
+
+def lemma_fingerprint(row: Dict[str, Any]) -> str:
+    """Huella de los campos del lema que determinan la tarjeta."""
+    payload = "\x1f".join(
+        str(row.get(field) or "") for field in ("lemma", "direction", "gloss_es", "gloss_bora", "pos_full")
+    )
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def render_answer_card(row: Dict[str, Any], examples: Sequence[Dict[str, Any]], max_examples: int = 2) -> Optional[str]:
+    """
+    Respuesta del mentor para un lema, en el tono de los prompts (párrafo
+    natural, traducción primero, 1-2 ejemplos). None si el lema no tiene glosa.
+    """
+    lemma = (row.get("lemma") or "").strip()
+    pos = (row.get("pos_full") or "").strip()
+    pos_text = f" ({pos})" if pos else ""
+    if row.get("direction") == "es_bora":
+        translation = (row.get("gloss_bora") or "").strip()
+        if not lemma or not translation:
+            return None
+        parts = [f"En bora, «{lemma}»{pos_text} se dice {translation}."]
+    else:
+        translation = (row.get("gloss_es") or "").strip()
+        if not lemma or not translation:
+            return None
+        parts = [f"«{lemma}»{pos_text} en español significa {translation}."]
+
+    shown = 0
+    for ex in examples:
+        bora = (ex.get("bora_text") or ex.get("bora") or "").strip()
+        es = (ex.get("spanish_text") or ex.get("es") or "").strip()
+        if not bora or not es:
+            continue
+        lead = "Por ejemplo" if shown == 0 else "Otro ejemplo"
+        parts.append(f"{lead}: \"{bora}\" significa \"{es}\".")
+        shown += 1
+        if shown >= max_examples:
+            break
+    return " ".join(parts)
+
+
+def resolve_cards_path(path: Optional[str] = None) -> Optional[Path]:
+    """Ruta del SQLite de tarjetas (relativa a backend/ si no es absoluta). '' desactiva."""
+    raw = settings.ANSWER_CARDS_PATH if path is None else path
+    if not raw:
+        return None
+    resolved = Path(raw)
+    if not resolved.is_absolute():
+        resolved = BACKEND_ROOT / resolved
+    return resolved
+
+
+class AnswerCardStore:
+    """
+    Lectura de tarjetas desde el SQLite generado offline
+
+    Solo lectura y thread-safe; una consulta por clave primaria (decenas de µs).
+    """
+
+    def __init__(self, path: Optional[str] = None, enabled: Optional[bool] = None):
+        self.enabled = settings.ANSWER_CARDS_ENABLED if enabled is None else enabled
+        self.path = resolve_cards_path(path)
+        self._conn: Optional[sqlite3.Connection] = None
+        self._mtime: Optional[float] = None
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+
+    # ==========================================
+    # API PÚBLICA
+    # ==========================================
+
+    def get(self, row: Dict[str, Any]) -> Optional[str]:
+        """Tarjeta del lema `row` (fila del mapa de lemas) o None si no hay o está desfasada."""
+        if not self.enabled or row.get("id") is None:
+            return None
+        with self._lock:
+            conn = self._connection()
+            found = None
+            if conn is not None:
+                try:
+                    found = conn.execute(
+                        "SELECT fingerprint, answer FROM cards WHERE lemma_id = ?", (int(row["id"]),)
+                    ).fetchone()
+                except sqlite3.Error as e:
+                    logger.warning(f"⚠️ Error leyendo tarjetas de respuesta: {e}")
+            if found is None:
+                self.misses += 1
+                result = "miss"
+            elif found[0] != lemma_fingerprint(row):
+                # El lema cambió desde el último build: mejor pasar por el pipeline
+                self.stale += 1
+                result = "stale"
+            else:
+                self.hits += 1
+                result = "hit"
+        record_cache_lookup("answer_card", result)
+        return found[1] if result == "hit" else None
+
+    def write(self, cards: Iterable[Tuple[int, str, str]]) -> int:
+        """
+        Reemplaza el fichero con las tarjetas (lemma_id, huella, respuesta).
+
+        Se escribe en un temporal y se renombra: los lectores ven el fichero
+        anterior o el nuevo completo, nunca uno a medias.
+        """
+        if self.path is None:
+            raise ValueError("ANSWER_CARDS_PATH vacío: no hay dónde escribir las tarjetas")
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        if tmp_path.exists():
+            tmp_path.unlink()
+        conn = sqlite3.connect(str(tmp_path))
+        try:
+            conn.execute(
+                "CREATE TABLE cards ("
+                " lemma_id INTEGER PRIMARY KEY,"
+                " fingerprint TEXT NOT NULL,"
+                " answer TEXT NOT NULL)"
+            )
+            conn.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            conn.executemany("INSERT OR REPLACE INTO cards VALUES (?, ?, ?)", cards)
+            count = int(conn.execute("SELECT COUNT(*) FROM cards").fetchone()[0])
+            conn.executemany(
+                "INSERT INTO meta VALUES (?, ?)",
+                [("built_at", str(time.time())), ("count", str(count))],
+            )
+            conn.commit()
+            conn.execute("VACUUM")
+        finally:
+            conn.close()
+        os.replace(tmp_path, self.path)
+        with self._lock:
+            self._close()
+        return count
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            conn = self._connection()
+            meta: Dict[str, str] = {}
+            if conn is not None:
+                try:
+                    meta = dict(conn.execute("SELECT key, value FROM meta").fetchall())
+                except sqlite3.Error:
+                    meta = {}
+        lookups = self.hits + self.misses + self.stale
+        return {
+            "enabled": self.enabled,
+            "path": str(self.path) if self.path else None,
+            "available": conn is not None,
+            "cards": int(meta["count"]) if "count" in meta else None,
+            "built_at": float(meta["built_at"]) if "built_at" in meta else None,
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale": self.stale,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+    # ==========================================
+    # INTERNOS (llamar con self._lock tomado)
+    # ==========================================
+
+    def _connection(self) -> Optional[sqlite3.Connection]:
+        if self.path is None:
+            return None
+        try:
+            mtime = self.path.stat().st_mtime
+        except OSError:
+            # Aún no se ejecutó el job: sin tarjetas, todo va por el pipeline
+            self._close()
+            return None
+        if self._conn is not None and mtime == self._mtime:
+            return self._conn
+        # Primera apertura o el job reemplazó el fichero
+        self._close()
+        try:
+            self._conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+            self._mtime = mtime
+            logger.info(f"🃏 Tarjetas de respuesta cargadas desde {self.path}")
+        except sqlite3.Error as e:
+            logger.warning(f"⚠️ Tarjetas de respuesta no disponibles ({self.path}): {e}")
+        return self._conn
+
+    def _close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+        self._conn = None
+        self._mtime = None
+
+
+async def build_answer_cards(
+    supabase_adapter,
+    store: Optional["AnswerCardStore"] = None,
+    max_examples: Optional[int] = None,
+) -> Dict[str, int]:
+    """Renderiza una tarjeta por lema de lexicon_lemmas y reemplaza el fichero de tarjetas."""
+    from services.lemma_map import LEMMA_COLUMNS
+
+    store = store or get_answer_card_store()
+    max_examples = max_examples if max_examples is not None else settings.ANSWER_CARDS_MAX_EXAMPLES
+    rows: List[Dict[str, Any]] = [r for r in supabase_adapter.fetch_all_lemmas(columns=LEMMA_COLUMNS) if r.get("id")]
+    cards: List[Tuple[int, str, str]] = []
+    skipped = 0
+    for start in range(0, len(rows), _BUILD_CHUNK):
+        chunk = rows[start:start + _BUILD_CHUNK]
+        examples = (
+            await supabase_adapter.get_examples_by_lemma_ids([r["id"] for r in chunk], limit_per_lemma=max_examples)
+            if max_examples > 0 else {}
+        )
+        for row in chunk:
+            answer = render_answer_card(row, examples.get(row["id"], []), max_examples)
+            if answer is None:
+                skipped += 1
+                continue
+            cards.append((int(row["id"]), lemma_fingerprint(row), answer))
+    written = store.write(cards) if rows else 0
+    logger.info(f"🃏 Tarjetas de respuesta: {written} escritas, {skipped} lemas sin glosa")
+    return {"lemmas": len(rows), "cards": written, "skipped": skipped}
+
+
+# Instancia global (compartida por todas las instancias de RAGService)
+answer_card_store = AnswerCardStore()
+
+
+def get_answer_card_store() -> AnswerCardStore:
+    """Función helper para obtener las tarjetas de respuesta precalculadas"""
+    return answer_card_store
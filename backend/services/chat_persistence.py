@@ -0,0 +1,236 @@
+"""
+Persistencia diferida (write-behind) de los mensajes del mentor
+
+El endpoint solo resuelve la conversación (validar o crear, para devolver su
+id) y encola el intercambio usuario/asistente; un worker en segundo plano lo
+escribe en la DB por lotes con su propia sesión, fuera de la ruta de respuesta.
+
+- Cola acotada (CHAT_PERSIST_QUEUE_MAX): si está llena, la petición espera
+  hasta CHAT_PERSIST_ENQUEUE_TIMEOUT_SECONDS y, si sigue llena, escribe inline
+  (backpressure sin perder mensajes).
+- El worker toma lo que haya en cola (hasta CHAT_PERSIST_BATCH_SIZE) y lo
+  escribe en una sola transacción; si el lote falla, reintenta intercambio a
+  intercambio para no perder todo el lote por una fila.
+- `stop()` (lifespan de FastAPI) deja de aceptar y vacía la cola antes de cerrar.
+- Tras escribir cada intercambio se avisa al resumidor de conversaciones, que
+  así cuenta mensajes ya presentes en la DB.
+
+Compromiso: si el proceso muere sin pasar por el shutdown se pierden los
+intercambios aún en cola (como mucho CHAT_PERSIST_QUEUE_MAX).
+"""
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+import asyncio
+import logging
+
+from config.settings import settings
+from services.metrics import record_chat_persist, set_chat_persist_queue_depth
+
+logger = logging.getLogger(__name__)
+
+# (conversation_id, mensajes {"role", "content", "created_at"})
+PendingExchange = Tuple[int, List[Dict[str, Any]]]
+
+_STOP = object()
+
+
+class ChatPersistenceQueue:
+    """Cola acotada + worker asyncio que escribe ChatMessage por lotes."""
+
+    def __init__(
+        self,
+        max_size: Optional[int] = None,
+        batch_size: Optional[int] = None,
+        enqueue_timeout: Optional[float] = None,
+        session_factory: Optional[Callable[[], Any]] = None,
+    ):
+        self.max_size = max_size if max_size is not None else settings.CHAT_PERSIST_QUEUE_MAX
+        self.batch_size = batch_size if batch_size is not None else settings.CHAT_PERSIST_BATCH_SIZE
+        self.enqueue_timeout = (
+            enqueue_timeout if enqueue_timeout is not None else settings.CHAT_PERSIST_ENQUEUE_TIMEOUT_SECONDS
+        )
+        self._session_factory = session_factory
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._accepting = False
+
+        self.written = 0
+        self.failed = 0
+        self.batches = 0
+
+    @property
+    def running(self) -> bool:
+        return self._accepting and self._worker is not None and not self._worker.done()
+
+    # ==========================================
+    # CICLO DE VIDA
+    # ==========================================
+
+    def start(self) -> Optional[asyncio.Task]:
+        """Arranca el worker en el event loop actual (startup)."""
+        if self.running:
+            return self._worker
+        if self._session_factory is None:
+            from config.database_connection import SessionLocal
+            self._session_factory = SessionLocal
+        self._queue = asyncio.Queue(maxsize=self.max_size)
+        self._accepting = True
+        self._worker = asyncio.get_running_loop().create_task(self._run())
+        logger.info(f"📝 Persistencia diferida de chat activa (cola máx. {self.max_size})")
+        return self._worker
+
+    async def stop(self, timeout: Optional[float] = None) -> None:
+        """Deja de aceptar intercambios y espera a que el worker vacíe la cola (shutdown)."""
+        if self._worker is None or self._queue is None:
+            return
+        self._accepting = False
+        timeout = timeout if timeout is not None else settings.CHAT_PERSIST_SHUTDOWN_TIMEOUT_SECONDS
+        pending = self._queue.qsize()
+        try:
+            await asyncio.wait_for(self._queue.put(_STOP), timeout=timeout)
+            await asyncio.wait_for(asyncio.shield(self._worker), timeout=timeout)
+            if pending:
+                logger.info(f"📝 Cola de chat vaciada al cerrar ({pending} intercambios)")
+        except asyncio.TimeoutError:
+            lost = self._queue.qsize()
+            logger.error(f"❌ Timeout vaciando la cola de chat; se descartan {lost} intercambios")
+            self._worker.cancel()
+        finally:
+            self._worker = None
+
+    # ==========================================
+    # API PÚBLICA
+    # ==========================================
+
+    async def submit(self, conversation_id: int, messages: Sequence[Dict[str, Any]]) -> bool:
+        """
+        Encola un intercambio ya asignado a una conversación existente.
+
+        Retorna False si la cola no está activa o sigue llena tras el timeout:
+        el llamador debe escribir inline.
+        """
+        if not self.running:
+            return False
+        item: PendingExchange = (conversation_id, [self._stamp(m) for m in messages])
+        try:
+            self._queue.put_nowait(item)
+        except asyncio.QueueFull:
+            try:
+                await asyncio.wait_for(self._queue.put(item), timeout=self.enqueue_timeout)
+            except asyncio.TimeoutError:
+                logger.warning("⚠️ Cola de chat llena; escribiendo el intercambio inline")
+                return False
+        set_chat_persist_queue_depth(self._queue.qsize())
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self.running,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "max_size": self.max_size,
+            "written": self.written,
+            "failed": self.failed,
+            "batches": self.batches,
+        }
+
+    # ==========================================
+    # WORKER
+    # ==========================================
+
+    async def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            item = await self._queue.get()
+            if item is _STOP:
+                break
+            batch: List[PendingExchange] = [item]
+            # Agrupar lo que ya esté en cola (sin esperar: a poca carga, lotes de 1)
+            while len(batch) < self.batch_size:
+                try:
+                    nxt = self._queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    break
+                if nxt is _STOP:
+                    stopping = True
+                    break
+                batch.append(nxt)
+            try:
+                written = await asyncio.to_thread(self._write_batch, batch)
+            except Exception:
+                written = []
+                logger.exception("Error inesperado en el worker de persistencia de chat")
+            set_chat_persist_queue_depth(self._queue.qsize())
+            self._notify_written(written)
+
+    @staticmethod
+    def _notify_written(conversation_ids: Sequence[int]) -> None:
+        """Programa la revisión del resumen una vez escritos los mensajes (no antes)."""
+        from services.conversation_summarizer import get_conversation_summarizer
+
+        summarizer = get_conversation_summarizer()
+        for conversation_id in conversation_ids:
+            summarizer.note_exchange(conversation_id)
+
+    def _write_batch(self, batch: Sequence[PendingExchange]) -> List[int]:
+        """Escribe el lote; retorna las conversaciones de los intercambios persistidos."""
+        from models.database import ChatMessage
+
+        db = self._session_factory()
+        try:
+            try:
+                db.add_all(self._rows(ChatMessage, batch))
+                db.commit()
+                count = sum(len(messages) for _, messages in batch)
+                self.written += count
+                self.batches += 1
+                record_chat_persist("batch", count)
+                return [convo_id for convo_id, _ in batch]
+            except Exception as e:
+                db.rollback()
+                if len(batch) == 1:
+                    raise
+                logger.warning(f"⚠️ Lote de chat falló ({e}); reintentando uno a uno")
+            written: List[int] = []
+            for exchange in batch:
+                try:
+                    db.add_all(self._rows(ChatMessage, [exchange]))
+                    db.commit()
+                    self.written += len(exchange[1])
+                    written.append(exchange[0])
+                    record_chat_persist("batch", len(exchange[1]))
+                except Exception:
+                    db.rollback()
+                    self.failed += len(exchange[1])
+                    record_chat_persist("error", len(exchange[1]))
+                    logger.exception(f"Error al persistir mensajes de la conversación {exchange[0]}")
+            return written
+        except Exception:
+            failed = sum(len(messages) for _, messages in batch)
+            self.failed += failed
+            record_chat_persist("error", failed)
+            logger.exception("Error al persistir lote de chat")
+            return []
+        finally:
+            db.close()
+
+    @staticmethod
+    def _rows(model, batch: Sequence[PendingExchange]) -> List[Any]:
+        return [
+            model(conversation_id=convo_id, role=m["role"], content=m["content"], created_at=m["created_at"])
+            for convo_id, messages in batch
+            for m in messages
+        ]
+
+    @staticmethod
+    def _stamp(message: Dict[str, Any]) -> Dict[str, Any]:
+        # created_at se fija al encolar: el orden del historial no depende de cuándo se escribe
+        return {**message, "created_at": message.get("created_at") or datetime.utcnow()}
+
+
+# Instancia global (arrancada/detenida en el lifespan de main.py)
+chat_persistence_queue = ChatPersistenceQueue()
+
+
+def get_chat_persistence_queue() -> ChatPersistenceQueue:
+    """Función helper para obtener la cola de persistencia de chat"""
+    return chat_persistence_queue
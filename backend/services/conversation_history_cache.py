@@ -0,0 +1,183 @@
+"""
+Cache en memoria del historial reciente de cada conversación del mentor
+
+Por conversación se guarda un buffer circular (deque con maxlen) con los
+últimos `window` mensajes {"role", "content"}; las conversaciones se expulsan
+en orden LRU al superar `max_conversations`.
+
+- Se llena desde la DB con una consulta descendente con LIMIT (índice
+  compuesto conversation_id, created_at) y se actualiza al persistir cada
+  intercambio, así que leer el historial es O(limit) y casi siempre sin DB.
+- `complete` indica que el buffer contiene la conversación entera (menos
+  mensajes que la ventana); si no, solo responde a ventanas <= lo cacheado.
+- Con resúmenes (services/conversation_summarizer.py) guarda también el
+  resumen, cuántos mensajes cubre y el total de mensajes, para saber qué cola
+  del historial aún no está resumida sin volver a la DB.
+
+La cache es por proceso: con varios workers cada uno mantiene la suya y, como
+solo se añaden mensajes (nunca se editan), el peor caso es un fallo de cache.
+"""
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, List, Optional, Sequence, Tuple
+import threading
+
+from config.settings import settings
+
+
+class _History:
+    __slots__ = ("messages", "complete", "summary", "summary_covered", "total")
+
+    def __init__(
+        self,
+        window: int,
+        messages: Sequence[Dict[str, Any]],
+        complete: bool,
+        summary: Optional[str] = None,
+        summary_covered: int = 0,
+        total: Optional[int] = None,
+    ):
+        self.messages: Deque[Dict[str, Any]] = deque(messages, maxlen=window)
+        self.complete = complete
+        self.summary = summary
+        self.summary_covered = summary_covered
+        # Mensajes de la conversación en total (None = desconocido)
+        self.total = total
+
+
+class ConversationHistoryCache:
+    """Buffers circulares de historial por conversation_id, con expulsión LRU."""
+
+    def __init__(self, window: Optional[int] = None, max_conversations: Optional[int] = None):
+        self.window = window if window is not None else settings.CONVERSATION_HISTORY_WINDOW
+        self.max_conversations = (
+            max_conversations if max_conversations is not None else settings.CONVERSATION_HISTORY_CACHE_MAX_CONVERSATIONS
+        )
+        self.enabled = self.window > 0 and self.max_conversations > 0
+        self._items: "OrderedDict[int, _History]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    # ==========================================
+    # API PÚBLICA
+    # ==========================================
+
+    def get(self, conversation_id: int, limit: int) -> Optional[List[Dict[str, Any]]]:
+        """Últimos `limit` mensajes (orden cronológico) o None si la cache no los cubre."""
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._items.get(conversation_id)
+            if entry is None or (len(entry.messages) < limit and not entry.complete):
+                self.misses += 1
+                return None
+            self._items.move_to_end(conversation_id)
+            self.hits += 1
+            messages = list(entry.messages)
+        return messages[-limit:] if limit > 0 else []
+
+    def load(
+        self,
+        conversation_id: int,
+        messages: Sequence[Dict[str, Any]],
+        complete: bool,
+        summary: Optional[str] = None,
+        summary_covered: int = 0,
+        total: Optional[int] = None,
+    ) -> None:
+        """Reemplaza el buffer con mensajes leídos de la DB (orden cronológico)."""
+        if not self.enabled:
+            return
+        if total is None and complete:
+            total = len(messages)
+        with self._lock:
+            self._items[conversation_id] = _History(
+                self.window, messages, complete, summary, summary_covered, total
+            )
+            self._items.move_to_end(conversation_id)
+            self._evict()
+
+    def append(self, conversation_id: int, messages: Sequence[Dict[str, Any]], new: bool = False) -> None:
+        """
+        Añade mensajes recién persistidos.
+
+        Si la conversación no estaba cacheada solo se crea el buffer cuando es
+        nueva (`new`): de lo contrario faltarían los mensajes anteriores.
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            entry = self._items.get(conversation_id)
+            if entry is None:
+                if not new:
+                    return
+                entry = _History(self.window, (), complete=True, total=0)
+                self._items[conversation_id] = entry
+            # Al desbordar el buffer ya no contiene la conversación entera
+            if len(entry.messages) + len(messages) > self.window:
+                entry.complete = False
+            entry.messages.extend(messages)
+            if entry.total is not None:
+                entry.total += len(messages)
+            self._items.move_to_end(conversation_id)
+            self._evict()
+
+    def get_summary(self, conversation_id: int) -> Optional[Tuple[Optional[str], int, int]]:
+        """(resumen, mensajes que cubre, total de mensajes) o None si la cache no lo sabe."""
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._items.get(conversation_id)
+            if entry is None or entry.total is None:
+                return None
+            return entry.summary, entry.summary_covered, entry.total
+
+    def set_summary(self, conversation_id: int, summary: Optional[str], covered: int) -> None:
+        """Actualiza el resumen tras una revisión (si la conversación está cacheada)."""
+        if not self.enabled:
+            return
+        with self._lock:
+            entry = self._items.get(conversation_id)
+            if entry is not None:
+                entry.summary = summary
+                entry.summary_covered = covered
+
+    def invalidate(self, conversation_id: Optional[int] = None) -> int:
+        with self._lock:
+            if conversation_id is None:
+                removed = len(self._items)
+                self._items.clear()
+                return removed
+            return 1 if self._items.pop(conversation_id, None) is not None else 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            size = len(self._items)
+        total = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "conversations": size,
+            "max_conversations": self.max_conversations,
+            "window": self.window,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
+
+    # ==========================================
+    # INTERNOS
+    # ==========================================
+
+    def _evict(self) -> None:
+        while len(self._items) > self.max_conversations:
+            self._items.popitem(last=False)
+
+
+# Instancia global (compartida por todas las instancias de RAGService)
+conversation_history_cache = ConversationHistoryCache()
+
+
+def get_conversation_history_cache() -> ConversationHistoryCache:
+    """Función helper para obtener la cache de historial de conversaciones"""
+    return conversation_history_cache
@@ -0,0 +1,288 @@
+"""
+Resúmenes incrementales de las conversaciones del mentor
+
+El prompt usa resumen + últimos turnos en lugar de un historial que crece sin
+límite, así que su tamaño (y la latencia del LLM) no depende de la longitud de
+la conversación:
+
+- Cuando un intercambio ya está escrito en la DB (tras el lote de la cola
+  write-behind, o tras la escritura inline) se programa una revisión en
+  segundo plano (fuera de la ruta de respuesta) si los mensajes sin resumir llegan a
+  `history_window` (KEEP_MESSAGES + 2 * EVERY_EXCHANGES), es decir, cada
+  CONVERSATION_SUMMARY_EVERY_EXCHANGES intercambios. Se sabe por la cache de
+  historial; si la conversación no está cacheada, se revisa la primera vez
+  que se ve y luego cada EVERY_EXCHANGES intercambios.
+- La revisión condensa los mensajes más antiguos (todos salvo los últimos
+  CONVERSATION_SUMMARY_KEEP_MESSAGES) junto al resumen anterior con una
+  llamada al LLM (purpose "summary") y lo guarda en
+  ChatConversation.summary / summary_message_count (migración 006).
+- Es trabajo de baja prioridad: usa su propio carril en el gobernador de
+  OpenAI y, si la ruta de petición está esperando hueco o cuota, la revisión
+  se salta y se repite con un intercambio posterior.
+- La actualización es optimista (solo si summary_message_count no cambió), de
+  modo que dos workers no pueden avanzar el resumen dos veces.
+
+Así, los mensajes sin resumir nunca superan `history_window` (salvo el desfase
+de una revisión en curso) y el historial del prompt es resumen + esa ventana.
+"""
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+import asyncio
+import logging
+
+from config.settings import settings
+from services.metrics import record_conversation_summary
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_SYSTEM_PROMPT = (
+    "Resumes conversaciones entre un estudiante de Bora (lengua indígena amazónica) y su Mentor.\n"
+    "Actualiza el resumen anterior con los nuevos turnos. Conserva:\n"
+    "- Palabras y frases en Bora ya enseñadas, con su traducción\n"
+    "- Objetivos, nivel y dudas pendientes del estudiante\n"
+    "No inventes nada que no esté en los turnos. Máximo 120 palabras, en un solo párrafo, sin encabezados."
+)
+
+# Caracteres por mensaje que se envían al resumidor (acota el coste de respuestas largas)
+_MAX_MESSAGE_CHARS = 1200
+
+
+def summary_history_message(summary: str) -> Dict[str, str]:
+    """Entrada de historial con el resumen (va tras el system prompt estático)."""
+    return {
+        "role": "system",
+        "content": f"Resumen de la conversación anterior (contexto, no lo repitas): {summary}",
+    }
+
+
+class ConversationSummarizer:
+    """Revisiones en segundo plano que mantienen el resumen de cada conversación."""
+
+    def __init__(
+        self,
+        every_exchanges: Optional[int] = None,
+        keep_messages: Optional[int] = None,
+        max_tokens: Optional[int] = None,
+        enabled: Optional[bool] = None,
+        session_factory: Optional[Callable[[], Any]] = None,
+    ):
+        self.enabled = settings.CONVERSATION_SUMMARY_ENABLED if enabled is None else enabled
+        self.every_exchanges = max(
+            1, every_exchanges if every_exchanges is not None else settings.CONVERSATION_SUMMARY_EVERY_EXCHANGES
+        )
+        self.keep_messages = max(
+            1, keep_messages if keep_messages is not None else settings.CONVERSATION_SUMMARY_KEEP_MESSAGES
+        )
+        self.max_tokens = max_tokens if max_tokens is not None else settings.CONVERSATION_SUMMARY_MAX_TOKENS
+        self._session_factory = session_factory
+        # Intercambios desde la última revisión, por conversación (LRU acotado)
+        self._since_check: "OrderedDict[int, int]" = OrderedDict()
+        self._max_tracked = max(1, settings.CONVERSATION_HISTORY_CACHE_MAX_CONVERSATIONS)
+        self._in_flight: Set[int] = set()
+        self._tasks: Set[asyncio.Task] = set()
+
+        self.summaries = 0
+        self.skipped = 0
+        self.failed = 0
+
+    @property
+    def history_window(self) -> int:
+        """Mensajes sin resumir que puede haber como mucho: los que se conservan + K intercambios."""
+        return self.keep_messages + 2 * self.every_exchanges
+
+    # ==========================================
+    # API PÚBLICA
+    # ==========================================
+
+    def note_exchange(self, conversation_id: Optional[int]) -> Optional[asyncio.Task]:
+        """Registra un intercambio ya escrito en la DB y programa una revisión si toca."""
+        if not self.enabled or not conversation_id:
+            return None
+        if not self._due(conversation_id) or conversation_id in self._in_flight:
+            return None
+        self._in_flight.add(conversation_id)
+        task = asyncio.get_running_loop().create_task(self._review(conversation_id))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def stop(self) -> None:
+        """Cancela las revisiones en curso (shutdown); se repetirán con el próximo intercambio."""
+        for task in list(self._tasks):
+            task.cancel()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "every_exchanges": self.every_exchanges,
+            "keep_messages": self.keep_messages,
+            "history_window": self.history_window,
+            "in_flight": len(self._in_flight),
+            "summaries": self.summaries,
+            "skipped": self.skipped,
+            "failed": self.failed,
+        }
+
+    # ==========================================
+    # INTERNOS
+    # ==========================================
+
+    async def _review(self, conversation_id: int) -> None:
+        try:
+            if self._request_path_busy():
+                self.skipped += 1
+                record_conversation_summary("skipped")
+                logger.debug(f"Resumen de la conversación {conversation_id} aplazado: OpenAI ocupado")
+                return
+            pending = await asyncio.to_thread(self._load_pending, conversation_id)
+            if pending is None:
+                self.skipped += 1
+                record_conversation_summary("skipped")
+                return
+            previous, covered, messages = pending
+            summary = await self._summarize(previous, messages)
+            if not summary:
+                self.failed += 1
+                record_conversation_summary("error")
+                return
+            new_covered = covered + len(messages)
+            if await asyncio.to_thread(self._store, conversation_id, covered, new_covered, summary):
+                from services.conversation_history_cache import get_conversation_history_cache
+
+                get_conversation_history_cache().set_summary(conversation_id, summary, new_covered)
+                self.summaries += 1
+                record_conversation_summary("ok")
+                logger.info(
+                    f"📝 Resumen de la conversación {conversation_id} actualizado "
+                    f"({new_covered} mensajes cubiertos)"
+                )
+            else:
+                self.skipped += 1
+                record_conversation_summary("skipped")
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self.failed += 1
+            record_conversation_summary("error")
+            logger.exception(f"Error resumiendo la conversación {conversation_id}")
+        finally:
+            self._in_flight.discard(conversation_id)
+
+    @staticmethod
+    def _request_path_busy() -> bool:
+        """Las llamadas de usuarios esperan hueco o cuota en el gobernador: ceder."""
+        if not settings.OPENAI_API_KEY:
+            return False
+        from adapters.openai_rate_governor import get_openai_rate_governor
+
+        return get_openai_rate_governor().request_path_contended()
+
+    def _due(self, conversation_id: int) -> bool:
+        from services.conversation_history_cache import get_conversation_history_cache
+
+        info = get_conversation_history_cache().get_summary(conversation_id)
+        if info is not None:
+            _, covered, total = info
+            return total - covered >= self.history_window
+        # Sin datos en cache: la primera vez y luego cada every_exchanges intercambios
+        seen = conversation_id in self._since_check
+        count = self._since_check.pop(conversation_id, 0) + 1
+        due = not seen or count >= self.every_exchanges
+        self._since_check[conversation_id] = 0 if due else count
+        self._evict()
+        return due
+
+    def _session(self):
+        if self._session_factory is None:
+            from config.database_connection import SessionLocal
+            self._session_factory = SessionLocal
+        return self._session_factory()
+
+    def _load_pending(self, conversation_id: int) -> Optional[Tuple[Optional[str], int, List[Dict[str, str]]]]:
+        """(resumen anterior, mensajes cubiertos, mensajes a resumir) o None si aún no toca."""
+        from models.database import ChatConversation, ChatMessage
+
+        # Columnas sin mapear en el ORM (ver ChatConversation): se consultan vía la tabla
+        columns = ChatConversation.__table__.c
+        db = self._session()
+        try:
+            conversation = (
+                db.query(columns.summary, columns.summary_message_count)
+                .filter(columns.id == conversation_id)
+                .first()
+            )
+            if conversation is None:
+                return None
+            covered = conversation.summary_message_count or 0
+            total = db.query(ChatMessage.id).filter(ChatMessage.conversation_id == conversation_id).count()
+            if total - covered < self.history_window:
+                return None
+            rows = (
+                db.query(ChatMessage.role, ChatMessage.content)
+                .filter(ChatMessage.conversation_id == conversation_id)
+                .order_by(ChatMessage.created_at.asc(), ChatMessage.id.asc())
+                .offset(covered)
+                .limit(total - covered - self.keep_messages)
+                .all()
+            )
+            return conversation.summary, covered, [{"role": r.role, "content": r.content} for r in rows]
+        finally:
+            db.close()
+
+    async def _summarize(self, previous: Optional[str], messages: List[Dict[str, str]]) -> Optional[str]:
+        if not settings.OPENAI_API_KEY:
+            return None
+        from adapters.openai_adapter import get_openai_adapter
+
+        turns = "\n".join(
+            f"{'Estudiante' if m['role'] == 'user' else 'Mentor'}: {(m['content'] or '')[:_MAX_MESSAGE_CHARS]}"
+            for m in messages
+        )
+        user = (
+            f"Resumen anterior:\n{previous or '(ninguno)'}\n\n"
+            f"Nuevos turnos:\n{turns}\n\n"
+            "Resumen actualizado:"
+        )
+        response = await get_openai_adapter().chat_completion(
+            messages=[{"role": "system", "content": SUMMARY_SYSTEM_PROMPT}, {"role": "user", "content": user}],
+            temperature=0.2,
+            max_tokens=self.max_tokens,
+            purpose="summary",
+        )
+        return (response or "").strip() or None
+
+    def _store(self, conversation_id: int, covered: int, new_covered: int, summary: str) -> bool:
+        """Guarda el resumen solo si nadie lo avanzó desde que se leyó (actualización optimista)."""
+        from sqlalchemy import update
+        from models.database import ChatConversation
+
+        table = ChatConversation.__table__
+        db = self._session()
+        try:
+            result = db.execute(
+                update(table)
+                .where(table.c.id == conversation_id, table.c.summary_message_count == covered)
+                .values(summary=summary, summary_message_count=new_covered)
+            )
+            db.commit()
+            return bool(result.rowcount)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _evict(self) -> None:
+        while len(self._since_check) > self._max_tracked:
+            self._since_check.popitem(last=False)
+
+
+# Instancia global (compartida por todas las instancias de RAGService)
+conversation_summarizer = ConversationSummarizer()
+
+
+def get_conversation_summarizer() -> ConversationSummarizer:
+    """Función helper para obtener el resumidor de conversaciones"""
+    return conversation_summarizer
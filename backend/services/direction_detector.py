@@ -0,0 +1,216 @@
+"""
+Detector determinista de dirección de traducción para MIAPPBORA
+Clasifica consultas ES→Bora / Bora→ES sin llamar al LLM cuando hay señales claras
+
+Señales (las mismas que usaba el prompt del clasificador LLM):
+- Frases guía: "cómo se dice X", "X en bora" → ES→Bora; "qué significa X", "X al español" → Bora→ES
+- Caracteres propios del Bora: ɨ, ʉ, acento combinante suelto (U+0301), varias vocales
+  acentuadas en una misma palabra, oclusivas preaspiradas (j + consonante: "majtsíva")
+- Pertenencia del término a los lemas conocidos de cada diccionario (lexicon_lemmas,
+  cargados por services/lemma_map.py)
+
+Solo cuando las señales faltan o se contradicen se delega al LLM.
+"""
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+import logging
+import re
+import threading
+import unicodedata
+
+logger = logging.getLogger(__name__)
+
+DIRECTION_ES_BORA = "es_bora"
+DIRECTION_BORA_ES = "bora_es"
+
+# Peso de cada tipo de señal y margen mínimo para decidir sin LLM
+_PHRASE_WEIGHT = 3
+_BORA_CHAR_WEIGHT = 3
+_LEMMA_WEIGHT = 2
+_CONFIDENT_MARGIN = 2
+
+_ES_BORA_PATTERNS = [
+    re.compile(r"\bc[oó]mo\s+(se\s+)?(dice|digo|decir|escribe|llama)\b"),
+    re.compile(r"\b(en|al)\s+(idioma\s+|lengua\s+)?bora\b"),
+    re.compile(r"\btraduc\w*\b.*\bal\s+bora\b"),
+    re.compile(r"\bpalabra\s+bora\s+(para|de)\b"),
+]
+_BORA_ES_PATTERNS = [
+    re.compile(r"\bqu[eé]\s+(significa|quiere\s+decir)\b"),
+    re.compile(r"\bsignificado\s+de\b"),
+    re.compile(r"\b(al|en)\s+(espa[nñ]ol|castellano)\b"),
+]
+
+# Palabras de las frases guía que no forman parte del término consultado
+_STOPWORDS = {
+    "como", "cómo", "se", "dice", "digo", "decir", "escribe", "llama", "que", "qué",
+    "significa", "quiere", "significado", "es", "en", "al", "a", "el", "la", "los", "las",
+    "un", "una", "de", "del", "y", "o", "bora", "español", "espanol", "castellano",
+    "idioma", "lengua", "traducir", "traduce", "traduceme", "tradúceme", "traducción",
+    "traduccion", "palabra", "frase", "para", "por", "favor", "me", "puedes", "podrías",
+}
+
+_TOKEN_RE = re.compile(r"[^\W\d_][\w\u0300-\u036f]*")
+_BORA_LETTERS_RE = re.compile(r"[ɨʉƗɄ]")
+_PREASPIRATED_RE = re.compile(r"j[ptkcb]")
+_ACCENTED_VOWELS = set("áéíóúÁÉÍÓÚ")
+
+
+def normalize_term(text: str) -> str:
+    """Clave de comparación con los lemas: NFC + minúsculas + espacios colapsados."""
+    text = unicodedata.normalize("NFC", text or "").casefold()
+    return " ".join(text.split()).strip(" \t\"'¿?¡!.,;:«»“”")
+
+
+def query_terms(query: str) -> List[str]:
+    """Tokens del término consultado, sin las frases guía ("cómo se dice", "en bora"...)."""
+    text = unicodedata.normalize("NFC", query or "").casefold()
+    return [t for t in _TOKEN_RE.findall(text) if t not in _STOPWORDS]
+
+
+def _has_bora_characters(term: str) -> bool:
+    """Caracteres u ortografía que no aparecen en palabras españolas."""
+    if _BORA_LETTERS_RE.search(term):
+        return True
+    # Tras NFC el acento solo queda combinante si no existe forma precompuesta (p. ej. ɨ́, ʉ́)
+    if "\u0301" in term:
+        return True
+    if _PREASPIRATED_RE.search(term):
+        return True
+    for token in _TOKEN_RE.findall(term):
+        if sum(1 for ch in token if ch in _ACCENTED_VOWELS) >= 2:
+            return True
+    return False
+
+
+class DirectionDetector:
+    """
+    Clasificador local de dirección (microsegundos por consulta)
+
+    classify() retorna (dirección, confiable). Si confiable es False la
+    consulta es genuinamente ambigua y conviene consultar al LLM.
+    """
+
+    def __init__(self):
+        self._bora_lemmas: Set[str] = set()
+        self._es_lemmas: Set[str] = set()
+        self._lock = threading.Lock()
+
+        self.local_decisions = 0
+        self.llm_fallbacks = 0
+        self.unresolved = 0
+
+    # ==========================================
+    # LEMAS CONOCIDOS
+    # ==========================================
+
+    def set_lemmas(self, rows: Iterable[Dict[str, Any]]) -> int:
+        """Carga lemas desde filas {lemma, direction} (formato de lexicon_lemmas)."""
+        bora: Set[str] = set()
+        es: Set[str] = set()
+        for row in rows:
+            key = normalize_term(row.get("lemma") or "")
+            if not key:
+                continue
+            if row.get("direction") == DIRECTION_ES_BORA:
+                es.add(key)
+            else:
+                bora.add(key)
+        with self._lock:
+            self._bora_lemmas, self._es_lemmas = bora, es
+        logger.info(f"🧭 Detector de dirección: {len(bora)} lemas Bora, {len(es)} lemas ES")
+        return len(bora) + len(es)
+
+    def has_lemmas(self) -> bool:
+        return bool(self._bora_lemmas or self._es_lemmas)
+
+    # ==========================================
+    # CLASIFICACIÓN
+    # ==========================================
+
+    def classify(self, query: str) -> Tuple[Optional[str], bool]:
+        """
+        Clasifica la consulta con señales locales.
+
+        Returns:
+            (dirección, confiable): dirección es 'es_bora', 'bora_es' o None
+        """
+        text = unicodedata.normalize("NFC", query or "").casefold()
+        es_score = 0
+        bora_score = 0
+
+        if any(p.search(text) for p in _ES_BORA_PATTERNS):
+            es_score += _PHRASE_WEIGHT
+        if any(p.search(text) for p in _BORA_ES_PATTERNS):
+            bora_score += _PHRASE_WEIGHT
+
+        tokens = query_terms(text)
+        term = " ".join(tokens)
+
+        if term and _has_bora_characters(term):
+            bora_score += _BORA_CHAR_WEIGHT
+
+        if term:
+            es_hits, bora_hits = self._lemma_votes(term, tokens)
+            if bora_hits > es_hits:
+                bora_score += _LEMMA_WEIGHT
+            elif es_hits > bora_hits:
+                es_score += _LEMMA_WEIGHT
+
+        margin = abs(es_score - bora_score)
+        if margin < _CONFIDENT_MARGIN:
+            return None, False
+        direction = DIRECTION_ES_BORA if es_score > bora_score else DIRECTION_BORA_ES
+        return direction, True
+
+    def _lemma_votes(self, term: str, tokens: List[str]) -> Tuple[int, int]:
+        """Cuenta coincidencias exclusivas con cada diccionario (término completo o por token)."""
+        es_lemmas, bora_lemmas = self._es_lemmas, self._bora_lemmas
+        key = normalize_term(term)
+        in_es, in_bora = key in es_lemmas, key in bora_lemmas
+        if in_es != in_bora:
+            return (1, 0) if in_es else (0, 1)
+
+        es_hits = bora_hits = 0
+        for token in tokens:
+            t_es, t_bora = token in es_lemmas, token in bora_lemmas
+            if t_es and not t_bora:
+                es_hits += 1
+            elif t_bora and not t_es:
+                bora_hits += 1
+        return es_hits, bora_hits
+
+    # ==========================================
+    # ESTADÍSTICAS
+    # ==========================================
+
+    def record(self, source: str) -> None:
+        """Registra cómo se resolvió una consulta: 'local', 'llm' o 'unresolved'."""
+        if source == "local":
+            self.local_decisions += 1
+        elif source == "llm":
+            self.llm_fallbacks += 1
+        else:
+            self.unresolved += 1
+
+    def local_share(self) -> float:
+        total = self.local_decisions + self.llm_fallbacks + self.unresolved
+        return self.local_decisions / total if total else 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "bora_lemmas": len(self._bora_lemmas),
+            "es_lemmas": len(self._es_lemmas),
+            "local_decisions": self.local_decisions,
+            "llm_fallbacks": self.llm_fallbacks,
+            "unresolved": self.unresolved,
+            "local_share": round(self.local_share(), 4),
+        }
+
+
+# Instancia global (los lemas se cargan una sola vez por proceso)
+direction_detector = DirectionDetector()
+
+
+def get_direction_detector() -> DirectionDetector:
+    """Función helper para obtener el detector de dirección"""
+    return direction_detector
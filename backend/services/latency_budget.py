@@ -0,0 +1,188 @@
+"""
+Presupuesto de latencia (deadline_ms) para el pipeline RAG del lexicón
+
+Dos piezas:
+    LatencyEstimator -> EWMA de media y varianza por etapa (preprocessing_total,
+                        embedding, vector_search, examples_fetch, llm, ...),
+                        alimentado con los `timings` de cada petición. La
+                        estimación es media + 1 desviación (≈ p84), más
+                        conservadora que la media sola.
+    LatencyBudget    -> tiempo restante de una petición; decide si las etapas
+                        pendientes caben y registra las degradaciones aplicadas.
+
+Antes de tener observaciones (o si una etapa lleva mucho sin medirse) se usan
+priors fijos con el orden de magnitud de producción.
+"""
+from typing import Dict, List, Mapping, Optional, Sequence
+import math
+import threading
+import time
+
+from config.settings import settings
+from services.metrics import record_degradation
+
+# Degradaciones posibles, de menor a mayor impacto en la respuesta
+SKIP_PREPROCESSING = "skip_preprocessing"
+PREPROCESSING_TIMEOUT = "preprocessing_timeout"
+SKIP_EXAMPLES = "skip_examples"
+REDUCE_TOP_K = "reduce_top_k"
+SHRINK_MAX_TOKENS = "shrink_max_tokens"
+LLM_TIMEOUT = "llm_timeout"
+FALLBACK_ANSWER = "fallback_answer"
+
+# Priors (ms) hasta tener mediciones reales
+DEFAULT_PRIORS_MS: Dict[str, float] = {
+    "preprocessing_total": 350.0,
+    "embedding": 150.0,
+    "vector_search": 120.0,
+    "lexical": 5.0,
+    "lemma_lookup": 1.0,
+    "examples_fetch": 80.0,
+    "context_build": 1.0,
+    "llm": 1800.0,
+}
+
+# Etapas cuya medición deja de ser representativa con cada degradación
+_DEGRADED_STAGES: Dict[str, Sequence[str]] = {
+    SKIP_PREPROCESSING: ("preprocessing_total",),
+    PREPROCESSING_TIMEOUT: ("preprocessing_total",),
+    SKIP_EXAMPLES: ("examples_fetch",),
+    SHRINK_MAX_TOKENS: ("llm",),
+    LLM_TIMEOUT: ("llm",),
+    FALLBACK_ANSWER: ("llm",),
+}
+
+
+class LatencyEstimator:
+    """EWMA de latencia por etapa, compartida por todas las peticiones del proceso."""
+
+    def __init__(
+        self,
+        alpha: Optional[float] = None,
+        stale_seconds: Optional[float] = None,
+        priors_ms: Optional[Mapping[str, float]] = None,
+    ):
+        self.alpha = alpha if alpha is not None else settings.LATENCY_EWMA_ALPHA
+        self.stale_seconds = stale_seconds if stale_seconds is not None else settings.LATENCY_ESTIMATE_STALE_SECONDS
+        self.priors_ms = dict(priors_ms or DEFAULT_PRIORS_MS)
+        # etapa -> [media, varianza, muestras, última observación (monotonic)]
+        self._stats: Dict[str, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, stage: str, value_ms: float) -> None:
+        if value_ms is None or value_ms < 0 or math.isnan(value_ms):
+            return
+        now = time.monotonic()
+        with self._lock:
+            entry = self._stats.get(stage)
+            if entry is None or self._is_stale(entry, now):
+                self._stats[stage] = [float(value_ms), 0.0, 1.0, now]
+                return
+            mean, var, count, _ = entry
+            diff = value_ms - mean
+            incr = self.alpha * diff
+            entry[0] = mean + incr
+            entry[1] = (1.0 - self.alpha) * (var + diff * incr)
+            entry[2] = count + 1.0
+            entry[3] = now
+
+    def observe_timings(self, timings: Mapping[str, float], degradations: Sequence[str] = ()) -> None:
+        """Alimenta las etapas `<etapa>_ms` de un dict de timings, omitiendo las degradadas."""
+        skipped = {stage for kind in degradations for stage in _DEGRADED_STAGES.get(kind, ())}
+        for stage in self.priors_ms:
+            if stage in skipped:
+                continue
+            value = timings.get(f"{stage}_ms")
+            if value is not None:
+                self.observe(stage, value)
+
+    def estimate(self, stage: str) -> float:
+        """Latencia esperada (ms) de una etapa: media + 1 desviación, o el prior."""
+        entry = self._stats.get(stage)
+        if entry is None or self._is_stale(entry, time.monotonic()):
+            return self.priors_ms.get(stage, 0.0)
+        return entry[0] + math.sqrt(max(entry[1], 0.0))
+
+    def _is_stale(self, entry: List[float], now: float) -> bool:
+        return bool(self.stale_seconds) and now - entry[3] > self.stale_seconds
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            items = {stage: list(entry) for stage, entry in self._stats.items()}
+        return {
+            stage: {
+                "mean_ms": round(mean, 1),
+                "std_ms": round(math.sqrt(max(var, 0.0)), 1),
+                "estimate_ms": round(self.estimate(stage), 1),
+                "samples": int(count),
+            }
+            for stage, (mean, var, count, _) in items.items()
+        }
+
+
+class LatencyBudget:
+    """
+    Tiempo restante de una petición con deadline
+
+    `fits(...)` compara el restante (menos un margen de seguridad) con la suma
+    de las estimaciones de las etapas pendientes; `degrade(...)` anota una
+    degradación (una vez) y la cuenta en /metrics.
+    """
+
+    def __init__(
+        self,
+        deadline_ms: float,
+        started_at: Optional[float] = None,
+        estimator: Optional[LatencyEstimator] = None,
+    ):
+        self.deadline_ms = float(deadline_ms)
+        self.started_at = started_at if started_at is not None else time.perf_counter()
+        self.estimator = estimator or get_latency_estimator()
+        self.margin_ms = float(settings.DEADLINE_SAFETY_MARGIN_MS)
+        self.applied: List[str] = []
+
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self.started_at) * 1000.0
+
+    def remaining_ms(self) -> float:
+        return self.deadline_ms - self.elapsed_ms()
+
+    def llm_timeout_seconds(self) -> float:
+        """Tiempo restante menos el margen de seguridad (timeout de la llamada al LLM)."""
+        return max(0.0, (self.remaining_ms() - self.margin_ms) / 1000.0)
+
+    def estimate(self, *stages: str) -> float:
+        return sum(self.estimator.estimate(s) for s in stages)
+
+    def fits(self, *stages: str) -> bool:
+        return self.remaining_ms() - self.margin_ms >= self.estimate(*stages)
+
+    def degrade(self, kind: str) -> None:
+        if kind not in self.applied:
+            self.applied.append(kind)
+            record_degradation(kind)
+
+    def response_tokens(self, base_tokens: int) -> Optional[int]:
+        """
+        Tokens de salida que caben en el tiempo restante para el LLM.
+
+        Retorna base_tokens si la estimación completa cabe, una fracción
+        proporcional (>= DEADLINE_MIN_RESPONSE_TOKENS) si cabe parcialmente, o
+        None si ni la respuesta mínima cabe (usar el fallback determinista).
+        """
+        available = self.remaining_ms() - self.margin_ms
+        expected = self.estimator.estimate("llm")
+        if available >= expected:
+            return base_tokens
+        min_tokens = min(base_tokens, settings.DEADLINE_MIN_RESPONSE_TOKENS)
+        tokens = int(base_tokens * max(available, 0.0) / expected) if expected > 0 else base_tokens
+        return tokens if tokens >= min_tokens else None
+
+
+# Instancia global (las estimaciones se comparten entre peticiones)
+latency_estimator = LatencyEstimator()
+
+
+def get_latency_estimator() -> LatencyEstimator:
+    """Función helper para obtener el estimador de latencias"""
+    return latency_estimator
@@ -0,0 +1,209 @@
+"""
+Diccionario de lemas en memoria para MIAPPBORA
+Reemplaza las consultas find_lemma_by_text (una petición de red por búsqueda)
+
+Se carga una vez desde lexicon_lemmas (ambas direcciones) y se indexa por:
+    exacta  -> NFC sin espacios extra ("Cantar")
+    minúsc. -> NFC + casefold ("cantar")
+    plegada -> sin diacríticos, ɨ→i, ʉ→u ("majtsiva" encuentra "majtsíva")
+
+La búsqueda prueba las claves en ese orden, así que una coincidencia exacta
+gana sobre una plegada. Se refresca periódicamente (LEMMA_MAP_REFRESH_SECONDS)
+o desde el endpoint de admin, y alimenta también al detector de dirección.
+"""
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import asyncio
+import logging
+import threading
+import time
+import unicodedata
+
+from services.direction_detector import get_direction_detector, normalize_term
+from services.lexical_index import fold_text
+
+logger = logging.getLogger(__name__)
+
+LEMMA_COLUMNS = 'id, lemma, gloss_es, gloss_bora, direction, pos, pos_full, page'
+
+
+def _exact_key(text: str) -> str:
+    return " ".join(unicodedata.normalize("NFC", text or "").split())
+
+
+class LemmaMap:
+    """
+    Lemas indexados por texto exacto, en minúsculas y plegado
+
+    Las tres tablas se reemplazan de una vez en cada carga, así que los
+    lectores nunca ven un estado a medias.
+    """
+
+    def __init__(self):
+        self._exact: Dict[str, Dict[str, Any]] = {}
+        self._lower: Dict[str, Dict[str, Any]] = {}
+        self._folded: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._load_task: Optional[asyncio.Task] = None
+        self._refresh_task: Optional[asyncio.Task] = None
+        self.loaded_at: Optional[float] = None
+        self.lemma_count = 0
+
+        self.hits = 0
+        self.misses = 0
+
+    # ==========================================
+    # CARGA
+    # ==========================================
+
+    def is_loaded(self) -> bool:
+        return self.loaded_at is not None
+
+    def set_rows(self, rows: Iterable[Dict[str, Any]]) -> int:
+        """Indexa filas de lexicon_lemmas. Ante claves repetidas gana el id menor."""
+        exact: Dict[str, Dict[str, Any]] = {}
+        lower: Dict[str, Dict[str, Any]] = {}
+        folded: Dict[str, Dict[str, Any]] = {}
+        count = 0
+        for row in sorted(rows, key=lambda r: r.get('id') or 0):
+            lemma = row.get('lemma')
+            if not lemma:
+                continue
+            entry = {
+                'id': row.get('id'),
+                'lemma': lemma,
+                'gloss_es': row.get('gloss_es'),
+                'gloss_bora': row.get('gloss_bora'),
+                'direction': row.get('direction'),
+                'pos': row.get('pos'),
+                'pos_full': row.get('pos_full'),
+                'page': row.get('page'),
+            }
+            exact.setdefault(_exact_key(lemma), entry)
+            lower.setdefault(normalize_term(lemma), entry)
+            folded_key = fold_text(lemma)
+            if folded_key:
+                folded.setdefault(folded_key, entry)
+            count += 1
+
+        with self._lock:
+            self._exact, self._lower, self._folded = exact, lower, folded
+            self.lemma_count = count
+            self.loaded_at = time.time()
+        logger.info(f"📖 Mapa de lemas: {count} lemas ({len(folded)} claves plegadas)")
+        return count
+
+    def load_from_supabase(self, supabase_adapter) -> int:
+        """Descarga lexicon_lemmas (síncrono, para hilos) y actualiza también el detector."""
+        if not supabase_adapter or not supabase_adapter.is_connected():
+            logger.warning("⚠️ Mapa de lemas vacío: Supabase no conectado")
+            return 0
+        rows = supabase_adapter.fetch_all_lemmas(columns=LEMMA_COLUMNS)
+        if not rows:
+            # Conservar el mapa anterior si la descarga falló
+            return self.lemma_count
+        count = self.set_rows(rows)
+        get_direction_detector().set_lemmas(rows)
+        return count
+
+    async def refresh(self, supabase_adapter) -> int:
+        return await asyncio.to_thread(self.load_from_supabase, supabase_adapter)
+
+    def schedule_load(self, supabase_adapter, refresh_seconds: float = 0) -> Optional[asyncio.Task]:
+        """
+        Carga inicial en segundo plano y, si refresh_seconds > 0, refresco periódico.
+        """
+        if self._load_task and not self._load_task.done():
+            return self._load_task
+
+        async def _load():
+            try:
+                await self.refresh(supabase_adapter)
+            except Exception as e:
+                logger.warning(f"⚠️ No se pudo cargar el mapa de lemas: {e}")
+
+        async def _periodic():
+            while True:
+                await asyncio.sleep(refresh_seconds)
+                try:
+                    await self.refresh(supabase_adapter)
+                except Exception as e:
+                    logger.warning(f"⚠️ Refresco del mapa de lemas falló: {e}")
+
+        loop = asyncio.get_running_loop()
+        self._load_task = loop.create_task(_load())
+        if refresh_seconds and refresh_seconds > 0 and not self._refresh_task:
+            self._refresh_task = loop.create_task(_periodic())
+        return self._load_task
+
+    def stop(self) -> None:
+        """Cancela el refresco periódico (shutdown)."""
+        for task in (self._refresh_task, self._load_task):
+            if task and not task.done():
+                task.cancel()
+        self._refresh_task = None
+
+    # ==========================================
+    # BÚSQUEDA
+    # ==========================================
+
+    def lookup(self, text: str) -> Optional[Dict[str, Any]]:
+        """Lema para `text` probando clave exacta, en minúsculas y plegada."""
+        match, _ = self.lookup_with_kind(text)
+        return match
+
+    def lookup_with_kind(self, text: str) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+        """Como lookup, indicando qué clave coincidió ('exact', 'lower' o 'folded')."""
+        entry, kind = self._find(text)
+        self._count(entry)
+        return entry, kind
+
+    def lookup_any(self, candidates: List[str]) -> Optional[Dict[str, Any]]:
+        """Primer lema encontrado entre varias formas de la consulta (cuenta como una búsqueda)."""
+        entry = None
+        for text in candidates:
+            entry, _ = self._find(text)
+            if entry is not None:
+                break
+        self._count(entry)
+        return entry
+
+    def _find(self, text: str) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+        if not text:
+            return None, None
+        for kind, table, key in (
+            ('exact', self._exact, _exact_key(text)),
+            ('lower', self._lower, normalize_term(text)),
+            ('folded', self._folded, fold_text(text)),
+        ):
+            entry = table.get(key) if key else None
+            if entry is not None:
+                return entry, kind
+        return None, None
+
+    def _count(self, entry: Optional[Dict[str, Any]]) -> None:
+        if entry is not None:
+            self.hits += 1
+        else:
+            self.misses += 1
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "loaded": self.is_loaded(),
+            "lemmas": self.lemma_count,
+            "keys_exact": len(self._exact),
+            "keys_folded": len(self._folded),
+            "loaded_at": self.loaded_at,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+# Instancia global (una carga por proceso)
+lemma_map = LemmaMap()
+
+
+def get_lemma_map() -> LemmaMap:
+    """Función helper para obtener el mapa de lemas"""
+    return lemma_map
@@ -0,0 +1,294 @@
+"""
+Índice léxico en proceso para el lexicón Bora (BM25 sobre n-gramas de caracteres)
+Complementa la búsqueda vectorial: los embeddings representan mal palabras
+Bora cortas y llenas de diacríticos ("áábukɨ", "tsʉ́bɨ").
+
+- Documentos: las mismas filas que devuelve match_bora_docs_v2 (lemma, subentry, example)
+- Campos: lemma (peso 3), gloss_es, gloss_bora, bora_text, spanish_text (peso 1)
+- Texto plegado: NFKD sin marcas combinantes, ɨ→i, ʉ→u, minúsculas
+  ("aabuki" encuentra "áábukɨ")
+- Fuente: metadata.json del snapshot local si existe; si no, Supabase (sin embeddings)
+
+Los resultados se combinan con los de la búsqueda vectorial mediante
+reciprocal-rank fusion (ver reciprocal_rank_fusion).
+"""
+from collections import Counter, defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+import asyncio
+import json
+import logging
+import math
+import re
+import threading
+import time
+import unicodedata
+
+import numpy as np
+
+from config.settings import settings
+from adapters.local_vector_adapter import (
+    EXTRA_COLUMNS,
+    METADATA_FILE,
+    RESULT_COLUMNS,
+    fetch_bora_doc_rows,
+    resolve_snapshot_dir,
+)
+from services.direction_detector import query_terms
+
+logger = logging.getLogger(__name__)
+
+# Campos indexados y su peso (frecuencia de término multiplicada)
+FIELD_WEIGHTS: Sequence[Tuple[str, int]] = (
+    ('lemma', 3),
+    ('gloss_es', 1),
+    ('gloss_bora', 1),
+    ('bora_text', 1),
+    ('spanish_text', 1),
+)
+
+# Parámetros BM25 estándar
+_BM25_K1 = 1.2
+_BM25_B = 0.75
+
+_FOLD_MAP = str.maketrans({"ɨ": "i", "Ɨ": "i", "ʉ": "u", "Ʉ": "u"})
+_NON_WORD_RE = re.compile(r"[^\w]+")
+
+
+def fold_text(text: str) -> str:
+    """Plegado para comparar sin diacríticos: 'Tsʉ́bɨ' -> 'tsubi'."""
+    decomposed = unicodedata.normalize("NFKD", (text or "").translate(_FOLD_MAP))
+    stripped = "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return _NON_WORD_RE.sub(" ", stripped.casefold().translate(_FOLD_MAP)).strip()
+
+
+def char_ngrams(text: str, n: int) -> List[str]:
+    """N-gramas por palabra con marcas de borde (' can', 'ant', ...)."""
+    grams: List[str] = []
+    for word in fold_text(text).split():
+        padded = f" {word} "
+        if len(padded) <= n:
+            grams.append(padded)
+            continue
+        grams.extend(padded[i:i + n] for i in range(len(padded) - n + 1))
+    return grams
+
+
+def reciprocal_rank_fusion(
+    ranked_lists: Sequence[Sequence[Dict[str, Any]]],
+    k: int = 60,
+    key: str = 'id',
+) -> List[Dict[str, Any]]:
+    """
+    Fusiona listas ordenadas por RRF: score(d) = Σ 1 / (k + rank_i(d)).
+
+    Se conserva la primera versión de cada documento (la lista vectorial va
+    primero para mantener su `similarity`) y se anota `rrf_score`. En empate
+    manda el orden de las listas de entrada.
+    """
+    fused: Dict[Any, Dict[str, Any]] = {}
+    scores: Dict[Any, float] = defaultdict(float)
+    for ranked in ranked_lists:
+        for rank, row in enumerate(ranked, 1):
+            doc_key = row.get(key)
+            scores[doc_key] += 1.0 / (k + rank)
+            if doc_key in fused:
+                # Completar con campos que solo trae la otra lista (p. ej. lexical_score)
+                for field, value in row.items():
+                    fused[doc_key].setdefault(field, value)
+            else:
+                fused[doc_key] = dict(row)
+    ordered = sorted(fused, key=lambda d: scores[d], reverse=True)
+    results = []
+    for doc_key in ordered:
+        row = fused[doc_key]
+        row['rrf_score'] = round(scores[doc_key], 6)
+        results.append(row)
+    return results
+
+
+class LexicalIndex:
+    """
+    BM25 sobre n-gramas de caracteres con postings precalculados
+
+    Cada posting guarda el peso BM25 final (idf · tf normalizado), así que una
+    búsqueda es una suma dispersa con NumPy por n-grama de la consulta.
+    """
+
+    def __init__(self, ngram_size: Optional[int] = None):
+        self.ngram_size = ngram_size or settings.LEXICAL_NGRAM_SIZE
+        self._lock = threading.Lock()
+        self._rows: List[Dict[str, Any]] = []
+        self._postings: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        self._pos_full: Optional[np.ndarray] = None
+        self._load_task: Optional[asyncio.Task] = None
+        self.source: Optional[str] = None
+        self.build_ms = 0.0
+
+    # ==========================================
+    # CONSTRUCCIÓN
+    # ==========================================
+
+    def is_loaded(self) -> bool:
+        return bool(self._rows)
+
+    def build(self, rows: Iterable[Dict[str, Any]], source: str = "rows") -> int:
+        """Construye el índice a partir de filas con RESULT_COLUMNS."""
+        t0 = time.perf_counter()
+        docs = [{col: row.get(col) for col in RESULT_COLUMNS} for row in rows]
+
+        doc_lengths = np.zeros(len(docs), dtype=np.float32)
+        term_freqs: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+        for i, doc in enumerate(docs):
+            counts: Counter = Counter()
+            for field, weight in FIELD_WEIGHTS:
+                for gram in char_ngrams(doc.get(field) or "", self.ngram_size):
+                    counts[gram] += weight
+            doc_lengths[i] = sum(counts.values())
+            for gram, tf in counts.items():
+                term_freqs[gram].append((i, tf))
+
+        n_docs = len(docs)
+        avg_len = float(doc_lengths.mean()) if n_docs else 0.0
+        postings: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        for gram, entries in term_freqs.items():
+            ids = np.fromiter((d for d, _ in entries), dtype=np.int32, count=len(entries))
+            tf = np.fromiter((t for _, t in entries), dtype=np.float32, count=len(entries))
+            df = len(entries)
+            idf = math.log(1.0 + (n_docs - df + 0.5) / (df + 0.5))
+            norm = _BM25_K1 * (1.0 - _BM25_B + _BM25_B * doc_lengths[ids] / (avg_len or 1.0))
+            postings[gram] = (ids, (idf * tf * (_BM25_K1 + 1.0) / (tf + norm)).astype(np.float32))
+
+        pos_full = np.asarray([d.get('pos_full') or '' for d in docs], dtype=str)
+        with self._lock:
+            self._rows = docs
+            self._postings = postings
+            self._pos_full = pos_full
+            self.source = source
+            self.build_ms = (time.perf_counter() - t0) * 1000.0
+
+        logger.info(
+            f"🔤 Índice léxico: {n_docs} docs, {len(postings)} n-gramas ({self.build_ms:.0f}ms, fuente={source})"
+        )
+        return n_docs
+
+    def load_from_snapshot(self, index_dir: Optional[str] = None) -> bool:
+        """Construye desde metadata.json del snapshot vectorial local (sin red)."""
+        snapshot_dir, _ = resolve_snapshot_dir(str(index_dir) if index_dir else None)
+        if snapshot_dir is None or not (snapshot_dir / METADATA_FILE).exists():
+            return False
+        path = snapshot_dir / METADATA_FILE
+        columns = json.loads(path.read_text(encoding='utf-8'))
+        count = len(columns.get('id', []))
+        rows = (
+            {col: columns[col][i] for col in RESULT_COLUMNS + EXTRA_COLUMNS if col in columns}
+            for i in range(count)
+        )
+        self.build(rows, source="snapshot")
+        return True
+
+    def load_from_supabase(self, supabase_adapter) -> bool:
+        """Descarga bora_docs + joins (sin embeddings). Síncrono: ejecutar en un hilo."""
+        if not supabase_adapter or not supabase_adapter.is_connected():
+            return False
+        rows, _, _ = fetch_bora_doc_rows(supabase_adapter.client, emb_col=None)
+        self.build(rows, source="supabase")
+        return True
+
+    def load(self, supabase_adapter=None) -> bool:
+        """Snapshot local si existe; si no, Supabase."""
+        if self.load_from_snapshot():
+            return True
+        if self.load_from_supabase(supabase_adapter):
+            return True
+        logger.warning("⚠️ Índice léxico vacío: sin snapshot local ni Supabase")
+        return False
+
+    def schedule_load(self, supabase_adapter) -> Optional[asyncio.Task]:
+        """Construye el índice en segundo plano (no bloquea el arranque)."""
+        if self._load_task and not self._load_task.done():
+            return self._load_task
+
+        async def _load():
+            try:
+                await asyncio.to_thread(self.load, supabase_adapter)
+            except Exception as e:
+                logger.warning(f"⚠️ No se pudo construir el índice léxico: {e}")
+
+        self._load_task = asyncio.get_running_loop().create_task(_load())
+        return self._load_task
+
+    # ==========================================
+    # BÚSQUEDA
+    # ==========================================
+
+    def search(
+        self,
+        query: str,
+        top_k: int = 10,
+        pos_full: Optional[str] = None,
+        min_score_ratio: Optional[float] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Top-k BM25 para el término de la consulta (sin frases guía).
+
+        Solo se devuelven documentos con score >= min_score_ratio · mejor score,
+        para no diluir la fusión con coincidencias de un único n-grama.
+        """
+        with self._lock:
+            rows = self._rows
+            postings = self._postings
+            pos_arr = self._pos_full
+        if not rows or top_k <= 0:
+            return []
+
+        term = " ".join(query_terms(query)) or query
+        grams = Counter(char_ngrams(term, self.ngram_size))
+        if not grams:
+            return []
+
+        scores = np.zeros(len(rows), dtype=np.float32)
+        for gram, qtf in grams.items():
+            posting = postings.get(gram)
+            if posting is not None:
+                ids, weights = posting
+                scores[ids] += weights * qtf
+
+        if pos_full:
+            scores[pos_arr != pos_full] = 0.0
+        best = float(scores.max())
+        if best <= 0.0:
+            return []
+        ratio = settings.LEXICAL_MIN_SCORE_RATIO if min_score_ratio is None else float(min_score_ratio)
+        # score > 0 siempre: con ratio 0 no deben colarse documentos sin coincidencia (o filtrados)
+        candidates = np.flatnonzero((scores > 0.0) & (scores >= best * ratio))
+        if candidates.size > top_k:
+            part = np.argpartition(-scores[candidates], top_k - 1)[:top_k]
+            candidates = candidates[part]
+        ordered = candidates[np.argsort(-scores[candidates], kind='stable')]
+
+        results: List[Dict[str, Any]] = []
+        for i in ordered.tolist():
+            row = dict(rows[i])
+            row['similarity'] = 0.0  # Sin similitud vectorial: solo coincidencia léxica
+            row['lexical_score'] = round(float(scores[i]), 4)
+            results.append(row)
+        return results
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "loaded": self.is_loaded(),
+            "docs": len(self._rows),
+            "ngrams": len(self._postings),
+            "ngram_size": self.ngram_size,
+            "source": self.source,
+            "build_ms": round(self.build_ms, 1),
+        }
+
+
+# Instancia global (se construye una vez por proceso y se refresca con el snapshot)
+lexical_index = LexicalIndex()
+
+
+def get_lexical_index() -> LexicalIndex:
+    """Función helper para obtener el índice léxico"""
+    return lexical_index
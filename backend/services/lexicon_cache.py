@@ -0,0 +1,241 @@
+"""
+Cache de respuestas del lexicón para MIAPPBORA
+LRU acotado por número de entradas y bytes, con TTL y single-flight
+"""
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+import asyncio
+import json
+import logging
+import time
+
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# Estados devueltos por get_or_compute
+CACHE_HIT = "hit"
+CACHE_MISS = "miss"
+CACHE_COALESCED = "coalesced"
+
+
+class _LeaderCancelled(Exception):
+    """El cómputo compartido se canceló (p. ej. el cliente del líder se desconectó)."""
+
+
+def _estimate_size(value: Any) -> int:
+    """Tamaño aproximado en bytes del valor serializado (JSON UTF-8)."""
+    try:
+        return len(json.dumps(value, ensure_ascii=False, default=str).encode("utf-8"))
+    except (TypeError, ValueError):
+        return len(repr(value).encode("utf-8"))
+
+
+class LexiconAnswerCache:
+    """
+    Cache en memoria para resultados de answer_with_lexicon
+
+    Características:
+    - LRU con límite de entradas (max_entries) y de bytes (max_bytes)
+    - TTL configurable; las entradas vencidas se eliminan al leer y en barridos periódicos
+    - Single-flight: consultas idénticas concurrentes comparten un único cómputo
+    - Generación: un cómputo que termina después de invalidate() no se guarda
+    - Contadores de hits/misses/evictions para diagnóstico (cada consulta cuenta una vez)
+    """
+
+    def __init__(
+        self,
+        max_entries: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        ttl_seconds: Optional[float] = None,
+    ):
+        self.max_entries = max_entries if max_entries is not None else settings.LEXICON_CACHE_MAX_ENTRIES
+        self.max_bytes = max_bytes if max_bytes is not None else settings.LEXICON_CACHE_MAX_BYTES
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else settings.LEXICON_CACHE_TTL_SECONDS
+
+        # key -> (expires_at, size_bytes, value)
+        self._entries: "OrderedDict[str, Tuple[float, int, Dict[str, Any]]]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._bytes = 0
+        # Sube en cada invalidate(); los cómputos de una generación anterior no se guardan
+        self._generation = 0
+        self._last_sweep = time.monotonic()
+
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.rejected = 0
+
+    # ==========================================
+    # OPERACIONES BÁSICAS
+    # ==========================================
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Retorna el valor vigente (marcándolo como usado) o None."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, _, value = entry
+        if expires_at <= time.monotonic():
+            self._remove(key)
+            self.expirations += 1
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Dict[str, Any]) -> bool:
+        """Inserta/actualiza una entrada respetando los límites. Retorna False si no cabe."""
+        size = _estimate_size(value)
+        if self.max_bytes and size > self.max_bytes:
+            self.rejected += 1
+            return False
+
+        if key in self._entries:
+            self._remove(key)
+
+        now = time.monotonic()
+        self._entries[key] = (now + self.ttl_seconds, size, value)
+        self._bytes += size
+        self._maybe_sweep(now)
+        self._evict()
+        return True
+
+    def invalidate(self, prefix: Optional[str] = None) -> int:
+        """
+        Elimina entradas (todas, o solo las que empiezan por `prefix`).
+        Usar tras una re-ingesta del lexicón o un refresco del índice vectorial.
+        """
+        if prefix is None:
+            removed = len(self._entries)
+            self._entries.clear()
+            self._bytes = 0
+        else:
+            keys = [k for k in self._entries if k.startswith(prefix)]
+            for k in keys:
+                self._remove(k)
+            removed = len(keys)
+        # Los cómputos en curso usan datos anteriores: ni se guardan ni se comparten
+        # con las consultas que lleguen a partir de ahora
+        self._generation += 1
+        self._inflight = {
+            k: f for k, f in self._inflight.items() if prefix is not None and not k.startswith(prefix)
+        }
+        self.invalidations += 1
+        logger.info(f"🧹 Cache del lexicón invalidada ({removed} entradas)")
+        return removed
+
+    # ==========================================
+    # SINGLE-FLIGHT
+    # ==========================================
+
+    async def get_or_compute(
+        self,
+        key: str,
+        compute: Callable[[], Awaitable[Dict[str, Any]]],
+        cacheable: Optional[Callable[[Dict[str, Any]], bool]] = None,
+    ) -> Tuple[Dict[str, Any], str]:
+        """
+        Retorna (valor, estado) donde estado es 'hit', 'miss' o 'coalesced'.
+
+        Si otra corrutina ya está calculando la misma clave, se espera su
+        resultado en lugar de lanzar un segundo cómputo. Los errores del
+        cómputo se propagan a todos los que esperan y no se cachean; si el
+        líder se cancela, los que esperaban reintentan (uno pasa a ser líder).
+        Cada llamada cuenta una sola vez, según cómo terminó.
+        """
+        while True:
+            value = self.get(key)
+            if value is not None:
+                self.hits += 1
+                return value, CACHE_HIT
+
+            pending = self._inflight.get(key)
+            if pending is None:
+                break
+            try:
+                value = await asyncio.shield(pending)
+            except _LeaderCancelled:
+                continue
+            self.coalesced += 1
+            return value, CACHE_COALESCED
+
+        self.misses += 1
+        generation = self._generation
+        future: asyncio.Future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await compute()
+        except BaseException as e:
+            if not future.done():
+                # La cancelación es del líder, no del cómputo: no debe fallar a los demás
+                future.set_exception(_LeaderCancelled() if isinstance(e, asyncio.CancelledError) else e)
+            # Evitar "Future exception was never retrieved" si nadie esperaba
+            future.exception()
+            raise
+        else:
+            if generation == self._generation and (cacheable is None or cacheable(value)):
+                self.set(key, value)
+            future.set_result(value)
+            return value, CACHE_MISS
+        finally:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+    # ==========================================
+    # INTERNOS
+    # ==========================================
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[1]
+
+    def _evict(self) -> None:
+        while self._entries and (
+            len(self._entries) > self.max_entries
+            or (self.max_bytes and self._bytes > self.max_bytes)
+        ):
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def _maybe_sweep(self, now: float) -> None:
+        """Barre entradas vencidas como mucho una vez por periodo de TTL."""
+        if now - self._last_sweep < self.ttl_seconds:
+            return
+        self._last_sweep = now
+        expired = [k for k, (exp, _, _) in self._entries.items() if exp <= now]
+        for k in expired:
+            self._remove(k)
+        self.expirations += len(expired)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl_seconds,
+            "inflight": len(self._inflight),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+            "rejected": self.rejected,
+            "hit_rate": round((self.hits + self.coalesced) / lookups, 4) if lookups else 0.0,
+        }
+
+
+# Instancia global (compartida por todas las instancias de RAGService)
+lexicon_cache = LexiconAnswerCache()
+
+
+def get_lexicon_cache() -> LexiconAnswerCache:
+    """Función helper para obtener la cache del lexicón"""
+    return lexicon_cache
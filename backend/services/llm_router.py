@@ -0,0 +1,347 @@
+"""
+Router de proveedores LLM para la generación de respuestas del mentor
+
+Sustituye el "OpenAI y, si falla, Hugging Face" de generate_response por una
+política explícita:
+
+- Circuit breaker por proveedor: se abre tras LLM_BREAKER_FAILURE_THRESHOLD
+  fallos o llamadas lentas (> LLM_BREAKER_SLOW_CALL_MS) consecutivas; abierto,
+  el proveedor se salta sin esperar su timeout. Pasados
+  LLM_BREAKER_OPEN_SECONDS deja pasar una sola llamada de prueba (half-open).
+- Hedging opcional (LLM_HEDGE_ENABLED): si el primario no respondió tras su
+  p95 observado (mínimo LLM_HEDGE_MIN_DELAY_MS), se lanza el secundario y se
+  usa la primera respuesta válida; la otra llamada se cancela.
+
+El secundario solo existe si ALLOW_HF_LLM_FALLBACK lo permite, como antes. El
+estado de los breakers se publica en /health/connections y en /metrics.
+"""
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional
+import asyncio
+import logging
+import time
+
+from adapters.openai_rate_governor import LLMQueueTimeout
+from config.settings import settings
+from services.metrics import record_llm_hedge, set_llm_circuit_state
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+# Muestras de latencia por proveedor para el p95 del hedging
+_LATENCY_WINDOW = 200
+_HEDGE_MIN_SAMPLES = 20
+
+
+class CircuitBreaker:
+    """Breaker por fallos/lentitud consecutivos con ventana de latencias."""
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: Optional[int] = None,
+        slow_call_ms: Optional[float] = None,
+        open_seconds: Optional[float] = None,
+    ):
+        self.name = name
+        self.failure_threshold = (
+            failure_threshold if failure_threshold is not None else settings.LLM_BREAKER_FAILURE_THRESHOLD
+        )
+        self.slow_call_ms = slow_call_ms if slow_call_ms is not None else settings.LLM_BREAKER_SLOW_CALL_MS
+        self.open_seconds = open_seconds if open_seconds is not None else settings.LLM_BREAKER_OPEN_SECONDS
+
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self._probe_in_flight = False
+        self.latencies_ms: Deque[float] = deque(maxlen=_LATENCY_WINDOW)
+
+        self.successes = 0
+        self.failures = 0
+        self.slow_calls = 0
+        self.rejected = 0
+        self.last_error: Optional[str] = None
+
+    def allow(self) -> bool:
+        """¿Se puede llamar ahora? En half-open solo pasa una llamada de prueba."""
+        if self.state == OPEN:
+            if time.monotonic() - (self.opened_at or 0.0) < self.open_seconds:
+                self.rejected += 1
+                return False
+            self._set_state(HALF_OPEN)
+        if self.state == HALF_OPEN:
+            if self._probe_in_flight:
+                self.rejected += 1
+                return False
+            self._probe_in_flight = True
+        return True
+
+    def record_success(self, latency_ms: float) -> None:
+        self._probe_in_flight = False
+        self.latencies_ms.append(latency_ms)
+        if self.slow_call_ms and latency_ms > self.slow_call_ms:
+            # La respuesta sirve, pero cuenta para abrir el circuito
+            self.slow_calls += 1
+            self._register_failure(f"llamada lenta ({latency_ms:.0f}ms)")
+            return
+        self.successes += 1
+        self.consecutive_failures = 0
+        if self.state != CLOSED:
+            logger.info(f"✅ Circuito LLM '{self.name}' cerrado de nuevo")
+            self._set_state(CLOSED)
+
+    def record_failure(self, error: BaseException) -> None:
+        self._probe_in_flight = False
+        self.failures += 1
+        self._register_failure(str(error) or type(error).__name__)
+
+    def release(self) -> None:
+        """Llamada cancelada o sin hueco en la cola local: no cuenta ni a favor ni en contra."""
+        self._probe_in_flight = False
+
+    def p95_ms(self) -> Optional[float]:
+        if len(self.latencies_ms) < _HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(self.latencies_ms)
+        return ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))]
+
+    def stats(self) -> Dict[str, Any]:
+        p95 = self.p95_ms()
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "successes": self.successes,
+            "failures": self.failures,
+            "slow_calls": self.slow_calls,
+            "rejected": self.rejected,
+            "p95_ms": round(p95, 1) if p95 is not None else None,
+            "open_for_s": (
+                round(max(0.0, self.open_seconds - (time.monotonic() - self.opened_at)), 1)
+                if self.state == OPEN and self.opened_at else 0.0
+            ),
+            "last_error": self.last_error,
+        }
+
+    def _register_failure(self, reason: str) -> None:
+        self.last_error = reason[:200]
+        self.consecutive_failures += 1
+        if self.state == HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            if self.state != OPEN:
+                logger.warning(
+                    f"🔌 Circuito LLM '{self.name}' abierto {self.open_seconds:.0f}s "
+                    f"({self.consecutive_failures} fallos/lentitud seguidos: {self.last_error})"
+                )
+            self.opened_at = time.monotonic()
+            self._set_state(OPEN)
+
+    def _set_state(self, state: str) -> None:
+        self.state = state
+        set_llm_circuit_state(self.name, _STATE_VALUES[state])
+
+
+# Llamada a un proveedor: (messages, max_tokens_override) -> texto o None
+ProviderCall = Callable[[List[Dict[str, Any]], Optional[int]], Awaitable[Optional[str]]]
+
+
+async def _call_openai(messages: List[Dict[str, Any]], max_tokens: Optional[int]) -> Optional[str]:
+    from adapters.openai_adapter import get_openai_adapter
+
+    if not settings.OPENAI_API_KEY:
+        raise RuntimeError("OpenAI no configurado")
+    return await get_openai_adapter().chat_completion(
+        messages=messages,
+        temperature=settings.OPENAI_TEMPERATURE,
+        max_tokens=(max_tokens or settings.OPENAI_MAX_TOKENS),
+    )
+
+
+async def _call_huggingface(messages: List[Dict[str, Any]], max_tokens: Optional[int]) -> Optional[str]:
+    from adapters.huggingface_adapter import get_huggingface_adapter
+
+    # El cliente de Inference API es síncrono: fuera del event loop
+    return await asyncio.to_thread(
+        get_huggingface_adapter().chat_completion,
+        messages=messages,
+        max_tokens=(max_tokens or getattr(settings, "LLM_MAX_NEW_TOKENS", 320)),
+    )
+
+
+class LLMRouter:
+    """Elige proveedor según la configuración y el estado de sus breakers."""
+
+    def __init__(self, providers: Optional[Dict[str, ProviderCall]] = None):
+        self.providers: Dict[str, ProviderCall] = providers or {
+            "openai": _call_openai,
+            "huggingface": _call_huggingface,
+        }
+        self.breakers: Dict[str, CircuitBreaker] = {name: CircuitBreaker(name) for name in self.providers}
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    # ==========================================
+    # API PÚBLICA
+    # ==========================================
+
+    def candidates(self) -> List[str]:
+        """Proveedor principal y, si se permite fallback, el secundario."""
+        primary = getattr(settings, "LLM_PROVIDER", "openai").lower()
+        if primary not in self.providers:
+            raise ValueError(f"LLM_PROVIDER no soportado: {primary}")
+        names = [primary]
+        if primary == "openai" and getattr(settings, "ALLOW_HF_LLM_FALLBACK", False):
+            names.append("huggingface")
+        return names
+
+    async def generate(self, messages: List[Dict[str, Any]], max_tokens: Optional[int] = None) -> Optional[str]:
+        """
+        Respuesta del primer proveedor disponible.
+
+        Raises:
+            RuntimeError: si ningún proveedor respondió (o todos tienen el circuito abierto)
+        """
+        names = self.candidates()
+        primary = next((n for n in names if self.breakers[n].allow()), None)
+        if primary is None:
+            raise RuntimeError(f"LLM no disponible: circuito abierto ({', '.join(names)})")
+        rest = names[names.index(primary) + 1:]
+        secondary = rest[0] if rest else None
+
+        if secondary and settings.LLM_HEDGE_ENABLED:
+            return await self._hedged(primary, secondary, messages, max_tokens)
+
+        try:
+            return await self.call_provider(primary, messages, max_tokens)
+        except Exception as e:
+            logger.error(f"❌ {primary} falló: {e}")
+            errors = [f"{primary}: {e}"]
+        if secondary and self.breakers[secondary].allow():
+            logger.info(f"🔁 Intentando con {secondary} como fallback...")
+            try:
+                return await self.call_provider(secondary, messages, max_tokens)
+            except Exception as e:
+                logger.error(f"❌ {secondary} falló: {e}")
+                errors.append(f"{secondary}: {e}")
+        raise RuntimeError(f"LLM no disponible ({'; '.join(errors)})")
+
+    def hedge_delay_ms(self, name: str) -> float:
+        """Espera antes de lanzar el secundario: p95 del primario (o el valor por defecto sin muestras)."""
+        p95 = self.breakers[name].p95_ms()
+        if p95 is None:
+            return float(settings.LLM_HEDGE_DEFAULT_DELAY_MS)
+        return max(float(settings.LLM_HEDGE_MIN_DELAY_MS), p95)
+
+    def stats(self) -> Dict[str, Any]:
+        try:
+            candidates = self.candidates()
+        except ValueError:
+            candidates = []
+        return {
+            "candidates": candidates,
+            "hedging": {
+                "enabled": settings.LLM_HEDGE_ENABLED and len(candidates) > 1,
+                "delay_ms": round(self.hedge_delay_ms(candidates[0]), 1) if candidates else None,
+                "fired": self.hedges,
+                "secondary_wins": self.hedge_wins,
+            },
+            "breakers": {name: breaker.stats() for name, breaker in self.breakers.items()},
+        }
+
+    async def call_provider(
+        self,
+        name: str,
+        messages: List[Dict[str, Any]],
+        max_tokens: Optional[int] = None,
+    ) -> Optional[str]:
+        """Llamada a un proveedor concreto registrando el resultado en su breaker (ya admitida con allow())."""
+        breaker = self.breakers[name]
+        t0 = time.perf_counter()
+        try:
+            response = await self.providers[name](messages, max_tokens)
+        except (asyncio.CancelledError, LLMQueueTimeout):
+            # LLMQueueTimeout es saturación de la cola local (ráfaga de la clase), no un
+            # fallo del proveedor: contarla abriría el circuito para todos
+            breaker.release()
+            raise
+        except Exception as e:
+            breaker.record_failure(e)
+            raise
+        if not response or not str(response).strip():
+            error = RuntimeError(f"{name} devolvió una respuesta vacía")
+            breaker.record_failure(error)
+            raise error
+        breaker.record_success((time.perf_counter() - t0) * 1000.0)
+        return response
+
+    # ==========================================
+    # INTERNOS
+    # ==========================================
+
+    async def _hedged(
+        self,
+        primary: str,
+        secondary: str,
+        messages: List[Dict[str, Any]],
+        max_tokens: Optional[int],
+    ) -> Optional[str]:
+        """Primario; si tarda más que su p95, también el secundario. Gana la primera respuesta válida."""
+        tasks: Dict[asyncio.Task, str] = {
+            asyncio.ensure_future(self.call_provider(primary, messages, max_tokens)): primary
+        }
+        delay = self.hedge_delay_ms(primary) / 1000.0
+        errors: List[str] = []
+        hedge_fired = False
+
+        def start_secondary() -> Optional[asyncio.Task]:
+            if secondary in tasks.values() or not self.breakers[secondary].allow():
+                return None
+            task = asyncio.ensure_future(self.call_provider(secondary, messages, max_tokens))
+            tasks[task] = secondary
+            return task
+
+        try:
+            pending = set(tasks)
+            done, _ = await asyncio.wait(pending, timeout=delay)
+            if not done and start_secondary() is not None:
+                hedge_fired = True
+                self.hedges += 1
+                record_llm_hedge("fired")
+                logger.info(f"🪁 {primary} sin respuesta tras {delay * 1000:.0f}ms; lanzando {secondary} en paralelo")
+                pending = set(tasks)
+
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    name = tasks[task]
+                    error = task.exception()
+                    if error is None:
+                        if hedge_fired and name == secondary:
+                            self.hedge_wins += 1
+                            record_llm_hedge("secondary_won")
+                        return task.result()
+                    errors.append(f"{name}: {error}")
+                    logger.error(f"❌ {name} falló: {error}")
+                    # El primario falló antes del hedge: el secundario actúa como fallback
+                    if name == primary:
+                        fallback = start_secondary()
+                        if fallback is not None:
+                            logger.info(f"🔁 Intentando con {secondary} como fallback...")
+                            pending.add(fallback)
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+        raise RuntimeError(f"LLM no disponible ({'; '.join(errors)})")
+
+
+# Instancia global (los breakers y latencias se comparten entre peticiones)
+llm_router = LLMRouter()
+
+
+def get_llm_router() -> LLMRouter:
+    """Función helper para obtener el router de proveedores LLM"""
+    return llm_router
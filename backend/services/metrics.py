@@ -0,0 +1,550 @@
+"""
+Métricas en proceso para MIAPPBORA (formato de exposición de texto de Prometheus)
+
+Registro mínimo sin dependencias (prometheus_client no está en requirements):
+contadores, gauges e histogramas con etiquetas, servidos en GET /metrics.
+
+En la ruta caliente cada observación es un dict lookup + una suma bajo un
+lock por métrica; los buckets acumulados y el texto se calculan solo al
+renderizar. Las etiquetas deben tener cardinalidad acotada (etapas, propósitos,
+rutas plantilla), nunca texto de la consulta ni ids.
+
+Métricas de la app:
+    miappbora_rag_stage_seconds{stage}            latencia por etapa del pipeline RAG
+    miappbora_cache_lookups_total{cache,result}   aciertos/fallos de las caches
+    miappbora_llm_calls_total{purpose,status}     llamadas al LLM por propósito
+    miappbora_llm_tokens_total{purpose,kind}      tokens de entrada/cacheados/salida por propósito
+    miappbora_prompt_trims_total{part}            recortes del prompt por presupuesto (history/summary/examples/groups)
+    miappbora_llm_queue_depth{purpose}            llamadas al LLM esperando hueco de concurrencia
+    miappbora_llm_queue_wait_seconds{purpose,kind} espera en cola (concurrencia / cuota RPM-TPM)
+    miappbora_llm_retries_total{purpose,reason}   reintentos por 429/5xx
+    miappbora_llm_circuit_state{provider}         circuito por proveedor (0 cerrado, 1 half-open, 2 abierto)
+    miappbora_llm_hedges_total{outcome}           peticiones duplicadas al proveedor secundario
+    miappbora_rag_degradations_total{kind}        degradaciones aplicadas por deadline_ms
+    miappbora_rag_speculative_retrievals_total{result} recuperación especulativa reutilizada o descartada
+    miappbora_admission_in_flight                 pipelines de /lexicon en ejecución
+    miappbora_admission_queue_depth{priority}     peticiones esperando hueco por prioridad
+    miappbora_admission_queue_wait_seconds{priority} espera en la cola de admisión
+    miappbora_admission_decisions_total{priority,result} admitidas / rate_limited / queue_full / timeout
+    miappbora_admission_shed_total{priority,source} rechazadas por saturación y cómo se atendieron
+    miappbora_chat_persist_queue_depth            intercambios de chat pendientes de escribir
+    miappbora_chat_persist_messages_total{result} mensajes de chat escritos (batch/inline/error)
+    miappbora_conversation_summaries_total{result} revisiones del resumen de conversación (ok/skipped/error)
+    miappbora_http_requests_in_flight             peticiones HTTP en curso
+    miappbora_http_request_seconds{method,route}  latencia por ruta (plantilla)
+"""
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+import math
+import threading
+import time
+
+from config.settings import settings
+
+LabelValues = Tuple[str, ...]
+
+# Buckets en segundos: de 1ms (lookups en memoria) a 30s (LLM lento)
+DEFAULT_BUCKETS: Tuple[float, ...] = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+)
+
+# Claves de `timings` (ms) que se publican como etapa; el resto son detalles o derivados
+RAG_STAGES: Tuple[str, ...] = (
+    "preprocessing_ms",
+    "direction_detection_ms",
+    "preprocessing_total_ms",
+    "embedding_ms",
+    "semantic_cache_ms",
+    "vector_search_ms",
+    "lexical_ms",
+    "lemma_lookup_ms",
+    "examples_fetch_ms",
+    "context_build_ms",
+    "llm_ms",
+    "first_token_ms",
+    "retrieval_ms",
+    "total_ms",
+)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _Metric:
+    type_name = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Mapping[str, str]) -> LabelValues:
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name}: etiquetas esperadas {self.labelnames}, recibidas {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def _header(self) -> List[str]:
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type_name}",
+        ]
+
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Valor monótono creciente por combinación de etiquetas."""
+
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        if amount < 0:
+            raise ValueError("Un contador solo puede incrementarse")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        lines = self._header()
+        lines.extend(
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(v)}" for key, v in items
+        )
+        return lines
+
+
+class Gauge(_Metric):
+    """Valor que sube y baja (p. ej. peticiones en curso)."""
+
+    type_name = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        if not items and not self.labelnames:
+            items = [((), 0.0)]
+        lines = self._header()
+        lines.extend(
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(v)}" for key, v in items
+        )
+        return lines
+
+
+class Histogram(_Metric):
+    """
+    Distribución con buckets fijos
+
+    Se guarda el conteo por bucket (no acumulado) para que observe() toque una
+    sola celda; la suma acumulada que exige el formato se hace al renderizar.
+    """
+
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Iterable[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets: Tuple[float, ...] = tuple(sorted(float(b) for b in buckets if b != math.inf))
+        # Por etiqueta: [conteos por bucket (+Inf al final), suma]
+        self._series: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        idx = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = ([0] * (len(self.buckets) + 1), [0.0])
+                self._series[key] = series
+            series[0][idx] += 1
+            series[1][0] += value
+
+    def snapshot(self, **labels: str) -> Optional[Dict[str, object]]:
+        """Conteo, suma y buckets acumulados de una serie (None si no hay datos)."""
+        with self._lock:
+            series = self._series.get(self._key(labels))
+            if series is None:
+                return None
+            counts, total = list(series[0]), series[1][0]
+        cumulative, running = [], 0
+        for bound, count in zip(self.buckets + (math.inf,), counts):
+            running += count
+            cumulative.append((bound, running))
+        return {"count": running, "sum": total, "buckets": cumulative}
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, list(counts), total[0]) for key, (counts, total) in self._series.items())
+        lines = self._header()
+        for key, counts, total in items:
+            running = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                running += count
+                le = 'le="' + _format_value(bound) + '"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {running}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {running}")
+        return lines
+
+
+class MetricsRegistry:
+    """Colección de métricas con nombre único; render() produce el texto de /metrics."""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                if type(existing) is not type(metric) or existing.labelnames != metric.labelnames:
+                    raise ValueError(f"Métrica '{metric.name}' ya registrada con otro tipo o etiquetas")
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Iterable[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def get(self, name: str) -> Optional[_Metric]:
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = [self._metrics[name] for name in sorted(self._metrics)]
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+# Instancia global (una por proceso; con varios workers cada uno expone la suya)
+metrics_registry = MetricsRegistry()
+
+
+def get_metrics() -> MetricsRegistry:
+    """Función helper para obtener el registro de métricas"""
+    return metrics_registry
+
+
+RAG_STAGE_SECONDS = metrics_registry.histogram(
+    "miappbora_rag_stage_seconds",
+    "Latencia por etapa del pipeline RAG del lexicón",
+    ("stage",),
+)
+CACHE_LOOKUPS = metrics_registry.counter(
+    "miappbora_cache_lookups_total",
+    "Consultas a las caches (lexicon, semantic, embedding) por resultado",
+    ("cache", "result"),
+)
+LLM_CALLS = metrics_registry.counter(
+    "miappbora_llm_calls_total",
+    "Llamadas al LLM por propósito (extraction, direction, answer) y estado",
+    ("purpose", "status"),
+)
+LLM_TOKENS = metrics_registry.counter(
+    "miappbora_llm_tokens_total",
+    "Tokens consumidos por propósito y tipo (input, cached, output)",
+    ("purpose", "kind"),
+)
+PROMPT_TRIMS = metrics_registry.counter(
+    "miappbora_prompt_trims_total",
+    "Elementos recortados del prompt del mentor por el presupuesto de tokens",
+    ("part",),
+)
+LLM_QUEUE_DEPTH = metrics_registry.gauge(
+    "miappbora_llm_queue_depth",
+    "Llamadas al LLM esperando hueco de concurrencia",
+    ("purpose",),
+)
+LLM_QUEUE_WAIT_SECONDS = metrics_registry.histogram(
+    "miappbora_llm_queue_wait_seconds",
+    "Espera antes de llamar al LLM (concurrencia o cuota RPM/TPM)",
+    ("purpose", "kind"),
+)
+LLM_RETRIES = metrics_registry.counter(
+    "miappbora_llm_retries_total",
+    "Reintentos de llamadas al LLM por motivo",
+    ("purpose", "reason"),
+)
+LLM_CIRCUIT_STATE = metrics_registry.gauge(
+    "miappbora_llm_circuit_state",
+    "Estado del circuit breaker por proveedor LLM (0 cerrado, 1 half-open, 2 abierto)",
+    ("provider",),
+)
+LLM_HEDGES = metrics_registry.counter(
+    "miappbora_llm_hedges_total",
+    "Hedging de generación: secundarios lanzados y ganados",
+    ("outcome",),
+)
+RAG_DEGRADATIONS = metrics_registry.counter(
+    "miappbora_rag_degradations_total",
+    "Degradaciones aplicadas para cumplir deadline_ms",
+    ("kind",),
+)
+RAG_SPECULATIVE_RETRIEVALS = metrics_registry.counter(
+    "miappbora_rag_speculative_retrievals_total",
+    "Recuperaciones especulativas con la query original (hit = reutilizada)",
+    ("result",),
+)
+CHAT_PERSIST_QUEUE_DEPTH = metrics_registry.gauge(
+    "miappbora_chat_persist_queue_depth",
+    "Intercambios de chat en cola de escritura diferida",
+)
+CHAT_PERSIST_MESSAGES = metrics_registry.counter(
+    "miappbora_chat_persist_messages_total",
+    "Mensajes de chat persistidos por resultado (batch, inline, error)",
+    ("result",),
+)
+ADMISSION_IN_FLIGHT = metrics_registry.gauge(
+    "miappbora_admission_in_flight",
+    "Pipelines de /lexicon en ejecución (admitidos por el control de admisión)",
+)
+ADMISSION_QUEUE_DEPTH = metrics_registry.gauge(
+    "miappbora_admission_queue_depth",
+    "Peticiones de /lexicon esperando hueco, por prioridad",
+    ("priority",),
+)
+ADMISSION_QUEUE_WAIT_SECONDS = metrics_registry.histogram(
+    "miappbora_admission_queue_wait_seconds",
+    "Espera en la cola de admisión antes de ejecutar el pipeline",
+    ("priority",),
+)
+ADMISSION_DECISIONS = metrics_registry.counter(
+    "miappbora_admission_decisions_total",
+    "Decisiones del control de admisión (admitted, rate_limited, queue_full, timeout)",
+    ("priority", "result"),
+)
+ADMISSION_SHED = metrics_registry.counter(
+    "miappbora_admission_shed_total",
+    "Peticiones rechazadas por saturación según cómo se atendieron (answer_card, cache, lexical, none)",
+    ("priority", "source"),
+)
+CONVERSATION_SUMMARIES = metrics_registry.counter(
+    "miappbora_conversation_summaries_total",
+    "Revisiones en segundo plano del resumen de conversación (ok, skipped, error)",
+    ("result",),
+)
+HTTP_IN_FLIGHT = metrics_registry.gauge(
+    "miappbora_http_requests_in_flight",
+    "Peticiones HTTP en curso",
+)
+HTTP_REQUEST_SECONDS = metrics_registry.histogram(
+    "miappbora_http_request_seconds",
+    "Latencia de las peticiones HTTP por ruta (plantilla)",
+    ("method", "route"),
+)
+
+
+# ==========================================
+# HELPERS PARA LA RUTA CALIENTE
+# ==========================================
+
+def observe_rag_timings(timings: Mapping[str, float]) -> None:
+    """Publica las etapas conocidas de un dict `timings` (en ms) como histograma."""
+    if not settings.METRICS_ENABLED:
+        return
+    for key in RAG_STAGES:
+        value = timings.get(key)
+        if value is not None:
+            RAG_STAGE_SECONDS.observe(value / 1000.0, stage=key[:-3])
+
+
+def record_cache_lookup(cache: str, result: str, amount: int = 1) -> None:
+    if settings.METRICS_ENABLED and amount:
+        CACHE_LOOKUPS.inc(amount, cache=cache, result=result)
+
+
+def record_degradation(kind: str) -> None:
+    if settings.METRICS_ENABLED:
+        RAG_DEGRADATIONS.inc(kind=kind)
+
+
+def record_speculative_retrieval(result: str) -> None:
+    if settings.METRICS_ENABLED:
+        RAG_SPECULATIVE_RETRIEVALS.inc(result=result)
+
+
+def record_chat_persist(result: str, messages: int) -> None:
+    if settings.METRICS_ENABLED:
+        CHAT_PERSIST_MESSAGES.inc(messages, result=result)
+
+
+def set_admission_in_flight(count: int) -> None:
+    if settings.METRICS_ENABLED:
+        ADMISSION_IN_FLIGHT.set(count)
+
+
+def set_admission_queue_depth(priority: str, depth: int) -> None:
+    if settings.METRICS_ENABLED:
+        ADMISSION_QUEUE_DEPTH.set(depth, priority=priority)
+
+
+def observe_admission_wait(priority: str, seconds: float) -> None:
+    if settings.METRICS_ENABLED:
+        ADMISSION_QUEUE_WAIT_SECONDS.observe(seconds, priority=priority)
+
+
+def record_admission_decision(priority: str, result: str) -> None:
+    if settings.METRICS_ENABLED:
+        ADMISSION_DECISIONS.inc(priority=priority, result=result)
+
+
+def record_admission_shed(priority: str, source: str) -> None:
+    if settings.METRICS_ENABLED:
+        ADMISSION_SHED.inc(priority=priority, source=source)
+
+
+def record_conversation_summary(result: str) -> None:
+    if settings.METRICS_ENABLED:
+        CONVERSATION_SUMMARIES.inc(result=result)
+
+
+def set_chat_persist_queue_depth(depth: int) -> None:
+    if settings.METRICS_ENABLED:
+        CHAT_PERSIST_QUEUE_DEPTH.set(depth)
+
+
+def set_llm_queue_depth(purpose: str, depth: int) -> None:
+    if settings.METRICS_ENABLED:
+        LLM_QUEUE_DEPTH.set(depth, purpose=purpose)
+
+
+def observe_llm_queue_wait(purpose: str, kind: str, seconds: float) -> None:
+    if settings.METRICS_ENABLED:
+        LLM_QUEUE_WAIT_SECONDS.observe(seconds, purpose=purpose, kind=kind)
+
+
+def record_llm_retry(purpose: str, reason: str) -> None:
+    if settings.METRICS_ENABLED:
+        LLM_RETRIES.inc(purpose=purpose, reason=reason)
+
+
+def set_llm_circuit_state(provider: str, value: int) -> None:
+    if settings.METRICS_ENABLED:
+        LLM_CIRCUIT_STATE.set(value, provider=provider)
+
+
+def record_prompt_trim(part: str, amount: int) -> None:
+    if settings.METRICS_ENABLED and amount:
+        PROMPT_TRIMS.inc(amount, part=part)
+
+
+def record_llm_hedge(outcome: str) -> None:
+    if settings.METRICS_ENABLED:
+        LLM_HEDGES.inc(outcome=outcome)
+
+
+def record_llm_call(
+    purpose: str,
+    status: str = "ok",
+    input_tokens: Optional[int] = None,
+    output_tokens: Optional[int] = None,
+    cached_tokens: Optional[int] = None,
+) -> None:
+    """Cuenta una llamada al LLM y, si el proveedor informa uso, sus tokens."""
+    if not settings.METRICS_ENABLED:
+        return
+    LLM_CALLS.inc(purpose=purpose, status=status)
+    if input_tokens:
+        LLM_TOKENS.inc(input_tokens, purpose=purpose, kind="input")
+    if cached_tokens:
+        # Subconjunto de input servido desde el prompt cache del proveedor
+        LLM_TOKENS.inc(cached_tokens, purpose=purpose, kind="cached")
+    if output_tokens:
+        LLM_TOKENS.inc(output_tokens, purpose=purpose, kind="output")
+
+
+class MetricsMiddleware:
+    """
+    Middleware ASGI: gauge de peticiones en curso + latencia por ruta plantilla
+
+    ASGI puro (no BaseHTTPMiddleware) para no envolver el cuerpo de la
+    respuesta: en los streams SSE la petición sigue "en curso" hasta el final.
+    La ruta se toma de scope["route"] tras el enrutado, así /conversations/{id}
+    no crea una serie por id.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not settings.METRICS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+        HTTP_IN_FLIGHT.inc()
+        t0 = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            HTTP_IN_FLIGHT.dec()
+            route = scope.get("route")
+            HTTP_REQUEST_SECONDS.observe(
+                time.perf_counter() - t0,
+                method=scope.get("method", ""),
+                route=getattr(route, "path", None) or "unmatched",
+            )
@@ -0,0 +1,276 @@
+"""
+Ensamblado del prompt del mentor con presupuesto de tokens de entrada
+
+_build_messages enviaba el system prompt estático (~2.5 KB), hasta 3 turnos de
+historial sin límite de longitud y un contexto que crece con top_k y los
+ejemplos, sin medir ni acotar los tokens. PromptAssembler:
+
+- Estima tokens en local (bytes UTF-8 / 4: el Bora con diacríticos cuenta más)
+  sin tokenizer ni llamadas de red.
+- Con PROMPT_MAX_INPUT_TOKENS recorta, en este orden: historial (el más
+  antiguo primero), resumen de la conversación, ejemplos (de los grupos menos
+  relevantes primero) y grupos del contexto (desde el final). El system
+  prompt y la query no se tocan.
+- El resumen de la conversación (services/conversation_summarizer.py) llega
+  como mensajes role "system" al inicio del historial y va justo tras el
+  system prompt; con resúmenes activos el historial ya viene acotado a los
+  mensajes no resumidos (history_window) en lugar de a los últimos 3.
+- Mantiene el prefijo estático byte a byte idéntico (MENTOR_SYSTEM_PROMPT
+  siempre primero, sin interpolar nada) para que aplique el prompt caching
+  del proveedor; lo variable (historial, query, contexto) va detrás.
+
+`collect_prompt_stats()` recoge por petición los tokens estimados, los recortes
+y el uso real que informa el proveedor (prompt, cacheados y de salida).
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+import logging
+
+from config.settings import settings
+from services.metrics import record_prompt_trim
+
+logger = logging.getLogger(__name__)
+
+# Tokens de formato por mensaje de chat y para cebar la respuesta (formato OpenAI)
+_MESSAGE_OVERHEAD_TOKENS = 4
+_REPLY_PRIMING_TOKENS = 3
+
+# Turnos de historial que se envían como mucho (antes del presupuesto)
+_HISTORY_MESSAGES = 3
+
+# Estadísticas de la petición en curso (dict mutable: lo ven también las
+# tareas hijas, p. ej. el hedging o asyncio.wait_for)
+_prompt_stats: ContextVar[Optional[Dict[str, int]]] = ContextVar("prompt_stats", default=None)
+
+
+MENTOR_SYSTEM_PROMPT = (
+    "Eres el Mentor Bora, un profesor amable y cercano que enseña el idioma Bora (lengua indígena amazónica) a hispanohablantes.\n\n"
+
+    "Tu misión:\n"
+    "- Responder de forma conversacional, clara y educativa (150-200 palabras máximo)\n"
+    "- Usar SOLO información del CONTEXTO proporcionado - nunca inventes datos\n"
+    "- Ayudar con: traducciones Bora-Español, definiciones, ejemplos de uso, pronunciación básica\n\n"
+
+    "Reglas importantes:\n"
+    "- Usa la MEJOR información disponible del CONTEXTO: traducción literal si existe, o la aproximación más cercana\n"
+    "- Responde directamente a la pregunta del estudiante con un tono cálido y motivador\n"
+    "- Explica el por qué cuando sea relevante (etimología, contexto cultural, diferencias con sinónimos)\n"
+    "- Incluye 1-2 ejemplos prácticos en Bora con su traducción al español cuando ayuden al entendimiento\n"
+    "- Si el contexto es insuficiente, sé honesto pero ofrece alternativas relacionadas\n"
+    "- Escribe en párrafos naturales (NO uses formato tipo formulario o secciones rígidas)\n"
+    "- Evita términos técnicos innecesarios - habla como un maestro, no como un diccionario\n\n"
+
+    "Formato de respuesta ADAPTATIVO:\n"
+    "1. Si hay traducción literal → úsala primero (ej: 'En bora, abrazar se dice ámabúcu o chiááve')\n"
+    "2. Si solo hay aproximaciones o ejemplos → úsalos como mejor opción disponible\n"
+    "3. Explica el contexto o significado si es relevante\n"
+    "4. Da ejemplos prácticos cuando clarifiquen el uso\n"
+    "5. Agrega un consejo o nota cultural si es relevante\n\n"
+
+    "Ejemplo de buen estilo:\n"
+    "Claro! Para saludar en Bora puedes decir 'a uúj' cuando llegas. Esta palabra significa 'hola' en general. Por ejemplo: ' ¿A aabye uúj; kiávú u pééhií?' significa 'Hola amigo, ¿a dónde vas?'. Los Bora valoran mucho los saludos al encontrarse, así que es una excelente forma de iniciar cualquier conversación.\n\n"
+
+    "NUNCA uses estos formatos rígidos:\n"
+    "- Respuesta: ...\n"
+    "- Por qué: ...\n"
+    "- Confianza: Alta o Baja\n"
+    "- Citas: ...\n"
+    "Simplemente responde de forma natural y conversacional.\n\n"
+
+    "Recibirás:\n"
+    "- query: La pregunta del estudiante\n"
+    "- context: Información del lexicón Bora (usa esto como referencia, pero no lo copies literalmente)"
+)
+
+
+def estimate_tokens(text: Optional[str]) -> int:
+    """Estimación local de tokens: ~4 bytes UTF-8 por token."""
+    if not text:
+        return 0
+    return (len(text.encode("utf-8")) + 3) // 4
+
+
+def estimate_messages_tokens(messages: Sequence[Dict[str, Any]]) -> int:
+    """Tokens de entrada estimados de una lista de mensajes de chat."""
+    return _REPLY_PRIMING_TOKENS + sum(
+        _MESSAGE_OVERHEAD_TOKENS + estimate_tokens(str(m.get("content") or "")) for m in messages
+    )
+
+
+@contextmanager
+def collect_prompt_stats() -> Iterator[Dict[str, int]]:
+    """
+    Recoge en un dict las estadísticas de prompt de las llamadas hechas dentro del bloque:
+    prompt_tokens_estimated, prompt_trimmed_{history,summary,examples,groups} (del ensamblado)
+    y prompt_tokens, cached_prompt_tokens, completion_tokens (uso real del proveedor).
+    """
+    stats: Dict[str, int] = {}
+    previous = _prompt_stats.get()
+    _prompt_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        # set() y no reset(token): en streaming el bloque puede cerrarse desde otro contexto
+        _prompt_stats.set(previous)
+
+
+def record_prompt_usage(usage: Any) -> None:
+    """Suma el `usage` de una respuesta de OpenAI a las estadísticas de la petición en curso."""
+    stats = _prompt_stats.get()
+    if stats is None or usage is None:
+        return
+    details = getattr(usage, "prompt_tokens_details", None)
+    for key, value in (
+        ("prompt_tokens", getattr(usage, "prompt_tokens", None)),
+        ("cached_prompt_tokens", getattr(details, "cached_tokens", None)),
+        ("completion_tokens", getattr(usage, "completion_tokens", None)),
+    ):
+        stats[key] = stats.get(key, 0) + int(value or 0)
+
+
+class PromptAssembler:
+    """Construye los mensajes del mentor respetando el presupuesto de tokens de entrada."""
+
+    def __init__(self, max_input_tokens: Optional[int] = None, system_prompt: str = MENTOR_SYSTEM_PROMPT):
+        self.max_input_tokens = (
+            max_input_tokens if max_input_tokens is not None else settings.PROMPT_MAX_INPUT_TOKENS
+        )
+        self.system_prompt = system_prompt
+        self._system_tokens = _MESSAGE_OVERHEAD_TOKENS + estimate_tokens(system_prompt)
+
+    def assemble(
+        self,
+        query: str,
+        context: str,
+        conversation_history: Optional[Sequence[Dict[str, Any]]] = None,
+    ) -> List[Dict[str, str]]:
+        """system (estático) + resumen + historial + user(<query>, <context>), recortados al presupuesto."""
+        summary, turns = _split_summary(conversation_history or [])
+        history = [
+            {"role": m.get("role", "user"), "content": m.get("content", "")}
+            for m in turns[-self._history_messages():]
+        ]
+        header, groups = _split_context(context)
+        trimmed = {"history": 0, "summary": 0, "examples": 0, "groups": 0}
+
+        history_tokens = [_MESSAGE_OVERHEAD_TOKENS + estimate_tokens(m["content"]) for m in history]
+        summary_tokens = sum(_MESSAGE_OVERHEAD_TOKENS + estimate_tokens(m["content"]) for m in summary)
+        fixed = (
+            _REPLY_PRIMING_TOKENS
+            + self._system_tokens
+            + _MESSAGE_OVERHEAD_TOKENS
+            + estimate_tokens(f"<query>{query}</query>\n<context>\n\n</context>")
+        )
+        # Cada línea del contexto cuesta sus tokens más el salto de línea
+        context_tokens = sum(_line_tokens(line) for line in header) + sum(
+            _line_tokens(line) for group in groups for line in group
+        )
+        total = fixed + summary_tokens + sum(history_tokens) + context_tokens
+        budget = self.max_input_tokens
+
+        if budget and budget > 0 and total > budget:
+            # 1) Historial, del turno más antiguo al más reciente
+            while total > budget and history:
+                history.pop(0)
+                total -= history_tokens.pop(0)
+                trimmed["history"] += 1
+            # 2) Resumen de la conversación
+            if total > budget and summary:
+                total -= summary_tokens
+                trimmed["summary"] = len(summary)
+                summary = []
+            # 3) Ejemplos, empezando por los grupos menos relevantes (los últimos)
+            for group in reversed(groups):
+                while total > budget and len(group) > 1 and _is_example_line(group[-1]):
+                    total -= _line_tokens(group.pop())
+                    trimmed["examples"] += 1
+                if total <= budget:
+                    break
+            # 4) Grupos completos desde el final; el mejor se conserva siempre
+            while total > budget and len(groups) > 1:
+                total -= sum(_line_tokens(line) for line in groups.pop())
+                trimmed["groups"] += 1
+            if total > budget:
+                logger.warning(f"⚠️ Prompt por encima del presupuesto tras recortar ({total} > {budget} tokens)")
+
+        if any(trimmed.values()):
+            logger.info(
+                "✂️ Prompt recortado a ~%d tokens | historial=%d resumen=%d ejemplos=%d grupos=%d",
+                total, trimmed["history"], trimmed["summary"], trimmed["examples"], trimmed["groups"],
+            )
+            for part, count in trimmed.items():
+                record_prompt_trim(part, count)
+
+        stats = _prompt_stats.get()
+        if stats is not None:
+            stats["prompt_tokens_estimated"] = total
+            for part, count in trimmed.items():
+                stats[f"prompt_trimmed_{part}"] = count
+
+        context_text = "\n".join(header + [line for group in groups for line in group])
+        user = (
+            f"<query>{query}</query>\n"
+            f"<context>\n{context_text}\n</context>"
+        )
+        return (
+            [{"role": "system", "content": self.system_prompt}]
+            + summary
+            + history
+            + [{"role": "user", "content": user}]
+        )
+
+    @staticmethod
+    def _history_messages() -> int:
+        from services.conversation_summarizer import get_conversation_summarizer
+
+        summarizer = get_conversation_summarizer()
+        return summarizer.history_window if summarizer.enabled else _HISTORY_MESSAGES
+
+
+def _split_summary(history: Sequence[Dict[str, Any]]) -> Tuple[List[Dict[str, str]], Sequence[Dict[str, Any]]]:
+    """Separa los mensajes "system" iniciales (resumen de la conversación) de los turnos."""
+    count = 0
+    while count < len(history) and history[count].get("role") == "system":
+        count += 1
+    summary = [{"role": "system", "content": str(m.get("content") or "")} for m in history[:count]]
+    return summary, history[count:]
+
+
+def _line_tokens(line: str) -> int:
+    return estimate_tokens(line) + 1
+
+
+def _is_example_line(line: str) -> bool:
+    # "   • Ejemplo: BORA: ..." (_build_lexicon_context)
+    return line[:1].isspace() and line.lstrip().startswith("•")
+
+
+def _split_context(context: str) -> Tuple[List[str], List[List[str]]]:
+    """
+    Separa el contexto en cabecera y grupos: cada línea "N. ..." abre un grupo
+    y las líneas sangradas (ejemplos) pertenecen al grupo anterior.
+    """
+    header: List[str] = []
+    groups: List[List[str]] = []
+    for line in (context or "").split("\n"):
+        stripped = line.lstrip()
+        if not line[:1].isspace() and stripped[:1].isdigit() and ". " in stripped[:6]:
+            groups.append([line])
+        elif groups:
+            groups[-1].append(line)
+        else:
+            header.append(line)
+    return header, groups
+
+
+# Instancia global (sin estado por petición)
+_assembler: Optional[PromptAssembler] = None
+
+
+def get_prompt_assembler() -> PromptAssembler:
+    """Función helper para obtener el ensamblador de prompts del mentor"""
+    global _assembler
+    if _assembler is None:
+        _assembler = PromptAssembler()
+    return _assembler
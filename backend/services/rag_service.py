@@ -2,7 +2,9 @@
 Servicio RAG (Retrieval-Augmented Generation) para MIAPPBORA
 Implementa el pipeline completo de RAG con Langchain
 """
-from typing import List, Dict, Optional, Any, Tuple
+from typing import List, Dict, Optional, Any, Tuple, AsyncIterator, Sequence, Set
+import asyncio
+import re
 import time
 from pathlib import Path
 from langchain.embeddings.base import Embeddings
@@ -15,22 +17,100 @@ from sqlalchemy.orm import Session
 from models.database import BoraPhrase, PhraseEmbedding, ChatConversation, ChatMessage
 from adapters.huggingface_adapter import get_huggingface_adapter
 from adapters.supabase_adapter import get_supabase_adapter
+from adapters.async_supabase_adapter import get_async_supabase_adapter
 from adapters.openai_adapter import get_openai_adapter
+from adapters.openai_rate_governor import LLMQueueTimeout
+from adapters.local_vector_adapter import get_local_vector_index
+from services.lexicon_cache import get_lexicon_cache, CACHE_HIT, CACHE_COALESCED
+from services.direction_detector import get_direction_detector, normalize_term, query_terms
+from services.lemma_map import get_lemma_map
+from services.lexical_index import get_lexical_index, reciprocal_rank_fusion
+from services.semantic_cache import get_semantic_cache, make_semantic_scope, semantic_query_key
+from services.conversation_history_cache import get_conversation_history_cache
+from services.chat_persistence import get_chat_persistence_queue
+from services.conversation_summarizer import get_conversation_summarizer, summary_history_message
+from services.llm_router import get_llm_router
+from services.answer_cards import get_answer_card_store, render_answer_card
+from services.prompt_assembler import collect_prompt_stats, get_prompt_assembler
+from services.metrics import (
+    observe_rag_timings,
+    record_cache_lookup,
+    record_chat_persist,
+    record_speculative_retrieval,
+)
+from services.latency_budget import (
+    LatencyBudget,
+    get_latency_estimator,
+    SKIP_PREPROCESSING,
+    PREPROCESSING_TIMEOUT,
+    SKIP_EXAMPLES,
+    REDUCE_TOP_K,
+    SHRINK_MAX_TOKENS,
+    LLM_TIMEOUT,
+    FALLBACK_ANSWER,
+)
 from config.settings import settings
 import logging
 import json
 
 logger = logging.getLogger(__name__)
 
-# Cache simple en memoria para resultados del lexicón
-_CACHE_TTL_SECONDS = 120  # 2 minutos
-_lexicon_cache: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+# Resultado de la recuperación especulativa en este proceso (para counters)
+_speculation_stats = {"hit": 0, "miss": 0}
+# Guardados diferidos en la cache semántica (referencias para que no los recoja el GC)
+_semantic_store_tasks: Set[asyncio.Task] = set()
 
 def _make_lexicon_cache_key(q: str, top_k: int, min_sim: float, category: Optional[str], fast: bool) -> str:
     cat = (category or '').strip().lower()
     return f"q={q.strip().lower()}|k={top_k}|min={min_sim:.2f}|cat={cat}|fast={int(fast)}"
 
 
+def _is_context_echo_line(line: str) -> bool:
+    """True si la línea (ya sin espacios) es eco del bloque de CONTEXTO."""
+    # Filtrar ecos típicos
+    if line.startswith('[CONTEXTO') or 'Entradas relevantes' in line:
+        return True
+    # Filtrar líneas que parezcan ser el listado crudo del contexto
+    return bool(re.match(r'^\d+\.\s*\[Lemma\b', line))
+
+
+class _MentorStreamFilter:
+    """
+    Versión incremental de _post_process_mentor_response para respuestas en streaming.
+
+    Cada línea se retiene hasta su salto de línea y se evalúa entera con el
+    mismo predicado (_is_context_echo_line): "Entradas relevantes" descarta la
+    línea aparezca donde aparezca, así que no hay prefijo que se pueda emitir
+    antes con garantías. Se descartan líneas vacías y espacios de borde, igual
+    que el post-proceso; la salida concatenada es idéntica a la suya.
+    """
+
+    def __init__(self):
+        self._line = ""          # línea actual, pendiente de su salto de línea
+        self._emitted_any = False
+
+    def feed(self, chunk: str) -> str:
+        out: List[str] = []
+        lines = (self._line + chunk).split("\n")
+        self._line = lines.pop()
+        for line in lines:
+            out.append(self._emit(line))
+        return "".join(out)
+
+    def flush(self) -> str:
+        out = self._emit(self._line)
+        self._line = ""
+        return out
+
+    def _emit(self, line: str) -> str:
+        line = line.strip()
+        if not line or _is_context_echo_line(line):
+            return ""
+        prefix = "\n" if self._emitted_any else ""
+        self._emitted_any = True
+        return prefix + line
+
+
 class CustomHuggingFaceEmbeddings(Embeddings):
     """
     Wrapper de embeddings de HuggingFace para Langchain
@@ -72,11 +152,35 @@ class RAGService:
     
     def __init__(self):
         self.hf_adapter = get_huggingface_adapter()  # Fallback local
-        self.supabase_adapter = get_supabase_adapter()
+        self.supabase_adapter = self._select_supabase_adapter()
         self.embeddings = CustomHuggingFaceEmbeddings()
         
         # Adaptador de OpenAI (si está habilitado)
         self.openai_adapter = get_openai_adapter() if settings.OPENAI_ENABLED else None
+
+        # Motor de búsqueda vectorial del lexicón (RPC en Supabase o snapshot local)
+        self.vector_store = self._select_vector_store()
+
+    @staticmethod
+    def _select_supabase_adapter():
+        """Cliente PostgREST asíncrono con pool (SUPABASE_ASYNC_CLIENT) o supabase-py en hilos."""
+        if getattr(settings, "SUPABASE_ASYNC_CLIENT", True):
+            async_adapter = get_async_supabase_adapter()
+            if async_adapter.is_connected():
+                return async_adapter
+        return get_supabase_adapter()
+
+    def _select_vector_store(self):
+        """Elige el backend de vector_search_bora_docs según VECTOR_SEARCH_BACKEND."""
+        backend = getattr(settings, "VECTOR_SEARCH_BACKEND", "rpc").lower()
+        if backend == "local":
+            local_index = get_local_vector_index()
+            if local_index.ensure_loaded():
+                return local_index
+            logger.warning("Índice vectorial local no disponible, usando RPC de Supabase")
+        elif backend != "rpc":
+            logger.warning(f"VECTOR_SEARCH_BACKEND no soportado: {backend}. Usando RPC de Supabase")
+        return self.supabase_adapter
     
     # ==========================================
     # Helpers de conversación/persistencia
@@ -95,24 +199,86 @@ class RAGService:
         conversation_id: Optional[int],
         limit: int = 6,
     ) -> List[Dict[str, Any]]:
-        """Obtiene historial desde la DB para alimentar el prompt."""
+        """
+        Obtiene los últimos `limit` mensajes para alimentar el prompt.
+
+        Primero la cache en memoria; si no los cubre, consulta descendente con
+        LIMIT (índice chat_messages(conversation_id, created_at)) y rellena la
+        cache con la ventana completa. Con resúmenes activos devuelve resumen +
+        mensajes aún no resumidos (ver _fetch_summarized_history) e ignora `limit`.
+        """
         if not db or not conversation_id:
             return []
-
-        messages = (
-            db.query(ChatMessage)
+        if get_conversation_summarizer().enabled:
+            return self._fetch_summarized_history(db, conversation_id)
+
+        history_cache = get_conversation_history_cache()
+        cached = history_cache.get(conversation_id, limit)
+        if cached is not None:
+            return cached
+
+        # Traer la ventana de la cache (si es mayor) para que las siguientes lecturas no toquen la DB
+        fetch_limit = max(limit, history_cache.window)
+        rows = (
+            db.query(ChatMessage.role, ChatMessage.content)
             .filter(ChatMessage.conversation_id == conversation_id)
-            .order_by(ChatMessage.created_at.asc())
+            .order_by(ChatMessage.created_at.desc(), ChatMessage.id.desc())
+            .limit(fetch_limit)
             .all()
         )
-        if not messages:
-            return []
+        messages = [{"role": r.role, "content": r.content} for r in reversed(rows)]
+        history_cache.load(conversation_id, messages, complete=len(rows) < fetch_limit)
+        return messages[-limit:] if limit > 0 else []
 
-        # Solo últimos N para evitar prompts gigantes
-        sliced = messages[-limit:]
-        return [{"role": m.role, "content": m.content} for m in sliced]
+    def _fetch_summarized_history(self, db: Session, conversation_id: int) -> List[Dict[str, Any]]:
+        """
+        Resumen de la conversación (mensaje role "system") + los mensajes que
+        aún no cubre, entre keep_messages y history_window: el tamaño no crece
+        con la longitud de la conversación.
+        """
+        summarizer = get_conversation_summarizer()
+        history_cache = get_conversation_history_cache()
+        window = summarizer.history_window
+
+        messages = history_cache.get(conversation_id, window)
+        info = history_cache.get_summary(conversation_id) if messages is not None else None
+        if info is None:
+            fetch_limit = max(window, history_cache.window)
+            rows = (
+                db.query(ChatMessage.role, ChatMessage.content)
+                .filter(ChatMessage.conversation_id == conversation_id)
+                .order_by(ChatMessage.created_at.desc(), ChatMessage.id.desc())
+                .limit(fetch_limit)
+                .all()
+            )
+            # Columnas del resumen: sin mapear en el ORM (ver ChatConversation)
+            columns = ChatConversation.__table__.c
+            conversation = (
+                db.query(columns.summary, columns.summary_message_count)
+                .filter(columns.id == conversation_id)
+                .first()
+            )
+            complete = len(rows) < fetch_limit
+            total = len(rows) if complete else (
+                db.query(ChatMessage.id).filter(ChatMessage.conversation_id == conversation_id).count()
+            )
+            summary = conversation.summary if conversation else None
+            covered = (conversation.summary_message_count or 0) if conversation else 0
+            messages = [{"role": r.role, "content": r.content} for r in reversed(rows)]
+            history_cache.load(
+                conversation_id, messages, complete=complete,
+                summary=summary, summary_covered=covered, total=total,
+            )
+        else:
+            summary, covered, total = info
 
-    def _persist_chat_exchange(
+        pending = min(window, max(summarizer.keep_messages, total - covered))
+        history = messages[-pending:] if pending > 0 else []
+        if summary:
+            history = [summary_history_message(summary)] + history
+        return history
+
+    async def _persist_chat_exchange(
         self,
         db: Optional[Session],
         user_id: Optional[int],
@@ -120,15 +286,23 @@ class RAGService:
         answer: str,
         conversation_id: Optional[int],
     ) -> Optional[int]:
-        """Guarda mensaje del usuario y respuesta del mentor."""
+        """
+        Guarda mensaje del usuario y respuesta del mentor.
+
+        En la ruta de la petición solo se valida o crea la conversación (para
+        devolver su id); los mensajes los escribe la cola write-behind
+        (services/chat_persistence.py). Sin cola activa o con la cola llena se
+        escriben inline como antes.
+        """
         if not db or not user_id:
             return conversation_id
 
         try:
             conversation = None
+            created = False
             if conversation_id:
                 conversation = (
-                    db.query(ChatConversation)
+                    db.query(ChatConversation.id)
                     .filter(
                         ChatConversation.id == conversation_id,
                         ChatConversation.user_id == user_id,
@@ -136,33 +310,31 @@ class RAGService:
                     .first()
                 )
 
-            if not conversation:
-                conversation = ChatConversation(
+            if conversation:
+                convo_id = conversation.id
+            else:
+                new_conversation = ChatConversation(
                     user_id=user_id,
                     title=self._conversation_title_from_query(query),
                 )
-                db.add(conversation)
-                db.flush()  # Necesitamos el ID para mensajes
-
-            convo_id = conversation.id
-
-            db.add(
-                ChatMessage(
-                    conversation_id=convo_id,
-                    role="user",
-                    content=query,
-                )
-            )
-            db.add(
-                ChatMessage(
-                    conversation_id=convo_id,
-                    role="assistant",
-                    content=answer,
-                )
-            )
-
-            db.commit()
-            db.refresh(conversation)
+                db.add(new_conversation)
+                # Commit inmediato: el worker escribe con otra sesión y necesita la FK visible
+                db.commit()
+                convo_id = new_conversation.id
+                created = True
+
+            messages = [{"role": "user", "content": query}, {"role": "assistant", "content": answer}]
+            queued = await get_chat_persistence_queue().submit(convo_id, messages)
+            if not queued:
+                for m in messages:
+                    db.add(ChatMessage(conversation_id=convo_id, role=m["role"], content=m["content"]))
+                db.commit()
+                record_chat_persist("inline", len(messages))
+            # El historial en memoria se actualiza ya: el siguiente turno no depende del flush
+            get_conversation_history_cache().append(convo_id, messages, new=created)
+            if not queued:
+                # Encolado, el resumidor se avisa cuando el worker escribe el lote
+                get_conversation_summarizer().note_exchange(convo_id)
             return convo_id
         except Exception:
             if db:
@@ -246,6 +418,7 @@ Asistente:"""
                 messages=[{"role": "user", "content": extraction_prompt}],
                 temperature=0.2,  # Temperatura ligeramente más alta para flexibilidad
                 max_tokens=100,    # Permitir frases más largas con contexto
+                purpose="extraction",
             )
             
             extracted = response.strip()
@@ -271,9 +444,17 @@ Asistente:"""
     # LEXICON: búsqueda semántica + respuesta RAG
     # ==========================================
 
-    async def _detect_query_direction(self, query: str) -> Optional[str]:
+    async def _detect_query_direction(
+        self,
+        query: str,
+        counters: Optional[Dict[str, int]] = None,
+        allow_llm: bool = True,
+    ) -> Optional[str]:
         """
-        Detecta la dirección de traducción del query usando LLM.
+        Detecta la dirección de traducción del query.
+
+        Primero aplica el detector local (frases guía, caracteres Bora y lemas
+        conocidos); solo si la consulta es ambigua se consulta al LLM.
         
         Ejemplos:
         - "Como se dice cantar en bora" → 'es_bora' (español a Bora)
@@ -285,15 +466,34 @@ Asistente:"""
             'bora_es': Query en Bora buscando traducción al español
             None: Ambiguo o no se puede determinar
         """
-        # Si el preprocesamiento está deshabilitado, no detectar dirección
-        if not settings.ENABLE_QUERY_PREPROCESSING:
-            logger.debug("Query preprocessing deshabilitado, sin detección de dirección")
-            return None
-        
-        if not self.openai_adapter:
-            logger.warning("OpenAI adapter no disponible para detección de dirección")
-            return None
-        
+        detector = get_direction_detector()
+        local_direction, confident = detector.classify(query)
+        source = "local" if confident else "unresolved"
+        try:
+            if confident:
+                logger.info(f"🧭 Dirección detectada localmente: {local_direction} para query '{query}'")
+                return local_direction
+
+            # Si el preprocesamiento está deshabilitado (o no cabe en el deadline), no consultar al LLM
+            if not settings.ENABLE_QUERY_PREPROCESSING or not allow_llm:
+                logger.debug("Query preprocessing deshabilitado, sin detección de dirección por LLM")
+                return None
+
+            if not self.openai_adapter:
+                logger.warning("OpenAI adapter no disponible para detección de dirección")
+                return None
+
+            source = "llm"
+            return await self._detect_query_direction_llm(query)
+        finally:
+            detector.record(source)
+            if counters is not None:
+                counters["direction_local"] = int(source == "local")
+                counters["direction_llm"] = int(source == "llm")
+                counters["direction_local_share_pct"] = int(round(detector.local_share() * 100))
+
+    async def _detect_query_direction_llm(self, query: str) -> Optional[str]:
+        """Clasificación de dirección con LLM (solo para consultas ambiguas)."""
         try:
             detection_prompt = f"""Eres un clasificador de consultas de traducción Español-Bora.
 
@@ -344,6 +544,7 @@ Respuesta:"""
                 messages=[{"role": "user", "content": detection_prompt}],
                 temperature=0.0,
                 max_tokens=10,
+                purpose="direction",
             )
             
             detected = response.strip().upper()
@@ -363,6 +564,61 @@ Respuesta:"""
             logger.error(f"Error en detección de dirección: {e}", exc_info=True)
             return None
 
+    async def _preprocess_query(
+        self,
+        query: str,
+        timings: Dict[str, float],
+        counters: Optional[Dict[str, int]] = None,
+    ) -> Tuple[str, Optional[str]]:
+        """
+        Ejecuta extracción de keywords y detección de dirección de forma concurrente.
+
+        Ambas tareas son round trips independientes a gpt-4o-mini (la detección
+        de dirección solo cuando el detector local no es concluyente); lanzarlas
+        con asyncio.gather reduce la latencia de preprocesamiento a la de la
+        llamada más lenta. Cada tarea conserva su propio fallback (query original / None).
+
+        Registra en timings:
+            preprocessing_ms: duración de la extracción de keywords
+            direction_detection_ms: duración de la detección de dirección
+            preprocessing_total_ms: tiempo de pared de la etapa completa
+            preprocessing_saved_ms: ahorro frente a ejecutarlas en serie
+        """
+
+        async def _timed(coro, key: str):
+            t_start = time.perf_counter()
+            try:
+                return await coro
+            finally:
+                timings[key] = (time.perf_counter() - t_start) * 1000.0
+
+        t_prep0 = time.perf_counter()
+        cleaned_query, detected_direction = await asyncio.gather(
+            _timed(self._extract_search_keywords(query), "preprocessing_ms"),
+            _timed(self._detect_query_direction(query, counters), "direction_detection_ms"),
+        )
+        total_ms = (time.perf_counter() - t_prep0) * 1000.0
+        timings["preprocessing_total_ms"] = total_ms
+        sequential_ms = timings.get("preprocessing_ms", 0.0) + timings.get("direction_detection_ms", 0.0)
+        timings["preprocessing_saved_ms"] = max(0.0, sequential_ms - total_ms)
+        return cleaned_query, detected_direction
+
+    async def _preprocess_query_local(
+        self,
+        query: str,
+        timings: Dict[str, float],
+        counters: Optional[Dict[str, int]] = None,
+    ) -> Tuple[str, Optional[str]]:
+        """
+        Preprocesado sin LLM (cuando no cabe en el deadline): el término sin
+        frases guía como query limpia y solo el detector local de dirección.
+        """
+        t_prep0 = time.perf_counter()
+        cleaned_query = " ".join(query_terms(query)) or query
+        detected_direction = await self._detect_query_direction(query, counters, allow_llm=False)
+        timings["preprocessing_total_ms"] = (time.perf_counter() - t_prep0) * 1000.0
+        return cleaned_query, detected_direction
+
     async def search_lexicon(
         self,
         query: str,
@@ -372,7 +628,7 @@ Respuesta:"""
         direction: Optional[str] = None,  # ✅ NUEVO: 'es_bora', 'bora_es', o None
     ) -> List[Dict[str, Any]]:
         """Busca en el lexicón usando match_bora_docs (unificado) y filtra por similitud mínima."""
-        emb = self.hf_adapter.generate_embedding(query)
+        emb = await self.hf_adapter.agenerate_embedding(query)
         if not emb:
             return []
         
@@ -380,7 +636,7 @@ Respuesta:"""
         # Esto asegura que el vector search retorne los top_k resultados más similares
         # sin filtrar por dirección (mejor recall)
         
-        results = await self.supabase_adapter.vector_search_bora_docs(
+        results = await self.vector_store.vector_search_bora_docs(
             query_embedding=emb,
             top_k=top_k,
             kinds=None,  # ['lemma','subentry','example']
@@ -391,6 +647,116 @@ Respuesta:"""
         # match_bora_docs ya aplica el threshold; devolvemos tal cual
         return results or []
 
+    async def search_lexicon_batch(
+        self,
+        queries: List[str],
+        top_k: int = 10,
+        min_similarity: float = 0.7,
+        category: Optional[str] = None,
+        fast: bool = False,
+        skip_llm: bool = False,
+        max_concurrency: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        """
+        Varias consultas del lexicón en una sola petición.
+
+        preprocesado (concurrente) -> UN embedding batch -> recuperación (+ LLM
+        opcional) concurrente con fan-out acotado. Las consultas repetidas se
+        resuelven una sola vez. No usa las caches de respuestas: está pensado
+        para material de clase y evaluaciones offline.
+        """
+        t0 = time.perf_counter()
+        unique_queries = list(dict.fromkeys(q.strip() for q in queries if q and q.strip()))
+        semaphore = asyncio.Semaphore(max_concurrency or settings.LEXICON_BATCH_CONCURRENCY)
+        per_query: Dict[str, Dict[str, Any]] = {
+            q: {"query": q, "timings": {}, "counters": {}} for q in unique_queries
+        }
+        aggregate: Dict[str, float] = {}
+
+        async def _bounded(coro):
+            async with semaphore:
+                return await coro
+
+        # 1) Preprocesado (keywords + dirección) de todas las consultas
+        t_prep0 = time.perf_counter()
+        prepped = await asyncio.gather(*(
+            _bounded(self._preprocess_query(q, per_query[q]["timings"], per_query[q]["counters"]))
+            for q in unique_queries
+        ))
+        aggregate["preprocessing_ms"] = (time.perf_counter() - t_prep0) * 1000.0
+        for q, (cleaned, direction) in zip(unique_queries, prepped):
+            per_query[q]["cleaned_query"] = cleaned
+            per_query[q]["direction"] = direction
+
+        # 2) Un único round trip de embeddings para todo el lote
+        t_emb0 = time.perf_counter()
+        embeddings = await self.hf_adapter.agenerate_embeddings_batch(
+            [per_query[q]["cleaned_query"] for q in unique_queries]
+        ) if unique_queries else []
+        aggregate["embedding_ms"] = (time.perf_counter() - t_emb0) * 1000.0
+        if embeddings is None:
+            embeddings = [None] * len(unique_queries)
+
+        # 3) Recuperación (+ LLM) por consulta, con fan-out acotado
+        async def _one(q: str, emb: Optional[List[float]]) -> None:
+            entry = per_query[q]
+            timings, counters = entry["timings"], entry["counters"]
+            if not emb:
+                entry.update({"results": [], "groups": [], "error": "embedding_failed"})
+                return
+            async with semaphore:
+                t_q0 = time.perf_counter()
+                hits, groups = await self._retrieve_lexicon_groups(
+                    query=q,
+                    query_embedding=emb,
+                    top_k=top_k,
+                    min_similarity=min_similarity,
+                    category=category,
+                    fast=fast,
+                    timings=timings,
+                    counters=counters,
+                )
+                entry["results"] = hits
+                entry["groups"] = [{k: v for k, v in g.items() if k != 'items'} for g in groups]
+                if not skip_llm:
+                    context = self._build_lexicon_context(groups, timings)
+                    t_llm0 = time.perf_counter()
+                    answer = await self.generate_response(
+                        query=q,
+                        context=context,
+                        conversation_history=None,
+                        response_max_tokens=self._fast_max_tokens(fast),
+                    )
+                    timings["llm_ms"] = (time.perf_counter() - t_llm0) * 1000.0
+                    entry["answer"] = answer
+                timings["query_ms"] = (time.perf_counter() - t_q0) * 1000.0
+            observe_rag_timings(timings)
+            get_latency_estimator().observe_timings(timings)
+
+        t_ret0 = time.perf_counter()
+        await asyncio.gather(*(_one(q, emb) for q, emb in zip(unique_queries, embeddings)))
+        aggregate["retrieval_ms"] = (time.perf_counter() - t_ret0) * 1000.0
+        aggregate["total_ms"] = (time.perf_counter() - t0) * 1000.0
+
+        failed = sum(1 for q in unique_queries if per_query[q].get("error"))
+        logger.info(
+            "⏱️ Batch lexicón | queries=%d unique=%d failed=%d total=%.0fms prep=%.0fms emb=%.0fms ret=%.0fms llm=%s",
+            len(queries), len(unique_queries), failed,
+            aggregate["total_ms"], aggregate["preprocessing_ms"], aggregate["embedding_ms"],
+            aggregate["retrieval_ms"], "no" if skip_llm else "sí",
+        )
+        return {
+            # Una entrada por consulta recibida (repetidas comparten resultado)
+            "results": [per_query[q.strip()] for q in queries if q and q.strip()],
+            "timings": aggregate,
+            "counters": {
+                "queries": len(queries),
+                "unique_queries": len(unique_queries),
+                "failed": failed,
+                "embedding_api_calls": 1 if unique_queries else 0,
+            },
+        }
+
     async def answer_with_lexicon(
         self,
         query: str,
@@ -404,11 +770,32 @@ Respuesta:"""
         conversation_id: Optional[int] = None,
         persist: bool = False,
         history_limit: int = 6,
+        deadline_ms: Optional[int] = None,
+        full_answer: bool = False,
     ) -> Dict[str, Any]:
-        """Pipeline RAG unificado: retrieve (con boost por lemma exacto) -> prompt -> LLM."""
+        """
+        Pipeline RAG unificado: retrieve (con boost por lemma exacto) -> prompt -> LLM.
+
+        Si la consulta es exactamente un lema ("cantar", "cómo se dice cantar")
+        se sirve su tarjeta precalculada (services/answer_cards.py) sin
+        embedding ni LLM, salvo `full_answer`.
+
+        Con `deadline_ms`, cada etapa se decide según las latencias estimadas
+        (services/latency_budget.py): sin preprocesado LLM, sin ejemplos, menos
+        top_k, menos tokens de salida o la respuesta determinista de fallback.
+        Las degradaciones aplicadas se devuelven en `degradations` y esas
+        respuestas no se cachean.
+        """
         t0 = time.perf_counter()
-        timings: Dict[str, float] = {}
-        counters: Dict[str, int] = {}
+        budget = LatencyBudget(deadline_ms, started_at=t0) if deadline_ms else None
+
+        result = None if full_answer else self._answer_from_card(query, category, t0)
+        if result is not None:
+            if persist:
+                await self._persist_lexicon_result(result, db, user_id, query, conversation_id)
+            else:
+                result["conversation_id"] = conversation_id
+            return result
 
         if conversation_history is None and db and conversation_id:
             conversation_history = self._fetch_conversation_history_from_db(
@@ -416,85 +803,888 @@ Respuesta:"""
             )
 
         use_cache = not (conversation_history or conversation_id or persist)
-        cache_key: Optional[str] = None
-        now = time.time()
 
-        # 0) Cache lookup
+        # 0) Cache (con single-flight: consultas idénticas concurrentes comparten cómputo)
         if use_cache:
             cache_key = _make_lexicon_cache_key(query, top_k, min_similarity, category, fast)
-            cached = _lexicon_cache.get(cache_key)
-            if cached and cached[0] > now:
-                result = cached[1]
-                result = dict(result)
-                t_elapsed = (time.perf_counter() - t0) * 1000.0
-                ts = dict(result.get("timings", {}))
-                ts["cache_hit_ms"] = t_elapsed
-                result["timings"] = ts
+            semantic_scope = (
+                make_semantic_scope(top_k, min_similarity, category, fast)
+                if getattr(settings, "SEMANTIC_CACHE_ENABLED", True) else None
+            )
+            result, cache_status = await get_lexicon_cache().get_or_compute(
+                cache_key,
+                lambda: self._run_lexicon_pipeline(
+                    query=query,
+                    top_k=top_k,
+                    min_similarity=min_similarity,
+                    category=category,
+                    conversation_history=conversation_history,
+                    fast=fast,
+                    t0=t0,
+                    semantic_scope=semantic_scope,
+                    budget=budget,
+                ),
+                # No cachear respuestas vacías (p. ej. falló el embedding) ni degradadas
+                cacheable=lambda r: bool(r.get("answer")) and not r.get("degradations"),
+            )
+            record_cache_lookup("lexicon", cache_status)
+            # Siempre una copia: el valor es el mismo objeto guardado en la LRU y
+            # en la cache semántica (también en un MISS), y el llamador puede modificarlo
+            result = dict(result)
+            result["timings"] = dict(result.get("timings", {}))
+            result["counters"] = dict(result.get("counters", {}))
+            if cache_status in (CACHE_HIT, CACHE_COALESCED):
+                result["timings"]["cache_hit_ms"] = (time.perf_counter() - t0) * 1000.0
+            return result
+
+        result = await self._run_lexicon_pipeline(
+            query=query,
+            top_k=top_k,
+            min_similarity=min_similarity,
+            category=category,
+            conversation_history=conversation_history,
+            fast=fast,
+            t0=t0,
+            budget=budget,
+        )
+
+        if persist:
+            await self._persist_lexicon_result(result, db, user_id, query, conversation_id)
+        else:
+            result["conversation_id"] = conversation_id
+
+        return result
+
+    async def _persist_lexicon_result(
+        self,
+        result: Dict[str, Any],
+        db: Optional[Session],
+        user_id: Optional[int],
+        query: str,
+        conversation_id: Optional[int],
+    ) -> None:
+        if not db or not user_id:
+            logger.warning("Persistencia de chat solicitada sin db/user_id")
+            return
+        stored_conversation_id = await self._persist_chat_exchange(
+            db=db,
+            user_id=user_id,
+            query=query,
+            answer=result.get("answer", ""),
+            conversation_id=conversation_id,
+        )
+        if stored_conversation_id:
+            result["conversation_id"] = stored_conversation_id
+
+    def _answer_card_lemma(self, query: str) -> Optional[Dict[str, Any]]:
+        """
+        Lema con tarjeta servible: la consulta (o su término sin frases guía)
+        coincide con el lema de forma exacta o en minúsculas, y la dirección
+        detectada, si es confiable, no contradice la del lema. Las coincidencias
+        solo plegadas (sin diacríticos) pasan por el pipeline completo.
+        """
+        lemma_map = get_lemma_map()
+        if not lemma_map.is_loaded():
+            return None
+        term = " ".join(query_terms(query))
+        row, kind = lemma_map.lookup_with_kind(term or query)
+        if row is None or kind == 'folded':
+            return None
+        direction, reliable = get_direction_detector().classify(query)
+        if reliable and direction and row.get('direction') and direction != row['direction']:
+            return None
+        return row
+
+    def _answer_from_card(self, query: str, category: Optional[str], t0: float) -> Optional[Dict[str, Any]]:
+        """Resultado de answer_with_lexicon servido desde la tarjeta del lema, o None."""
+        store = get_answer_card_store()
+        if not store.enabled:
+            return None
+        row = self._answer_card_lemma(query)
+        if row is None or (category and row.get('pos_full') != category):
+            return None
+        answer = store.get(row)
+        if not answer:
+            return None
+        timings = {"answer_card_ms": (time.perf_counter() - t0) * 1000.0}
+        timings["total_ms"] = timings["answer_card_ms"]
+        observe_rag_timings(timings)
+        logger.info(f"🃏 Tarjeta de respuesta para '{query}' (lemma {row['id']}: {row['lemma']})")
+        return {
+            "answer": answer,
+            "response": answer,
+            "results": [self._lemma_boost_hit(row)],
+            "timings": timings,
+            "counters": {"answer_card_hit": 1},
+            "conversation_id": None,
+            "answer_card": {"lemma_id": row['id'], "lemma": row['lemma']},
+        }
+
+    def shed_lexicon_answer(
+        self,
+        query: str,
+        top_k: int = 10,
+        min_similarity: float = 0.7,
+        category: Optional[str] = None,
+        fast: bool = False,
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Respuesta barata para consultas que el control de admisión no puede
+        atender a tiempo (services/admission_control.py), sin embedding, LLM
+        ni DB: tarjeta del lema, respuesta ya cacheada o respuesta determinista
+        con el lema del índice léxico que coincide con el término consultado.
+        None si no hay nada que servir (el router responde 503).
+
+        El campo `shed` indica el origen; estas respuestas no se persisten.
+        """
+        t0 = time.perf_counter()
+        result = self._answer_from_card(query, category, t0)
+        source = "answer_card"
+        if result is None:
+            cached = get_lexicon_cache().get(_make_lexicon_cache_key(query, top_k, min_similarity, category, fast))
+            if cached and cached.get("answer"):
+                result = dict(cached)
+                result["timings"] = dict(result.get("timings", {}))
+                source = "cache"
+        if result is None:
+            result = self._lexical_shed_answer(query, top_k, category)
+            source = "lexical"
+        if result is None:
+            return None
+        result["timings"]["shed_ms"] = (time.perf_counter() - t0) * 1000.0
+        result["conversation_id"] = None
+        result["shed"] = source
+        return result
+
+    @staticmethod
+    def _lexical_shed_answer(query: str, top_k: int, category: Optional[str]) -> Optional[Dict[str, Any]]:
+        """
+        Lema del índice léxico (BM25 en memoria) renderizado como tarjeta, con sus ejemplos.
+
+        Solo si el lema es el término consultado, con la misma regla que
+        _answer_card_lemma: la consulta (o su término sin frases guía) coincide
+        de forma exacta o en minúsculas y la dirección detectada, si es
+        confiable, no la contradice. El mejor hit BM25 sin más puede ser otra
+        palabra ("quiero aprender a contar" -> «aprender»).
+        """
+        lexical_index = get_lexical_index()
+        if not getattr(settings, "LEXICAL_SEARCH_ENABLED", True) or not lexical_index.is_loaded():
+            return None
+        wanted = normalize_term(" ".join(query_terms(query)) or query)
+        if not wanted:
+            return None
+        direction, reliable = get_direction_detector().classify(query)
+        hits = lexical_index.search(query, min(top_k, settings.LEXICAL_TOP_K), category)
+        lemma = next(
+            (
+                h for h in hits
+                if h.get('kind') == 'lemma'
+                and normalize_term(h.get('lemma') or '') == wanted
+                and not (reliable and direction and h.get('direction') and h['direction'] != direction)
+            ),
+            None,
+        )
+        if lemma is None:
+            return None
+        examples = [
+            h for h in hits
+            if h.get('kind') == 'example' and h.get('parent_lemma_id') == lemma.get('parent_lemma_id')
+        ]
+        answer = render_answer_card(lemma, examples)
+        if not answer:
+            return None
+        return {
+            "answer": answer,
+            "response": answer,
+            "results": hits,
+            "timings": {},
+            "counters": {"lexical_hits": len(hits)},
+            "conversation_id": None,
+        }
+
+    async def stream_answer_with_lexicon(
+        self,
+        query: str,
+        top_k: int = 10,
+        min_similarity: float = 0.7,
+        category: Optional[str] = None,
+        fast: bool = False,
+        db: Optional[Session] = None,
+        user_id: Optional[int] = None,
+        conversation_id: Optional[int] = None,
+        persist: bool = True,
+        history_limit: int = 6,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Variante en streaming de answer_with_lexicon.
+
+        Emite eventos {"event": ..., "data": ...} en este orden:
+            retrieval -> resultados recuperados (el cliente puede pintarlos ya)
+            token     -> fragmentos de la respuesta del LLM, ya filtrados
+            done      -> respuesta final, timings, counters y conversation_id
+        o bien "error" si falla el embedding o el LLM. La conversación se
+        persiste solo cuando el stream termina correctamente.
+        """
+        t0 = time.perf_counter()
+        timings: Dict[str, float] = {}
+        counters: Dict[str, int] = {}
+
+        conversation_history = None
+        if db and conversation_id:
+            conversation_history = self._fetch_conversation_history_from_db(
+                db, conversation_id, history_limit
+            )
+
+        if self._can_speculate(query):
+            emb, speculative = await self._embed_lexicon_query_speculative(
+                query, top_k, min_similarity, category, fast, timings, counters
+            )
+        else:
+            _, emb = await self._embed_lexicon_query(query, timings, counters)
+            speculative = None
+        if not emb:
+            timings["total_ms"] = (time.perf_counter() - t0) * 1000.0
+            logger.info("⏱️ Timings RAG stream (falló embedding) | %s", timings)
+            yield {"event": "error", "data": {"detail": "No se pudo generar el embedding de la consulta", "timings": timings}}
+            return
+        if speculative is not None:
+            hits, context = speculative
+        else:
+            hits, context = await self._retrieve_lexicon_context(
+                query=query,
+                query_embedding=emb,
+                top_k=top_k,
+                min_similarity=min_similarity,
+                category=category,
+                fast=fast,
+                timings=timings,
+                counters=counters,
+            )
+        timings["retrieval_ms"] = (time.perf_counter() - t0) * 1000.0
+        yield {"event": "retrieval", "data": {"results": hits, "timings": dict(timings), "counters": dict(counters)}}
+
+        t_llm0 = time.perf_counter()
+        parts: List[str] = []
+        try:
+            with collect_prompt_stats() as prompt_stats:
+                async for piece in self._stream_response(
+                    query=query,
+                    context=context,
+                    conversation_history=conversation_history,
+                    response_max_tokens=self._fast_max_tokens(fast),
+                ):
+                    if not parts:
+                        timings["first_token_ms"] = (time.perf_counter() - t0) * 1000.0
+                    parts.append(piece)
+                    yield {"event": "token", "data": {"text": piece}}
+            counters.update(prompt_stats)
+        except Exception as e:
+            logger.error(f"❌ Error generando respuesta en streaming: {e}")
+            timings["total_ms"] = (time.perf_counter() - t0) * 1000.0
+            yield {"event": "error", "data": {"detail": "El modelo de lenguaje no está disponible", "timings": timings}}
+            return
+
+        answer = "".join(parts)
+        if not answer.strip():
+            # Asegurar que nunca devolvemos vacío al frontend
+            answer = self._generate_fallback_response(context)
+            yield {"event": "token", "data": {"text": answer}}
+        timings["llm_ms"] = (time.perf_counter() - t_llm0) * 1000.0
+        timings["total_ms"] = (time.perf_counter() - t0) * 1000.0
+        self._log_lexicon_timings(timings, counters)
+
+        stored_conversation_id = conversation_id
+        if persist:
+            if not db or not user_id:
+                logger.warning("Persistencia de chat solicitada sin db/user_id")
+            else:
+                stored_conversation_id = await self._persist_chat_exchange(
+                    db=db,
+                    user_id=user_id,
+                    query=query,
+                    answer=answer,
+                    conversation_id=conversation_id,
+                )
+
+        yield {
+            "event": "done",
+            "data": {
+                "answer": answer,
+                "response": answer,
+                "timings": timings,
+                "counters": counters,
+                "conversation_id": stored_conversation_id,
+            },
+        }
+
+    async def _stream_response(
+        self,
+        query: str,
+        context: str,
+        conversation_history: Optional[List[Dict]] = None,
+        response_max_tokens: Optional[int] = None,
+    ) -> AsyncIterator[str]:
+        """
+        Genera la respuesta del mentor en fragmentos, aplicando el filtrado de
+        _post_process_mentor_response de forma incremental.
+
+        Misma estrategia de proveedores que generate_response (sin hedging: el
+        texto ya emitido no se puede cambiar); respeta los circuit breakers del
+        router. Hugging Face no tiene streaming y se emite como un único fragmento.
+        """
+        messages = self._build_messages(query, context, conversation_history)
+        provider = getattr(settings, "LLM_PROVIDER", "openai").lower()
+        max_tokens_override = response_max_tokens if (response_max_tokens and response_max_tokens > 0) else None
+        allow_hf = getattr(settings, "ALLOW_HF_LLM_FALLBACK", False)
+        llm_router = get_llm_router()
+
+        if provider == "openai":
+            breaker = llm_router.breakers["openai"]
+            if self.openai_adapter and settings.OPENAI_API_KEY and breaker.allow():
+                stream_filter = _MentorStreamFilter()
+                emitted = False
+                t_stream0 = time.perf_counter()
+                try:
+                    async for chunk in self.openai_adapter.chat_completion_stream(
+                        messages=messages,
+                        temperature=settings.OPENAI_TEMPERATURE,
+                        max_tokens=(max_tokens_override or settings.OPENAI_MAX_TOKENS),
+                    ):
+                        text = stream_filter.feed(chunk)
+                        if text:
+                            emitted = True
+                            yield text
+                    tail = stream_filter.flush()
+                    if tail:
+                        yield tail
+                    breaker.record_success((time.perf_counter() - t_stream0) * 1000.0)
+                    return
+                except Exception as e:
+                    if isinstance(e, LLMQueueTimeout):
+                        # Cola local saturada: OpenAI no falló, no cuenta para el breaker
+                        breaker.release()
+                    else:
+                        breaker.record_failure(e)
+                    logger.error(f"❌ OpenAI (stream) falló: {e}")
+                    # Si ya se envió texto al cliente no se puede cambiar de proveedor
+                    if emitted or not allow_hf:
+                        raise RuntimeError("LLM (OpenAI) no disponible y fallback deshabilitado")
+                    logger.info("🔁 Intentando con Hugging Face (Inference API) como fallback...")
+                except BaseException:
+                    # Cliente desconectado o cancelación: no cuenta para el breaker
+                    breaker.release()
+                    raise
+            elif not allow_hf:
+                raise RuntimeError("LLM (OpenAI) no disponible y fallback deshabilitado")
+        elif provider != "huggingface":
+            raise ValueError(f"LLM_PROVIDER no soportado: {provider}")
+
+        if not llm_router.breakers["huggingface"].allow():
+            raise RuntimeError("LLM no disponible: circuito abierto (huggingface)")
+        try:
+            response = await llm_router.call_provider("huggingface", messages, max_tokens_override)
+        except Exception as e:
+            logger.error(f"❌ Hugging Face (stream) falló: {e}")
+            response = None
+        text = self._post_process_mentor_response(response) if response else ""
+        if text:
+            yield text
+
+    async def _run_lexicon_pipeline(
+        self,
+        query: str,
+        top_k: int,
+        min_similarity: float,
+        category: Optional[str],
+        conversation_history: Optional[List[Dict[str, Any]]],
+        fast: bool,
+        t0: float,
+        semantic_scope: Optional[str] = None,
+        budget: Optional[LatencyBudget] = None,
+    ) -> Dict[str, Any]:
+        """
+        Etapas del pipeline sin cache exacta ni persistencia: preprocesado -> retrieve -> contexto -> LLM.
+
+        Con `semantic_scope`, antes del preprocesado se consulta la cache semántica
+        (embedding de la query original, misma clave de término): una paráfrasis ya
+        respondida en el mismo ámbito evita la extracción, la recuperación y el LLM.
+        Con `budget` (deadline_ms) cada etapa puede degradarse para llegar a tiempo.
+        Sin `budget`, las consultas cortas recuperan de forma especulativa con la
+        query original mientras el LLM extrae keywords (_embed_lexicon_query_speculative).
+        """
+        timings: Dict[str, float] = {}
+        counters: Dict[str, int] = {}
+
+        semantic_key: Optional[str] = None
+        raw_emb: Optional[List[float]] = None
+        if semantic_scope:
+            semantic_key = semantic_query_key(query)
+            cache = get_semantic_cache()
+            t_sc0 = time.perf_counter()
+            # Solo se embebe la query original si hay entradas con la misma clave de término
+            if cache.has_candidates(semantic_scope, semantic_key):
+                raw_emb = await self.hf_adapter.agenerate_embedding(query)
+            match = cache.lookup(raw_emb, semantic_scope, semantic_key)
+            timings["semantic_cache_ms"] = (time.perf_counter() - t_sc0) * 1000.0
+            record_cache_lookup("semantic", "hit" if match else "miss")
+            if match:
+                cached, similarity, matched_query = match
+                counters["semantic_cache_hit"] = 1
+                timings["total_ms"] = (time.perf_counter() - t0) * 1000.0
+                observe_rag_timings(timings)
+                logger.info(
+                    f"🧠 Cache semántica: '{query}' ≈ '{matched_query}' (sim {similarity:.3f})"
+                )
+                result = dict(cached)
+                result["timings"] = timings
+                result["counters"] = counters
+                result["semantic_match"] = {"query": matched_query, "similarity": round(similarity, 4)}
                 return result
 
-        # 1) Preprocesar query para extraer keywords/frases clave (mejora búsqueda vectorial)
-        t_prep0 = time.perf_counter()
-        cleaned_query = await self._extract_search_keywords(query)
-        timings["preprocessing_ms"] = (time.perf_counter() - t_prep0) * 1000.0
-        
-        # 1.5) Detectar dirección de traducción del query (solo para logging, NO para filtrar)
-        t_dir0 = time.perf_counter()
-        detected_direction = await self._detect_query_direction(query)
-        timings["direction_detection_ms"] = (time.perf_counter() - t_dir0) * 1000.0
+        speculative: Optional[Tuple[List[Dict[str, Any]], str]] = None
+        if budget is None and self._can_speculate(query):
+            emb, speculative = await self._embed_lexicon_query_speculative(
+                query, top_k, min_similarity, category, fast, timings, counters
+            )
+            if speculative is not None:
+                # Reutilizada la recuperación con la query original: emb es el suyo
+                raw_emb = raw_emb or emb
+        else:
+            cleaned_query, emb = await self._embed_lexicon_query(query, timings, counters, budget=budget)
+            if cleaned_query == query:
+                raw_emb = raw_emb or emb
+        if not emb:
+            timings["total_ms"] = (time.perf_counter() - t0) * 1000.0
+            logger.info("⏱️ Timings RAG (falló embedding) | %s", timings)
+            return {"answer": "", "response": "", "results": [], "timings": timings, "counters": counters}
+
+        # Con deadline: sin ejemplos y/o menos top_k si la recuperación completa no cabe
+        retrieval_top_k, fetch_examples = top_k, True
+        if budget is not None and not fast and not budget.fits("vector_search", "examples_fetch", "llm"):
+            budget.degrade(SKIP_EXAMPLES)
+            fetch_examples = False
+            if not budget.fits("vector_search", "llm"):
+                budget.degrade(REDUCE_TOP_K)
+                retrieval_top_k = min(top_k, settings.DEADLINE_REDUCED_TOP_K)
+
+        if speculative is not None:
+            hits, context = speculative
+        else:
+            hits, context = await self._retrieve_lexicon_context(
+                query=query,
+                query_embedding=emb,
+                top_k=retrieval_top_k,
+                min_similarity=min_similarity,
+                category=category,
+                fast=fast,
+                timings=timings,
+                counters=counters,
+                fetch_examples=fetch_examples,
+            )
+
+        # Generar respuesta con el LLM existente
+        t_llm0 = time.perf_counter()
+        with collect_prompt_stats() as prompt_stats:
+            answer = await self._generate_lexicon_answer(
+                query=query,
+                context=context,
+                conversation_history=conversation_history,
+                fast=fast,
+                budget=budget,
+            )
+        counters.update(prompt_stats)
+        timings["llm_ms"] = (time.perf_counter() - t_llm0) * 1000.0
+        timings["total_ms"] = (time.perf_counter() - t0) * 1000.0
+        degradations = list(budget.applied) if budget is not None else []
+        if budget is not None:
+            timings["deadline_ms"] = budget.deadline_ms
+            counters["deadline_exceeded"] = int(timings["total_ms"] > budget.deadline_ms)
+        self._log_lexicon_timings(timings, counters, degradations)
+
+        # Devolvemos ambas claves por compatibilidad retro (algunas vistas usan "response")
+        result = {
+            "answer": answer,
+            "response": answer,
+            "results": hits,
+            "timings": timings,
+            "counters": counters,
+            "conversation_id": None,
+        }
+        if budget is not None:
+            result["degradations"] = degradations
+        if semantic_scope and answer and not degradations:
+            self._store_semantic_answer(query, semantic_scope, semantic_key, raw_emb, result)
+        return result
+
+    def _store_semantic_answer(
+        self,
+        query: str,
+        scope: str,
+        key: str,
+        raw_emb: Optional[List[float]],
+        result: Dict[str, Any],
+    ) -> None:
+        """
+        Guarda la respuesta en la cache semántica con el embedding de la query original.
+
+        Si no se calculó en esta petición (la query limpia difería), se embebe en
+        segundo plano para no añadir latencia a la respuesta.
+        """
+        cache = get_semantic_cache()
+        if raw_emb:
+            cache.store(raw_emb, scope, key, query, result)
+            return
+
+        async def _embed_and_store() -> None:
+            try:
+                emb = await self.hf_adapter.agenerate_embedding(query)
+            except Exception as e:
+                logger.warning(f"⚠️ No se pudo embeber '{query}' para la cache semántica: {e}")
+                return
+            if emb:
+                cache.store(emb, scope, key, query, result)
+
+        task = asyncio.ensure_future(_embed_and_store())
+        _semantic_store_tasks.add(task)
+        task.add_done_callback(_semantic_store_tasks.discard)
+
+    async def _generate_lexicon_answer(
+        self,
+        query: str,
+        context: str,
+        conversation_history: Optional[List[Dict[str, Any]]],
+        fast: bool,
+        budget: Optional[LatencyBudget] = None,
+    ) -> str:
+        """
+        Respuesta del LLM; con `budget`, recorta max_tokens a lo que cabe o usa
+        el fallback determinista, y corta la llamada al agotarse el deadline.
+        """
+        response_max_tokens = self._fast_max_tokens(fast)
+        if budget is None:
+            return await self.generate_response(
+                query=query,
+                context=context,
+                conversation_history=conversation_history,
+                response_max_tokens=response_max_tokens,
+            )
+
+        base_tokens = response_max_tokens or settings.OPENAI_MAX_TOKENS
+        tokens = budget.response_tokens(base_tokens)
+        if tokens is None:
+            budget.degrade(FALLBACK_ANSWER)
+            return self._generate_fallback_response(context)
+        if tokens < base_tokens:
+            budget.degrade(SHRINK_MAX_TOKENS)
+            response_max_tokens = tokens
+        try:
+            return await asyncio.wait_for(
+                self.generate_response(
+                    query=query,
+                    context=context,
+                    conversation_history=conversation_history,
+                    response_max_tokens=response_max_tokens,
+                ),
+                # Con el margen de seguridad: al vencer aún queda tiempo para el fallback
+                timeout=budget.llm_timeout_seconds(),
+            )
+        except asyncio.TimeoutError:
+            budget.degrade(LLM_TIMEOUT)
+            logger.warning(f"⏱️ LLM sin respuesta dentro del deadline ({budget.deadline_ms:.0f}ms); usando fallback")
+            return self._generate_fallback_response(context)
+
+    @staticmethod
+    def _fast_max_tokens(fast: bool) -> Optional[int]:
+        """Reducir presupuesto de salida en modo rápido para acelerar la respuesta del modelo."""
+        return min(getattr(settings, "OPENAI_MAX_TOKENS", 500), 220) if fast else None
+
+    def _log_lexicon_timings(
+        self,
+        timings: Dict[str, float],
+        counters: Dict[str, int],
+        degradations: Sequence[str] = (),
+    ) -> None:
+        observe_rag_timings(timings)
+        get_latency_estimator().observe_timings(timings, degradations)
+        logger.info(
+            "⏱️ Timings RAG | total=%.0fms prep=%.0fms (saved=%.0fms) emb=%.0fms vs=%.0fms lex=%.0fms lemma=%.0fms ex=%.0fms ctx=%.0fms llm=%.0fms | hits=%d groups=%d ex_calls=%d ex_total=%d",
+            timings.get("total_ms", 0.0),
+            timings.get("preprocessing_total_ms", 0.0),
+            timings.get("preprocessing_saved_ms", 0.0),
+            timings.get("embedding_ms", 0.0),
+            timings.get("vector_search_ms", 0.0),
+            timings.get("lexical_ms", 0.0),
+            timings.get("lemma_lookup_ms", 0.0),
+            timings.get("examples_fetch_ms", 0.0),
+            timings.get("context_build_ms", 0.0),
+            timings.get("llm_ms", 0.0),
+            counters.get("hits_count", 0),
+            counters.get("groups_count", 0),
+            counters.get("examples_api_calls", 0),
+            counters.get("examples_returned_total", 0),
+        )
+
+    async def _embed_lexicon_query(
+        self,
+        query: str,
+        timings: Dict[str, float],
+        counters: Dict[str, int],
+        budget: Optional[LatencyBudget] = None,
+    ) -> Tuple[str, Optional[List[float]]]:
+        """
+        Preprocesado + embedding de la query limpia. Retorna (query limpia, embedding o None).
+
+        Con `budget`, el preprocesado por LLM solo se intenta si caben también
+        las etapas siguientes, y se corta al tiempo que estas dejan libre.
+        """
+        # 1) Preprocesar query: keywords + dirección (informativa) en paralelo
+        if budget is None or not settings.ENABLE_QUERY_PREPROCESSING:
+            cleaned_query, detected_direction = await self._preprocess_query(query, timings, counters)
+        elif not budget.fits("preprocessing_total", "embedding", "vector_search", "llm"):
+            budget.degrade(SKIP_PREPROCESSING)
+            cleaned_query, detected_direction = await self._preprocess_query_local(query, timings, counters)
+        else:
+            spare_ms = budget.remaining_ms() - budget.margin_ms - budget.estimate("embedding", "vector_search", "llm")
+            try:
+                cleaned_query, detected_direction = await asyncio.wait_for(
+                    self._preprocess_query(query, timings, counters),
+                    timeout=max(spare_ms, 0.0) / 1000.0,
+                )
+            except asyncio.TimeoutError:
+                budget.degrade(PREPROCESSING_TIMEOUT)
+                cleaned_query, detected_direction = await self._preprocess_query_local(query, timings, counters)
         logger.info(f"🧭 Dirección detectada (informativo): {detected_direction}")
         
         # 2) Embedding de la query LIMPIA (no la original)
         t_emb0 = time.perf_counter()
-        emb = self.hf_adapter.generate_embedding(cleaned_query)
+        emb = await self.hf_adapter.agenerate_embedding(cleaned_query)
         timings["embedding_ms"] = (time.perf_counter() - t_emb0) * 1000.0
-        if not emb:
-            timings["total_ms"] = (time.perf_counter() - t0) * 1000.0
-            logger.info("⏱️ Timings RAG (falló embedding) | %s", timings)
-            return {"answer": "", "response": "", "results": [], "timings": timings, "counters": counters}
+        return cleaned_query, emb
 
-        t_vs0 = time.perf_counter()
-        # Reducir top_k en modo rápido para acotar latencia en la recuperación
-        effective_top_k = top_k if not fast else min(top_k, 6)
+    @staticmethod
+    def _can_speculate(query: str) -> bool:
+        """Especular solo si hay extracción por LLM que esperar y la consulta es corta (suele venir ya limpia)."""
+        return (
+            settings.SPECULATIVE_RETRIEVAL_ENABLED
+            and settings.ENABLE_QUERY_PREPROCESSING
+            and 0 < len(query.split()) <= settings.SPECULATIVE_RETRIEVAL_MAX_WORDS
+        )
 
-        hits = await self.supabase_adapter.vector_search_bora_docs(
-            query_embedding=emb,
-            top_k=effective_top_k,
-            kinds=None,
-            pos_full=category,
+    @staticmethod
+    def _speculation_match(original: str, cleaned: str) -> Optional[str]:
+        """
+        ¿Sirve la recuperación hecha con la query original para la limpia?
+
+        'exact': iguales salvo mayúsculas/espacios/puntuación de los extremos;
+        'terms': mismo término sin frases guía ("cómo se dice casa en bora" vs
+        "como se dice casa"). None = no. No hay coincidencia aproximada: una
+        letra distinta es otra palabra ("padre"/"madre") o justo la corrección
+        de acento/ortografía que busca la extracción ("pajtsiro" -> "pájtsiro").
+        """
+        if normalize_term(original) == normalize_term(cleaned):
+            return "exact"
+        terms = query_terms(original)
+        if terms and terms == query_terms(cleaned):
+            return "terms"
+        return None
+
+    async def _embed_lexicon_query_speculative(
+        self,
+        query: str,
+        top_k: int,
+        min_similarity: float,
+        category: Optional[str],
+        fast: bool,
+        timings: Dict[str, float],
+        counters: Dict[str, int],
+    ) -> Tuple[Optional[List[float]], Optional[Tuple[List[Dict[str, Any]], str]]]:
+        """
+        Embedding + recuperación con la query original en paralelo con el preprocesado.
+
+        Si la query limpia coincide con la original (_speculation_match) se
+        reutiliza lo recuperado y se retorna (embedding de la query original,
+        (hits, contexto)); si no, se descarta y se retorna (embedding de la
+        query limpia, None) para que el llamador recupere como siempre. La
+        cache semántica solo guarda embeddings de la query original, así que
+        el de la limpia nunca llega a ella.
+
+        Registra speculation_hit / speculation_hit_rate_pct en counters y
+        speculation_saved_ms (recuperación solapada con el preprocesado) en timings.
+        """
+        spec_timings: Dict[str, float] = {}
+        spec_counters: Dict[str, int] = {}
+
+        async def _speculate() -> Tuple[Optional[List[float]], List[Dict[str, Any]], str]:
+            t_emb0 = time.perf_counter()
+            emb = await self.hf_adapter.agenerate_embedding(query)
+            spec_timings["embedding_ms"] = (time.perf_counter() - t_emb0) * 1000.0
+            if not emb:
+                return None, [], ""
+            hits, context = await self._retrieve_lexicon_context(
+                query=query,
+                query_embedding=emb,
+                top_k=top_k,
+                min_similarity=min_similarity,
+                category=category,
+                fast=fast,
+                timings=spec_timings,
+                counters=spec_counters,
+            )
+            spec_timings["speculation_done"] = time.perf_counter()
+            return emb, hits, context
+
+        t_spec0 = time.perf_counter()
+        spec_task = asyncio.ensure_future(_speculate())
+        try:
+            cleaned_query, detected_direction = await self._preprocess_query(query, timings, counters)
+        except BaseException:
+            spec_task.cancel()
+            raise
+        prep_done = time.perf_counter()
+        logger.info(f"🧭 Dirección detectada (informativo): {detected_direction}")
+
+        match = self._speculation_match(query, cleaned_query)
+        if match is not None:
+            emb, hits, context = await spec_task
+            if emb:
+                done = spec_timings.pop("speculation_done")
+                timings.update(spec_timings)
+                counters.update(spec_counters)
+                # Lo que la recuperación especulativa avanzó mientras se esperaba al LLM
+                timings["speculation_saved_ms"] = (min(prep_done, done) - t_spec0) * 1000.0
+                self._record_speculation(True, counters)
+                logger.info(f"⚡ Recuperación especulativa reutilizada ({match}): '{query}' ≈ '{cleaned_query}'")
+                return emb, (hits, context)
+        else:
+            spec_task.cancel()
+        self._record_speculation(False, counters)
+
+        # La query limpia difiere (o falló el embedding especulativo): recuperar con ella
+        t_emb0 = time.perf_counter()
+        emb = await self.hf_adapter.agenerate_embedding(cleaned_query)
+        timings["embedding_ms"] = (time.perf_counter() - t_emb0) * 1000.0
+        return emb, None
+
+    @staticmethod
+    def _record_speculation(hit: bool, counters: Dict[str, int]) -> None:
+        _speculation_stats["hit" if hit else "miss"] += 1
+        record_speculative_retrieval("hit" if hit else "miss")
+        total = _speculation_stats["hit"] + _speculation_stats["miss"]
+        counters["speculation_hit"] = int(hit)
+        counters["speculation_hit_rate_pct"] = int(round(_speculation_stats["hit"] * 100 / total))
+
+    async def _lookup_lemma(self, query: str, counters: Dict[str, int]) -> Optional[Dict[str, Any]]:
+        """
+        Lemma exacto para el boost: mapa en memoria (exacto, minúsculas o sin
+        diacríticos). Solo si el mapa aún no cargó se consulta Supabase.
+        """
+        lemma_map = get_lemma_map()
+        if lemma_map.is_loaded():
+            term = " ".join(query_terms(query))
+            row = lemma_map.lookup_any([query, term] if term else [query])
+            counters["lemma_map_hit"] = int(row is not None)
+            return row
+        counters["lemma_lookup_api_calls"] = 1
+        return await self.supabase_adapter.find_lemma_by_text(query)
+
+    async def _retrieve_lexicon_context(
+        self,
+        query: str,
+        query_embedding: List[float],
+        top_k: int,
+        min_similarity: float,
+        category: Optional[str],
+        fast: bool,
+        timings: Dict[str, float],
+        counters: Dict[str, int],
+        fetch_examples: bool = True,
+    ) -> Tuple[List[Dict[str, Any]], str]:
+        """
+        Etapa de recuperación: búsqueda vectorial -> boost de lemma -> ejemplos -> contexto.
+
+        Returns:
+            (hits, contexto para el LLM)
+        """
+        hits, groups = await self._retrieve_lexicon_groups(
+            query=query,
+            query_embedding=query_embedding,
+            top_k=top_k,
             min_similarity=min_similarity,
-            direction=None,  # ✅ SIEMPRE None - buscar en AMBAS direcciones (mejor recall)
+            category=category,
+            fast=fast,
+            timings=timings,
+            counters=counters,
+            fetch_examples=fetch_examples,
         )
-        hits = hits or []
-        timings["vector_search_ms"] = (time.perf_counter() - t_vs0) * 1000.0
+        return hits, self._build_lexicon_context(groups, timings)
+
+    async def _retrieve_lexicon_groups(
+        self,
+        query: str,
+        query_embedding: List[float],
+        top_k: int,
+        min_similarity: float,
+        category: Optional[str],
+        fast: bool,
+        timings: Dict[str, float],
+        counters: Dict[str, int],
+        fetch_examples: bool = True,
+    ) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """
+        Búsqueda vectorial + léxica (RRF) -> boost de lemma -> agrupación por lemma -> ejemplos.
+
+        Returns:
+            (hits, grupos por lemma en orden de relevancia)
+        """
+        emb = query_embedding
+        # Reducir top_k en modo rápido para acotar latencia en la recuperación
+        effective_top_k = top_k if not fast else min(top_k, 6)
 
-        # Boost si el query coincide exactamente con un lemma (case-sensitive)
+        async def _vector_search() -> List[Dict[str, Any]]:
+            t_vs0 = time.perf_counter()
+            found = await self.vector_store.vector_search_bora_docs(
+                query_embedding=emb,
+                top_k=effective_top_k,
+                kinds=None,
+                pos_full=category,
+                min_similarity=min_similarity,
+                direction=None,  # ✅ SIEMPRE None - buscar en AMBAS direcciones (mejor recall)
+            )
+            timings["vector_search_ms"] = (time.perf_counter() - t_vs0) * 1000.0
+            return found or []
+
+        async def _lexical_search() -> List[Dict[str, Any]]:
+            lexical_index = get_lexical_index()
+            if not getattr(settings, "LEXICAL_SEARCH_ENABLED", True) or not lexical_index.is_loaded():
+                return []
+            t_lex0 = time.perf_counter()
+            found = await asyncio.to_thread(
+                lexical_index.search,
+                query,
+                min(effective_top_k, settings.LEXICAL_TOP_K),
+                category,
+            )
+            timings["lexical_ms"] = (time.perf_counter() - t_lex0) * 1000.0
+            return found
+
+        # Vectorial y léxica en paralelo; se fusionan por RRF antes de agrupar
+        vector_hits, lexical_hits = await asyncio.gather(_vector_search(), _lexical_search())
+        counters["vector_hits"] = len(vector_hits)
+        counters["lexical_hits"] = len(lexical_hits)
+        if lexical_hits:
+            # La fusión junta hasta top_k + LEXICAL_TOP_K candidatos: quedarse con top_k
+            hits = reciprocal_rank_fusion([vector_hits, lexical_hits], k=settings.RRF_K)[:top_k]
+            vector_ids = {h.get('id') for h in vector_hits}
+            counters["lexical_only_hits"] = sum(1 for h in hits if h.get('id') not in vector_ids)
+        else:
+            hits = vector_hits
+
+        # Boost si el query (o su término sin frases guía) coincide con un lemma
         t_lemq0 = time.perf_counter()
-        lemma_row = await self.supabase_adapter.find_lemma_by_text(query)
+        lemma_row = await self._lookup_lemma(query, counters)
         timings["lemma_lookup_ms"] = (time.perf_counter() - t_lemq0) * 1000.0
         if lemma_row:
-            # Determinar la traducción correcta según dirección
-            direction = lemma_row.get('direction', 'bora_es')
-            translation = (
-                lemma_row.get('gloss_bora') if direction == 'es_bora' 
-                else lemma_row.get('gloss_es')
-            )
-            
-            boosted = {
-                'id': -1,
-                'kind': 'lemma',
-                'parent_lemma_id': lemma_row['id'],
-                'subentry_id': None,
-                'example_id': None,
-                'lemma': lemma_row['lemma'],
-                'pos_full': lemma_row.get('pos_full'),
-                'bora_text': None,
-                'spanish_text': None,
-                'gloss_es': lemma_row.get('gloss_es'),
-                'gloss_bora': lemma_row.get('gloss_bora'),
-                'direction': direction,
-                'translation': translation,  # Helper field
-                'similarity': 1.0,  # fuerza al top
-            }
+            boosted = self._lemma_boost_hit(lemma_row)
             # Evitar duplicado del mismo lemma si ya está
             if not any(h.get('kind') == 'lemma' and h.get('lemma') == boosted['lemma'] for h in hits):
                 hits = [boosted] + hits
@@ -513,6 +1703,7 @@ Respuesta:"""
             
             g = groups.setdefault(lemma, {
                 'lemma': lemma,
+                'lemma_id': h.get('parent_lemma_id'),
                 'pos_full': h.get('pos_full'),
                 'gloss_es': h.get('gloss_es'),
                 'gloss_bora': h.get('gloss_bora'),
@@ -533,36 +1724,77 @@ Respuesta:"""
         examples_api_calls = 0
         examples_total = 0
         t_examples_total0 = time.perf_counter()
-        for lemma, g in groups.items():
-            examples = [
+        hit_examples: Dict[str, List[Dict[str, Any]]] = {
+            lemma: [
                 {'bora': it.get('bora_text'), 'es': it.get('spanish_text')}
                 for it in g['items'] if it.get('kind') == 'example' and it.get('bora_text') and it.get('spanish_text')
             ]
+            for lemma, g in groups.items()
+        }
+        fetched_examples: Dict[int, List[Dict[str, Any]]] = {}
+        if not fast and fetch_examples:
+            # Una sola consulta in_() para todos los lemmas que necesitan ejemplos
+            missing_ids = [
+                g['lemma_id'] for lemma, g in groups.items()
+                if g.get('lemma_id') is not None and len(hit_examples[lemma]) < 3
+            ]
+            if missing_ids:
+                t_ex0 = time.perf_counter()
+                fetched_examples = await self.supabase_adapter.get_examples_by_lemma_ids(missing_ids, limit_per_lemma=3)
+                timings["examples_fetch_detail"] = (time.perf_counter() - t_ex0) * 1000.0
+                examples_api_calls = 1
+        for lemma, g in groups.items():
+            examples = hit_examples[lemma]
             if not fast and len(examples) < 3:
-                # Buscar por lemma exacto solo si no estamos en modo rápido
-                lemma_row = await self.supabase_adapter.find_lemma_by_text(lemma)
-                if lemma_row:
-                    t_ex0 = time.perf_counter()
-                    ex_rows = await self.supabase_adapter.get_examples_by_lemma_id(lemma_row['id'], limit=3-len(examples))
-                    timings.setdefault("examples_fetch_detail", 0.0)
-                    timings["examples_fetch_detail"] += (time.perf_counter() - t_ex0) * 1000.0
-                    examples_api_calls += 1
-                    for er in ex_rows:
-                        examples.append({'bora': er.get('bora_text'), 'es': er.get('spanish_text')})
+                seen = {(ex['bora'], ex['es']) for ex in examples}
+                for er in fetched_examples.get(g.get('lemma_id'), []):
+                    pair = (er.get('bora_text'), er.get('spanish_text'))
+                    if pair not in seen:
+                        seen.add(pair)
+                        examples.append({'bora': pair[0], 'es': pair[1]})
             # En modo rápido, nos quedamos solo con los ejemplos ya presentes en hits
             g['examples'] = examples[: (1 if fast else 3)]
             examples_total += len(g['examples'])
         timings["examples_fetch_ms"] = (time.perf_counter() - t_examples_total0) * 1000.0
         counters["examples_api_calls"] = examples_api_calls
         counters["examples_returned_total"] = examples_total
+        # Grupos en el orden de los hits (similitud o rango fusionado; el boost de lemma va primero)
+        return hits, list(groups.values())
+
+    @staticmethod
+    def _lemma_boost_hit(lemma_row: Dict[str, Any]) -> Dict[str, Any]:
+        """Hit sintético para un lemma exacto (boost), con la traducción según su dirección."""
+        direction = lemma_row.get('direction', 'bora_es')
+        translation = (
+            lemma_row.get('gloss_bora') if direction == 'es_bora'
+            else lemma_row.get('gloss_es')
+        )
+        return {
+            'id': -1,
+            'kind': 'lemma',
+            'parent_lemma_id': lemma_row['id'],
+            'subentry_id': None,
+            'example_id': None,
+            'lemma': lemma_row['lemma'],
+            'pos_full': lemma_row.get('pos_full'),
+            'bora_text': None,
+            'spanish_text': None,
+            'gloss_es': lemma_row.get('gloss_es'),
+            'gloss_bora': lemma_row.get('gloss_bora'),
+            'direction': direction,
+            'translation': translation,  # Helper field
+            'similarity': 1.0,  # fuerza al top
+        }
 
-        # Construir contexto interno (solo para el LLM). No debe ser repetido en la respuesta.
-        # Ordenar grupos por similitud
+    @staticmethod
+    def _build_lexicon_context(ordered: List[Dict[str, Any]], timings: Dict[str, float]) -> str:
+        """Contexto interno (solo para el LLM). No debe ser repetido en la respuesta."""
         t_ctx0 = time.perf_counter()
-        ordered = sorted(groups.values(), key=lambda x: x['best_similarity'], reverse=True)
         context_lines: List[str] = ["[CONTEXTO (no lo repitas en la respuesta)]"]
         for i, g in enumerate(ordered, 1):
             sim = g['best_similarity']
+            # Grupos encontrados solo por la búsqueda léxica no tienen similitud vectorial
+            match = f"sim {sim:.2f}" if sim > 0 else "coincidencia léxica"
             # Mostrar traducción según dirección del diccionario
             direction = g.get('direction', 'bora_es')
             translation = g.get('translation') or ''
@@ -570,76 +1802,17 @@ Respuesta:"""
             # Formato adaptado según dirección
             if direction == 'es_bora':
                 # ES→Bora: lemma es español, traducción es Bora
-                line = f"{i}. [Lemma ES→Bora | sim {sim:.2f}] {g['lemma']} — DEF_BORA: {translation} — POS: {g.get('pos_full') or ''}"
+                line = f"{i}. [Lemma ES→Bora | {match}] {g['lemma']} — DEF_BORA: {translation} — POS: {g.get('pos_full') or ''}"
             else:
                 # Bora→ES: lemma es Bora, traducción es español (default)
-                line = f"{i}. [Lemma | sim {sim:.2f}] {g['lemma']} — DEF_ES: {translation} — POS: {g.get('pos_full') or ''}"
+                line = f"{i}. [Lemma | {match}] {g['lemma']} — DEF_ES: {translation} — POS: {g.get('pos_full') or ''}"
             
             context_lines.append(line)
             for ex in g['examples']:
                 context_lines.append(f"   • Ejemplo: BORA: \"{ex['bora']}\" — ES: \"{ex['es']}\"")
         context = "\n".join(context_lines) if len(context_lines) > 1 else "No se encontró información relevante."
         timings["context_build_ms"] = (time.perf_counter() - t_ctx0) * 1000.0
-
-        # Generar respuesta con el LLM existente
-        t_llm0 = time.perf_counter()
-        # Reducir presupuesto de salida en modo rápido para acelerar la respuesta del modelo
-        fast_max_tokens = min(getattr(settings, "OPENAI_MAX_TOKENS", 500), 220) if fast else None
-        answer = await self.generate_response(
-            query=query,
-            context=context,
-            conversation_history=conversation_history,
-            response_max_tokens=fast_max_tokens,
-        )
-        timings["llm_ms"] = (time.perf_counter() - t_llm0) * 1000.0
-        timings["total_ms"] = (time.perf_counter() - t0) * 1000.0
-
-        logger.info(
-            "⏱️ Timings RAG | total=%.0fms prep=%.0fms emb=%.0fms vs=%.0fms lemma=%.0fms ex=%.0fms ctx=%.0fms llm=%.0fms | hits=%d groups=%d ex_calls=%d ex_total=%d",
-            timings.get("total_ms", 0.0),
-            timings.get("preprocessing_ms", 0.0),
-            timings.get("embedding_ms", 0.0),
-            timings.get("vector_search_ms", 0.0),
-            timings.get("lemma_lookup_ms", 0.0),
-            timings.get("examples_fetch_ms", 0.0),
-            timings.get("context_build_ms", 0.0),
-            timings.get("llm_ms", 0.0),
-            counters.get("hits_count", 0),
-            counters.get("groups_count", 0),
-            counters.get("examples_api_calls", 0),
-            counters.get("examples_returned_total", 0),
-        )
-
-        # Devolvemos ambas claves por compatibilidad retro (algunas vistas usan "response")
-        result = {
-            "answer": answer,
-            "response": answer,
-            "results": hits,
-            "timings": timings,
-            "counters": counters,
-            "conversation_id": conversation_id,
-        }
-
-        if persist:
-            if not db or not user_id:
-                logger.warning("Persistencia de chat solicitada sin db/user_id")
-            else:
-                stored_conversation_id = self._persist_chat_exchange(
-                    db=db,
-                    user_id=user_id,
-                    query=query,
-                    answer=answer,
-                    conversation_id=conversation_id,
-                )
-                if stored_conversation_id:
-                    conversation_id = stored_conversation_id
-                    result["conversation_id"] = stored_conversation_id
-
-        # Guardar en cache
-        if use_cache and cache_key:
-            _lexicon_cache[cache_key] = (now + _CACHE_TTL_SECONDS, result)
-
-        return result
+        return context
 
     # ==========================================
     # INGESTA DE CORPUS DESDE salida.json
@@ -754,7 +1927,7 @@ Respuesta:"""
             Lista de frases similares con scores
         """
         # Generar embedding de la consulta
-        query_embedding = self.hf_adapter.generate_embedding(query)
+        query_embedding = await self.hf_adapter.agenerate_embedding(query)
         
         if not query_embedding:
             logger.error("No se pudo generar embedding de la consulta")
@@ -816,11 +1989,13 @@ Respuesta:"""
         """
         Genera respuesta usando LLM con contexto
 
-        Estrategia (configurable por settings):
-        - Si settings.LLM_PROVIDER == 'openai': usar OpenAI. Si falla y
-          settings.ALLOW_HF_LLM_FALLBACK es False, lanzar excepción.
-          Si ALLOW_HF_LLM_FALLBACK es True, intentar Hugging Face (API).
-        - Si settings.LLM_PROVIDER == 'huggingface': usar Hugging Face (API).
+        Estrategia (services/llm_router.py, configurable por settings):
+        - Proveedor principal settings.LLM_PROVIDER ('openai' o 'huggingface').
+        - Con LLM_PROVIDER='openai' y ALLOW_HF_LLM_FALLBACK, Hugging Face (API)
+          como secundario: tras un fallo o, con LLM_HEDGE_ENABLED, en paralelo
+          si OpenAI supera su p95.
+        - Cada proveedor tiene circuit breaker: abierto, se salta sin esperar
+          su timeout. Si ninguno responde, lanza RuntimeError.
 
         Args:
             query: Pregunta del usuario
@@ -833,55 +2008,10 @@ Respuesta:"""
         # Construir mensajes (system + user) para mejorar obediencia al estilo
         messages = self._build_messages(query, context, conversation_history)
 
-        response = None
-
-        provider = getattr(settings, "LLM_PROVIDER", "openai").lower()
         # Permite reducir tokens de salida en modo rápido
         max_tokens_override = response_max_tokens if (response_max_tokens and response_max_tokens > 0) else None
 
-        if provider == "openai":
-            # OpenAI como proveedor principal
-            if self.openai_adapter and settings.OPENAI_API_KEY:
-                try:
-                    logger.info(f"🤖 Generando respuesta con OpenAI ({settings.OPENAI_MODEL})...")
-                    response = await self.openai_adapter.chat_completion(
-                        messages=messages,
-                        temperature=settings.OPENAI_TEMPERATURE,
-                        max_tokens=(max_tokens_override or settings.OPENAI_MAX_TOKENS)
-                    )
-                    logger.info("✓ Respuesta generada con OpenAI")
-                except Exception as e:
-                    logger.error(f"❌ OpenAI falló: {e}")
-                    # ¿Permitir fallback a HF?
-                    if getattr(settings, "ALLOW_HF_LLM_FALLBACK", False):
-                        logger.info("🔁 Intentando con Hugging Face (Inference API) como fallback...")
-                        response = self.hf_adapter.chat_completion(
-                            messages=messages,
-                            max_tokens=(max_tokens_override or getattr(settings, "LLM_MAX_NEW_TOKENS", 320)),
-                        )
-                    else:
-                        # Modo estricto: fallar inmediatamente
-                        raise RuntimeError("LLM (OpenAI) no disponible y fallback deshabilitado")
-            else:
-                # OpenAI no configurado
-                if getattr(settings, "ALLOW_HF_LLM_FALLBACK", False):
-                    logger.info("🔁 OpenAI no configurado. Usando Hugging Face (Inference API) como fallback...")
-                    response = self.hf_adapter.chat_completion(
-                        messages=messages,
-                        max_tokens=(max_tokens_override or getattr(settings, "LLM_MAX_NEW_TOKENS", 320)),
-                    )
-                else:
-                    raise RuntimeError("OpenAI no configurado y fallback deshabilitado")
-
-        elif provider == "huggingface":
-            # Usar directamente Hugging Face (Inference API)
-            logger.info("🤖 Generando respuesta con Hugging Face (Inference API)...")
-            response = self.hf_adapter.chat_completion(
-                messages=messages,
-                max_tokens=(max_tokens_override or getattr(settings, "LLM_MAX_NEW_TOKENS", 320)),
-            )
-        else:
-            raise ValueError(f"LLM_PROVIDER no soportado: {provider}")
+        response = await get_llm_router().generate(messages, max_tokens_override)
 
         if not response:
             # Si llegamos aquí sin respuesta, entregar fallback simple (mensaje educativo)
@@ -954,75 +2084,21 @@ Responde en un solo bloque de texto usando la mejor información del CONTEXTO: s
         context: str,
         conversation_history: Optional[List[Dict]] = None
     ) -> List[Dict[str, str]]:
-        """Construye mensajes con rol system+user para usar chat_completion."""
-        system = (
-            "Eres el Mentor Bora, un profesor amable y cercano que enseña el idioma Bora (lengua indígena amazónica) a hispanohablantes.\n\n"
-            
-            "Tu misión:\n"
-            "- Responder de forma conversacional, clara y educativa (150-200 palabras máximo)\n"
-            "- Usar SOLO información del CONTEXTO proporcionado - nunca inventes datos\n"
-            "- Ayudar con: traducciones Bora-Español, definiciones, ejemplos de uso, pronunciación básica\n\n"
-            
-            "Reglas importantes:\n"
-            "- Usa la MEJOR información disponible del CONTEXTO: traducción literal si existe, o la aproximación más cercana\n"
-            "- Responde directamente a la pregunta del estudiante con un tono cálido y motivador\n"
-            "- Explica el por qué cuando sea relevante (etimología, contexto cultural, diferencias con sinónimos)\n"
-            "- Incluye 1-2 ejemplos prácticos en Bora con su traducción al español cuando ayuden al entendimiento\n"
-            "- Si el contexto es insuficiente, sé honesto pero ofrece alternativas relacionadas\n"
-            "- Escribe en párrafos naturales (NO uses formato tipo formulario o secciones rígidas)\n"
-            "- Evita términos técnicos innecesarios - habla como un maestro, no como un diccionario\n\n"
-            
-            "Formato de respuesta ADAPTATIVO:\n"
-            "1. Si hay traducción literal → úsala primero (ej: 'En bora, abrazar se dice ámabúcu o chiááve')\n"
-            "2. Si solo hay aproximaciones o ejemplos → úsalos como mejor opción disponible\n"
-            "3. Explica el contexto o significado si es relevante\n"
-            "4. Da ejemplos prácticos cuando clarifiquen el uso\n"
-            "5. Agrega un consejo o nota cultural si es relevante\n\n"
-            
-            "Ejemplo de buen estilo:\n"
-            "Claro! Para saludar en Bora puedes decir 'a uúj' cuando llegas. Esta palabra significa 'hola' en general. Por ejemplo: ' ¿A aabye uúj; kiávú u pééhií?' significa 'Hola amigo, ¿a dónde vas?'. Los Bora valoran mucho los saludos al encontrarse, así que es una excelente forma de iniciar cualquier conversación.\n\n"
-            
-            "NUNCA uses estos formatos rígidos:\n"
-            "- Respuesta: ...\n"
-            "- Por qué: ...\n"
-            "- Confianza: Alta o Baja\n"
-            "- Citas: ...\n"
-            "Simplemente responde de forma natural y conversacional.\n\n"
-            
-            "Recibirás:\n"
-            "- query: La pregunta del estudiante\n"
-            "- context: Información del lexicón Bora (usa esto como referencia, pero no lo copies literalmente)"
-        )
-        # Historial breve opcional
-        history_parts: List[Dict[str, str]] = []
-        if conversation_history:
-            for msg in conversation_history[-3:]:
-                role = msg.get('role', 'user')
-                content = msg.get('content', '')
-                history_parts.append({'role': role, 'content': content})
+        """
+        Construye mensajes system+historial+user para chat_completion.
 
-        user = (
-            f"<query>{query}</query>\n"
-            f"<context>\n{context}\n</context>"
-        )
-        return [{'role': 'system', 'content': system}] + history_parts + [{'role': 'user', 'content': user}]
+        El system prompt estático va siempre primero y sin cambios (prompt
+        caching del proveedor); historial y contexto se recortan al presupuesto
+        PROMPT_MAX_INPUT_TOKENS (services/prompt_assembler.py).
+        """
+        return get_prompt_assembler().assemble(query, context, conversation_history)
 
     def _post_process_mentor_response(self, text: str) -> str:
         """Limpia ecos del contexto pero conserva el formato de secciones solicitado."""
         if not text:
             return text
         lines = [l for l in text.splitlines() if l.strip()]
-        cleaned: List[str] = []
-        import re
-        for l in lines:
-            ls = l.strip()
-            # Filtrar ecos típicos
-            if ls.startswith('[CONTEXTO') or 'Entradas relevantes' in ls:
-                continue
-            # Filtrar líneas que parezcan ser el listado crudo del contexto
-            if re.match(r'^\d+\.\s*\[Lemma\b', ls):
-                continue
-            cleaned.append(ls)
+        cleaned: List[str] = [l.strip() for l in lines if not _is_context_echo_line(l.strip())]
         # Conservar saltos de línea para las secciones (Respuesta/Por qué/Ejemplo/Citas/Confianza)
         return "\n".join(cleaned)
     
@@ -1044,6 +2120,9 @@ Responde en un solo bloque de texto usando la mejor información del CONTEXTO: s
                 break
 
         if not picks:
+            lexicon_answer = self._lexicon_fallback_response(lines)
+            if lexicon_answer:
+                return lexicon_answer
             return f"Encontré estas frases relevantes en Bora:\n\n{context}"
 
         bora, esp = picks[0]
@@ -1059,6 +2138,46 @@ Responde en un solo bloque de texto usando la mejor información del CONTEXTO: s
             f"3) Cuándo usarla: Frase sugerida según similitud semántica con tu consulta." 
             f"{alt_text}"
         )
+
+    @staticmethod
+    def _lexicon_fallback_response(lines: List[str]) -> Optional[str]:
+        """
+        Respuesta determinista a partir del contexto del lexicón (_build_lexicon_context):
+        la mejor entrada con su traducción y un ejemplo, más hasta 2 alternativas.
+        """
+        entries: List[Dict[str, Any]] = []
+        for line in lines:
+            # 1. [Lemma ES→Bora | sim 0.82] cantar — DEF_BORA: ... — POS: verbo
+            m = re.match(r'^\d+\. \[Lemma( ES→Bora)?[^\]]*\] (.+?) — DEF_(?:BORA|ES): (.*?) — POS: ?(.*)$', line)
+            if m:
+                entries.append({
+                    "es_bora": bool(m.group(1)),
+                    "lemma": m.group(2).strip(),
+                    "translation": m.group(3).strip(),
+                    "pos": m.group(4).strip(),
+                    "example": None,
+                })
+                continue
+            # • Ejemplo: BORA: "..." — ES: "..."
+            m = re.search(r'Ejemplo: BORA: "([^"]+)" — ES: "([^"]+)"', line)
+            if m and entries and entries[-1]["example"] is None:
+                entries[-1]["example"] = (m.group(1), m.group(2))
+        if not entries:
+            return None
+
+        best = entries[0]
+        if best["es_bora"]:
+            head = f"1) En Bora, «{best['lemma']}» se dice: {best['translation'] or '(sin definición)'}"
+        else:
+            head = f"1) «{best['lemma']}» en español: {best['translation'] or '(sin definición)'}"
+        parts = [head + (f" ({best['pos']})" if best["pos"] else "")]
+        if best["example"]:
+            bora, es = best["example"]
+            parts.append(f"2) Ejemplo: \"{bora}\" — \"{es}\"")
+        alts = [f"{e['lemma']}: {e['translation']}" for e in entries[1:3] if e["translation"]]
+        if alts:
+            parts.append(f"{len(parts) + 1}) Otras entradas: " + "; ".join(alts))
+        return "\n".join(parts)
     
     # ==========================================
     # PIPELINE COMPLETO DE RAG
@@ -1103,22 +2222,8 @@ Responde en un solo bloque de texto usando la mejor información del CONTEXTO: s
             # 2. Construir contexto
             context = await self.get_context_from_phrases(similar_phrases)
             
-            # 3. Obtener historial si existe conversación
-            conversation_history = []
-            if conversation_id:
-                conversation = db.query(ChatConversation).filter(
-                    ChatConversation.id == conversation_id
-                ).first()
-                
-                if conversation:
-                    messages = db.query(ChatMessage).filter(
-                        ChatMessage.conversation_id == conversation_id
-                    ).order_by(ChatMessage.created_at).all()
-                    
-                    conversation_history = [
-                        {"role": msg.role, "content": msg.content}
-                        for msg in messages
-                    ]
+            # 3. Obtener historial reciente si existe conversación (el prompt usa solo los últimos)
+            conversation_history = self._fetch_conversation_history_from_db(db, conversation_id)
             
             # 4. Generar respuesta
             response_text = await self.generate_response(
@@ -1128,6 +2233,7 @@ Responde en un solo bloque de texto usando la mejor información del CONTEXTO: s
             )
             
             # 5. Guardar en historial
+            created = not conversation_id
             if not conversation_id:
                 # Crear nueva conversación
                 new_conversation = ChatConversation(
@@ -1156,6 +2262,12 @@ Responde en un solo bloque de texto usando la mejor información del CONTEXTO: s
             db.add(assistant_message)
             
             db.commit()
+            get_conversation_history_cache().append(
+                conversation_id,
+                [{"role": "user", "content": query}, {"role": "assistant", "content": response_text}],
+                new=created,
+            )
+            get_conversation_summarizer().note_exchange(conversation_id)
             
             # 6. Retornar resultado
             return {
@@ -0,0 +1,220 @@
+"""
+Cache semántica de respuestas del lexicón para MIAPPBORA
+Reutiliza respuestas de consultas parafraseadas ("como se dice cantar" ~ "cómo digo cantar en bora")
+
+Cada entrada guarda el embedding de la query original junto a la respuesta,
+así que se consulta antes del preprocesado con LLM. Solo compiten entradas del
+mismo ámbito (categoría/top_k/min_similarity/fast) y con la misma clave de
+término (semantic_query_key): dos consultas casi idénticas sobre palabras
+distintas ("perro"/"perros", "cómo se dice padre"/"cómo se dice madre") nunca
+se confunden aunque sus embeddings superen el umbral. Entre las candidatas, la
+búsqueda es un escaneo coseno vectorizado (numpy); con pocos miles de entradas
+es más rápido que mantener un índice ANN.
+
+La clave ya exige la misma dirección y los mismos términos, así que el umbral
+(SEMANTIC_CACHE_THRESHOLD) rara vez decide: con la configuración por defecto
+solo descarta paráfrasis cuya redacción cambia mucho el embedding (consultas
+largas con contexto extra alrededor del término). La cache aporta sobre todo
+que esas paráfrasis se resuelvan antes del preprocesado con LLM, que sí
+es costoso.
+"""
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+import logging
+import time
+
+import numpy as np
+
+from config.settings import settings
+from services.direction_detector import get_direction_detector, normalize_term, query_terms
+
+logger = logging.getLogger(__name__)
+
+
+def make_semantic_scope(top_k: int, min_sim: float, category: Optional[str], fast: bool) -> str:
+    """Ámbito de reutilización: mismos parámetros que la clave exacta, sin la query."""
+    cat = (category or '').strip().lower()
+    return f"k={top_k}|s={min_sim:.3f}|c={cat}|f={int(bool(fast))}"
+
+
+def semantic_query_key(query: str) -> str:
+    """
+    Clave de término: dirección detectada + términos sin frases guía.
+
+    Las paráfrasis de una misma pregunta ("como se dice cantar" / "cómo digo
+    cantar en bora") comparten clave; consultas sobre otra palabra o en la
+    dirección contraria no.
+    """
+    terms = " ".join(query_terms(query)) or normalize_term(query)
+    direction, _ = get_direction_detector().classify(query)
+    return f"{direction or '-'}|{terms}"
+
+
+class SemanticAnswerCache:
+    """
+    Cache de respuestas indexada por similitud de embeddings
+
+    - Buffer circular de `max_entries` filas (matriz float32 normalizada)
+    - Una entrada solo se reutiliza dentro de su ámbito, con la misma clave de
+      término y antes de vencer su TTL
+    - `threshold` es la similitud coseno mínima para considerar dos consultas equivalentes
+    """
+
+    def __init__(
+        self,
+        max_entries: Optional[int] = None,
+        threshold: Optional[float] = None,
+        ttl_seconds: Optional[float] = None,
+    ):
+        self.max_entries = max_entries if max_entries is not None else settings.SEMANTIC_CACHE_MAX_ENTRIES
+        self.threshold = threshold if threshold is not None else settings.SEMANTIC_CACHE_THRESHOLD
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else settings.LEXICON_CACHE_TTL_SECONDS
+
+        self._matrix: Optional[np.ndarray] = None
+        self._expires = np.zeros(self.max_entries, dtype=np.float64)
+        # (ámbito, clave de término) -> slots; acotado por max_entries
+        self._slots: Dict[Tuple[str, str], Set[int]] = {}
+        self._slot_keys: List[Optional[Tuple[str, str]]] = [None] * self.max_entries
+        self._queries: List[Optional[str]] = [None] * self.max_entries
+        self._values: List[Optional[Dict[str, Any]]] = [None] * self.max_entries
+        self._next = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+
+    # ==========================================
+    # API PÚBLICA
+    # ==========================================
+
+    def has_candidates(self, scope: str, key: str) -> bool:
+        """Si hay entradas vigentes con ese ámbito y clave (evita embeber para nada)."""
+        return self._live_slots(scope, key).size > 0
+
+    def lookup(
+        self,
+        embedding: Optional[Sequence[float]],
+        scope: str,
+        key: str,
+    ) -> Optional[Tuple[Dict[str, Any], float, str]]:
+        """
+        Busca la entrada vigente más parecida del mismo ámbito y clave de término.
+
+        Returns:
+            (valor, similitud, query original) si supera el umbral, o None
+            (un embedding None cuenta como fallo)
+        """
+        query = self._normalize(embedding)
+        if query is None or self._matrix is None or self._matrix.shape[1] != query.shape[0]:
+            self.misses += 1
+            return None
+
+        candidates = self._live_slots(scope, key)
+        if not candidates.size:
+            self.misses += 1
+            return None
+
+        sims = self._matrix[candidates] @ query
+        best = int(np.argmax(sims))
+        similarity = float(sims[best])
+        if similarity < self.threshold:
+            self.misses += 1
+            return None
+
+        slot = int(candidates[best])
+        self.hits += 1
+        return self._values[slot], similarity, self._queries[slot] or ""
+
+    def store(
+        self,
+        embedding: Sequence[float],
+        scope: str,
+        key: str,
+        query: str,
+        value: Dict[str, Any],
+    ) -> None:
+        """Guarda la respuesta en el siguiente slot del buffer circular."""
+        vec = self._normalize(embedding)
+        if vec is None:
+            return
+        if self._matrix is None or self._matrix.shape[1] != vec.shape[0]:
+            # Primera entrada (o cambio de modelo de embeddings): reservar matriz
+            self._matrix = np.zeros((self.max_entries, vec.shape[0]), dtype=np.float32)
+            self._expires[:] = 0.0
+
+        slot = self._next
+        self._next = (self._next + 1) % self.max_entries
+        self._release_slot(slot)
+        self._matrix[slot] = vec
+        self._expires[slot] = time.monotonic() + self.ttl_seconds
+        self._slot_keys[slot] = (scope, key)
+        self._slots.setdefault((scope, key), set()).add(slot)
+        self._queries[slot] = query
+        self._values[slot] = value
+        self.stores += 1
+
+    def invalidate(self) -> int:
+        """Vacía la cache (tras re-ingesta o refresco del índice vectorial)."""
+        removed = int(np.count_nonzero(self._expires > time.monotonic()))
+        self._expires[:] = 0.0
+        self._values = [None] * self.max_entries
+        self._slots.clear()
+        self._slot_keys = [None] * self.max_entries
+        self._queries = [None] * self.max_entries
+        logger.info(f"🧹 Cache semántica invalidada ({removed} entradas)")
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": bool(getattr(settings, "SEMANTIC_CACHE_ENABLED", True)),
+            "entries": int(np.count_nonzero(self._expires > time.monotonic())),
+            "max_entries": self.max_entries,
+            "threshold": self.threshold,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "stores": self.stores,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+    # ==========================================
+    # INTERNOS
+    # ==========================================
+
+    def _live_slots(self, scope: str, key: str) -> np.ndarray:
+        slots = self._slots.get((scope, key))
+        if not slots:
+            return np.empty(0, dtype=np.int64)
+        candidates = np.fromiter(slots, dtype=np.int64, count=len(slots))
+        return candidates[self._expires[candidates] > time.monotonic()]
+
+    def _release_slot(self, slot: int) -> None:
+        """Saca el slot (que se va a sobrescribir) del índice por clave."""
+        old = self._slot_keys[slot]
+        if old is None:
+            return
+        slots = self._slots.get(old)
+        if slots is not None:
+            slots.discard(slot)
+            if not slots:
+                del self._slots[old]
+        self._slot_keys[slot] = None
+
+    @staticmethod
+    def _normalize(embedding: Sequence[float]) -> Optional[np.ndarray]:
+        if embedding is None or len(embedding) == 0:
+            return None
+        vec = np.asarray(embedding, dtype=np.float32)
+        norm = float(np.linalg.norm(vec))
+        if norm == 0.0:
+            return None
+        return vec / norm
+
+
+# Instancia global (compartida por todas las instancias de RAGService)
+semantic_cache = SemanticAnswerCache()
+
+
+def get_semantic_cache() -> SemanticAnswerCache:
+    """Función helper para obtener la cache semántica"""
+    return semantic_cache
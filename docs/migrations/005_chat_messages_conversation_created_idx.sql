@@ -0,0 +1,29 @@
+-- ============================================================================
+-- Migración: Índice compuesto para el historial reciente del mentor
+-- ============================================================================
+-- Problema:
+--   El historial se lee como
+--     SELECT role, content FROM chat_messages
+--     WHERE conversation_id = $1
+--     ORDER BY created_at DESC, id DESC
+--     LIMIT $2;
+--   Con solo el índice sobre conversation_id, Postgres ordena todos los mensajes
+--   de la conversación en cada turno (cada vez más lento en conversaciones largas).
+--
+-- Solución:
+--   Índice (conversation_id, created_at): el LIMIT se resuelve recorriendo el
+--   índice hacia atrás y leyendo solo las filas necesarias.
+--   El modelo SQLAlchemy (ChatMessage.__table_args__) declara el mismo índice
+--   para bases creadas con create_all.
+--
+-- Uso:
+--   Ejecutar en Supabase SQL Editor (CONCURRENTLY no bloquea escrituras;
+--   no puede ir dentro de una transacción)
+-- ============================================================================
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_chat_messages_conversation_created
+ON chat_messages (conversation_id, created_at);
+
+-- El índice simple sobre conversation_id queda cubierto por el compuesto
+-- (prefijo). Se puede eliminar tras verificar los planes con EXPLAIN:
+-- DROP INDEX CONCURRENTLY IF EXISTS ix_chat_messages_conversation_id;
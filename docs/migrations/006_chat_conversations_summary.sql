@@ -0,0 +1,26 @@
+-- ============================================================================
+-- Migración: Resumen incremental de conversaciones del mentor
+-- ============================================================================
+-- Problema:
+--   Las conversaciones largas crecen sin límite y el historial que llega al
+--   prompt (y su latencia) crece con ellas.
+--
+-- Solución:
+--   Cada conversación guarda un resumen de sus mensajes antiguos, que un
+--   worker en segundo plano actualiza cada CONVERSATION_SUMMARY_EVERY_EXCHANGES
+--   intercambios. El prompt usa resumen + últimos turnos.
+--     summary                -> texto del resumen (NULL = aún sin resumir)
+--     summary_message_count  -> cuántos mensajes (los más antiguos) cubre
+--   El modelo SQLAlchemy (ChatConversation) declara las mismas columnas para
+--   bases creadas con create_all, sin mapearlas en el ORM: sin esta migración
+--   la app sigue funcionando mientras CONVERSATION_SUMMARY_ENABLED=false.
+--   Activar el flag solo después de ejecutarla.
+--
+-- Uso:
+--   Ejecutar en Supabase SQL Editor (ADD COLUMN con DEFAULT constante no
+--   reescribe la tabla en Postgres 11+)
+-- ============================================================================
+
+ALTER TABLE chat_conversations
+    ADD COLUMN IF NOT EXISTS summary TEXT,
+    ADD COLUMN IF NOT EXISTS summary_message_count INTEGER NOT NULL DEFAULT 0;